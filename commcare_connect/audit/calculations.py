@@ -59,7 +59,9 @@ class AuditCalculation(ABC):
     Subclasses declare a ``name`` and ``label`` and implement :meth:`compute`,
     returning ``(value, sample_size)``. The base class handles the
     "insufficient data" short-circuit and the bounds check, so concrete
-    subclasses don't repeat that boilerplate.
+    subclasses don't repeat that boilerplate. Calculations that can measure many
+    workers in one query also implement :meth:`compute_many`, which reports use
+    through :meth:`run_many`; :class:`BatchedAuditCalculation` implements only that.
 
     Tuning knobs (override as class attributes):
 
@@ -86,8 +88,26 @@ class AuditCalculation(ABC):
         is taken over a different population than the gating ``sample_size``.
         """
 
+    def compute_many(self, opportunity_accesses, period_start, period_end) -> dict[int, Measurement] | None:
+        """Optionally compute the measurements of several accesses together, keyed by access id.
+
+        Accesses left out of the result have no data. Returns ``None`` when the calculation
+        can't batch, in which case :meth:`run_many` calls :meth:`compute` for each access.
+        """
+        return None
+
     def run(self, opportunity_access, period_start, period_end) -> CalculationResult:
-        m = self.compute(opportunity_access, period_start, period_end)
+        return self._result(self.compute(opportunity_access, period_start, period_end))
+
+    def run_many(self, opportunity_accesses, period_start, period_end) -> dict[int, CalculationResult]:
+        """Results of several accesses keyed by access id, using :meth:`compute_many` where available."""
+        measurements = self.compute_many(opportunity_accesses, period_start, period_end)
+        if measurements is None:
+            return {access.id: self.run(access, period_start, period_end) for access in opportunity_accesses}
+        no_data = Measurement(None, 0)
+        return {access.id: self._result(measurements.get(access.id, no_data)) for access in opportunity_accesses}
+
+    def _result(self, m: Measurement) -> CalculationResult:
         has_sufficient_data = m.sample_size >= self.min_sample_size
         if not has_sufficient_data:
             return CalculationResult(
@@ -123,6 +143,18 @@ class AuditCalculation(ABC):
         return True
 
 
+class BatchedAuditCalculation(AuditCalculation):
+    """Audit calculation implemented by :meth:`compute_many`, which also serves single accesses."""
+
+    @abstractmethod
+    def compute_many(self, opportunity_accesses, period_start, period_end) -> dict[int, Measurement]:
+        """Return the :class:`Measurement` of each access with data, keyed by access id."""
+
+    def compute(self, opportunity_access, period_start, period_end) -> Measurement:
+        measurements = self.compute_many([opportunity_access], period_start, period_end)
+        return measurements.get(opportunity_access.id, Measurement(None, 0))
+
+
 def format_value(result: dict, with_fraction: bool = False) -> str:
     """Format a calculation result dict for display. Reads ``value`` and,
     for percentages, ``numerator``/``denominator``; for values built from
@@ -6,9 +6,15 @@ from django.db.models import Count, F, IntegerField, Max, Q, Sum, Value
 from django.db.models.fields.json import KeyTextTransform
 from django.db.models.functions import Cast, NullIf
 
-from commcare_connect.audit.calculations import AuditCalculation, Measurement, register_calculation
+from commcare_connect.audit.calculations import (
+    AuditCalculation,
+    BatchedAuditCalculation,
+    Measurement,
+    register_calculation,
+)
 from commcare_connect.microplanning.models import WorkArea, WorkAreaGroup, WorkAreaStatus
 from commcare_connect.opportunity.models import UserVisit
+from commcare_connect.opportunity.utils.form_json_keys import is_form_json_key_absent
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +62,46 @@ def _q_link_present(form_field) -> Q:
     return Q(**{f"{path}__isnull": False}) & ~Q(**{path: ""})
 
 
+def _form_field_absent(opportunity_access, form_field) -> bool:
+    """Return whether no visit to the deliver app has the field, see ``is_form_json_key_absent``.
+
+    Indicators whose visits must have the field can then skip their visit queries altogether.
+    """
+    path = ("form", *form_field.split("__"))
+    return is_form_json_key_absent(opportunity_access.opportunity.deliver_app, path)
+
+
+def _accesses_with_form_field(opportunity_accesses, form_field) -> list[int]:
+    """Ids of the accesses whose deliver app may have visits with the field, see ``_form_field_absent``."""
+    absent_by_app = {}
+    access_ids = []
+    for access in opportunity_accesses:
+        app_id = access.opportunity.deliver_app_id
+        if app_id not in absent_by_app:
+            absent_by_app[app_id] = _form_field_absent(access, form_field)
+        if not absent_by_app[app_id]:
+            access_ids.append(access.id)
+    return access_ids
+
+
+def _service_visits(access_ids, period_start, period_end):
+    """Service delivery visits of the accesses in the period, to be grouped by access."""
+    return UserVisit.objects.filter(
+        opportunity_access_id__in=access_ids,
+        visit_date__date__range=(period_start, period_end),
+        deliver_unit__slug=SERVICE_DELIVERY_SLUG,
+    ).values("opportunity_access_id")
+
+
+def _percent_measurements(rows, numerator) -> dict[int, Measurement]:
+    """Measure ``numerator`` as a percentage of ``total`` for each access's grouped row."""
+    return {
+        row["opportunity_access_id"]: Measurement(_percent(row[numerator], row["total"]), row["total"])
+        for row in rows
+        if row["total"]
+    }
+
+
 def _json_int(form_field) -> Cast:
     """Cast a __-delimited form_json field to an integer for numeric comparison.
 
@@ -123,7 +169,7 @@ def _find_last_closed_wag(opportunity_access, period_end) -> WorkAreaGroup | Non
 
 
 @register_calculation
-class CampingRatio(AuditCalculation):
+class CampingRatio(BatchedAuditCalculation):
     """Detect inflated visit reporting within a Work Area's building count.
     Flags if any WA has >MAX_VISITS_PER_BUILDING visits per building in the report week.
     Returns count of camping WAs; upper_bound=0 means any camping WA flags the FLW.
@@ -135,30 +181,25 @@ class CampingRatio(AuditCalculation):
     min_sample_size = 1
     upper_bound = 0
 
-    def compute(self, opportunity_access, period_start, period_end):
+    def compute_many(self, opportunity_accesses, period_start, period_end):
         wa_visit_counts = (
-            UserVisit.objects.filter(
-                opportunity_access=opportunity_access,
-                visit_date__date__range=(period_start, period_end),
-                work_area__isnull=False,
-                work_area__building_count__gt=0,
-                deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-            )
-            .values("work_area_id", "work_area__building_count")
+            _service_visits([access.id for access in opportunity_accesses], period_start, period_end)
+            .filter(work_area__isnull=False, work_area__building_count__gt=0)
+            .values("opportunity_access_id", "work_area_id", "work_area__building_count")
             .annotate(visit_count=Count("id"))
         )
 
-        total_evaluated = len(wa_visit_counts)
-        camping_count = sum(
-            1
-            for row in wa_visit_counts
-            if row["visit_count"] > MAX_VISITS_PER_BUILDING * row["work_area__building_count"]
-        )
-        return Measurement(camping_count, total_evaluated)
+        # Work areas evaluated and camping work areas per access.
+        counts = {}
+        for row in wa_visit_counts:
+            evaluated, camping = counts.get(row["opportunity_access_id"], (0, 0))
+            is_camping = row["visit_count"] > MAX_VISITS_PER_BUILDING * row["work_area__building_count"]
+            counts[row["opportunity_access_id"]] = (evaluated + 1, camping + is_camping)
+        return {access_id: Measurement(camping, evaluated) for access_id, (evaluated, camping) in counts.items()}
 
 
 @register_calculation
-class GenderRatioDeviation(AuditCalculation):
+class GenderRatioDeviation(BatchedAuditCalculation):
     """Detect gender imbalance suggesting selective visit recording.
     Percent = female visits / last 97 completed visits * 100.
     Flags if female percent < 40 or > 60 (10% max deviation from 50/50 at 95% confidence).
@@ -172,23 +213,16 @@ class GenderRatioDeviation(AuditCalculation):
     lower_bound = 40
     upper_bound = 60
 
-    def compute(self, opportunity_access, period_start, period_end):
-        result = UserVisit.objects.filter(
-            opportunity_access=opportunity_access,
-            visit_date__date__range=(period_start, period_end),
-            deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-        ).aggregate(
+    def compute_many(self, opportunity_accesses, period_start, period_end):
+        rows = _service_visits([access.id for access in opportunity_accesses], period_start, period_end).annotate(
             total=Count("id"),
             female=Count("id", filter=Q(**{f"form_json__form__{GENDER_FIELD}": FEMALE})),
         )
-        total = result["total"]
-        if not total:
-            return Measurement(None, 0)
-        return Measurement(_percent(result["female"], total), total)
+        return _percent_measurements(rows, "female")
 
 
 @register_calculation
-class MUACPhotoCompliance(AuditCalculation):
+class MUACPhotoCompliance(BatchedAuditCalculation):
     """Detect missing MUAC measurement photos for eligible children.
     Denominator: last 70 visits where child is >6 months old (regardless of consent).
     Numerator: visits where muac_photo_link is non-empty.
@@ -202,28 +236,25 @@ class MUACPhotoCompliance(AuditCalculation):
     min_sample_size = 70
     lower_bound = 72
 
-    def compute(self, opportunity_access, period_start, period_end):
-        result = (
-            UserVisit.objects.filter(
-                opportunity_access=opportunity_access,
-                visit_date__date__range=(period_start, period_end),
-                deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-            )
+    def compute_many(self, opportunity_accesses, period_start, period_end):
+        access_ids = _accesses_with_form_field(opportunity_accesses, AGE_FIELD)
+        if not access_ids:
+            return {}
+        rows = (
+            _service_visits(access_ids, period_start, period_end)
             .annotate(age_months=_json_int(AGE_FIELD))
             .filter(age_months__gt=6)
-            .aggregate(
+            .values("opportunity_access_id")
+            .annotate(
                 total=Count("id"),
                 with_photo=Count("id", filter=_q_link_present(MUAC_PHOTO_LINK_FIELD)),
             )
         )
-        total = result["total"]
-        if not total:
-            return Measurement(None, 0)
-        return Measurement(_percent(result["with_photo"], total), total)
+        return _percent_measurements(rows, "with_photo")
 
 
 @register_calculation
-class AgeHeaping(AuditCalculation):
+class AgeHeaping(BatchedAuditCalculation):
     """Detect rounding/shortcut age entry at exact whole-year values.
     Flags when visits with childs_age_in_month in (12, 24, 36, 48) exceed 19%
     of the last 97 visits.
@@ -237,24 +268,23 @@ class AgeHeaping(AuditCalculation):
     min_sample_size = 97
     upper_bound = 19
 
-    def compute(self, opportunity_access, period_start, period_end):
-        result = UserVisit.objects.filter(
-            opportunity_access=opportunity_access,
-            visit_date__date__range=(period_start, period_end),
-            deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-            **{f"form_json__form__{AGE_FIELD}__isnull": False},
-        ).aggregate(
-            total=Count("id"),
-            heaped=Count("id", filter=Q(**{f"form_json__form__{AGE_FIELD}__in": AGE_HEAPING_VALUES})),
+    def compute_many(self, opportunity_accesses, period_start, period_end):
+        access_ids = _accesses_with_form_field(opportunity_accesses, AGE_FIELD)
+        if not access_ids:
+            return {}
+        rows = (
+            _service_visits(access_ids, period_start, period_end)
+            .filter(**{f"form_json__form__{AGE_FIELD}__isnull": False})
+            .annotate(
+                total=Count("id"),
+                heaped=Count("id", filter=Q(**{f"form_json__form__{AGE_FIELD}__in": AGE_HEAPING_VALUES})),
+            )
         )
-        total = result["total"]
-        if not total:
-            return Measurement(None, 0)
-        return Measurement(_percent(result["heaped"], total), total)
+        return _percent_measurements(rows, "heaped")
 
 
 @register_calculation
-class WACoverageToVisitRatio(AuditCalculation):
+class WACoverageToVisitRatio(BatchedAuditCalculation):
     """Detect imbalance between work area coverage progress and visit progress.
 
     Ratio = (VISITED WAs / eligible WAs) / (actual visits / expected visits).
@@ -269,40 +299,53 @@ class WACoverageToVisitRatio(AuditCalculation):
     lower_bound = 0.6
     upper_bound = 1.4
 
-    def compute(self, opportunity_access, period_start, period_end):
+    def compute_many(self, opportunity_accesses, period_start, period_end):
+        access_ids = [access.id for access in opportunity_accesses]
         _eligible = ~Q(status__in=[WorkAreaStatus.EXCLUDED])
-        wa_stats = WorkArea.objects.filter(opportunity_access=opportunity_access).aggregate(
-            total_eligible=Count("id", filter=_eligible),
-            visited_count=Count(
-                "id", filter=Q(status__in=[WorkAreaStatus.VISITED, WorkAreaStatus.EXPECTED_VISIT_REACHED])
-            ),
-            expected_visits=Sum("expected_visit_count", filter=_eligible),
+        wa_stats = (
+            WorkArea.objects.filter(opportunity_access_id__in=access_ids)
+            .values("opportunity_access_id")
+            .annotate(
+                total_eligible=Count("id", filter=_eligible),
+                visited_count=Count(
+                    "id", filter=Q(status__in=[WorkAreaStatus.VISITED, WorkAreaStatus.EXPECTED_VISIT_REACHED])
+                ),
+                expected_visits=Sum("expected_visit_count", filter=_eligible),
+            )
         )
-
-        total_eligible = wa_stats["total_eligible"] or 0
-        expected_visits = wa_stats["expected_visits"] or 0
-        actual_visits = UserVisit.objects.filter(
-            opportunity_access=opportunity_access,
-            visit_date__date__lte=period_end,
-            work_area__isnull=False,
-            deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-        ).count()
-
-        if not (total_eligible and expected_visits and actual_visits):
-            return Measurement(None, 0)
-
-        visited_count = wa_stats["visited_count"]
-        coverage_ratio = visited_count / total_eligible
-        visit_ratio = actual_visits / expected_visits
-        return Measurement(
-            coverage_ratio / visit_ratio,
-            total_eligible,
-            components=[
-                {"numerator": visited_count, "denominator": total_eligible},
-                {"numerator": actual_visits, "denominator": expected_visits},
-            ],
+        actual_visits_by_access = dict(
+            UserVisit.objects.filter(
+                opportunity_access_id__in=access_ids,
+                visit_date__date__lte=period_end,
+                work_area__isnull=False,
+                deliver_unit__slug=SERVICE_DELIVERY_SLUG,
+            )
+            .values("opportunity_access_id")
+            .annotate(actual_visits=Count("id"))
+            .values_list("opportunity_access_id", "actual_visits")
         )
 
+        measurements = {}
+        for stats in wa_stats:
+            total_eligible = stats["total_eligible"] or 0
+            expected_visits = stats["expected_visits"] or 0
+            actual_visits = actual_visits_by_access.get(stats["opportunity_access_id"], 0)
+            if not (total_eligible and expected_visits and actual_visits):
+                continue
+
+            visited_count = stats["visited_count"]
+            coverage_ratio = visited_count / total_eligible
+            visit_ratio = actual_visits / expected_visits
+            measurements[stats["opportunity_access_id"]] = Measurement(
+                coverage_ratio / visit_ratio,
+                total_eligible,
+                components=[
+                    {"numerator": visited_count, "denominator": total_eligible},
+                    {"numerator": actual_visits, "denominator": expected_visits},
+                ],
+            )
+        return measurements
+
 
 @register_calculation
 class InaccessibleWARateEarlyWarning(AuditCalculation):
@@ -384,7 +427,7 @@ class InaccessibleWARateLastCompletedWAG(AuditCalculation):
 
 
 @register_calculation
-class VaccineRate(AuditCalculation):
+class VaccineRate(BatchedAuditCalculation):
     """Detect gaps in vaccine question completion.
     Rate = visits where received_any_vaccine = yes / last 97 visits.
     Flags if rate < 58% (anchored to Gombe baseline 66%, one-sided 95% CI).
@@ -397,23 +440,16 @@ class VaccineRate(AuditCalculation):
     min_sample_size = 97
     lower_bound = 58
 
-    def compute(self, opportunity_access, period_start, period_end):
-        result = UserVisit.objects.filter(
-            opportunity_access=opportunity_access,
-            visit_date__date__range=(period_start, period_end),
-            deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-        ).aggregate(
+    def compute_many(self, opportunity_accesses, period_start, period_end):
+        rows = _service_visits([access.id for access in opportunity_accesses], period_start, period_end).annotate(
             total=Count("id"),
             vaccinated=Count("id", filter=Q(**{f"form_json__form__{VACCINE_FIELD}": YES})),
         )
-        total = result["total"]
-        if not total:
-            return Measurement(None, 0)
-        return Measurement(_percent(result["vaccinated"], total), total)
+        return _percent_measurements(rows, "vaccinated")
 
 
 @register_calculation
-class VaccineCardPhotoCompliance(AuditCalculation):
+class VaccineCardPhotoCompliance(BatchedAuditCalculation):
     """Detect missing vaccine card photos for vaccinated children.
 
     Denominator: last 97 visits where received_any_vaccine = yes.
@@ -428,20 +464,19 @@ class VaccineCardPhotoCompliance(AuditCalculation):
     min_sample_size = 97
     lower_bound = 38
 
-    def compute(self, opportunity_access, period_start, period_end):
-        result = UserVisit.objects.filter(
-            opportunity_access=opportunity_access,
-            visit_date__date__range=(period_start, period_end),
-            deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-            **{f"form_json__form__{VACCINE_FIELD}": YES},
-        ).aggregate(
-            total=Count("id"),
-            with_photo=Count("id", filter=_q_link_present(VACCINE_CARD_LINK_FIELD)),
+    def compute_many(self, opportunity_accesses, period_start, period_end):
+        access_ids = _accesses_with_form_field(opportunity_accesses, VACCINE_FIELD)
+        if not access_ids:
+            return {}
+        rows = (
+            _service_visits(access_ids, period_start, period_end)
+            .filter(**{f"form_json__form__{VACCINE_FIELD}": YES})
+            .annotate(
+                total=Count("id"),
+                with_photo=Count("id", filter=_q_link_present(VACCINE_CARD_LINK_FIELD)),
+            )
         )
-        total = result["total"]
-        if not total:
-            return Measurement(None, 0)
-        return Measurement(_percent(result["with_photo"], total), total)
+        return _percent_measurements(rows, "with_photo")
 
 
 # ── MUAC distribution helpers (ported from MLFeatureAggregationReport.py) ────
@@ -539,7 +574,7 @@ def _muac_no_plateau(bin_counts, max_count) -> bool:
 
 
 @register_calculation
-class MUACDistributionPatternIndex(AuditCalculation):
+class MUACDistributionPatternIndex(BatchedAuditCalculation):
     """Assess whether a FLW's MUAC distribution looks biologically realistic.
     Scores 6 boolean shape features of the histogram (0–6 total).
     Flags if fewer than 5 features pass. Requires ≥100 valid measurements.
@@ -553,14 +588,24 @@ class MUACDistributionPatternIndex(AuditCalculation):
     min_sample_size = 100
     lower_bound = 5
 
-    def compute(self, opportunity_access, period_start, period_end):
-        raw = UserVisit.objects.filter(
-            opportunity_access=opportunity_access,
-            visit_date__date__range=(period_start, period_end),
-            deliver_unit__slug=SERVICE_DELIVERY_SLUG,
-            **{f"form_json__form__{MUAC_MEASUREMENT_FIELD}__isnull": False},
-        ).values_list(f"form_json__form__{MUAC_MEASUREMENT_FIELD}", flat=True)
-
+    def compute_many(self, opportunity_accesses, period_start, period_end):
+        access_ids = _accesses_with_form_field(opportunity_accesses, MUAC_MEASUREMENT_FIELD)
+        if not access_ids:
+            return {}
+        raw = (
+            _service_visits(access_ids, period_start, period_end)
+            .filter(**{f"form_json__form__{MUAC_MEASUREMENT_FIELD}__isnull": False})
+            .values_list("opportunity_access_id", f"form_json__form__{MUAC_MEASUREMENT_FIELD}")
+        )
+        values_by_access = {}
+        for access_id, value in raw:
+            values_by_access.setdefault(access_id, []).append(value)
+        return {
+            access_id: self._measure(access_id, values, period_start, period_end)
+            for access_id, values in values_by_access.items()
+        }
+
+    def _measure(self, access_id, raw, period_start, period_end):
         measurements = []
         out_of_range = []
         for v in raw:
@@ -576,7 +621,7 @@ class MUACDistributionPatternIndex(AuditCalculation):
         if out_of_range:
             logger.warning(
                 "MUAC out-of-range values for opportunity_access=%s period=%s–%s: %d value(s) outside 9.5–21.5 cm: %s",
-                opportunity_access.id,
+                access_id,
                 period_start,
                 period_end,
                 len(out_of_range),
@@ -113,17 +113,21 @@ def generate_audit_report_for_opportunity(
             accepted=True,
             suspended=False,
         )
-        .select_related("user")
+        .select_related("user", "opportunity__deliver_app")
         .order_by("user__name")
     )
+    active_accesses = list(active_accesses)
 
-    calcs = calculations.get_registered_calculations()
+    # Each calculation measures all the workers together, see AuditCalculation.compute_many.
+    calc_results = [
+        calc.run_many(active_accesses, period_start, period_end) for calc in calculations.get_registered_calculations()
+    ]
     entries = []
     for access in active_accesses:
         results = {}
         flagged = False
-        for calc in calcs:
-            result = calc.run(access, period_start, period_end)
+        for results_by_access in calc_results:
+            result = results_by_access[access.id]
             results[result.name] = result.to_dict()
             if result.has_sufficient_data and not result.in_range:
                 flagged = True
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import datetime
 import logging
 from collections import defaultdict
 
 from allauth.utils import build_absolute_uri
+from celery import chord
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.db.models import Q
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 
+from commcare_connect.audit.models import AuditReport
 from commcare_connect.audit.services import generate_audit_report_for_opportunity, period_for
 from commcare_connect.flags.flag_names import WEEKLY_PERFORMANCE_REPORT
 from commcare_connect.flags.models import Flag
@@ -31,30 +34,47 @@ def generate_audit_reports() -> None:
 
     period_start, period_end = period_for(timezone.now().date())
 
-    opportunities = (
+    opportunity_ids = (
         Opportunity.objects.filter(
             Q(pk__in=flag.opportunities.values_list("pk", flat=True)) | Q(program__in=flag.programs.all()),
             active=True,
         )
-        .select_related("program__organization")
         .distinct()
+        .values_list("pk", flat=True)
     )
 
-    generated_reports = []
-    for opportunity in opportunities:
-        try:
-            report = generate_audit_report_for_opportunity(
-                opportunity,
-                period_start=period_start,
-                period_end=period_end,
-            )
-        except Exception:
-            logger.exception("Failed to generate weekly report for opportunity %s", opportunity.pk)
-            continue
-        generated_reports.append(report)
+    # Reports are generated in parallel by the workers, and the notifications are sent once all are done.
+    report_tasks = [
+        generate_audit_report.s(opportunity_id, period_start.isoformat(), period_end.isoformat())
+        for opportunity_id in opportunity_ids
+    ]
+    if report_tasks:
+        chord(report_tasks)(notify_audit_reports.s())
+
 
+@app.task(name="audit.generate_audit_report")
+def generate_audit_report(opportunity_id, period_start, period_end) -> int | None:
+    """Generate the audit report of one opportunity, returning its id or None if it failed."""
+    try:
+        opportunity = Opportunity.objects.select_related("program__organization").get(pk=opportunity_id)
+        report = generate_audit_report_for_opportunity(
+            opportunity,
+            period_start=datetime.date.fromisoformat(period_start),
+            period_end=datetime.date.fromisoformat(period_end),
+        )
+    except Exception:
+        logger.exception("Failed to generate weekly report for opportunity %s", opportunity_id)
+        return None
+    return report.pk
+
+
+@app.task(name="audit.notify_audit_reports")
+def notify_audit_reports(report_ids) -> None:
+    reports = AuditReport.objects.filter(pk__in=[pk for pk in report_ids if pk is not None]).select_related(
+        "opportunity__program__organization"
+    )
     try:
-        send_new_audit_report_notifications(generated_reports)
+        send_new_audit_report_notifications(list(reports))
     except Exception:
         logger.exception("Failed to send audit report notifications")
 
@@ -773,3 +773,55 @@ class TestMUACDistributionPatternIndex(BaseIndicatorTest):
         access = OpportunityAccessFactory()
         make_muac_visits(access, visit_date=AFTER_PERIOD)
         self.assert_insufficient_data(access)
+
+
+# ── batched computation matches per-access computation ────────────────────────
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "calc",
+    [
+        CampingRatio(),
+        GenderRatioDeviation(),
+        MUACPhotoCompliance(),
+        AgeHeaping(),
+        WACoverageToVisitRatio(),
+        VaccineRate(),
+        VaccineCardPhotoCompliance(),
+        MUACDistributionPatternIndex(),
+    ],
+    ids=lambda calc: type(calc).__name__,
+)
+def test_compute_many_matches_compute(calc):
+    first = OpportunityAccessFactory()
+    second = OpportunityAccessFactory(opportunity=first.opportunity)
+    idle = OpportunityAccessFactory(opportunity=first.opportunity)
+    for access, visits in [(first, 3), (second, 1)]:
+        wa = WorkAreaFactory(
+            opportunity=access.opportunity,
+            opportunity_access=access,
+            building_count=1,
+            status=WorkAreaStatus.VISITED,
+            expected_visit_count=2,
+        )
+        for age in range(visits):
+            make_form_visit(
+                access,
+                {
+                    "additional_case_info": {"childs_gender": FEMALE, "childs_age_in_months": str(age * 12)},
+                    "child_vaccine_group": {"vaccines_ql": {"received_any_vaccine": YES}},
+                },
+                work_area=wa,
+            )
+        make_muac_visits(access, REALISTIC_MUAC[: visits * 30], work_area=wa)
+
+    accesses = [first, second, idle]
+    measurements = calc.compute_many(accesses, PERIOD_START, PERIOD_END)
+
+    for access in accesses:
+        expected = calc.compute(access, PERIOD_START, PERIOD_END)
+        if expected.sample_size == 0:
+            assert measurements.get(access.id, expected).sample_size == 0
+        else:
+            assert measurements[access.id] == expected
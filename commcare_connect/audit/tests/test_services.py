@@ -85,6 +85,35 @@ def test_generate_report_with_no_active_accesses(opportunity, fixed_calc):
     assert AuditReportEntry.objects.filter(audit_report=report).count() == 0
 
 
+@pytest.mark.django_db
+def test_generate_report_computes_batched_calculations_once(opportunity, isolated_registry):
+    from commcare_connect.audit.calculations import BatchedAuditCalculation, Measurement
+
+    batches = []
+
+    class FakeBatchedCalc(BatchedAuditCalculation):
+        name = "fake_batched"
+        label = "Fake batched"
+
+        def compute_many(self, opportunity_accesses, period_start, period_end):
+            batches.append(sorted(access.id for access in opportunity_accesses))
+            # Only the first access has data.
+            return {opportunity_accesses[0].id: Measurement(2.0, 1)}
+
+    calculations._REGISTRY.append(FakeBatchedCalc())
+    accesses = OpportunityAccessFactory.create_batch(3, opportunity=opportunity, accepted=True)
+
+    report = generate_audit_report_for_opportunity(
+        opportunity,
+        period_start=datetime.date(2026, 4, 13),
+        period_end=datetime.date(2026, 4, 19),
+    )
+
+    assert batches == [sorted(access.id for access in accesses)]
+    results = [entry.results["fake_batched"] for entry in report.entries.all()]
+    assert sorted(result["has_sufficient_data"] for result in results) == [False, False, True]
+
+
 @pytest.mark.parametrize(
     "today, expected_start, expected_end",
     [
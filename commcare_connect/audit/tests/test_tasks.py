@@ -16,6 +16,11 @@ from commcare_connect.users.tests.factories import MembershipFactory, ProgramMan
 MONDAY_2AM_UTC = datetime.datetime(2026, 4, 20, 2, 0, tzinfo=datetime.UTC)
 
 
+@pytest.fixture(autouse=True)
+def eager_tasks(settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+
+
 @pytest.mark.django_db
 @mock.patch("commcare_connect.audit.tasks.timezone.now", return_value=MONDAY_2AM_UTC)
 def test_task_generates_reports_only_for_flagged_opportunities(mock_now):
@@ -5,6 +5,8 @@ from django.apps import apps as django_apps
 from rest_framework.test import APIClient, APIRequestFactory
 
 from commcare_connect.commcarehq.tests.factories import HQServerFactory
+from commcare_connect.form_receiver.resolution import clear_resolution_caches
+from commcare_connect.form_receiver.verification import clear_verification_rules_caches
 from commcare_connect.opportunity.models import OpportunityClaimLimit
 from commcare_connect.opportunity.tests.factories import (
     CommCareAppFactory,
@@ -15,6 +17,7 @@ from commcare_connect.opportunity.tests.factories import (
     OpportunityVerificationFlagsFactory,
     PaymentUnitFactory,
 )
+from commcare_connect.opportunity.utils.list_metrics import clear_list_metrics_caches
 from commcare_connect.organization.models import Organization
 from commcare_connect.program.tests.factories import ProgramFactory
 from commcare_connect.users.models import User
@@ -32,6 +35,24 @@ def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def form_receiver_caches():
+    # The form receiver caches live in process memory and Redis, so they would otherwise
+    # outlive each test's database transaction.
+    clear_resolution_caches(reset_stats=True)
+    clear_verification_rules_caches()
+    yield
+    clear_resolution_caches(reset_stats=True)
+    clear_verification_rules_caches()
+
+
+@pytest.fixture(autouse=True)
+def opportunity_list_metrics_cache():
+    clear_list_metrics_caches()
+    yield
+    clear_list_metrics_caches()
+
+
 @pytest.fixture()
 def api_rf() -> APIRequestFactory:
     """APIRequestFactory instance"""
@@ -0,0 +1,211 @@
+"""Output formats of the streamed (v1) data exports, and their compression.
+
+Export views produce their rows in chunks of tuples ordered as the field names. The writers
+here turn those chunks into CSV, NDJSON or Parquet, yielding one piece of output per chunk (a
+Parquet row group per chunk) so large exports are streamed rather than built up in memory. Text
+formats can then be compressed with gzip, or with zstd where the ``zstandard`` package is
+installed, as negotiated from the request's ``Accept-Encoding``. Parquet needs ``pyarrow`` and
+compresses its own column chunks.
+
+``zstandard`` and ``pyarrow`` are only in the production and dev dependency groups, so their
+formats are only offered when they can be imported.
+"""
+
+import csv
+import io
+from dataclasses import dataclass
+from typing import Callable
+
+import orjson
+from django.utils.text import compress_sequence
+
+CSV = "csv"
+NDJSON = "ndjson"
+PARQUET = "parquet"
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+
+def iter_csv(fieldnames, row_chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
+    yield buffer.getvalue()
+
+    for rows in row_chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(fieldnames, row_chunks):
+    """One JSON object per line, keyed by field name."""
+    for rows in row_chunks:
+        yield b"".join(orjson.dumps(dict(zip(fieldnames, row))) + b"\n" for row in rows)
+
+
+def iter_parquet(fieldnames, row_chunks):
+    """A Parquet file written a row group per chunk of rows.
+
+    Column types are taken from the first chunk: boolean columns stay boolean, numbers are written
+    as floats so that later chunks can mix integers and floats, and all others are written as
+    text, with lists and objects as JSON. A later value that doesn't fit its column's type is
+    written as null rather than failing part way through the response.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _StreamSink()
+    writer = None
+    converters = None
+    for rows in row_chunks:
+        if not rows:
+            continue
+        columns = list(zip(*rows))
+        if writer is None:
+            arrow_types, converters = zip(*(_get_column_type(pa, values) for values in columns))
+            schema = pa.schema(list(zip(fieldnames, arrow_types)))
+            writer = pq.ParquetWriter(sink, schema, compression=ZSTD)
+        arrays = [
+            pa.array([convert(value) for value in values], type=field.type)
+            for values, convert, field in zip(columns, converters, schema)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+
+    if writer is None:
+        schema = pa.schema([(name, pa.string()) for name in fieldnames])
+        writer = pq.ParquetWriter(sink, schema, compression=ZSTD)
+    writer.close()
+    yield sink.drain()
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    writer: Callable
+    content_type: str
+    # Whether the output gains from HTTP compression, i.e. isn't compressed already.
+    compressible: bool = True
+
+
+EXPORT_FORMATS = {
+    CSV: ExportFormat(iter_csv, "text/csv"),
+    NDJSON: ExportFormat(iter_ndjson, "application/x-ndjson"),
+    PARQUET: ExportFormat(iter_parquet, "application/vnd.apache.parquet", compressible=False),
+}
+
+
+def get_export_format(name):
+    """The ExportFormat called ``name``, or None if it is unknown or can't be written here."""
+    if name == PARQUET and not _pyarrow_installed():
+        return None
+    return EXPORT_FORMATS.get(name)
+
+
+def get_content_encoding(accept_encoding):
+    """The compression to use for a request's ``Accept-Encoding``, preferring zstd, or None."""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    if ZSTD in accepted and _zstandard_installed():
+        return ZSTD
+    if GZIP in accepted:
+        return GZIP
+    return None
+
+
+def compress(chunks, content_encoding):
+    """Compress the output ``chunks``, flushing after each so the stream keeps moving."""
+    chunks = (chunk.encode() if isinstance(chunk, str) else chunk for chunk in chunks)
+    if content_encoding == GZIP:
+        return compress_sequence(chunks)
+    return _zstd_compress(chunks)
+
+
+def _zstd_compress(chunks):
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    yield compressor.flush()
+
+
+def _pyarrow_installed():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _zstandard_installed():
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _get_column_type(pa, values):
+    """The Arrow type of a column from its first values, and the converter fitting values to it."""
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, bool) for value in present):
+        return pa.bool_(), _to_bool
+    if present and all(isinstance(value, int | float) and not isinstance(value, bool) for value in present):
+        return pa.float64(), _to_float
+    return pa.string(), _to_text
+
+
+def _to_bool(value):
+    return value if isinstance(value, bool) else None
+
+
+def _to_float(value):
+    if isinstance(value, int | float) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _to_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, dict | list):
+        return orjson.dumps(value).decode()
+    return str(value)
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file collecting output until drained, while reporting the full length written."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.db.models import Q
 from rest_framework import serializers
 from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
@@ -12,6 +14,12 @@ class _PaginationParamsSerializer(serializers.Serializer):
     cursor_order = serializers.ChoiceField(choices=[FORWARD, REVERSE], default=FORWARD, required=False)
 
 
+class _ChangeFeedParamsSerializer(serializers.Serializer):
+    changed_since = serializers.IntegerField(min_value=0)
+    last_id = serializers.IntegerField(min_value=1, required=False)
+    page_size = serializers.IntegerField(min_value=1, required=False)
+
+
 class IdKeysetPagination(BasePagination):
     """Keyset (cursor) pagination using the integer ``id`` primary key.
 
@@ -28,6 +36,8 @@ class IdKeysetPagination(BasePagination):
     All other query parameters are preserved in the ``next`` link.
     """
 
+    # Fields of the page's last item that the ``next`` link is built from.
+    cursor_fields = ("id",)
     default_page_size = 1000
     max_page_size = 5000
     page_size_query_param = "page_size"
@@ -87,10 +97,97 @@ class IdKeysetPagination(BasePagination):
 
         return self.request.build_absolute_uri(f"{self.request.path}?{query.urlencode()}")
 
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "results": data,
+        }
+
     def get_paginated_response(self, data):
-        return Response(
-            {
-                "next": self.get_next_link(),
-                "results": data,
-            }
+        return Response(self.get_paginated_data(data))
+
+
+class ChangeFeedPagination(IdKeysetPagination):
+    """Keyset pagination over the rows changed since a cursor, for incremental syncs.
+
+    The paginated models have a ``row_version`` that the ``opportunity_row_version`` database
+    trigger sets to the id of the transaction that last wrote the row. Rows are returned in
+    ``(row_version, id)`` order, leaving out those written by transactions that may still be in
+    progress, so no row can later commit with a version below one already returned.
+
+    Query parameters:
+        changed_since - cursor: ``changed_since`` of the last page of the previous sync, or 0 for all rows
+        last_id       - id of the last item on the previous page, for rows sharing its version
+        page_size     - items per page (default 1000, max 5000)
+
+    The ``next`` link carries the cursor between the pages of a sync. The last page, whose
+    ``next`` is null, has the ``changed_since`` to start the next sync from. Rows changed again
+    during a sync may be returned twice, with their latest data each time.
+    """
+
+    cursor_fields = ("row_version", "id")
+    changed_since_query_param = "changed_since"
+
+    @property
+    def param_field_map(self):
+        return {
+            "changed_since": self.changed_since_query_param,
+            "last_id": self.last_id_query_param,
+            "page_size": self.page_size_query_param,
+        }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+
+        params = _ChangeFeedParamsSerializer(data=self._get_pagination_params(request))
+        params.is_valid(raise_exception=True)
+
+        self.changed_since = params.validated_data["changed_since"]
+        self.last_id = params.validated_data.get("last_id")
+        raw_page_size = params.validated_data.get("page_size")
+        self.page_size = (
+            min(raw_page_size, self.max_page_size) if raw_page_size is not None else self.default_page_size
         )
+        self.horizon = _get_row_version_horizon()
+
+        queryset = queryset.filter(row_version__lt=self.horizon).order_by("row_version", "id")
+        if self.last_id is None:
+            queryset = queryset.filter(row_version__gte=self.changed_since)
+        else:
+            queryset = queryset.filter(
+                Q(row_version__gt=self.changed_since) | Q(row_version=self.changed_since, id__gt=self.last_id)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        last_item = self.page[-1]
+        query = self.request.query_params.copy()
+        query[self.changed_since_query_param] = last_item.row_version
+        query[self.last_id_query_param] = last_item.id
+        query[self.page_size_query_param] = self.page_size
+
+        return self.request.build_absolute_uri(f"{self.request.path}?{query.urlencode()}")
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            # Every row written before the horizon has been returned once there is no next page.
+            "changed_since": None if self.has_next else self.horizon,
+            "results": data,
+        }
+
+
+def _get_row_version_horizon():
+    """Id of the oldest transaction that may still be in progress; all older ones have finished."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        (horizon,) = cursor.fetchone()
+    return horizon
@@ -0,0 +1,86 @@
+import csv
+import io
+from types import SimpleNamespace
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from commcare_connect.data_export import formats
+from commcare_connect.data_export.flat_export import FlatExport
+from commcare_connect.data_export.serializer import CompletedWorkDataSerializer
+from commcare_connect.data_export.views import (
+    AssignedTaskDataView,
+    CompletedWorkDataView,
+    PaymentDataView,
+    UserVisitDataView,
+)
+from commcare_connect.opportunity.tests.factories import (
+    AssignedTaskFactory,
+    CompletedWorkFactory,
+    OpportunityAccessFactory,
+    PaymentFactory,
+    UserVisitFactory,
+)
+
+
+def _create_user_visits(access):
+    UserVisitFactory.create_batch(
+        3, opportunity=access.opportunity, user=access.user, opportunity_access=access, completed_work=None
+    )
+    UserVisitFactory(opportunity=access.opportunity, user=access.user, opportunity_access=access)
+
+
+def _create_completed_work(access):
+    CompletedWorkFactory.create_batch(2, opportunity_access=access)
+
+
+def _create_payments(access):
+    PaymentFactory.create_batch(2, opportunity_access=access)
+
+
+def _create_assigned_tasks(access):
+    AssignedTaskFactory.create_batch(2, opportunity_access=access)
+
+
+def _get_view(view_class, opportunity):
+    view = view_class()
+    view.opportunity = opportunity
+    view.request = SimpleNamespace(query_params={})
+    return view
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "view_class, create_rows",
+    [
+        (UserVisitDataView, _create_user_visits),
+        (CompletedWorkDataView, _create_completed_work),
+        (PaymentDataView, _create_payments),
+        (AssignedTaskDataView, _create_assigned_tasks),
+    ],
+    ids=lambda value: getattr(value, "__name__", None),
+)
+def test_flat_export_matches_serializer(view_class, create_rows):
+    access = OpportunityAccessFactory()
+    create_rows(access)
+    view = _get_view(view_class, access.opportunity)
+    queryset = view.get_queryset(view.request, access.opportunity.id).order_by("id")
+    serializer_class = view.get_serializer_class()
+    expected = [dict(serializer_class(obj).data) for obj in queryset]
+
+    flat_export = view.get_flat_export()
+    rows = flat_export.encode(list(flat_export.values_list(queryset)))
+    assert [dict(zip(flat_export.fieldnames, row)) for row in rows] == expected
+
+    # The CSV is what csv.DictWriter wrote for the serializer's data.
+    content = "".join(formats.iter_csv(flat_export.fieldnames, flat_export.iter_chunks(queryset, chunk_size=2)))
+    expected_csv = io.StringIO()
+    writer = csv.DictWriter(expected_csv, fieldnames=flat_export.fieldnames)
+    writer.writeheader()
+    writer.writerows(expected)
+    assert content == expected_csv.getvalue()
+
+
+def test_method_field_requires_lookup():
+    with pytest.raises(ImproperlyConfigured, match="CompletedWorkDataSerializer.username"):
+        FlatExport(CompletedWorkDataSerializer, {"opportunity_id": "opportunity_id"})
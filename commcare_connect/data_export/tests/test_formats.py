@@ -0,0 +1,100 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from commcare_connect.data_export import formats
+
+FIELDNAMES = ["id", "name", "amount", "flagged", "details"]
+ROW_CHUNKS = [
+    [(1, "one", 1.5, True, {"a": 1}), (2, "two, too", None, False, None)],
+    [(3, 'the "third"', 3.0, None, [1, 2])],
+]
+
+
+def test_iter_csv():
+    content = "".join(formats.iter_csv(FIELDNAMES, ROW_CHUNKS))
+    reader = csv.DictReader(io.StringIO(content))
+    rows = list(reader)
+    assert reader.fieldnames == FIELDNAMES
+    assert [row["name"] for row in rows] == ["one", "two, too", 'the "third"']
+    assert rows[1]["amount"] == ""
+
+
+def test_iter_ndjson():
+    content = b"".join(formats.iter_ndjson(FIELDNAMES, ROW_CHUNKS))
+    rows = [json.loads(line) for line in content.splitlines()]
+    assert rows == [dict(zip(FIELDNAMES, row)) for rows in ROW_CHUNKS for row in rows]
+
+
+def test_iter_parquet():
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    content = b"".join(formats.iter_parquet(FIELDNAMES, ROW_CHUNKS))
+    parquet_file = pq.ParquetFile(io.BytesIO(content))
+    assert parquet_file.num_row_groups == 2
+    table = parquet_file.read()
+    assert table.column_names == FIELDNAMES
+    assert table.column("id").to_pylist() == [1, 2, 3]
+    assert table.column("amount").to_pylist() == [1.5, None, 3.0]
+    assert table.column("flagged").to_pylist() == [True, False, None]
+    assert table.column("details").to_pylist() == ['{"a":1}', None, "[1,2]"]
+
+
+def test_iter_parquet_later_chunks_change_type():
+    pq = pytest.importorskip("pyarrow.parquet")
+    row_chunks = [[(1, True, "a")], [(2.5, "yes", 3)]]
+
+    content = b"".join(formats.iter_parquet(["number", "flag", "text"], row_chunks))
+    table = pq.read_table(io.BytesIO(content))
+    assert table.column("number").to_pylist() == [1.0, 2.5]
+    assert table.column("flag").to_pylist() == [True, None]
+    assert table.column("text").to_pylist() == ["a", "3"]
+
+
+def test_iter_parquet_without_rows():
+    pq = pytest.importorskip("pyarrow.parquet")
+    content = b"".join(formats.iter_parquet(FIELDNAMES, []))
+    table = pq.read_table(io.BytesIO(content))
+    assert table.column_names == FIELDNAMES
+    assert table.num_rows == 0
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("gzip", formats.GZIP),
+        ("br, GZIP;q=0.5", formats.GZIP),
+        ("gzip;q=0", None),
+        ("deflate, gzip; q=0", None),
+        ("identity", None),
+    ],
+)
+def test_get_content_encoding(accept_encoding, expected):
+    assert formats.get_content_encoding(accept_encoding) == expected
+
+
+def test_get_content_encoding_prefers_zstd():
+    pytest.importorskip("zstandard")
+    assert formats.get_content_encoding("gzip, zstd") == formats.ZSTD
+
+
+def test_get_export_format():
+    assert formats.get_export_format("csv") == formats.EXPORT_FORMATS[formats.CSV]
+    assert formats.get_export_format("xml") is None
+
+
+def test_compress_gzip():
+    content = "".join(formats.iter_csv(FIELDNAMES, ROW_CHUNKS))
+    compressed = b"".join(formats.compress(formats.iter_csv(FIELDNAMES, ROW_CHUNKS), formats.GZIP))
+    assert gzip.decompress(compressed).decode() == content
+
+
+def test_compress_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    content = b"".join(formats.iter_ndjson(FIELDNAMES, ROW_CHUNKS))
+    compressed = b"".join(formats.compress(formats.iter_ndjson(FIELDNAMES, ROW_CHUNKS), formats.ZSTD))
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(compressed) == content
@@ -5,9 +5,9 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.request import Request
 from rest_framework.test import APIRequestFactory
 
-from commcare_connect.data_export.pagination import IdKeysetPagination
+from commcare_connect.data_export.pagination import ChangeFeedPagination, IdKeysetPagination
 from commcare_connect.opportunity.models import UserVisit
-from commcare_connect.opportunity.tests.factories import UserVisitFactory
+from commcare_connect.opportunity.tests.factories import OpportunityFactory, UserVisitFactory
 
 
 @pytest.fixture
@@ -192,3 +192,64 @@ class TestIdKeysetPaginationEdgeCases:
 
         with pytest.raises(ValidationError):
             paginator.paginate_queryset(UserVisit.objects.none(), request)
+
+
+def _sync_changes(api_rf, queryset, changed_since, page_size=2):
+    """Walk the pages of a ChangeFeedPagination sync, returning the rows and the next sync's cursor."""
+    rows = []
+    params = {"changed_since": changed_since, "page_size": page_size}
+    while True:
+        paginator = ChangeFeedPagination()
+        page = paginator.paginate_queryset(queryset, _make_request(api_rf, **params))
+        data = paginator.get_paginated_data([obj.id for obj in page])
+        rows.extend(data["results"])
+        if data["next"] is None:
+            return rows, data["changed_since"]
+        assert data["changed_since"] is None
+        params = {k: v[0] for k, v in parse_qs(urlparse(data["next"]).query).items()}
+
+
+# Each write commits in its own transaction, whose id becomes the row_version.
+@pytest.mark.django_db(transaction=True)
+class TestChangeFeedPagination:
+    def test_sync_returns_changed_rows_only(self, api_rf):
+        opportunity = OpportunityFactory()
+        visits = UserVisitFactory.create_batch(5, opportunity=opportunity)
+        queryset = UserVisit.objects.filter(opportunity=opportunity)
+
+        rows, changed_since = _sync_changes(api_rf, queryset, changed_since=0)
+        assert rows == sorted(v.id for v in visits)
+
+        assert _sync_changes(api_rf, queryset, changed_since)[0] == []
+
+        UserVisit.objects.filter(id=visits[3].id).update(reason="Changed")
+        new_visit = UserVisitFactory(opportunity=opportunity)
+        rows, next_changed_since = _sync_changes(api_rf, queryset, changed_since)
+        assert rows == [visits[3].id, new_visit.id]
+        assert next_changed_since > changed_since
+
+    def test_rows_sharing_a_version_are_paged_by_id(self, api_rf):
+        opportunity = OpportunityFactory()
+        visits = UserVisitFactory.create_batch(5, opportunity=opportunity)
+        queryset = UserVisit.objects.filter(opportunity=opportunity)
+        # A single update stamps all the visits with the same version.
+        queryset.update(reason="Changed")
+
+        rows, _changed_since = _sync_changes(api_rf, queryset, changed_since=0, page_size=2)
+
+        assert rows == sorted(v.id for v in visits)
+
+    def test_unchanged_rows_keep_their_version(self, api_rf):
+        opportunity = OpportunityFactory()
+        UserVisitFactory(opportunity=opportunity, reason="Unchanged")
+        queryset = UserVisit.objects.filter(opportunity=opportunity)
+        _rows, changed_since = _sync_changes(api_rf, queryset, changed_since=0)
+
+        queryset.update(reason="Unchanged")
+
+        assert _sync_changes(api_rf, queryset, changed_since)[0] == []
+
+    @pytest.mark.parametrize("params", [{}, {"changed_since": -1}, {"changed_since": 0, "last_id": 0}])
+    def test_invalid_query_params_raise_validation_error(self, api_rf, params):
+        with pytest.raises(ValidationError):
+            ChangeFeedPagination().paginate_queryset(UserVisit.objects.none(), _make_request(api_rf, **params))
@@ -1,6 +1,8 @@
 import csv
 import datetime
+import gzip
 import io
+import json
 
 import pytest
 from django.db import connection
@@ -113,6 +115,43 @@ class TestUserVisitDataViewV1:
         assert "photo.jpg" in rows[0]["images"]
         assert "doc.pdf" not in rows[0]["images"]
 
+    def test_ndjson_gzip(self, api_client, opportunity, org_user_member):
+        visits = UserVisitFactory.create_batch(2, opportunity=opportunity, user=org_user_member)
+        _add_export_credentials(api_client, org_user_member)
+
+        response = api_client.get(_get_url(opportunity.id, export_format="ndjson"), HTTP_ACCEPT_ENCODING="gzip")
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/x-ndjson"
+        assert response["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response["Vary"]
+
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        rows = [json.loads(line) for line in content.splitlines()]
+        assert sorted(row["id"] for row in rows) == sorted(visit.id for visit in visits)
+
+    def test_csv_uncompressed_without_accept_encoding(self, api_client, opportunity, org_user_member):
+        UserVisitFactory(opportunity=opportunity, user=org_user_member)
+        _add_export_credentials(api_client, org_user_member)
+
+        response = api_client.get(_get_url(opportunity.id))
+        assert not response.has_header("Content-Encoding")
+        rows, _ = _parse_csv_response(response)
+        assert len(rows) == 1
+
+    def test_changed_since_rejected(self, api_client, opportunity, org_user_member):
+        _add_export_credentials(api_client, org_user_member)
+
+        response = api_client.get(_get_url(opportunity.id, changed_since=0))
+        assert response.status_code == 400
+        assert "changed_since" in response.json()
+
+    def test_unknown_export_format(self, api_client, opportunity, org_user_member):
+        _add_export_credentials(api_client, org_user_member)
+
+        response = api_client.get(_get_url(opportunity.id, export_format="xml"))
+        assert response.status_code == 400
+        assert "export_format" in response.json()
+
 
 @pytest.mark.django_db
 class TestUserVisitDataViewV2:
@@ -4,12 +4,14 @@ import io
 import logging
 import uuid
 from collections import defaultdict
+from itertools import islice
 
 from django.core.exceptions import ImproperlyConfigured
 from django.core.files.storage import storages
 from django.db import transaction
 from django.db.models import Count, F, Q
 from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.utils.translation import gettext_lazy as _
 from drf_spectacular.utils import extend_schema, inline_serializer
 from oauth2_provider.contrib.rest_framework.permissions import TokenHasScope
@@ -23,6 +25,7 @@ from rest_framework.views import APIView
 from waffle import flag_is_active
 
 from commcare_connect.audit.models import AuditReport, AuditReportEntry
+from commcare_connect.data_export import formats
 from commcare_connect.data_export.const import (
     APP_TYPE_BOTH,
     APP_TYPE_DELIVER,
@@ -31,7 +34,8 @@ from commcare_connect.data_export.const import (
     LEARN_APP_KEY,
     VALID_APP_TYPES,
 )
-from commcare_connect.data_export.pagination import IdKeysetPagination
+from commcare_connect.data_export.flat_export import FlatExport
+from commcare_connect.data_export.pagination import ChangeFeedPagination, IdKeysetPagination
 from commcare_connect.data_export.serializer import (
     AssessmentDataSerializer,
     AssignedTaskDataSerializer,
@@ -78,7 +82,6 @@ from commcare_connect.organization.models import LLOEntity, Organization
 from commcare_connect.program.models import Program
 from commcare_connect.users.models import User
 from commcare_connect.utils.commcarehq_api import CommCareHQAPIException, get_app_structure
-from commcare_connect.utils.file import EchoWriter
 from commcare_connect.utils.permission_const import WORKSPACE_ENTITY_MANAGEMENT_ACCESS
 
 STREAM_CHUNK_SIZE = 2000
@@ -151,6 +154,13 @@ class BulkListMixin:
 class BaseDataExportListView(BaseDataExportView):
     serializer_class = None
     pagination_class = IdKeysetPagination
+    # Queryset lookups of the serializer fields that can't be read from their source, e.g. a
+    # ``SerializerMethodField`` returning an annotation. Setting it, even to an empty dict, serves
+    # the export from ``values_list`` rows rather than a serializer instance per row, see ``FlatExport``.
+    flat_export_lookups = None
+    # Whether the model has a ``row_version``, so v2 requests with ``changed_since`` can list the
+    # rows changed since that cursor, see ``ChangeFeedPagination``.
+    change_feed = False
 
     def get_serializer_class(self, *args, **kwargs):
         return self.serializer_class
@@ -158,19 +168,40 @@ class BaseDataExportListView(BaseDataExportView):
     def get_queryset(self, *args, **kwargs):
         raise NotImplementedError
 
-    def get_data_generator(self, *args, **kwargs):
+    def get_flat_export(self):
+        """The ``FlatExport`` serving this request, or None to serialize each object."""
+        if self.flat_export_lookups is None:
+            return None
+        return FlatExport.for_serializer(self.get_serializer_class(), tuple(sorted(self.flat_export_lookups.items())))
+
+    def get_export_fieldnames(self):
+        return list(self.get_serializer_class()().get_fields())
+
+    def get_row_chunks(self, *args, **kwargs):
+        """The exported rows, as tuples ordered by ``get_export_fieldnames``, ``STREAM_CHUNK_SIZE`` at a time."""
+        queryset = self.get_queryset(*args, **kwargs)
+        flat_export = self.get_flat_export()
+        if flat_export is not None:
+            yield from flat_export.iter_chunks(queryset, chunk_size=STREAM_CHUNK_SIZE)
+            return
+
         serializer_class = self.get_serializer_class()
-        fieldnames = serializer_class().get_fields().keys()
-        writer = csv.DictWriter(EchoWriter(), fieldnames=fieldnames)
-        objects = self.get_queryset(*args, **kwargs).iterator(chunk_size=STREAM_CHUNK_SIZE)
-        yield writer.writeheader()
+        objects = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        while chunk := list(islice(objects, STREAM_CHUNK_SIZE)):
+            self.post_paginate(chunk)
+            yield [tuple(serializer_class(obj).data.values()) for obj in chunk]
 
-        for obj in objects:
-            serialized_data = serializer_class(obj).data
-            yield writer.writerow(serialized_data)
+    def get_data_generator(self, *args, export_format=formats.CSV, **kwargs):
+        writer = formats.EXPORT_FORMATS[export_format].writer
+        return writer(self.get_export_fieldnames(), self.get_row_chunks(*args, **kwargs))
+
+    def get_pagination_class(self):
+        if self.change_feed and ChangeFeedPagination.changed_since_query_param in self.request.query_params:
+            return ChangeFeedPagination
+        return self.pagination_class
 
     def paginate_queryset(self, queryset):
-        self._paginator = self.pagination_class()
+        self._paginator = self.get_pagination_class()()
         return self._paginator.paginate_queryset(queryset, self.request)
 
     def get_paginated_response(self, data):
@@ -179,25 +210,56 @@ class BaseDataExportListView(BaseDataExportView):
     def post_paginate(self, page):
         """Hook called after pagination, before serialization. Override to modify the page list in-place.
 
-        Note: this hook is only called for v2.0 requests (paginated JSON). It is not invoked
-        for v1.0 requests, which use streaming CSV via ``get_data_generator``.
+        Note: this hook is only called for objects serialized by the serializer, i.e. v2.0 pages
+        and the chunks of v1.0 streams. It is not invoked for rows served by a ``FlatExport``.
         """
         pass
 
     @extend_schema(
         description=(
-            "v1.0: Returns CSV text StreamingHttpResponse. v2.0: Returns paginated JSON with 'next' and 'results'."
+            "v1.0: Returns a StreamingHttpResponse in the 'export_format' query parameter's format: 'csv' "
+            "(default), 'ndjson' or, where available, 'parquet'. CSV and NDJSON are compressed with zstd or "
+            "gzip when the Accept-Encoding header allows. v2.0: Returns paginated JSON with 'next' and 'results'. "
+            "Visit, completed work and payment exports accept a 'changed_since' cursor in v2.0 to list only the "
+            "rows changed since a previous sync, whose last page returns the cursor for the next one."
         )
     )
     def get(self, *args, **kwargs):
         if self.request.version == "2.0":
             queryset = self.get_queryset(*args, **kwargs)
+            flat_export = self.get_flat_export()
+            if flat_export is not None:
+                cursor_fields = self.get_pagination_class().cursor_fields
+                page = self.paginate_queryset(flat_export.values_list(queryset, cursor_fields=cursor_fields))
+                return flat_export.json_page_response(page, self._paginator)
             page = self.paginate_queryset(queryset)
             self.post_paginate(page)
             serializer_class = self.get_serializer_class()
             serializer = serializer_class(page, many=True)
             return self.get_paginated_response(serializer.data)
-        return StreamingHttpResponse(self.get_data_generator(*args, **kwargs), content_type="text/csv")
+        if ChangeFeedPagination.changed_since_query_param in self.request.query_params:
+            raise serializers.ValidationError(
+                {ChangeFeedPagination.changed_since_query_param: "Only supported by v2.0 requests."}
+            )
+        return self.get_streaming_response(*args, **kwargs)
+
+    def get_streaming_response(self, *args, **kwargs):
+        export_format = self.request.query_params.get("export_format", formats.CSV)
+        output_format = formats.get_export_format(export_format)
+        if output_format is None:
+            raise serializers.ValidationError({"export_format": f"Unsupported export format '{export_format}'."})
+
+        stream = self.get_data_generator(*args, export_format=export_format, **kwargs)
+        content_encoding = None
+        if output_format.compressible:
+            content_encoding = formats.get_content_encoding(self.request.headers.get("Accept-Encoding", ""))
+        if content_encoding:
+            stream = formats.compress(stream, content_encoding)
+        response = StreamingHttpResponse(stream, content_type=output_format.content_type)
+        if content_encoding:
+            response["Content-Encoding"] = content_encoding
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
 
 
 class V2OnlyVersioning(AcceptHeaderVersioning):
@@ -318,6 +380,8 @@ class OpportunityUserDataView(OpportunityScopedDataView):
 
 class UserVisitDataView(OpportunityScopedDataView):
     serializer_class = UserVisitDataSerializer
+    flat_export_lookups = {"username": "username"}
+    change_feed = True
 
     def _include_images(self):
         return self.request.query_params.get("images", "").lower() == "true"
@@ -327,6 +391,12 @@ class UserVisitDataView(OpportunityScopedDataView):
             return UserVisitDataWithImagesSerializer
         return UserVisitDataSerializer
 
+    def get_flat_export(self):
+        # Images are attached to each visit in post_paginate or by batch, so need the serializer.
+        if self._include_images():
+            return None
+        return super().get_flat_export()
+
     def get_queryset(self, request, opp_id):
         return (
             UserVisit.objects.filter(opportunity=self.opportunity)
@@ -338,32 +408,6 @@ class UserVisitDataView(OpportunityScopedDataView):
         if self._include_images():
             self._prefetch_images(page)
 
-    def get_data_generator(self, *args, **kwargs):
-        serializer_class = self.get_serializer_class()
-        fieldnames = serializer_class().get_fields().keys()
-        writer = csv.DictWriter(EchoWriter(), fieldnames=fieldnames)
-        yield writer.writeheader()
-
-        queryset = self.get_queryset(*args, **kwargs)
-        include_images = self._include_images()
-
-        if not include_images:
-            for obj in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
-                yield writer.writerow(serializer_class(obj).data)
-        else:
-            batch = []
-            for obj in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
-                batch.append(obj)
-                if len(batch) >= STREAM_CHUNK_SIZE:
-                    self._prefetch_images(batch)
-                    for visit in batch:
-                        yield writer.writerow(serializer_class(visit).data)
-                    batch = []
-            if batch:
-                self._prefetch_images(batch)
-                for visit in batch:
-                    yield writer.writerow(serializer_class(visit).data)
-
     def _prefetch_images(self, visits):
         xform_ids = [v.xform_id for v in visits]
         blobs_by_parent = defaultdict(list)
@@ -375,6 +419,8 @@ class UserVisitDataView(OpportunityScopedDataView):
 
 class CompletedWorkDataView(OpportunityScopedDataView):
     serializer_class = CompletedWorkDataSerializer
+    flat_export_lookups = {"username": "username", "opportunity_id": "opportunity_id"}
+    change_feed = True
 
     def get_queryset(self, request, opp_id):
         return (
@@ -389,6 +435,8 @@ class CompletedWorkDataView(OpportunityScopedDataView):
 
 class PaymentDataView(OpportunityScopedDataView):
     serializer_class = PaymentDataSerializer
+    flat_export_lookups = {"username": "username", "opportunity_id": "opportunity_id"}
+    change_feed = True
 
     def get_queryset(self, request, opp_id):
         return Payment.objects.filter(
@@ -401,6 +449,7 @@ class PaymentDataView(OpportunityScopedDataView):
 
 class InvoiceDataView(OpportunityScopedDataView):
     serializer_class = InvoiceDataSerializer
+    flat_export_lookups = {}
 
     def get_queryset(self, request, opp_id):
         opportunity = _get_opportunity_or_404(request.user, opp_id)
@@ -409,6 +458,7 @@ class InvoiceDataView(OpportunityScopedDataView):
 
 class CompletedModuleDataView(OpportunityScopedDataView):
     serializer_class = CompletedModuleDataSerializer
+    flat_export_lookups = {"username": "username"}
 
     def get_queryset(self, request, opp_id):
         queryset = CompletedModule.objects.filter(opportunity=self.opportunity)
@@ -423,6 +473,7 @@ class CompletedModuleDataView(OpportunityScopedDataView):
 
 class AssessmentDataView(OpportunityScopedDataView):
     serializer_class = AssessmentDataSerializer
+    flat_export_lookups = {"username": "username"}
 
     def get_queryset(self, request, opp_id):
         return Assessment.objects.filter(opportunity=self.opportunity).annotate(
@@ -641,6 +692,7 @@ class ProgramOpportunityDataView(BaseDataExportListView):
 
 class TaskTypeDataView(OpportunityDataExportView, BaseDataExportListViewV2):
     serializer_class = TaskTypeDataSerializer
+    flat_export_lookups = {}
 
     def get_queryset(self, *args, **kwargs):
         return TaskType.objects.filter(opportunity=self.opportunity)
@@ -648,6 +700,7 @@ class TaskTypeDataView(OpportunityDataExportView, BaseDataExportListViewV2):
 
 class AuditReportDataView(OpportunityDataExportView, BaseDataExportListViewV2):
     serializer_class = AuditReportDataSerializer
+    flat_export_lookups = {}
 
     def get_queryset(self, *args, **kwargs):
         return AuditReport.objects.filter(opportunity=self.opportunity).select_related("completed_by")
@@ -655,6 +708,7 @@ class AuditReportDataView(OpportunityDataExportView, BaseDataExportListViewV2):
 
 class AuditReportEntryDataView(OpportunityDataExportView, BaseDataExportListViewV2):
     serializer_class = AuditReportEntryDataSerializer
+    flat_export_lookups = {}
 
     def get_queryset(self, *args, **kwargs):
         qs = AuditReportEntry.objects.filter(
@@ -673,6 +727,7 @@ class AuditReportEntryDataView(OpportunityDataExportView, BaseDataExportListView
 
 class AssignedTaskDataView(OpportunityDataExportView, BaseDataExportListViewV2):
     serializer_class = AssignedTaskDataSerializer
+    flat_export_lookups = {}
 
     def get_queryset(self, *args, **kwargs):
         return AssignedTask.objects.filter(opportunity_access__opportunity=self.opportunity).select_related(
@@ -682,6 +737,7 @@ class AssignedTaskDataView(OpportunityDataExportView, BaseDataExportListViewV2):
 
 class WorkAreaGroupDataView(OpportunityDataExportView, BaseDataExportListViewV2):
     serializer_class = WorkAreaGroupDataSerializer
+    flat_export_lookups = {}
 
     def get_queryset(self, *args, **kwargs):
         return WorkAreaGroup.objects.filter(opportunity=self.opportunity)
@@ -696,6 +752,7 @@ class WorkAreaDataView(OpportunityDataExportView, BaseDataExportListViewV2):
 
 class LLOEntityDataView(BaseDataExportListViewV2):
     serializer_class = LLOEntityDataSerializer
+    flat_export_lookups = {}
 
     def check_permissions(self, request):
         super().check_permissions(request)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FormReceiverAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "commcare_connect.form_receiver"
+
+    def ready(self):
+        # Connects the signal handlers that invalidate the form resolution and verification caches.
+        from commcare_connect.form_receiver import resolution, verification  # noqa: F401
@@ -0,0 +1,62 @@
+"""Extraction of the Connect blocks (learn modules, assessments, tasks, deliver units and work
+area updates) embedded in a form.
+
+Blocks can sit at any depth of a form, including inside repeat groups, so the form is walked
+once and every block found is collected by kind. Blocks are returned in document order, the
+same order a ``$..<kind>`` JSONPath query returns them.
+
+The walk visits every group of the form whatever the namespaces in it: the ``@xmlns`` check
+only filters the blocks it finds, so the saving over the JSONPath queries comes from walking
+the form once instead of once per kind.
+"""
+
+from collections.abc import Iterator
+from typing import NamedTuple
+
+from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+
+LEARN_MODULE_BLOCK = "module"
+ASSESSMENT_BLOCK = "assessment"
+TASK_BLOCK = "task"
+DELIVER_UNIT_BLOCK = "deliver"
+WORK_AREA_UPDATE_BLOCK = "work_area_update"
+CONNECT_BLOCK_KINDS = frozenset(
+    {LEARN_MODULE_BLOCK, ASSESSMENT_BLOCK, TASK_BLOCK, DELIVER_UNIT_BLOCK, WORK_AREA_UPDATE_BLOCK}
+)
+
+
+class ConnectBlock(NamedTuple):
+    kind: str
+    xmlns: str | None
+    data: dict
+
+
+def iter_connect_blocks(form: dict) -> Iterator[ConnectBlock]:
+    """Yield every group named like a Connect block, whatever its namespace, in document order."""
+    stack = [form]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(child for child in reversed(node) if isinstance(child, dict | list))
+            continue
+        children = []
+        for key, value in node.items():
+            if isinstance(value, dict):
+                if key in CONNECT_BLOCK_KINDS:
+                    yield ConnectBlock(key, value.get("@xmlns"), value)
+                children.append(value)
+            elif isinstance(value, list):
+                children.append(value)
+        stack.extend(reversed(children))
+
+
+def get_connect_blocks(form: dict) -> dict[str, list[dict]]:
+    """The Connect blocks in ``form`` by kind, keeping only blocks in the Connect namespace.
+
+    Blocks without an ``@xmlns`` are dropped rather than rejecting the form.
+    """
+    blocks = {kind: [] for kind in CONNECT_BLOCK_KINDS}
+    for block in iter_connect_blocks(form):
+        if block.xmlns == CCC_LEARN_XMLNS:
+            blocks[block.kind].append(block.data)
+    return blocks
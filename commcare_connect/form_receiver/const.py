@@ -1 +1,6 @@
 CCC_LEARN_XMLNS = """http://commcareconnect.com/data/v1/learn"""
+
+# Staged bulk submissions are drained by one worker per partition at a time.
+SUBMISSION_PARTITION_COUNT = 16
+# Maximum number of forms accepted in one request to the bulk receiver.
+MAX_BULK_SUBMISSION_SIZE = 100
@@ -0,0 +1,75 @@
+"""Compare the single-pass Connect block extractor with the ``$..<kind>`` JSONPath scans it replaced.
+
+Both are timed on one synthetic form built in memory, shaped like a large delivery form: a
+repeat group per household member with nested groups of questions, and a deliver unit and task
+block inside each repeat. No real submissions are read, so the timings show the relative cost
+of the two approaches on that shape of form, not the receiver's throughput.
+"""
+
+import timeit
+
+from django.core.management.base import BaseCommand
+from jsonpath_ng.ext import parse
+
+from commcare_connect.form_receiver.blocks import CONNECT_BLOCK_KINDS, get_connect_blocks
+from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+
+FORM_XMLNS = "http://openrosa.org/formdesigner/benchmark"
+
+
+def build_form(repeats, questions):
+    def group(prefix):
+        return {f"{prefix}_question_{i}": f"value {i}" for i in range(questions)}
+
+    return {
+        "@xmlns": FORM_XMLNS,
+        "@name": "Household visit",
+        "meta": {"@xmlns": "http://openrosa.org/jr/xforms", "instanceID": "benchmark"},
+        "household": group("household"),
+        "members": [
+            {
+                "details": group("details"),
+                "health": {"vitals": group("vitals"), "history": [group("history") for _ in range(3)]},
+                "deliver": {
+                    "@xmlns": CCC_LEARN_XMLNS,
+                    "@id": "member_visit",
+                    "name": "Member visit",
+                    "entity_id": f"entity-{index}",
+                    "entity_name": f"Member {index}",
+                },
+                "task": {"@xmlns": CCC_LEARN_XMLNS, "@id": "follow_up", "name": "Follow up"},
+            }
+            for index in range(repeats)
+        ],
+    }
+
+
+def jsonpath_blocks(jsonpaths, form):
+    return {
+        kind: [match.value for match in jsonpath.find(form) if match.value["@xmlns"] == CCC_LEARN_XMLNS]
+        for kind, jsonpath in jsonpaths.items()
+    }
+
+
+class Command(BaseCommand):
+    help = "Time Connect block extraction against the equivalent JSONPath scans on a synthetic form"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeats", type=int, default=50, help="Repeat groups in the form")
+        parser.add_argument("--questions", type=int, default=20, help="Questions in each group")
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        form = build_form(options["repeats"], options["questions"])
+        iterations = options["iterations"]
+        jsonpaths = {kind: parse(f"$..{kind}") for kind in CONNECT_BLOCK_KINDS}
+
+        if get_connect_blocks(form) != jsonpath_blocks(jsonpaths, form):
+            self.stderr.write(self.style.ERROR("Extracted blocks differ from the JSONPath results"))
+            return
+
+        jsonpath_seconds = timeit.timeit(lambda: jsonpath_blocks(jsonpaths, form), number=iterations) / iterations
+        extractor_seconds = timeit.timeit(lambda: get_connect_blocks(form), number=iterations) / iterations
+        self.stdout.write(f"JSONPath scans: {jsonpath_seconds * 1000:.2f}ms per form")
+        self.stdout.write(f"Block extractor: {extractor_seconds * 1000:.2f}ms per form")
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {jsonpath_seconds / extractor_seconds:.1f}x"))
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("commcarehq", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="XFormSubmission",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("xform_id", models.CharField(max_length=50)),
+                ("partition", models.PositiveSmallIntegerField()),
+                ("payload", models.JSONField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processed", "Processed"),
+                            ("duplicate", "Duplicate"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=50,
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="")),
+                ("date_received", models.DateTimeField(auto_now_add=True)),
+                ("date_processed", models.DateTimeField(blank=True, null=True)),
+                (
+                    "hq_server",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING, to="commcarehq.hqserver"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "pending")),
+                        fields=["partition", "id"],
+                        name="pending_xform_submissions",
+                    ),
+                    models.Index(fields=["hq_server", "xform_id"], name="xform_submission_lookup"),
+                ],
+            },
+        ),
+    ]
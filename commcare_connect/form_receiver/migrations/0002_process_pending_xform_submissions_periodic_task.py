@@ -0,0 +1,37 @@
+from django.db import migrations
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+
+def create_process_pending_submissions_periodic_task(apps, schema_editor):
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute="*/5",
+        hour="*",
+        day_of_week="*",
+        day_of_month="*",
+        month_of_year="*",
+    )
+    PeriodicTask.objects.update_or_create(
+        name="process_pending_xform_submissions",
+        defaults={
+            "crontab": schedule,
+            "task": "commcare_connect.form_receiver.tasks.process_pending_xform_submissions",
+        },
+    )
+
+
+def delete_process_pending_submissions_periodic_task(apps, schema_editor):
+    PeriodicTask.objects.filter(name="process_pending_xform_submissions").delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("form_receiver", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_process_pending_submissions_periodic_task,
+            delete_process_pending_submissions_periodic_task,
+            hints={"run_on_secondary": False},
+        )
+    ]
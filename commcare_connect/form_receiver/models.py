@@ -0,0 +1,48 @@
+import zlib
+
+from django.db import models
+from django.utils.translation import gettext
+
+from commcare_connect.commcarehq.models import HQServer
+from commcare_connect.form_receiver.const import SUBMISSION_PARTITION_COUNT
+
+
+class XFormSubmissionStatus(models.TextChoices):
+    pending = "pending", gettext("Pending")
+    processed = "processed", gettext("Processed")
+    duplicate = "duplicate", gettext("Duplicate")
+    failed = "failed", gettext("Failed")
+
+
+class XFormSubmission(models.Model):
+    """A form received through the bulk endpoint, staged until a worker processes it.
+
+    Forms are drained in ``id`` order within a ``partition``. The partition is derived from
+    the CommCare username so every form from one worker, and therefore from each of their
+    opportunity accesses, is processed by one worker at a time and in the order received.
+    """
+
+    hq_server = models.ForeignKey(HQServer, on_delete=models.DO_NOTHING)
+    xform_id = models.CharField(max_length=50)
+    partition = models.PositiveSmallIntegerField()
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=50, choices=XFormSubmissionStatus.choices, default=XFormSubmissionStatus.pending
+    )
+    error = models.TextField(blank=True, default="")
+    date_received = models.DateTimeField(auto_now_add=True)
+    date_processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["partition", "id"],
+                condition=models.Q(status=XFormSubmissionStatus.pending),
+                name="pending_xform_submissions",
+            ),
+            models.Index(fields=["hq_server", "xform_id"], name="xform_submission_lookup"),
+        ]
+
+    @staticmethod
+    def get_partition(commcare_username: str) -> int:
+        return zlib.crc32(commcare_username.encode()) % SUBMISSION_PARTITION_COUNT
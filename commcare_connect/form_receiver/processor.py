@@ -1,21 +1,30 @@
 import datetime
 import logging
+import math
 from functools import partial
 from uuid import UUID
 
 import pghistory
+from django.contrib.gis.db.models import PointField
+from django.contrib.gis.db.models.functions import Distance
 from django.contrib.gis.geos import Point
-from django.db import transaction
-from django.db.models import Count, Min, Q
-from django.utils.timezone import now
-from geopy.distance import distance
-from jsonpath_ng.exceptions import JSONPathError
-from jsonpath_ng.ext import parse
+from django.contrib.gis.measure import D
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, FloatField, Func, Min, Q, Value
+from django.db.models.functions import Cast
 
 from commcare_connect.commcarehq.models import HQServer
-from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+from commcare_connect.form_receiver.blocks import (
+    ASSESSMENT_BLOCK,
+    DELIVER_UNIT_BLOCK,
+    LEARN_MODULE_BLOCK,
+    TASK_BLOCK,
+    WORK_AREA_UPDATE_BLOCK,
+)
 from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.form_receiver.resolution import resolve_opportunities, resolve_user
 from commcare_connect.form_receiver.serializers import XForm
+from commcare_connect.form_receiver.verification import get_verification_rules
 from commcare_connect.microplanning.models import (
     SRID,
     InaccessibilityRequestStatus,
@@ -32,14 +41,11 @@ from commcare_connect.opportunity.models import (
     CompletedWork,
     CompletedWorkStatus,
     DeliverUnit,
-    DeliverUnitFlagRules,
-    FormJsonValidationRules,
     LearnModule,
     Opportunity,
     OpportunityAccess,
     OpportunityClaim,
     OpportunityClaimLimit,
-    OpportunityVerificationFlags,
     UserVisit,
     VisitReviewStatus,
     VisitValidationStatus,
@@ -48,17 +54,53 @@ from commcare_connect.opportunity.tasks import (
     download_inaccessibility_request_attachments,
     download_user_visit_attachments,
     notify_user_for_scored_assessment,
+    record_visit_form_json_keys,
+)
+from commcare_connect.opportunity.utils.learn_progress import update_app_learn_progress, update_learn_progress
+from commcare_connect.opportunity.utils.list_metrics import invalidate_opportunity_list_metrics
+from commcare_connect.opportunity.utils.opportunity_stats import (
+    adjust_opportunity_stats,
+    last_active_stats_deltas,
+    utc_date,
 )
-from commcare_connect.opportunity.visit_import import update_payment_accrued_for_user
+from commcare_connect.opportunity.utils.payment_accrual_queue import queue_payment_accrual
 from commcare_connect.users.models import User
 
 logger = logging.getLogger(__name__)
 
-LEARN_MODULE_JSONPATH = parse("$..module")
-TASK_MODULE_JSONPATH = parse("$..task")
-ASSESSMENT_JSONPATH = parse("$..assessment")
-DELIVER_UNIT_JSONPATH = parse("$..deliver")
-WORK_AREA_UPDATE_JSONPATH = parse("$..work_area_update")
+# Unique constraints that mean the form, or part of it, was already processed. Hitting one is
+# not an error: HQ resends forms and the earlier submission stands.
+DUPLICATE_SUBMISSION_MESSAGES = {
+    "unique_xform_entity_deliver_unit": "Duplicate form with ID: {xform_id} received.",
+    "unique_xform_completed_module": "Learn Module is already completed with form ID: {xform_id}.",
+    "unique_xform_work_area_inaccessibility": "Duplicate inaccessibility request for form ID: {xform_id}.",
+}
+
+# Shortest length of one degree of latitude, used to turn a radius in metres into a (generous)
+# radius in degrees for index-assisted pre-filtering on SRID 4326 geometries.
+METERS_PER_DEGREE = 110_574
+
+# Daily and total visits that count towards the limits, read from the VisitLimitCount buckets,
+# and whether one of them was already for the entity. Entities are compared with IS NOT DISTINCT
+# FROM so that, as before, visits without an entity id are duplicates of each other. The EXISTS
+# probe is an index-only scan of uservisit_duplicate_check_idx, whose condition matches its
+# status filter: the worker's visits for the deliver unit are found by the leading columns and
+# their entity ids are compared in the index, as IS NOT DISTINCT FROM can't be an index bound.
+VISIT_LIMIT_COUNTS_SQL = """
+SELECT
+    COALESCE(SUM(visit_count) FILTER (WHERE date = %(date)s), 0),
+    COALESCE(SUM(visit_count), 0),
+    EXISTS (
+        SELECT 1
+        FROM opportunity_uservisit
+        WHERE opportunity_access_id = %(access_id)s
+            AND deliver_unit_id = %(deliver_unit_id)s
+            AND entity_id IS NOT DISTINCT FROM %(entity_id)s
+            AND status NOT IN ('over_limit', 'trial')
+    )
+FROM opportunity_visitlimitcount
+WHERE opportunity_access_id = %(access_id)s AND deliver_unit_id = %(deliver_unit_id)s
+"""
 
 
 def is_a_uuid(value):
@@ -73,37 +115,37 @@ def process_xform(xform: XForm, hq_server: HQServer):
     """Process a form received from CommCare HQ."""
     user = get_user(xform)
 
-    opportunity = get_opportunity(xform.domain, hq_server, deliver_app_id=xform.app_id)
-    if opportunity:
-        app = opportunity.deliver_app
-        process_deliver_form(user, xform, app, opportunity)
+    opportunities = resolve_opportunities(xform.domain, hq_server, xform.app_id)
+    if opportunities.deliver:
+        opportunity = opportunities.deliver
+        process_deliver_form(user, xform, opportunity.deliver_app, opportunity)
+
+    if opportunities.learn:
+        opportunity = opportunities.learn
+        process_learn_form(user, xform, opportunity.learn_app, opportunity)
+
 
-    opportunity = get_opportunity(xform.domain, hq_server, learn_app_id=xform.app_id)
-    if opportunity:
-        app = opportunity.learn_app
-        process_learn_form(user, xform, app, opportunity)
+def get_duplicate_submission_message(error: IntegrityError, xform_id: str) -> str | None:
+    """Return a log message if ``error`` was raised by a duplicate submission, otherwise None."""
+    for constraint, message in DUPLICATE_SUBMISSION_MESSAGES.items():
+        if constraint in str(error):
+            return message.format(xform_id=xform_id)
+    return None
 
 
 def process_learn_form(user, xform: XForm, app: CommCareApp, opportunity: Opportunity):
     processors = [
-        (LEARN_MODULE_JSONPATH, process_learn_modules),
-        (ASSESSMENT_JSONPATH, process_assessments),
+        (LEARN_MODULE_BLOCK, process_learn_modules),
+        (ASSESSMENT_BLOCK, process_assessments),
     ]
-    for jsonpath, processor in processors:
-        try:
-            matches = _get_matching_blocks(jsonpath, xform)
-            if matches:
-                processor(user, xform, app, opportunity, matches)
-        except JSONPathError as e:
-            raise ProcessingError from e
-
-
-def _get_matching_blocks(jsonpath, xform):
-    return [match.value for match in jsonpath.find(xform.form) if match.value["@xmlns"] == CCC_LEARN_XMLNS]
+    for block_kind, processor in processors:
+        matches = xform.connect_blocks[block_kind]
+        if matches:
+            processor(user, xform, app, opportunity, matches)
 
 
 def get_or_create_learn_module(app, module_data):
-    module, _ = LearnModule.objects.get_or_create(
+    return LearnModule.objects.get_or_create(
         app=app,
         slug=module_data["@id"],
         defaults=dict(
@@ -112,7 +154,6 @@ def get_or_create_learn_module(app, module_data):
             time_estimate=module_data["time_estimate"],
         ),
     )
-    return module
 
 
 def process_learn_modules(user: User, xform: XForm, app: CommCareApp, opportunity: Opportunity, blocks: list[dict]):
@@ -125,10 +166,13 @@ def process_learn_modules(user: User, xform: XForm, app: CommCareApp, opportunit
     :param blocks: A list of learn module form blocks."""
     with transaction.atomic():
         access = OpportunityAccess.objects.get(user=user, opportunity=opportunity)
+        old_last_active = access.last_active
         completed_modules = []
         save_access = False
+        new_module = False
         for module_data in blocks:
-            module = get_or_create_learn_module(app, module_data)
+            module, created = get_or_create_learn_module(app, module_data)
+            new_module = new_module or created
             completed_module = CompletedModule(
                 user=user,
                 module=module,
@@ -147,7 +191,14 @@ def process_learn_modules(user: User, xform: XForm, app: CommCareApp, opportunit
 
         if completed_modules:
             CompletedModule.objects.bulk_create(completed_modules)
+            update_learn_progress(access)
+            if new_module:
+                # The other workers' progress is now measured against one more module.
+                update_app_learn_progress(app.id)
             update_completed_learn_date(access, save_access)
+            adjust_opportunity_stats(
+                access.opportunity_id, **last_active_stats_deltas(old_last_active, access.last_active)
+            )
 
 
 def process_task_modules(user: User, xform: XForm, app: CommCareApp, opportunity: Opportunity, blocks: list[dict]):
@@ -198,6 +249,7 @@ def update_completed_learn_date(access, save_access=False):
         completed_learn_date = max(entry["earliest_date"] for entry in earliest_dates)
         access.completed_learn_date = completed_learn_date
         save_access = True
+        adjust_opportunity_stats(access.opportunity_id, completed_learning=1)
 
     if save_access:
         access.save()
@@ -238,18 +290,29 @@ def process_assessments(user, xform: XForm, app: CommCareApp, opportunity: Oppor
         if not created:
             raise ProcessingError("Learn Assessment is already completed")
 
+        if (
+            assessment.passed
+            and not Assessment.objects.filter(opportunity=opportunity, user=user, passed=True)
+            .exclude(pk=assessment.pk)
+            .exists()
+        ):
+            adjust_opportunity_stats(opportunity.id, completed_assessments=1)
+
         transaction.on_commit(partial(notify_user_for_scored_assessment.delay, assessment.pk))
 
 
 def process_deliver_form(user, xform: XForm, app: CommCareApp, opportunity: Opportunity):
-    for deliver_unit_block in _get_matching_blocks(DELIVER_UNIT_JSONPATH, xform):
+    deliver_unit_blocks = xform.connect_blocks[DELIVER_UNIT_BLOCK]
+    for deliver_unit_block in deliver_unit_blocks:
         process_deliver_unit(user, xform, app, opportunity, deliver_unit_block)
+    if deliver_unit_blocks:
+        transaction.on_commit(partial(record_visit_form_json_keys.delay, app.id, xform.id))
 
-    task_matches = _get_matching_blocks(TASK_MODULE_JSONPATH, xform)
+    task_matches = xform.connect_blocks[TASK_BLOCK]
     if task_matches:
         process_task_modules(user, xform, app, opportunity, task_matches)
 
-    work_area_blocks = _get_matching_blocks(WORK_AREA_UPDATE_JSONPATH, xform)
+    work_area_blocks = xform.connect_blocks[WORK_AREA_UPDATE_BLOCK]
     if work_area_blocks:
         process_work_area_update(user, opportunity, xform, work_area_blocks)
 
@@ -341,7 +404,8 @@ def clean_form_submission(access: OpportunityAccess, user_visit: UserVisit, xfor
     side effect (e.g., resetting duplicate status when the duplicate flag is disabled).
     """
     flags = []
-    opportunity_flags, _ = OpportunityVerificationFlags.objects.get_or_create(opportunity=user_visit.opportunity)
+    rules = get_verification_rules(user_visit.opportunity, user_visit.deliver_unit)
+    opportunity_flags = rules.definition
     if user_visit.status == VisitValidationStatus.duplicate:
         if opportunity_flags.duplicate:
             flags.append(["duplicate", "A beneficiary with the same identifier already exists"])
@@ -349,32 +413,15 @@ def clean_form_submission(access: OpportunityAccess, user_visit: UserVisit, xfor
             user_visit.status = VisitValidationStatus.pending
     if opportunity_flags.gps and user_visit.location is None:
         flags.append(["gps", "GPS data is missing"])
-    if opportunity_flags.location > 0 and user_visit.location:
-        user_visits = (
-            UserVisit.objects.filter(opportunity=user_visit.opportunity, deliver_unit=user_visit.deliver_unit)
-            .exclude(Q(status=VisitValidationStatus.trial) | Q(entity_id=user_visit.entity_id))
-            .values("location")
-        )
-        cur_lat, cur_lon, *_ = user_visit.location.split(" ")
-        for visit in user_visits:
-            if visit.get("location") is None:
-                continue
-            lat, lon, *_ = visit["location"].split(" ")
-            dist = distance((lat, lon), (cur_lat, cur_lon))
-            if dist.m <= opportunity_flags.location:
-                flags.append(["location", f"Visit location is {dist.m}m from another visit"])
-                break
+    if opportunity_flags.location > 0 and user_visit.location_point:
+        nearest = _nearest_visit_distance(user_visit, opportunity_flags.location)
+        if nearest is not None:
+            flags.append(["location", f"Visit location is {nearest.m}m from another visit"])
     if opportunity_flags.catchment_areas:
         areas = access.catchmentarea_set.filter(active=True)
-        if areas:
-            within_catchment = False
-            if xform.metadata.location is not None:
-                cur_lat, cur_lon, *_ = xform.metadata.location.split(" ")
-                for area in areas:
-                    dist = distance((area.latitude, area.longitude), (cur_lat, cur_lon))
-                    if dist.meters < area.radius:
-                        within_catchment = True
-                        break
+        if areas.exists():
+            location_point = _parse_xform_location(xform.metadata.location)
+            within_catchment = location_point is not None and _within_catchment_areas(areas, location_point)
             if not within_catchment:
                 flags.append(["catchment", "Visit outside worker catchment areas"])
     if (
@@ -388,36 +435,60 @@ def clean_form_submission(access: OpportunityAccess, user_visit: UserVisit, xfor
     ):
         flags.append(["form_submission_period", "Form was submitted after the end time"])
 
-    deliver_unit_flags = DeliverUnitFlagRules.objects.filter(
-        opportunity=user_visit.opportunity, deliver_unit=user_visit.deliver_unit
-    ).first()
-    if deliver_unit_flags is not None:
-        if deliver_unit_flags.check_attachments:
-            attachments = user_visit.form_json.get("attachments", {})
-            attachments.pop("form.xml", None)
-            if len(attachments) == 0:
-                flags.append(["attachment_missing", "Form was submitted without attachements."])
-
-        if deliver_unit_flags.duration > 0 and xform.metadata.duration < datetime.timedelta(
-            minutes=deliver_unit_flags.duration
-        ):
-            flags.append(["duration", "The form was completed too quickly."])
+    if rules.definition.check_attachments:
+        attachments = user_visit.form_json.get("attachments", {})
+        attachments.pop("form.xml", None)
+        if len(attachments) == 0:
+            flags.append(["attachment_missing", "Form was submitted without attachements."])
 
-    form_json_rules = FormJsonValidationRules.objects.filter(
-        opportunity=user_visit.opportunity, deliver_unit=user_visit.deliver_unit
-    )
-    for form_json_rule in form_json_rules:
-        json_path = parse(f"$.{form_json_rule.question_path}")
-        matches = [
-            match.value
-            for match in json_path.find(user_visit.form_json)
-            if match.value == form_json_rule.question_value
-        ]
-        if not matches:
-            flags.append(["form_value_not_found", f"Form does not satisfy {form_json_rule.name} validation rule."])
+    if rules.definition.duration > 0 and xform.metadata.duration < datetime.timedelta(
+        minutes=rules.definition.duration
+    ):
+        flags.append(["duration", "The form was completed too quickly."])
+
+    for form_json_rule in rules.failed_form_json_rules(user_visit.form_json):
+        flags.append(["form_value_not_found", f"Form does not satisfy {form_json_rule.name} validation rule."])
     return flags
 
 
+def _degrees_within(meters, point):
+    """An upper bound on the angular span of ``meters`` around ``point``, so an index-assisted
+    ``dwithin`` on the SRID 4326 geometry never drops a point that is within ``meters``."""
+    return meters / (METERS_PER_DEGREE * max(math.cos(math.radians(point.y)), 0.01))
+
+
+def _nearest_visit_distance(user_visit: UserVisit, max_meters: int):
+    """Distance to the nearest other visit for the same deliver unit within ``max_meters``, or None."""
+    point = user_visit.location_point
+    return (
+        UserVisit.objects.filter(
+            opportunity=user_visit.opportunity,
+            deliver_unit=user_visit.deliver_unit,
+            location_point__dwithin=(point, _degrees_within(max_meters, point)),
+        )
+        .exclude(Q(status=VisitValidationStatus.trial) | Q(entity_id=user_visit.entity_id))
+        .annotate(distance=Distance("location_point", point, spheroid=True))
+        .filter(distance__lte=D(m=max_meters))
+        .order_by("distance")
+        .values_list("distance", flat=True)
+        .first()
+    )
+
+
+def _within_catchment_areas(areas, point: Point) -> bool:
+    center = Func(
+        Func(
+            Cast("longitude", output_field=FloatField()),
+            Cast("latitude", output_field=FloatField()),
+            function="ST_MakePoint",
+        ),
+        Value(SRID),
+        function="ST_SetSRID",
+        output_field=PointField(srid=SRID),
+    )
+    return areas.annotate(distance=Distance(center, point, spheroid=True)).filter(distance__lt=F("radius")).exists()
+
+
 def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Opportunity, deliver_unit_block: dict):
     """Process a delivery form submission into a UserVisit and update CompletedWork.
 
@@ -429,21 +500,10 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
     4. Auto-rejects flagged visits if automatic_visit_verification is enabled
     5. Auto-approves if auto_approve_visits is enabled and no flags are raised
     6. Updates or creates the associated CompletedWork record
-    7. Triggers incremental payment recalculation
+    7. Queues an incremental payment recalculation
     """
     deliver_unit = get_or_create_deliver_unit(app, deliver_unit_block)
-    try:
-        access = OpportunityAccess.objects.get(opportunity=opportunity, user=user)
-    except OpportunityAccess.DoesNotExist:
-        raise ProcessingError(f"User does not have access to opportunity {opportunity.name}")
     payment_unit = deliver_unit.payment_unit
-    if not payment_unit:
-        raise ProcessingError(
-            f"Payment unit is not configured for the deliver unit: "
-            f"{deliver_unit.name} in opportunity: {opportunity.name}"
-        )
-
-    claim = OpportunityClaim.objects.get(opportunity_access=access)
     entity_id = deliver_unit_block.get("entity_id")
     entity_name = deliver_unit_block.get("entity_name")
 
@@ -453,18 +513,10 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
         # daily/total counts before either commits and both pass the limit check,
         # letting visits slip past the daily limit. The lock also serializes the
         # duplicate-entity check below.
-        claim_limit = OpportunityClaimLimit.objects.select_for_update().get(
-            opportunity_claim=claim, payment_unit=payment_unit
-        )
-        counts = (
-            UserVisit.objects.filter(opportunity_access=access, deliver_unit=deliver_unit)
-            .exclude(status__in=[VisitValidationStatus.over_limit, VisitValidationStatus.trial])
-            .aggregate(
-                daily=Count("pk", filter=Q(visit_date__date=xform.metadata.timeStart)),
-                total=Count("*"),
-                entity=Count("pk", filter=Q(entity_id=deliver_unit_block.get("entity_id"), deliver_unit=deliver_unit)),
-            )
-        )
+        claim_limit = _get_locked_claim_limit(user, opportunity, deliver_unit)
+        claim = claim_limit.opportunity_claim
+        access = claim.opportunity_access
+        counts = _get_visit_limit_counts(access, deliver_unit, entity_id, utc_date(xform.metadata.timeStart))
         user_visit = UserVisit(
             opportunity=opportunity,
             user=user,
@@ -478,15 +530,17 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
             app_build_version=xform.metadata.app_build_version,
             form_json=xform.raw_form,
             location=xform.metadata.location,
+            location_point=_parse_xform_location(xform.metadata.location),
         )
         completed_work_needs_save = False
+        new_work = False
         today = datetime.date.today()
         paymentunit_startdate = payment_unit.start_date if payment_unit else None
         if opportunity.start_date > today or (paymentunit_startdate and paymentunit_startdate > today):
             completed_work = None
             user_visit.status = VisitValidationStatus.trial
         else:
-            completed_work, _ = CompletedWork.objects.get_or_create(
+            completed_work, new_work = CompletedWork.objects.get_or_create(
                 opportunity_access=access,
                 entity_id=entity_id,
                 payment_unit=payment_unit,
@@ -502,7 +556,7 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
                 if not completed_work.status == CompletedWorkStatus.over_limit:
                     completed_work.status = CompletedWorkStatus.over_limit
                     completed_work_needs_save = True
-            elif counts["entity"] > 0:
+            elif counts["duplicate"]:
                 user_visit.status = VisitValidationStatus.duplicate
 
         flags = clean_form_submission(access, user_visit, xform)
@@ -541,19 +595,22 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
                 raise ProcessingError(f"Invalid work area case id specified: {work_area_case_id}")
             try:
                 work_area = WorkArea.objects.select_for_update().get(
-                    case_id=work_area_case_id, opportunity=access.opportunity
+                    case_id=work_area_case_id, opportunity=opportunity
                 )
                 user_visit.work_area = work_area
             except WorkArea.DoesNotExist:
                 raise ProcessingError("Work area not found")
 
+        first_visit = not UserVisit.objects.filter(opportunity_access=access).exists()
         user_visit.save()
 
         if work_area:
             work_area.update_status()
 
+        old_last_active = access.last_active
         if not access.last_active or access.last_active < user_visit.visit_date:
             access.last_active = user_visit.visit_date
+            access.save(update_fields=["last_active"])
 
         if completed_work is not None:
             if completed_work.status == CompletedWorkStatus.incomplete:
@@ -562,11 +619,61 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
             if completed_work_needs_save:
                 completed_work.save()
 
-    completed_work_id = completed_work.id if completed_work is not None else None
-    update_payment_accrued_for_user(access, incremental=True, completed_work_id=completed_work_id)
+        adjust_opportunity_stats(
+            opportunity.id,
+            latest={"most_recent_delivery": user_visit.visit_date},
+            daily={utc_date(user_visit.visit_date): {"deliveries": 1}},
+            total_deliveries=int(new_work),
+            started_deliveries=int(first_visit),
+            **last_active_stats_deltas(old_last_active, access.last_active),
+        )
+        invalidate_opportunity_list_metrics(opportunity.id)
+
+        queue_payment_accrual(access, completed_work.id if completed_work is not None else None)
+
     transaction.on_commit(partial(download_user_visit_attachments.delay, user_visit.id))
 
 
+def _get_locked_claim_limit(user, opportunity: Opportunity, deliver_unit: DeliverUnit) -> OpportunityClaimLimit:
+    """Lock and return the worker's claim limit for the deliver unit's payment unit, with its claim and access."""
+    try:
+        return (
+            OpportunityClaimLimit.objects.select_for_update(of=("self",))
+            .select_related("opportunity_claim__opportunity_access")
+            .get(
+                opportunity_claim__opportunity_access__opportunity=opportunity,
+                opportunity_claim__opportunity_access__user=user,
+                payment_unit_id=deliver_unit.payment_unit_id,
+            )
+        )
+    except OpportunityClaimLimit.DoesNotExist:
+        pass
+    # Find out what is missing to report it.
+    try:
+        access = OpportunityAccess.objects.get(opportunity=opportunity, user=user)
+    except OpportunityAccess.DoesNotExist:
+        raise ProcessingError(f"User does not have access to opportunity {opportunity.name}")
+    if not deliver_unit.payment_unit_id:
+        raise ProcessingError(
+            f"Payment unit is not configured for the deliver unit: "
+            f"{deliver_unit.name} in opportunity: {opportunity.name}"
+        )
+    claim = OpportunityClaim.objects.get(opportunity_access=access)
+    return OpportunityClaimLimit.objects.get(opportunity_claim=claim, payment_unit_id=deliver_unit.payment_unit_id)
+
+
+def _get_visit_limit_counts(access: OpportunityAccess, deliver_unit: DeliverUnit, entity_id, date) -> dict:
+    """The worker's visits for the deliver unit that count towards the limits, on ``date`` and in total,
+    and whether one of them is for ``entity_id``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            VISIT_LIMIT_COUNTS_SQL,
+            {"access_id": access.id, "deliver_unit_id": deliver_unit.id, "entity_id": entity_id, "date": date},
+        )
+        daily, total, duplicate = cursor.fetchone()
+    return {"daily": daily, "total": total, "duplicate": duplicate}
+
+
 def _has_blocking_pending_task(access: OpportunityAccess, app: CommCareApp) -> bool:
     return AssignedTask.objects.filter(
         opportunity_access=access,
@@ -578,7 +685,7 @@ def _has_blocking_pending_task(access: OpportunityAccess, app: CommCareApp) -> b
 
 
 def get_or_create_deliver_unit(app, unit_data):
-    unit, _ = DeliverUnit.objects.get_or_create(
+    unit, _ = DeliverUnit.objects.select_related("payment_unit").get_or_create(
         app=app,
         slug=unit_data["@id"],
         defaults={
@@ -588,46 +695,19 @@ def get_or_create_deliver_unit(app, unit_data):
     return unit
 
 
-def get_opportunity(domain, hq_server, deliver_app_id=None, learn_app_id=None):
-    if not (learn_app_id or deliver_app_id):
-        raise ValueError("One of learn_app_id or deliver_app_id along with domain must be provided")
-    if learn_app_id:
-        kwargs = {
-            "learn_app__cc_domain": domain,
-            "learn_app__cc_app_id": learn_app_id,
-        }
-    if deliver_app_id:
-        kwargs = {
-            "deliver_app__cc_domain": domain,
-            "deliver_app__cc_app_id": deliver_app_id,
-        }
-
-    try:
-        opportunity = Opportunity.objects.get(active=True, end_date__gte=now().date(), **kwargs)
-        if learn_app_id:
-            app = opportunity.learn_app
-        elif deliver_app_id:
-            app = opportunity.deliver_app
-        if app.hq_server != hq_server:
-            raise ProcessingError(f"CommCare App {app.id} not found on {hq_server}")
-        return opportunity
-    except Opportunity.DoesNotExist:
-        pass
-    except Opportunity.MultipleObjectsReturned:
-        app_id = learn_app_id or deliver_app_id
-        raise ProcessingError(f"Multiple active opportunities found for CommCare app {app_id}.")
-
-
 def get_user(xform: XForm):
     cc_username = _get_commcare_username(xform)
-    user = User.objects.filter(connectiduserlink__commcare_username=cc_username).first()
+    user = resolve_user(cc_username)
     if not user:
         raise ProcessingError(f"Commcare User {cc_username} not found")
     return user
 
 
 def _get_commcare_username(xform: XForm):
-    username = xform.metadata.username
+    return get_commcare_username(xform.metadata.username, xform.domain)
+
+
+def get_commcare_username(username: str, domain: str):
     if "@" in username:
         return username
-    return f"{username}@{xform.domain}.commcarehq.org"
+    return f"{username}@{domain}.commcarehq.org"
@@ -0,0 +1,159 @@
+"""Per-process cache of the lookups every form submission starts with.
+
+Each form needs the submitting user (via ``ConnectIDUserLink``) and the active opportunities
+whose deliver or learn app matches the form's ``(hq_server, domain, app_id)``. These change
+rarely compared to the rate forms arrive, so the results are kept in process memory for a
+short TTL.
+
+Entries are tagged with a shared generation stored in the Django cache; saving or deleting an
+``Opportunity``, ``CommCareApp`` or ``ConnectIDUserLink`` clears the local entries and bumps the
+generation so other processes drop theirs on their next lookup. ``QuerySet.update()`` sends no
+signals, so code updating those rows in bulk calls ``invalidate_resolution_caches`` itself.
+"""
+
+import copy
+import dataclasses
+import time
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils.timezone import now
+
+from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.opportunity.models import CommCareApp, Opportunity
+from commcare_connect.users.models import ConnectIDUserLink, User
+
+RESOLUTION_CACHE_TTL_SECONDS = 5 * 60
+RESOLUTION_GENERATION_CACHE_KEY = "form_receiver:resolution:generation"
+
+
+@dataclasses.dataclass
+class ResolvedOpportunities:
+    deliver: Opportunity | None = None
+    learn: Opportunity | None = None
+
+
+class ResolutionCache:
+    """TTL cache of model instances keyed by lookup arguments, with hit/miss counters.
+
+    Callers get a deep copy of the cached value, including any related instances fetched with
+    ``select_related``, so that per-request changes (related object caches, attribute
+    assignment) never leak into other requests.
+    """
+
+    def __init__(self, ttl=RESOLUTION_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        generation = cache.get(RESOLUTION_GENERATION_CACHE_KEY)
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at, entry_generation = entry
+            if expires_at > time.monotonic() and entry_generation == generation:
+                self.hits += 1
+                return copy.deepcopy(value)
+
+        self.misses += 1
+        value = compute()
+        if value is not None:
+            self._entries[key] = (value, time.monotonic() + self.ttl, generation)
+        return copy.deepcopy(value)
+
+    def clear(self, reset_stats=False):
+        self._entries.clear()
+        if reset_stats:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+user_cache = ResolutionCache()
+opportunity_cache = ResolutionCache()
+
+
+def resolution_cache_stats():
+    return {"users": user_cache.stats(), "opportunities": opportunity_cache.stats()}
+
+
+def clear_resolution_caches(reset_stats=False):
+    user_cache.clear(reset_stats)
+    opportunity_cache.clear(reset_stats)
+
+
+def invalidate_resolution_caches(**kwargs):
+    clear_resolution_caches()
+    cache.set(RESOLUTION_GENERATION_CACHE_KEY, uuid4().hex, timeout=None)
+
+
+def resolve_user(commcare_username: str) -> User | None:
+    # Misses are not cached: a link created for a new worker must be picked up immediately.
+    return user_cache.get_or_compute(
+        commcare_username,
+        lambda: User.objects.filter(connectiduserlink__commcare_username=commcare_username).first(),
+    )
+
+
+def resolve_opportunities(domain: str, hq_server, app_id: str) -> ResolvedOpportunities:
+    """Return the active opportunities using ``app_id`` as their deliver and learn app.
+
+    Both roles are fetched in a single query. Opportunities are cached regardless of their end
+    date, which is checked on every call so that entries stay correct across midnight.
+    """
+    candidates = opportunity_cache.get_or_compute(
+        (hq_server.pk, domain, app_id),
+        lambda: _get_candidate_opportunities(domain, app_id),
+    )
+    today = now().date()
+    candidates = [opp for opp in candidates if opp.end_date and opp.end_date >= today]
+    return ResolvedOpportunities(
+        deliver=_pick_opportunity(candidates, "deliver_app", domain, app_id, hq_server),
+        learn=_pick_opportunity(candidates, "learn_app", domain, app_id, hq_server),
+    )
+
+
+def _get_candidate_opportunities(domain, app_id):
+    return list(
+        Opportunity.objects.filter(
+            Q(deliver_app__cc_domain=domain, deliver_app__cc_app_id=app_id)
+            | Q(learn_app__cc_domain=domain, learn_app__cc_app_id=app_id),
+            active=True,
+        ).select_related("deliver_app", "learn_app")
+    )
+
+
+def _pick_opportunity(candidates, app_field, domain, app_id, hq_server):
+    matches = []
+    for opportunity in candidates:
+        app = getattr(opportunity, app_field)
+        if app is not None and app.cc_domain == domain and app.cc_app_id == app_id:
+            matches.append(opportunity)
+
+    if not matches:
+        return None
+    if len(matches) > 1:
+        raise ProcessingError(f"Multiple active opportunities found for CommCare app {app_id}.")
+
+    opportunity = matches[0]
+    app = getattr(opportunity, app_field)
+    if app.hq_server_id != hq_server.pk:
+        raise ProcessingError(f"CommCare App {app.id} not found on {hq_server}")
+    return opportunity
+
+
+for _model in (Opportunity, CommCareApp, ConnectIDUserLink):
+    post_save.connect(
+        invalidate_resolution_caches,
+        sender=_model,
+        dispatch_uid=f"commcare_connect.form_receiver.resolution.{_model.__name__}.save",
+    )
+    post_delete.connect(
+        invalidate_resolution_caches,
+        sender=_model,
+        dispatch_uid=f"commcare_connect.form_receiver.resolution.{_model.__name__}.delete",
+    )
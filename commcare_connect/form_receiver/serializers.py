@@ -1,8 +1,12 @@
 import dataclasses
 from datetime import datetime
+from functools import cached_property
 
 from rest_framework import serializers
 
+from commcare_connect.form_receiver.blocks import get_connect_blocks
+from commcare_connect.form_receiver.models import XFormSubmission
+
 
 @dataclasses.dataclass
 class XFormMetadata:
@@ -32,6 +36,11 @@ class XForm:
     def xmlns(self):
         return self.form.get("@xmlns")
 
+    @cached_property
+    def connect_blocks(self) -> dict[str, list[dict]]:
+        """The Connect blocks in the form by kind, see ``get_connect_blocks``."""
+        return get_connect_blocks(self.form)
+
 
 class XFormMetadataSerializer(serializers.Serializer):
     timeStart = serializers.DateTimeField(required=True)
@@ -53,3 +62,11 @@ class XFormSerializer(serializers.Serializer):
     def create(self, validated_data):
         metadata = XFormMetadata(**validated_data.pop("metadata"))
         return XForm(metadata=metadata, raw_form=self.initial_data, **validated_data)
+
+
+class XFormSubmissionStatusSerializer(serializers.ModelSerializer):
+    id = serializers.CharField(source="xform_id")
+
+    class Meta:
+        model = XFormSubmission
+        fields = ["id", "status", "error", "date_received", "date_processed"]
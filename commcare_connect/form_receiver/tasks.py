@@ -0,0 +1,110 @@
+import logging
+import time
+
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+from rest_framework.exceptions import APIException
+
+from commcare_connect.form_receiver.models import XFormSubmission, XFormSubmissionStatus
+from commcare_connect.form_receiver.processor import get_duplicate_submission_message, process_xform
+from commcare_connect.form_receiver.serializers import XFormSerializer
+from commcare_connect.utils.lock import try_redis_lock
+from config import celery_app
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_BATCH_SIZE = 100
+# A worker stops draining well before its partition lock expires so that a second worker can
+# never take over a partition while the first is still processing it.
+PARTITION_LOCK_TIMEOUT = 10 * 60
+PARTITION_DRAIN_SECONDS = 5 * 60
+
+
+def get_partition_lock_key(partition: int):
+    return f"form_receiver_submission_partition_{partition}"
+
+
+def enqueue_partitions(partitions):
+    for partition in sorted(set(partitions)):
+        process_xform_submissions.delay(partition)
+
+
+@celery_app.task()
+def process_xform_submissions(partition: int):
+    """Process the pending submissions in ``partition`` in the order they were received."""
+    drained = False
+    with try_redis_lock(get_partition_lock_key(partition), timeout=PARTITION_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            # The worker holding the lock re-checks for pending forms after releasing it.
+            return
+        drained = _drain_partition(partition)
+
+    # Forms staged while the lock was held may have had their task skipped above.
+    if not drained or _pending_submissions(partition).exists():
+        process_xform_submissions.delay(partition)
+
+
+@celery_app.task()
+def process_pending_xform_submissions():
+    """Periodic safety net for partitions whose task was lost, e.g. when a worker died."""
+    enqueue_partitions(
+        XFormSubmission.objects.filter(status=XFormSubmissionStatus.pending)
+        .values_list("partition", flat=True)
+        .distinct()
+    )
+
+
+def _pending_submissions(partition):
+    return XFormSubmission.objects.filter(partition=partition, status=XFormSubmissionStatus.pending)
+
+
+def _drain_partition(partition):
+    """Process pending submissions until none are left (returns True) or the time budget is spent."""
+    deadline = time.monotonic() + PARTITION_DRAIN_SECONDS
+    while True:
+        submissions = list(
+            _pending_submissions(partition).select_related("hq_server").order_by("id")[:SUBMISSION_BATCH_SIZE]
+        )
+        if not submissions:
+            return True
+        for submission in submissions:
+            process_xform_submission(submission)
+            if time.monotonic() > deadline:
+                return False
+
+
+def process_xform_submission(submission: XFormSubmission):
+    try:
+        # Mirrors ATOMIC_REQUESTS on the single-form receiver, including a duplicate being
+        # caught inside the transaction. The status is recorded afterwards; if the worker dies
+        # in between, reprocessing the form is caught by the same duplicate checks.
+        with transaction.atomic():
+            status, error = _process_staged_xform(submission)
+    except APIException as e:
+        status, error = XFormSubmissionStatus.failed, str(e.detail)
+    except Exception:
+        logger.exception(f"Unexpected error processing staged form {submission.xform_id}")
+        status, error = XFormSubmissionStatus.failed, "Unexpected error while processing the form"
+    _mark_processed(submission, status, error)
+
+
+def _process_staged_xform(submission):
+    serializer = XFormSerializer(data=submission.payload)
+    serializer.is_valid(raise_exception=True)
+    xform = serializer.save()
+    try:
+        process_xform(xform, submission.hq_server)
+    except IntegrityError as e:
+        message = get_duplicate_submission_message(e, xform.id)
+        if message is None:
+            raise
+        logger.info(message)
+        return XFormSubmissionStatus.duplicate, message
+    return XFormSubmissionStatus.processed, ""
+
+
+def _mark_processed(submission, status, error):
+    submission.status = status
+    submission.error = error
+    submission.date_processed = now()
+    submission.save(update_fields=["status", "error", "date_processed"])
@@ -0,0 +1,48 @@
+from commcare_connect.form_receiver.blocks import ConnectBlock, get_connect_blocks, iter_connect_blocks
+from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+from commcare_connect.form_receiver.management.commands.benchmark_xform_block_extraction import build_form
+
+
+def _block(block_id, xmlns=CCC_LEARN_XMLNS):
+    return {"@xmlns": xmlns, "@id": block_id}
+
+
+def test_iter_connect_blocks_document_order():
+    form = {
+        "deliver": _block("top"),
+        "group": {
+            "repeat": [
+                {"deliver": _block("first"), "task": _block("task")},
+                "not a group",
+                {"nested": {"deliver": _block("second")}},
+            ],
+        },
+        "last": {"deliver": _block("other", xmlns="http://example.com")},
+    }
+    assert [(block.kind, block.data["@id"]) for block in iter_connect_blocks(form)] == [
+        ("deliver", "top"),
+        ("deliver", "first"),
+        ("task", "task"),
+        ("deliver", "second"),
+        ("deliver", "other"),
+    ]
+
+
+def test_iter_connect_blocks_ignores_questions_named_like_blocks():
+    form = {"task": "a question", "module": ["a", "repeat"], "group": {"assessment": None}}
+    assert list(iter_connect_blocks(form)) == []
+
+
+def test_get_connect_blocks_filters_namespace():
+    inner = _block("inner")
+    form = {"deliver": _block("outer", xmlns=None), "group": {"deliver": inner}}
+    blocks = get_connect_blocks(form)
+    assert blocks["deliver"] == [inner]
+    assert blocks["module"] == blocks["assessment"] == blocks["task"] == blocks["work_area_update"] == []
+    assert ConnectBlock("deliver", None, form["deliver"]) in iter_connect_blocks(form)
+
+
+def test_get_connect_blocks_benchmark_form():
+    blocks = get_connect_blocks(build_form(repeats=3, questions=2))
+    assert [block["entity_id"] for block in blocks["deliver"]] == ["entity-0", "entity-1", "entity-2"]
+    assert len(blocks["task"]) == 3
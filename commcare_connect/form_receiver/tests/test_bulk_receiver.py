@@ -0,0 +1,95 @@
+from copy import deepcopy
+from unittest import mock
+
+import pytest
+from rest_framework.test import APIClient
+
+from commcare_connect.form_receiver.models import XFormSubmission, XFormSubmissionStatus
+from commcare_connect.form_receiver.tasks import process_xform_submission
+from commcare_connect.form_receiver.tests.test_receiver_endpoint import add_credentials
+from commcare_connect.form_receiver.tests.test_receiver_integration import get_form_json_for_payment_unit
+from commcare_connect.form_receiver.tests.xforms import get_form_json
+from commcare_connect.opportunity.models import Opportunity, UserVisit
+from commcare_connect.users.models import User
+
+
+def _post_bulk(api_client, user, opportunity, forms):
+    add_credentials(api_client, user, opportunity.hq_server.oauth_application)
+    return api_client.post("/api/receiver/bulk/", data=forms, format="json")
+
+
+@pytest.mark.django_db
+def test_bulk_receiver_stages_forms(
+    mobile_user_with_connect_link: User,
+    api_client: APIClient,
+    opportunity: Opportunity,
+    django_capture_on_commit_callbacks,
+):
+    forms = [get_form_json_for_payment_unit(pu) for pu in opportunity.paymentunit_set.all()]
+    with (
+        mock.patch("commcare_connect.form_receiver.views.enqueue_partitions") as enqueue_partitions,
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        response = _post_bulk(api_client, mobile_user_with_connect_link, opportunity, forms)
+
+    assert response.status_code == 202, response.data
+    assert [item["id"] for item in response.data] == [form["id"] for form in forms]
+    assert {item["status"] for item in response.data} == {XFormSubmissionStatus.pending}
+    submissions = XFormSubmission.objects.order_by("id")
+    assert [s.xform_id for s in submissions] == [form["id"] for form in forms]
+    # Both forms come from the same worker, so they share a partition.
+    assert len({s.partition for s in submissions}) == 1
+    enqueue_partitions.assert_called_once_with([s.partition for s in submissions])
+    assert not UserVisit.objects.exists()
+
+
+@pytest.mark.django_db
+def test_bulk_receiver_rejects_invalid_batch(user: User, api_client: APIClient, opportunity: Opportunity):
+    response = _post_bulk(api_client, user, opportunity, [get_form_json(), {"foo": "bar"}])
+    assert response.status_code == 400
+    assert not XFormSubmission.objects.exists()
+
+
+@pytest.mark.django_db
+def test_bulk_receiver_requires_list(user: User, api_client: APIClient, opportunity: Opportunity):
+    response = _post_bulk(api_client, user, opportunity, get_form_json())
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_process_staged_submissions_keeps_duplicate_detection(
+    mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    form_json = get_form_json_for_payment_unit(opportunity.paymentunit_set.first())
+    with mock.patch("commcare_connect.form_receiver.views.enqueue_partitions"):
+        _post_bulk(api_client, mobile_user_with_connect_link, opportunity, [form_json, deepcopy(form_json)])
+
+    for submission in XFormSubmission.objects.order_by("id"):
+        process_xform_submission(submission)
+
+    assert UserVisit.objects.filter(xform_id=form_json["id"]).count() == 1
+    statuses = list(XFormSubmission.objects.order_by("id").values_list("status", flat=True))
+    assert statuses == [XFormSubmissionStatus.processed, XFormSubmissionStatus.duplicate]
+
+    response = api_client.get("/api/receiver/status/", {"id": form_json["id"]})
+    assert response.status_code == 200
+    assert len(response.data) == 1
+    assert response.data[0]["status"] == XFormSubmissionStatus.duplicate
+
+
+@pytest.mark.django_db
+def test_process_staged_submission_records_processing_error(
+    user: User, api_client: APIClient, opportunity: Opportunity
+):
+    # No ConnectID link exists for the form's user.
+    form_json = get_form_json(domain=opportunity.deliver_app.cc_domain, app_id=opportunity.deliver_app.cc_app_id)
+    with mock.patch("commcare_connect.form_receiver.views.enqueue_partitions"):
+        _post_bulk(api_client, user, opportunity, [form_json])
+
+    submission = XFormSubmission.objects.get()
+    process_xform_submission(submission)
+
+    submission.refresh_from_db()
+    assert submission.status == XFormSubmissionStatus.failed
+    assert "not found" in submission.error
+    assert submission.date_processed is not None
@@ -5,9 +5,8 @@ from unittest import mock
 import pytest
 from django.utils.timezone import now
 
+from commcare_connect.form_receiver.blocks import ASSESSMENT_BLOCK
 from commcare_connect.form_receiver.processor import (
-    ASSESSMENT_JSONPATH,
-    _get_matching_blocks,
     process_assessments,
     process_deliver_form,
     process_learn_form,
@@ -235,7 +234,7 @@ def test_process_assessments(notification_patch, django_capture_on_commit_callba
     opportunity_access = OpportunityAccessFactory()
     assessment_form = AssessmentStubFactory().json
     xform = get_form_model(form_block=assessment_form)
-    matches = _get_matching_blocks(ASSESSMENT_JSONPATH, xform)
+    matches = xform.connect_blocks[ASSESSMENT_BLOCK]
 
     with django_capture_on_commit_callbacks(execute=True):
         process_assessments(
@@ -7,6 +7,7 @@ from unittest.mock import patch
 from uuid import uuid4
 
 import pytest
+from django.contrib.gis.geos import Point
 from django.db import connection
 from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now
@@ -33,16 +34,24 @@ from commcare_connect.opportunity.models import (
     CompletedModule,
     CompletedWork,
     CompletedWorkStatus,
+    DeliverUnit,
+    FormJsonKey,
     LearnModule,
     Opportunity,
     OpportunityAccess,
     OpportunityClaimLimit,
     OpportunityVerificationFlags,
+    PendingPaymentAccrual,
     UserVisit,
+    VisitLimitCount,
     VisitReviewStatus,
     VisitValidationStatus,
 )
-from commcare_connect.opportunity.tasks import bulk_approve_completed_work
+from commcare_connect.opportunity.tasks import (
+    bulk_approve_completed_work,
+    process_payment_accrual,
+    record_visit_form_json_keys,
+)
 from commcare_connect.opportunity.tests.factories import (
     AssignedTaskFactory,
     CatchmentAreaFactory,
@@ -58,6 +67,8 @@ from commcare_connect.opportunity.tests.factories import (
     UserVisitFactory,
 )
 from commcare_connect.opportunity.tests.helpers import validate_saved_fields
+from commcare_connect.opportunity.utils.form_json_keys import iter_form_json_leaves
+from commcare_connect.opportunity.utils.learn_progress import update_learn_progress
 from commcare_connect.opportunity.visit_import import update_payment_accrued
 from commcare_connect.users.models import User
 
@@ -146,6 +157,7 @@ def test_form_receiver_multiple_module_submissions(
     assert CompletedModule.objects.count() == module_count * 2  # Initial + subsequent submissions
     access = OpportunityAccess.objects.get(opportunity=opportunity, user=mobile_user_with_connect_link)
     assert access.unique_completed_modules.count() == module_count
+    assert (access.learn_modules_completed, access.learn_progress) == (module_count, 100)
 
     for module in modules:
         assert CompletedModule.objects.filter(
@@ -207,13 +219,22 @@ def test_receiver_deliver_form(mobile_user_with_connect_link: User, api_client:
     )
     assert UserVisit.objects.filter(user=mobile_user_with_connect_link).count() == 0
 
-    make_request(api_client, form_json, mobile_user_with_connect_link, oauth_application=oauth_application)
+    with patch("commcare_connect.form_receiver.processor.invalidate_opportunity_list_metrics") as invalidate:
+        make_request(api_client, form_json, mobile_user_with_connect_link, oauth_application=oauth_application)
+    invalidate.assert_called_once_with(opportunity.id)
     assert UserVisit.objects.filter(user=mobile_user_with_connect_link).count() == 1
     visit = UserVisit.objects.get(user=mobile_user_with_connect_link)
     assert visit.deliver_unit == deliver_unit
     assert visit.entity_id == stub.entity_id
     assert visit.entity_name == stub.entity_name
 
+    record_visit_form_json_keys(deliver_unit.app_id, visit.xform_id)
+    catalogued = FormJsonKey.objects.filter(app=deliver_unit.app, app_build_version=visit.app_build_version)
+    assert {tuple(path) for path in catalogued.values_list("path", flat=True)} == {
+        path for path, _ in iter_form_json_leaves(visit.form_json)
+    }
+    assert set(catalogued.values_list("visit_count", flat=True)) == {1}
+
 
 def _create_opp_and_form_json(
     opportunity,
@@ -709,6 +730,11 @@ def test_auto_approve_duplicate_visit_accrues_payment_for_each_visit(
         assert visit.status_modified_date >= before_requests
 
     access = OpportunityAccess.objects.get(user=user_with_connectid_link, opportunity=opportunity)
+    # Both submissions were merged into one queued recalculation.
+    assert PendingPaymentAccrual.objects.get(opportunity_access=access).version == 1
+    process_payment_accrual(access.id)
+    access.refresh_from_db()
+    assert not PendingPaymentAccrual.objects.exists()
     completed_work = CompletedWork.objects.get(opportunity_access=access)
     assert completed_work.saved_approved_count == 2
     assert access.payment_accrued == completed_work.payment_accrued == 2 * completed_work.payment_unit.amount
@@ -843,6 +869,60 @@ def test_receiver_verification_flags_catchment_areas(
     assert ["catchment", "Visit outside worker catchment areas"] in visit.flag_reason.get("flags", [])
 
 
+@pytest.mark.parametrize("opportunity", [{"verification_flags": {"location": 100}}], indirect=True)
+@pytest.mark.parametrize("other_location, flagged", [("20.0905 40.0935 0 0", True), ("20.2 40.2 0 0", False)])
+def test_receiver_verification_flags_location(
+    user_with_connectid_link: User, api_client: APIClient, opportunity: Opportunity, other_location, flagged
+):
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link)
+    deliver_unit = DeliverUnit.objects.get(slug=form_json["form"]["deliver"]["@id"], app=opportunity.deliver_app)
+    lat, lng, *_ = other_location.split()
+    UserVisitFactory(
+        opportunity=opportunity,
+        deliver_unit=deliver_unit,
+        entity_id=str(uuid4()),
+        status=VisitValidationStatus.approved,
+        location=other_location,
+        location_point=Point(float(lng), float(lat), srid=4326),
+    )
+    make_request(
+        api_client, form_json, user_with_connectid_link, oauth_application=opportunity.hq_server.oauth_application
+    )
+
+    visit = UserVisit.objects.get(user=user_with_connectid_link)
+    assert visit.location_point is not None
+    location_flags = [flag for flag, _ in (visit.flag_reason or {}).get("flags", []) if flag == "location"]
+    assert bool(location_flags) == flagged
+
+
+@pytest.mark.parametrize("radius, flagged", [(1000, False), (10, True)])
+def test_receiver_verification_flags_catchment_area_radius(
+    user_with_connectid_link: User, api_client: APIClient, opportunity: Opportunity, radius, flagged
+):
+    verification_flags = OpportunityVerificationFlags.objects.get(opportunity=opportunity)
+    verification_flags.catchment_areas = True
+    verification_flags.save()
+
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link)
+    access = OpportunityAccess.objects.get(user=user_with_connectid_link, opportunity=opportunity)
+    # The form is submitted from "20.090209 40.09320", roughly 110m from this area's centre.
+    CatchmentAreaFactory(
+        opportunity=opportunity,
+        opportunity_access=access,
+        active=True,
+        latitude=20.0912,
+        longitude=40.0932,
+        radius=radius,
+    )
+    make_request(
+        api_client, form_json, user_with_connectid_link, oauth_application=opportunity.hq_server.oauth_application
+    )
+
+    visit = UserVisit.objects.get(user=user_with_connectid_link)
+    catchment_flag = ["catchment", "Visit outside worker catchment areas"]
+    assert (catchment_flag in (visit.flag_reason or {}).get("flags", [])) == flagged
+
+
 @pytest.mark.parametrize("opportunity", [{"opp_options": {"managed": True}}], indirect=True)
 def test_approve_rejected_visit(mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity):
     assert opportunity.managed
@@ -1025,6 +1105,7 @@ def test_update_completed_learn_date(opportunity, mobile_user):
     dates = create_learn_module_data(opportunity, mobile_user, access)
     assert LearnModule.objects.filter(app=opportunity.learn_app).count() == 3
 
+    update_learn_progress(access)
     update_completed_learn_date(access)
 
     access.refresh_from_db()
@@ -1609,3 +1690,35 @@ def test_deliver_form_locks_claim_limit_row(
 
     # Sanity check the form was actually processed (the lock guards a real save path).
     assert UserVisit.objects.filter(user=user_with_connectid_link).count() == 1
+
+
+@pytest.mark.django_db
+def test_deliver_form_query_count_independent_of_visits(
+    user_with_connectid_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    """Benchmark guard: the limit and duplicate checks read running counters, not the worker's visits."""
+    oauth_application = opportunity.hq_server.oauth_application
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link, daily_max_per_user=100)
+
+    def submit():
+        new_form_json = deepcopy(form_json)
+        new_form_json["id"] = str(uuid4())
+        new_form_json["form"]["deliver"]["entity_id"] = str(uuid4())
+        with CaptureQueriesContext(connection) as ctx:
+            make_request(api_client, new_form_json, user_with_connectid_link, oauth_application=oauth_application)
+        return ctx.captured_queries
+
+    submit()
+    second_queries = submit()
+    for _ in range(5):
+        submit()
+    last_queries = submit()
+
+    assert len(last_queries) == len(second_queries)
+    assert not [
+        query["sql"]
+        for query in last_queries
+        if "count(" in query["sql"].lower() and 'from "opportunity_uservisit"' in query["sql"].lower()
+    ]
+    counts = VisitLimitCount.objects.get(opportunity_access__user=user_with_connectid_link)
+    assert counts.visit_count == 8
@@ -0,0 +1,98 @@
+import datetime
+from unittest import mock
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.form_receiver.resolution import (
+    opportunity_cache,
+    resolve_opportunities,
+    resolve_user,
+    user_cache,
+)
+from commcare_connect.opportunity.models import Opportunity
+from commcare_connect.opportunity.tests.factories import CommCareAppFactory, OpportunityFactory
+from commcare_connect.users.tests.factories import ConnectIdUserLinkFactory, MobileUserFactory
+
+
+@pytest.mark.django_db
+def test_resolve_opportunities_caches_lookup(opportunity: Opportunity):
+    app = opportunity.deliver_app
+    with CaptureQueriesContext(connection) as ctx:
+        first = resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id)
+        second = resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id)
+
+    assert len(ctx.captured_queries) == 1
+    assert first.deliver == second.deliver == opportunity
+    assert first.learn is None
+    assert opportunity_cache.stats()["hits"] == 1
+    assert opportunity_cache.stats()["misses"] == 1
+
+
+@pytest.mark.django_db
+def test_resolve_opportunities_both_roles(opportunity: Opportunity):
+    shared_app = opportunity.deliver_app
+    learn_opportunity = OpportunityFactory(
+        learn_app=shared_app, organization=opportunity.organization, hq_server=opportunity.hq_server
+    )
+    with CaptureQueriesContext(connection) as ctx:
+        resolved = resolve_opportunities(shared_app.cc_domain, opportunity.hq_server, shared_app.cc_app_id)
+
+    assert len(ctx.captured_queries) == 1
+    assert resolved.deliver == opportunity
+    assert resolved.learn == learn_opportunity
+
+
+@pytest.mark.django_db
+def test_resolve_opportunities_invalidated_on_save(opportunity: Opportunity):
+    app = opportunity.deliver_app
+    assert resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id).deliver == opportunity
+
+    opportunity.active = False
+    opportunity.save()
+
+    assert resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id).deliver is None
+
+
+@pytest.mark.django_db
+def test_resolve_opportunities_copies_related_apps(opportunity: Opportunity):
+    app = opportunity.deliver_app
+    first = resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id).deliver
+    first.deliver_app.name = "Changed in one request"
+
+    second = resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id).deliver
+    assert second.deliver_app is not first.deliver_app
+    assert second.deliver_app.name == app.name
+
+
+@pytest.mark.django_db
+def test_resolve_opportunities_checks_end_date_on_cached_entries(opportunity: Opportunity):
+    app = opportunity.deliver_app
+    assert resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id).deliver == opportunity
+
+    after_end = datetime.datetime.combine(opportunity.end_date + datetime.timedelta(days=1), datetime.time())
+    with mock.patch("commcare_connect.form_receiver.resolution.now", return_value=after_end):
+        assert resolve_opportunities(app.cc_domain, opportunity.hq_server, app.cc_app_id).deliver is None
+    assert opportunity_cache.stats()["hits"] == 1
+
+
+@pytest.mark.django_db
+def test_resolve_opportunities_wrong_hq_server(opportunity: Opportunity):
+    other_app = CommCareAppFactory(cc_domain=opportunity.deliver_app.cc_domain)
+    OpportunityFactory(deliver_app=other_app)
+    with pytest.raises(ProcessingError):
+        resolve_opportunities(other_app.cc_domain, opportunity.hq_server, other_app.cc_app_id)
+
+
+@pytest.mark.django_db
+def test_resolve_user_does_not_cache_misses():
+    assert resolve_user("worker@domain.commcarehq.org") is None
+
+    user = MobileUserFactory()
+    ConnectIdUserLinkFactory(user=user, commcare_username="worker@domain.commcarehq.org")
+
+    assert resolve_user("worker@domain.commcarehq.org") == user
+    assert resolve_user("worker@domain.commcarehq.org") == user
+    assert user_cache.stats()["hits"] == 1
@@ -0,0 +1,96 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from commcare_connect.form_receiver.verification import (
+    FormJsonRule,
+    RuleSetDefinition,
+    compile_rule_set,
+    get_key_path,
+    get_verification_rules,
+    get_verification_rules_cache_key,
+)
+from commcare_connect.opportunity.models import Opportunity, OpportunityVerificationFlags
+from commcare_connect.opportunity.tests.factories import DeliverUnitFlagRulesFactory, FormJsonValidationRulesFactory
+
+
+@pytest.mark.parametrize(
+    "question_path, expected",
+    [
+        ("form.value", ("form", "value")),
+        ("$.form.group.value", ("form", "group", "value")),
+        ("form.items[0].value", None),
+        ("form.*", None),
+        ("$..value", None),
+    ],
+)
+def test_get_key_path(question_path, expected):
+    assert get_key_path(question_path) == expected
+
+
+def test_failed_form_json_rules():
+    rules = (
+        FormJsonRule("plain", "form.group.value", "1"),
+        FormJsonRule("rooted", "$.form.other", "2"),
+        FormJsonRule("missing", "form.group.missing", "3"),
+        FormJsonRule("jsonpath", "form.items[*].value", "4"),
+        FormJsonRule("through_list", "form.items.value", "4"),
+        FormJsonRule("malformed", "form.items[", "4"),
+    )
+    rule_set = compile_rule_set(RuleSetDefinition(form_json_rules=rules))
+    form_json = {
+        "form": {
+            "group": {"value": "1"},
+            "other": "2",
+            "items": [{"value": "5"}, {"value": "4"}],
+        }
+    }
+    assert [rule.name for rule in rule_set.failed_form_json_rules(form_json)] == ["missing", "through_list"]
+    assert [rule.name for rule in rule_set.failed_form_json_rules({"form": "1"})] == [
+        rule.name for rule in rules if rule.name != "malformed"
+    ]
+
+
+def test_compiled_rule_sets_are_shared():
+    rules = (FormJsonRule("plain", "form.value", "1"),)
+    assert compile_rule_set(RuleSetDefinition(form_json_rules=rules)) is compile_rule_set(
+        RuleSetDefinition(form_json_rules=rules)
+    )
+
+
+@pytest.mark.django_db
+def test_get_verification_rules_cached_and_invalidated(opportunity: Opportunity):
+    deliver_unit = opportunity.deliver_app.deliver_units.first()
+    DeliverUnitFlagRulesFactory(opportunity=opportunity, deliver_unit=deliver_unit, duration=5)
+    rule = FormJsonValidationRulesFactory(opportunity=opportunity, question_path="form.value", question_value="1")
+    rule.deliver_unit.add(deliver_unit)
+
+    rules = get_verification_rules(opportunity, deliver_unit)
+    assert rules.definition.duration == 5
+    assert rules.definition.form_json_rules == (FormJsonRule(rule.name, "form.value", "1"),)
+    assert OpportunityVerificationFlags.objects.filter(opportunity=opportunity).exists()
+
+    with CaptureQueriesContext(connection) as queries:
+        assert get_verification_rules(opportunity, deliver_unit) is rules
+    assert len(queries) == 0
+
+    flags = OpportunityVerificationFlags.objects.get(opportunity=opportunity)
+    flags.gps = True
+    flags.save()
+    assert get_verification_rules(opportunity, deliver_unit).definition.gps
+
+    rule.deliver_unit.remove(deliver_unit)
+    assert get_verification_rules(opportunity, deliver_unit).definition.form_json_rules == ()
+
+
+@pytest.mark.django_db
+def test_verification_rules_invalidated_on_deliver_unit_save(opportunity: Opportunity):
+    deliver_unit = opportunity.deliver_app.deliver_units.first()
+    get_verification_rules(opportunity, deliver_unit)
+    key = get_verification_rules_cache_key(opportunity.pk, deliver_unit.pk)
+    assert cache.get(key) is not None
+
+    deliver_unit.name = "Renamed"
+    deliver_unit.save()
+    assert cache.get(key) is None
@@ -0,0 +1,224 @@
+"""Compiled verification rules for delivery forms.
+
+Every delivery form is checked against its opportunity's ``OpportunityVerificationFlags``, the
+``DeliverUnitFlagRules`` of its deliver unit and the ``FormJsonValidationRules`` that apply to
+that deliver unit. The rows are read once per ``(opportunity, deliver_unit)`` into a
+``RuleSetDefinition`` that is kept in the Django cache, and each definition is compiled once per
+process into a ``CompiledRuleSet``.
+
+Form JSON rules whose ``question_path`` is a plain dotted key path (``form.case.update.value``)
+are combined into a single tree of keys that is walked once over the form. Other paths fall
+back to JSONPath expressions that are parsed once when the rule set is compiled. Rules whose path
+isn't valid JSONPath are skipped, so they never flag a form.
+
+Saving or deleting any of the rule models, or changing the deliver units of a form JSON rule,
+drops the cached definitions for the opportunity. Saving or deleting a deliver unit drops its
+definitions in every opportunity.
+"""
+
+import dataclasses
+import datetime
+import functools
+import logging
+import re
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from jsonpath_ng.exceptions import JSONPathError
+from jsonpath_ng.ext import parse
+
+from commcare_connect.opportunity.models import (
+    DeliverUnit,
+    DeliverUnitFlagRules,
+    FormJsonValidationRules,
+    Opportunity,
+    OpportunityVerificationFlags,
+)
+
+logger = logging.getLogger(__name__)
+
+VERIFICATION_RULES_CACHE_TTL_SECONDS = 60 * 60
+COMPILED_RULE_SET_CACHE_SIZE = 1024
+_KEY_PATH_SEGMENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class FormJsonRule(NamedTuple):
+    name: str
+    question_path: str
+    question_value: str
+
+
+@dataclasses.dataclass(frozen=True)
+class RuleSetDefinition:
+    """The rule values that apply to one deliver unit of an opportunity."""
+
+    duplicate: bool = False
+    gps: bool = False
+    location: int = 0
+    catchment_areas: bool = False
+    form_submission_start: datetime.time | None = None
+    form_submission_end: datetime.time | None = None
+    check_attachments: bool = False
+    duration: int = 0
+    form_json_rules: tuple[FormJsonRule, ...] = ()
+
+
+def get_key_path(question_path: str) -> tuple[str, ...] | None:
+    """Split a plain dotted key path into its keys, or return None if it needs JSONPath.
+
+    A leading ``$`` is accepted since ``$.form.value`` and ``form.value`` select the same value.
+    """
+    segments = question_path.split(".")
+    while segments and segments[0] == "$":
+        segments = segments[1:]
+    if not segments or not all(_KEY_PATH_SEGMENT.fullmatch(segment) for segment in segments):
+        return None
+    return tuple(segments)
+
+
+class CompiledRuleSet:
+    def __init__(self, definition: RuleSetDefinition):
+        self.definition = definition
+        # Nested ``{key: (rule indexes ending at key, children)}`` for the plain key paths.
+        self._key_tree = {}
+        self._jsonpaths = []
+        self._malformed = set()
+        for index, rule in enumerate(definition.form_json_rules):
+            key_path = get_key_path(rule.question_path)
+            if key_path is None:
+                try:
+                    self._jsonpaths.append((index, parse(f"$.{rule.question_path}")))
+                except JSONPathError:
+                    logger.warning("Skipping form JSON rule %r with malformed path %r", rule.name, rule.question_path)
+                    self._malformed.add(index)
+                continue
+            children = self._key_tree
+            for key in key_path[:-1]:
+                children = children.setdefault(key, ([], {}))[1]
+            children.setdefault(key_path[-1], ([], {}))[0].append(index)
+
+    def failed_form_json_rules(self, form_json: dict) -> list[FormJsonRule]:
+        """The form JSON rules whose question is missing from the form or has another value."""
+        rules = self.definition.form_json_rules
+        if not rules:
+            return []
+        satisfied = set(self._malformed)
+        self._walk(form_json, self._key_tree, satisfied)
+        for index, jsonpath in self._jsonpaths:
+            if any(match.value == rules[index].question_value for match in jsonpath.find(form_json)):
+                satisfied.add(index)
+        return [rule for index, rule in enumerate(rules) if index not in satisfied]
+
+    def _walk(self, node, tree, satisfied):
+        if not isinstance(node, dict):
+            return
+        for key, (rule_indexes, children) in tree.items():
+            if key not in node:
+                continue
+            value = node[key]
+            for index in rule_indexes:
+                if value == self.definition.form_json_rules[index].question_value:
+                    satisfied.add(index)
+            if children:
+                self._walk(value, children, satisfied)
+
+
+@functools.lru_cache(maxsize=COMPILED_RULE_SET_CACHE_SIZE)
+def compile_rule_set(definition: RuleSetDefinition) -> CompiledRuleSet:
+    return CompiledRuleSet(definition)
+
+
+def get_verification_rules_cache_key(opportunity_id: int, deliver_unit_id: int):
+    return f"form_receiver:verification_rules:{opportunity_id}:{deliver_unit_id}"
+
+
+def get_verification_rules(opportunity: Opportunity, deliver_unit: DeliverUnit) -> CompiledRuleSet:
+    key = get_verification_rules_cache_key(opportunity.pk, deliver_unit.pk)
+    definition = cache.get(key)
+    if definition is None:
+        definition = load_rule_set_definition(opportunity, deliver_unit)
+        cache.set(key, definition, VERIFICATION_RULES_CACHE_TTL_SECONDS)
+    return compile_rule_set(definition)
+
+
+def load_rule_set_definition(opportunity: Opportunity, deliver_unit: DeliverUnit) -> RuleSetDefinition:
+    opportunity_flags, _ = OpportunityVerificationFlags.objects.get_or_create(opportunity=opportunity)
+    deliver_unit_flags = DeliverUnitFlagRules.objects.filter(
+        opportunity=opportunity, deliver_unit=deliver_unit
+    ).first()
+    form_json_rules = FormJsonValidationRules.objects.filter(
+        opportunity=opportunity, deliver_unit=deliver_unit
+    ).order_by("id")
+    return RuleSetDefinition(
+        duplicate=opportunity_flags.duplicate,
+        gps=opportunity_flags.gps,
+        location=opportunity_flags.location,
+        catchment_areas=opportunity_flags.catchment_areas,
+        form_submission_start=opportunity_flags.form_submission_start,
+        form_submission_end=opportunity_flags.form_submission_end,
+        check_attachments=deliver_unit_flags.check_attachments if deliver_unit_flags else False,
+        duration=deliver_unit_flags.duration if deliver_unit_flags else 0,
+        form_json_rules=tuple(
+            FormJsonRule(*values) for values in form_json_rules.values_list("name", "question_path", "question_value")
+        ),
+    )
+
+
+def invalidate_verification_rules(opportunity_id: int):
+    deliver_unit_ids = DeliverUnit.objects.filter(app__opportunity=opportunity_id).values_list("id", flat=True)
+    cache.delete_many(
+        [get_verification_rules_cache_key(opportunity_id, deliver_unit_id) for deliver_unit_id in deliver_unit_ids]
+    )
+
+
+def clear_verification_rules_caches():
+    cache.delete_pattern(get_verification_rules_cache_key("*", "*"))
+    compile_rule_set.cache_clear()
+
+
+def _invalidate_for_instance(sender, instance, **kwargs):
+    invalidate_verification_rules(instance.opportunity_id)
+
+
+def _invalidate_for_deliver_unit(sender, instance, **kwargs):
+    cache.delete_pattern(get_verification_rules_cache_key("*", instance.pk))
+
+
+def _invalidate_for_deliver_units_change(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(instance, FormJsonValidationRules):
+        invalidate_verification_rules(instance.opportunity_id)
+    elif action in ("post_add", "post_remove") and isinstance(instance, DeliverUnit):
+        # Changed from the deliver unit side; ``pk_set`` holds the rule ids.
+        for opportunity_id in set(
+            FormJsonValidationRules.objects.filter(pk__in=kwargs["pk_set"]).values_list("opportunity_id", flat=True)
+        ):
+            invalidate_verification_rules(opportunity_id)
+
+
+for _model in (OpportunityVerificationFlags, DeliverUnitFlagRules, FormJsonValidationRules):
+    post_save.connect(
+        _invalidate_for_instance,
+        sender=_model,
+        dispatch_uid=f"commcare_connect.form_receiver.verification.{_model.__name__}.save",
+    )
+    post_delete.connect(
+        _invalidate_for_instance,
+        sender=_model,
+        dispatch_uid=f"commcare_connect.form_receiver.verification.{_model.__name__}.delete",
+    )
+post_save.connect(
+    _invalidate_for_deliver_unit,
+    sender=DeliverUnit,
+    dispatch_uid="commcare_connect.form_receiver.verification.DeliverUnit.save",
+)
+post_delete.connect(
+    _invalidate_for_deliver_unit,
+    sender=DeliverUnit,
+    dispatch_uid="commcare_connect.form_receiver.verification.DeliverUnit.delete",
+)
+m2m_changed.connect(
+    _invalidate_for_deliver_units_change,
+    sender=FormJsonValidationRules.deliver_unit.through,
+    dispatch_uid="commcare_connect.form_receiver.verification.FormJsonValidationRules.deliver_unit",
+)
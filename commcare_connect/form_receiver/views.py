@@ -1,18 +1,36 @@
 import logging
+from functools import partial
 
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from oauth2_provider.contrib.rest_framework import OAuth2Authentication, TokenHasReadWriteScope
 from rest_framework import parsers, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from commcare_connect.commcarehq.models import HQServer
-from commcare_connect.form_receiver.processor import process_xform
-from commcare_connect.form_receiver.serializers import XFormSerializer
+from commcare_connect.form_receiver.const import MAX_BULK_SUBMISSION_SIZE
+from commcare_connect.form_receiver.models import XFormSubmission
+from commcare_connect.form_receiver.processor import (
+    get_commcare_username,
+    get_duplicate_submission_message,
+    process_xform,
+)
+from commcare_connect.form_receiver.serializers import XFormSerializer, XFormSubmissionStatusSerializer
+from commcare_connect.form_receiver.tasks import enqueue_partitions
 
 logger = logging.getLogger(__name__)
 
 
+def get_hq_server(request):
+    try:
+        return HQServer.objects.get(oauth_application=request.auth.application)
+    except HQServer.DoesNotExist as e:
+        from commcare_connect.form_receiver.exceptions import ProcessingError
+
+        raise ProcessingError from e
+
+
 class FormReceiver(APIView):
     parser_classes = [parsers.JSONParser]
     authentication_classes = [OAuth2Authentication]
@@ -28,22 +46,75 @@ class FormReceiver(APIView):
         serializer = XFormSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         xform = serializer.save()
-        try:
-            hq_server = HQServer.objects.get(oauth_application=request.auth.application)
-        except HQServer.DoesNotExist as e:
-            from commcare_connect.form_receiver.exceptions import ProcessingError
-
-            raise ProcessingError from e
+        hq_server = get_hq_server(request)
 
         try:
             process_xform(xform, hq_server)
         except IntegrityError as e:
-            if "unique_xform_entity_deliver_unit" in str(e):
-                logger.info(f"Duplicate form with ID: {xform.id} received.")
-            elif "unique_xform_completed_module" in str(e):
-                logger.info(f"Learn Module is already completed with form ID: {xform.id}.")
-            elif "unique_xform_work_area_inaccessibility" in str(e):
-                logger.info(f"Duplicate inaccessibility request for form ID: {xform.id}.")
-            else:
+            message = get_duplicate_submission_message(e, xform.id)
+            if message is None:
                 raise
+            logger.info(message)
         return Response(status=status.HTTP_200_OK)
+
+
+class BulkFormReceiver(APIView):
+    """Stage a list of forms for asynchronous processing.
+
+    The forms are acknowledged once they are stored; their progress can be polled from
+    ``FormSubmissionStatusView``.
+    """
+
+    parser_classes = [parsers.JSONParser]
+    authentication_classes = [OAuth2Authentication]
+    permission_classes = [TokenHasReadWriteScope]
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError("Expected a list of forms.")
+        if len(request.data) > MAX_BULK_SUBMISSION_SIZE:
+            raise ValidationError(f"At most {MAX_BULK_SUBMISSION_SIZE} forms can be submitted at once.")
+        serializer = XFormSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        hq_server = get_hq_server(request)
+
+        submissions = XFormSubmission.objects.bulk_create(
+            [
+                XFormSubmission(
+                    hq_server=hq_server,
+                    xform_id=form["id"],
+                    partition=XFormSubmission.get_partition(
+                        get_commcare_username(form["metadata"]["username"], form["domain"])
+                    ),
+                    payload=payload,
+                )
+                for form, payload in zip(serializer.validated_data, request.data)
+            ]
+        )
+        transaction.on_commit(partial(enqueue_partitions, [submission.partition for submission in submissions]))
+        return Response(
+            XFormSubmissionStatusSerializer(submissions, many=True).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class FormSubmissionStatusView(APIView):
+    """Status of forms staged through ``BulkFormReceiver``, looked up by one or more ``id`` parameters."""
+
+    authentication_classes = [OAuth2Authentication]
+    permission_classes = [TokenHasReadWriteScope]
+
+    def get(self, request):
+        xform_ids = request.query_params.getlist("id")
+        if not xform_ids:
+            raise ValidationError({"id": "At least one form id is required."})
+        if len(xform_ids) > MAX_BULK_SUBMISSION_SIZE:
+            raise ValidationError({"id": f"At most {MAX_BULK_SUBMISSION_SIZE} form ids can be requested at once."})
+        hq_server = get_hq_server(request)
+        # A form sent more than once reports its most recent submission.
+        submissions = (
+            XFormSubmission.objects.filter(hq_server=hq_server, xform_id__in=xform_ids)
+            .order_by("xform_id", "-id")
+            .distinct("xform_id")
+        )
+        return Response(XFormSubmissionStatusSerializer(submissions, many=True).data)
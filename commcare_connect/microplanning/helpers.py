@@ -1,7 +1,7 @@
 import logging
 
 import pghistory
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Count, F, Q
 from django.utils.translation import gettext
 
@@ -76,6 +76,28 @@ def work_area_detail(opportunity, work_area_id):
     return map_work_areas(opportunity).filter(id=work_area_id).values(*MAP_WORK_AREA_FIELDS).first()
 
 
+MAP_TILE_VERSION_SQL = """
+SELECT
+    (SELECT max(row_version) FROM microplanning_workarea WHERE opportunity_id = %(opportunity_id)s),
+    (SELECT max(row_version) FROM opportunity_uservisit WHERE opportunity_id = %(opportunity_id)s),
+    pg_snapshot_xmin(pg_current_snapshot())::text::bigint
+"""
+
+
+def map_tile_version(opportunity):
+    """A version of the opportunity's map data, and whether tiles built now may be cached under it.
+
+    The version is the latest ``row_version`` of its work areas and of its visits, so any write to
+    either moves it. Tiles may only be cached once no transaction older than those writes is still
+    running, since such a transaction would commit rows without moving the version.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(MAP_TILE_VERSION_SQL, {"opportunity_id": opportunity.id})
+        work_area_version, visit_version, horizon = cursor.fetchone()
+    latest = max(work_area_version or 0, visit_version or 0)
+    return f"{work_area_version}.{visit_version}", latest < horizon
+
+
 def work_area_search_options(opportunity):
     """Typeahead options for the map's work area search box, across all three searchable types.
 
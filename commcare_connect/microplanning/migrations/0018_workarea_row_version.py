@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 19:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Reuses the function created by opportunity's 0150_row_version.
+CREATE_TRIGGER = """
+CREATE TRIGGER microplanning_workarea_row_version
+BEFORE INSERT OR UPDATE ON microplanning_workarea
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS microplanning_workarea_row_version ON microplanning_workarea;"
+
+
+class Migration(migrations.Migration):
+    # The index is built concurrently so the table stays writable.
+    atomic = False
+
+    dependencies = [
+        ("opportunity", "0150_row_version"),
+        ("microplanning", "0017_workarea_implementation_area_name_implementationarea_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workarea",
+            name="row_version",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        AddIndexConcurrently(
+            model_name="workarea",
+            index=models.Index(fields=["opportunity", "row_version"], name="microplanni_opportu_d14970_idx"),
+        ),
+    ]
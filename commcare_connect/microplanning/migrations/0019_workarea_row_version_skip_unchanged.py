@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 21:40
+
+from django.db import migrations
+
+# Updates that leave a work area as it was keep its row_version, so they don't change the
+# opportunity's map tile version and its cached tiles are still served.
+CREATE_TRIGGERS = """
+DROP TRIGGER IF EXISTS microplanning_workarea_row_version ON microplanning_workarea;
+
+CREATE TRIGGER microplanning_workarea_row_version_insert
+BEFORE INSERT ON microplanning_workarea
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+
+CREATE TRIGGER microplanning_workarea_row_version_update
+BEFORE UPDATE ON microplanning_workarea
+FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION opportunity_row_version();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS microplanning_workarea_row_version_update ON microplanning_workarea;
+DROP TRIGGER IF EXISTS microplanning_workarea_row_version_insert ON microplanning_workarea;
+
+CREATE TRIGGER microplanning_workarea_row_version
+BEFORE INSERT OR UPDATE ON microplanning_workarea
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("microplanning", "0018_workarea_row_version"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -128,9 +128,13 @@ class WorkArea(geo_models.Model):
         related_name="excluded_work_areas",
     )
     excluded_reason = geo_models.CharField(max_length=500, blank=True, default="")
+    # Id of the transaction that last wrote the work area, set by the opportunity_row_version
+    # database trigger. Lets the map's tile cache tell when an opportunity's work areas changed.
+    row_version = geo_models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         constraints = [geo_models.UniqueConstraint(fields=["slug", "opportunity"], name="unique_slug_per_opportunity")]
+        indexes = [geo_models.Index(fields=["opportunity", "row_version"])]
 
     def __str__(self):
         return f"{self.slug}-{self.opportunity_id}"
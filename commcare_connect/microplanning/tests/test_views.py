@@ -5,6 +5,7 @@ import io
 import json
 import uuid
 from datetime import date, datetime, timedelta, timezone
+from functools import partial
 from types import SimpleNamespace
 from unittest import mock
 from unittest.mock import MagicMock, Mock, patch
@@ -48,9 +49,10 @@ from commcare_connect.microplanning.views import (
     MAX_UNASSIGN_WORK_AREAS,
     InaccessibilityReviewAction,
     UserVisitVectorLayer,
+    WorkAreaVectorLayer,
     get_metrics_for_microplanning,
 )
-from commcare_connect.opportunity.models import BlobMeta, VisitValidationStatus
+from commcare_connect.opportunity.models import BlobMeta, UserVisit, VisitValidationStatus
 from commcare_connect.opportunity.tests.factories import (
     DeliverUnitFactory,
     OpportunityAccessFactory,
@@ -1127,6 +1129,71 @@ class TestUserVisitVectorLayer:
         assert layer.get_queryset().count() == 2
 
 
+# Each write commits in its own transaction, so the tiles built between them can be cached.
+@pytest.mark.django_db(transaction=True)
+class TestTileCache(BaseMicroplanningFlagTest):
+    TILE_Z, TILE_X, TILE_Y = 10, 732, 427
+
+    def _get_tile(self, client, opportunity, layer_class, url_name, query_params=None):
+        url = reverse(
+            f"microplanning:{url_name}",
+            kwargs={
+                "org_slug": opportunity.organization.slug,
+                "opp_id": str(opportunity.opportunity_id),
+                "z": self.TILE_Z,
+                "x": self.TILE_X,
+                "y": self.TILE_Y,
+            },
+        )
+        with patch.object(layer_class, "get_tile", autospec=True, side_effect=layer_class.get_tile) as get_tile:
+            response = client.get(url, data=query_params or {})
+        assert response.status_code in (200, 204)
+        return get_tile.call_count
+
+    def test_work_area_tiles_cached_until_work_areas_change(self, client, org_user_admin, opportunity):
+        client.force_login(org_user_admin)
+        work_area = WorkAreaFactory(opportunity=opportunity, status=WorkAreaStatus.NOT_VISITED)
+        get_tile = partial(self._get_tile, client, opportunity, WorkAreaVectorLayer, "workareas_tiles")
+
+        assert get_tile() == 1
+        assert get_tile() == 0
+        assert get_tile({"status": WorkAreaStatus.VISITED}) == 1
+
+        WorkArea.objects.filter(id=work_area.id).update(status=WorkAreaStatus.VISITED)
+        assert get_tile() == 1
+        assert get_tile() == 0
+
+    def test_work_area_tiles_cached_after_no_op_update(self, client, org_user_admin, opportunity):
+        client.force_login(org_user_admin)
+        work_area = WorkAreaFactory(opportunity=opportunity, status=WorkAreaStatus.NOT_VISITED)
+        get_tile = partial(self._get_tile, client, opportunity, WorkAreaVectorLayer, "workareas_tiles")
+
+        assert get_tile() == 1
+        WorkArea.objects.filter(id=work_area.id).update(status=WorkAreaStatus.NOT_VISITED)
+        assert get_tile() == 0
+
+    def test_work_area_tiles_rebuilt_when_visits_change(self, client, org_user_admin, opportunity):
+        client.force_login(org_user_admin)
+        work_area = WorkAreaFactory(opportunity=opportunity)
+        get_tile = partial(self._get_tile, client, opportunity, WorkAreaVectorLayer, "workareas_tiles")
+
+        assert get_tile() == 1
+        UserVisitFactory(opportunity=opportunity, work_area=work_area, status=VisitValidationStatus.approved)
+        assert get_tile() == 1
+        assert get_tile() == 0
+
+    def test_visit_tiles_cached_until_visits_change(self, client, org_user_admin, opportunity):
+        client.force_login(org_user_admin)
+        visit = UserVisitFactory(opportunity=opportunity, location="28.6 77.1 0 0")
+        get_tile = partial(self._get_tile, client, opportunity, UserVisitVectorLayer, "user_visit_tiles")
+
+        assert get_tile() == 1
+        assert get_tile() == 0
+
+        UserVisit.objects.filter(id=visit.id).update(status=VisitValidationStatus.rejected)
+        assert get_tile() == 1
+
+
 @pytest.mark.django_db
 class TestDownloadWorkAreas(BaseMicroplanningFlagTest):
     def url(self, opportunity):
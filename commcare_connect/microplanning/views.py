@@ -1,4 +1,5 @@
 import csv
+import hashlib
 import json
 import logging
 import uuid
@@ -11,7 +12,6 @@ from crispy_forms.utils import render_crispy_form
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.gis.db.models import Extent, Union
-from django.contrib.gis.db.models.fields import PointField
 from django.contrib.gis.db.models.functions import AsGeoJSON
 from django.core.cache import cache
 from django.core.files.base import ContentFile
@@ -21,12 +21,9 @@ from django.db.models import (
     CharField,
     Count,
     F,
-    FloatField,
-    Func,
     Q,
     Sum,
     TextChoices,
-    Value,
 )
 from django.db.models.functions import Cast
 from django.db.utils import OperationalError
@@ -34,6 +31,7 @@ from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonRespo
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
 from django.utils.text import slugify
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
@@ -69,6 +67,7 @@ from commcare_connect.microplanning.helpers import (
     MAP_WORK_AREA_FIELDS,
     assign_work_areas_and_sync_to_hq,
     exclude_work_areas_for_opportunity,
+    map_tile_version,
     map_work_areas,
     pct,
     unassign_work_areas_for_opportunity,
@@ -112,6 +111,7 @@ from .tasks import (
 logger = logging.getLogger(__name__)
 
 WORKAREA_MIN_ZOOM = 6
+TILE_CACHE_TTL_SECONDS = 15 * 60
 
 STATEMENT_TIMEOUT = "30s"
 PG_QUERY_CANCELED = "57014"  # SQLSTATE raised when statement_timeout cancels a query
@@ -666,8 +666,36 @@ class WorkAreaVectorLayer(VectorLayer):
         return WorkAreaMapFilterSet(self.filter_params, queryset=qs, opportunity=self.opportunity).qs
 
 
+class CachedTileMixin:
+    """Caches each tile per opportunity and filters, until the opportunity's map data changes.
+
+    Tiles are keyed by ``map_tile_version``, so a write to any of the opportunity's work areas or
+    visits moves the map onto new keys. Deleted visits and changes to related rows, such as an
+    assignee's name, only show once ``TILE_CACHE_TTL_SECONDS`` has passed.
+    """
+
+    def get_layer_tiles(self, z, x, y):
+        version, cacheable = map_tile_version(self.request.opportunity)
+        filters = urlencode(sorted((key, sorted(values)) for key, values in self.request.GET.lists()), doseq=True)
+        key = "microplanning:tiles:{layers}:opp={opp_id}:{z}/{x}/{y}:{filters}:{version}".format(
+            layers=",".join(layer_class.id for layer_class in self.layer_classes),
+            opp_id=self.request.opportunity.id,
+            z=z,
+            x=x,
+            y=y,
+            filters=hashlib.md5(filters.encode(), usedforsecurity=False).hexdigest(),
+            version=version,
+        )
+        content = cache.get(key)
+        if content is None:
+            content = super().get_layer_tiles(z, x, y)
+            if cacheable:
+                cache.set(key, content, TILE_CACHE_TTL_SECONDS)
+        return content
+
+
 @method_decorator([org_admin_required, opportunity_required, waffle_flag(MICROPLANNING)], name="dispatch")
-class WorkAreaTileView(MVTView):
+class WorkAreaTileView(CachedTileMixin, MVTView):
     layer_classes = [WorkAreaVectorLayer]
 
     def get_layers(self):
@@ -692,36 +720,18 @@ class UserVisitVectorLayer(VectorLayer):
 
     def get_queryset(self):
         """
-        Returns the user visits with location_point annotated.
-
-        The user visit location is assumed to be a string in the format:
-        <lat> <lng> <altitude> <accuracy>
+        Returns the user visits with a location, placed by the stored ``location_point`` so the
+        tile's bounding box is answered from its spatial index.
         """
-        qs = UserVisit.objects.filter(
-            opportunity=self.opportunity,
-            location__isnull=False,
-        ).exclude(location="")
+        qs = UserVisit.objects.filter(opportunity=self.opportunity, location_point__isnull=False)
         qs = UserVisitMapFilterSet(self.filter_params, queryset=qs, opportunity=self.opportunity).qs
-        return (
-            qs.annotate(
-                lat=Cast(Func(F("location"), Value(" "), Value(1), function="split_part"), output_field=FloatField()),
-                lon=Cast(Func(F("location"), Value(" "), Value(2), function="split_part"), output_field=FloatField()),
-            )
-            .annotate(
-                location_point=Func(
-                    Func(F("lon"), F("lat"), function="ST_MakePoint"),
-                    Value(4326),
-                    function="ST_SetSRID",
-                    output_field=PointField(srid=4326),
-                ),
-                visit_uuid=Cast("user_visit_id", output_field=CharField()),
-            )
-            .values("location_point", "work_area_id", "visit_uuid")
+        return qs.annotate(visit_uuid=Cast("user_visit_id", output_field=CharField())).values(
+            "location_point", "work_area_id", "visit_uuid"
         )
 
 
 @method_decorator([org_admin_required, opportunity_required, waffle_flag(MICROPLANNING)], name="dispatch")
-class UserVisitTileView(MVTView):
+class UserVisitTileView(CachedTileMixin, MVTView):
     layer_classes = [UserVisitVectorLayer]
 
     def get_layers(self):
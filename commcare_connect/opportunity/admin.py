@@ -28,6 +28,8 @@ from commcare_connect.opportunity.models import (
     UserVisit,
 )
 from commcare_connect.opportunity.tasks import create_learn_modules_and_deliver_units
+from commcare_connect.opportunity.utils.learn_progress import update_learn_progress
+from commcare_connect.opportunity.utils.opportunity_stats import reconcile_opportunity_stats
 
 # Register your models here.
 
@@ -73,6 +75,8 @@ class OpportunityAccessAdmin(admin.ModelAdmin):
             CompletedModule.objects.filter(opportunity_access=access).delete()
             Assessment.objects.filter(opportunity_access=access).delete()
             CompletedWork.objects.filter(opportunity_access=access).delete()
+            update_learn_progress(access)
+        reconcile_opportunity_stats({access.opportunity_id for access in queryset})
 
 
 @admin.register(LearnModule)
@@ -1,4 +1,5 @@
-from django.db.models import Max, Sum
+from django.db.models import Max, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 
 from commcare_connect.cache import quickcache
@@ -85,12 +86,12 @@ class OpportunityClaimSerializer(serializers.ModelSerializer):
 
     def get_max_payments(self, obj):
         # return 1 for old opportunities
-        return obj.opportunityclaimlimit_set.aggregate(max_visits=Sum("max_visits")).get("max_visits", 0) or -1
+        return sum(claim_limit.max_visits for claim_limit in obj.opportunityclaimlimit_set.all()) or -1
 
     def get_payment_units(self, obj):
-        return OpportunityClaimLimitSerializer(
-            obj.opportunityclaimlimit_set.order_by("payment_unit_id"), many=True
-        ).data
+        # Sorted here rather than in the query so that limits prefetched by the listing are reused.
+        claim_limits = sorted(obj.opportunityclaimlimit_set.all(), key=lambda claim_limit: claim_limit.payment_unit_id)
+        return OpportunityClaimLimitSerializer(claim_limits, many=True).data
 
 
 class CatchmentAreaSerializer(serializers.ModelSerializer):
@@ -154,47 +155,94 @@ class OpportunitySerializer(serializers.ModelSerializer):
         ]
 
     def get_claim(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        claim = OpportunityClaim.objects.filter(opportunity_access=opp_access)
-        if claim.exists():
-            return OpportunityClaimSerializer(claim.first()).data
+        opp_access = self._get_opp_access(obj)
+        claim = getattr(opp_access, "opportunityclaim", None)
+        if claim is not None:
+            return OpportunityClaimSerializer(claim).data
         return None
 
     def get_learn_progress(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        total_modules = LearnModule.objects.filter(app=opp_access.opportunity.learn_app)
-        completed_modules = opp_access.unique_completed_modules
-        return {"total_modules": total_modules.count(), "completed_modules": completed_modules.count()}
+        opp_access = self._get_opp_access(obj)
+        total_modules = len(obj.learn_app.learn_modules.all())
+        return {"total_modules": total_modules, "completed_modules": opp_access.learn_modules_completed}
 
     def get_deliver_progress(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        return opp_access.visit_count
+        opp_access = self._get_opp_access(obj)
+        deliver_progress = getattr(opp_access, "deliver_progress", None)
+        return opp_access.visit_count if deliver_progress is None else deliver_progress
 
     def get_max_visits_per_user(self, obj):
         # return 1 for older opportunities
-        return obj.max_visits_per_user or -1
+        return sum(pu.max_total or 0 for pu in obj.paymentunit_set.all()) or -1
 
     def get_daily_max_visits_per_user(self, obj):
-        return obj.daily_max_visits_per_user or -1
+        return sum(pu.max_daily or 0 for pu in obj.paymentunit_set.all()) or -1
 
     def get_budget_per_visit(self, obj):
-        return obj.budget_per_visit or -1
+        return sum(pu.amount for pu in obj.paymentunit_set.all()) or -1
 
     def get_budget_per_user(self, obj):
         return obj.budget_per_user
 
     def get_payment_units(self, obj):
-        payment_units = PaymentUnit.objects.filter(opportunity=obj).order_by("pk")
+        payment_units = sorted(obj.paymentunit_set.all(), key=lambda pu: pu.pk)
         return PaymentUnitSerializer(payment_units, many=True).data
 
     def get_is_user_suspended(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
+        opp_access = self._get_opp_access(obj)
         return opp_access.suspended
 
     def get_catchment_areas(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        catchments = CatchmentArea.objects.filter(opportunity_access=opp_access)
-        return CatchmentAreaSerializer(catchments, many=True).data
+        opp_access = self._get_opp_access(obj)
+        return CatchmentAreaSerializer(opp_access.catchmentarea_set.all(), many=True).data
+
+    def _get_opp_access(self, obj):
+        """The requesting user's access to ``obj``, from the ``accesses`` in the context when given."""
+        accesses = self.context.get("accesses")
+        if accesses is not None:
+            return accesses[obj.id]
+        return _get_opp_access(self.context.get("request").user, obj)
+
+
+def get_opportunity_queryset(opportunities):
+    """Load what ``OpportunitySerializer`` reads from the opportunities themselves along with them."""
+    return opportunities.select_related(
+        "organization",
+        "opportunityverificationflags",
+        "learn_app__organization",
+        "learn_app__hq_server",
+        "deliver_app__organization",
+        "deliver_app__hq_server",
+    ).prefetch_related("paymentunit_set", "learn_app__learn_modules", "deliver_app__learn_modules")
+
+
+def get_user_opportunity_accesses(user) -> dict[int, OpportunityAccess]:
+    """Map the opportunities ``user`` can see to their access, loaded with what ``OpportunitySerializer`` reads.
+
+    Used as the ``accesses`` context of the serializer, so that listing the opportunities takes the
+    same number of queries however many there are.
+    """
+    accesses = (
+        OpportunityAccess.objects.filter(user=user, opportunity__archived=False)
+        .select_related("opportunityclaim")
+        .prefetch_related(
+            "catchmentarea_set",
+            Prefetch(
+                "opportunityclaim__opportunityclaimlimit_set",
+                queryset=OpportunityClaimLimit.objects.select_related("payment_unit"),
+            ),
+        )
+        .annotate(
+            deliver_progress=Coalesce(
+                Sum(
+                    "completedwork__saved_completed_count",
+                    filter=~Q(completedwork__status=CompletedWorkStatus.over_limit),
+                ),
+                0,
+            )
+        )
+    )
+    return {access.opportunity_id: access for access in accesses}
 
 
 @quickcache(vary_on=["user.pk", "opportunity.pk"], timeout=60 * 60)
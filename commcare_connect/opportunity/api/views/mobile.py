@@ -5,6 +5,7 @@ import waffle
 from django.db import transaction
 from django.db.models import Q
 from django.http import Http404
+from django.utils.http import parse_etags
 from django.utils.timezone import now
 from rest_framework import viewsets
 from rest_framework.generics import RetrieveAPIView
@@ -18,6 +19,8 @@ from commcare_connect.opportunity.api.serializers.mobile import (
     DeliveryProgressSerializer,
     OpportunitySerializer,
     UserLearnProgressSerializer,
+    get_opportunity_queryset,
+    get_user_opportunity_accesses,
 )
 from commcare_connect.opportunity.models import (
     CompletedWork,
@@ -27,6 +30,8 @@ from commcare_connect.opportunity.models import (
     OpportunityClaimLimit,
     Payment,
 )
+from commcare_connect.opportunity.utils.opportunity_listing import get_opportunity_listing_etag
+from commcare_connect.opportunity.utils.opportunity_stats import adjust_opportunity_stats
 from commcare_connect.users.helpers import create_hq_user_and_link
 from commcare_connect.users.models import User
 from commcare_connect.utils.db import get_object_or_list_by_uuid_or_int
@@ -40,7 +45,24 @@ class OpportunityViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Opportunity.objects.filter(opportunityaccess__user=self.request.user, archived=False)
+        return get_opportunity_queryset(
+            Opportunity.objects.filter(opportunityaccess__user=self.request.user, archived=False)
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["accesses"] = get_user_opportunity_accesses(self.request.user)
+        return context
+
+    def list(self, request, *args, **kwargs):
+        # Computed before the listing so that a change made while it renders is picked up by the next poll.
+        etag = get_opportunity_listing_etag(request.user, request.version)
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(status=304, headers={"ETag": etag})
+        response = super().list(request, *args, **kwargs)
+        response["ETag"] = etag
+        return response
 
 
 class UserLearnProgressView(RetrieveAPIView):
@@ -115,6 +137,7 @@ class ClaimOpportunityView(APIView):
                 return Response(status=200, data="Opportunity is already claimed")
 
             OpportunityClaimLimit.create_claim_limits(opportunity, claim)
+            adjust_opportunity_stats(opportunity.id, claimed_job=1)
 
         domain = opportunity.deliver_app.cc_domain
         user_created = create_hq_user_and_link(self.request.user, domain, opportunity)
@@ -1,19 +1,25 @@
+import csv
 import datetime
+import io
 import json
+from itertools import islice
 
-from django.core.paginator import Paginator
-from django.db.models import Sum
+from django.db.models import JSONField, Sum
+from django.db.models.expressions import RawSQL
 from django.utils.encoding import force_str
 from flatten_dict import flatten as flatten_json
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
 from tablib import Dataset
 
 from commcare_connect.opportunity.helpers import (
     get_annotated_opportunity_access,
     get_annotated_opportunity_access_deliver_status,
+    get_completed_work_table_data,
 )
 from commcare_connect.opportunity.models import (
     CatchmentArea,
-    CompletedWork,
     Opportunity,
     OpportunityAccess,
     UserVisit,
@@ -28,13 +34,44 @@ from commcare_connect.opportunity.tables import (
     UserVisitReviewTable,
     UserVisitTable,
 )
+from commcare_connect.opportunity.utils.form_json_keys import (
+    get_form_json_paths,
+    iter_form_json_leaves,
+    jsonb_key_order,
+)
 from commcare_connect.utils.datetime import get_start_end_date_range_with_time
 
+# A jsonb array with the value at each of the given paths, "" where the form has no such path.
+FORM_JSON_VALUES_SQL = """
+SELECT jsonb_agg(
+    COALESCE(opportunity_uservisit.form_json #> ARRAY(SELECT jsonb_array_elements_text(paths.path)), '""')
+    ORDER BY paths.position
+)
+FROM jsonb_array_elements(%s::jsonb) WITH ORDINALITY AS paths (path, position)
+"""
+
 
 class UserVisitExporter:
-    def __init__(self, opportunity: Opportunity, flatten: bool):
+    """Writes visit exports a chunk of visits at a time.
+
+    Flattened exports need every ``form_json`` key as a header before the first row is written.
+    With ``flatten_in_db`` the keys come from the deliver app's ``FormJsonKey`` catalog for the
+    builds of the exported visits, plus those the database finds in the visits the catalog doesn't
+    cover yet, and the database projects each row's values for them, so neither the full form_json
+    nor its attachments are sent to the worker. Otherwise the visits are read twice: once for the
+    keys alone, and once for the rows. Reads use a server-side cursor, which keeps memory bounded
+    by the chunk size and the number of keys rather than the number of visits.
+
+    The form_json columns are in jsonb key order either way.
+    """
+
+    title = "Export User Visits"
+    chunk_size = 500
+
+    def __init__(self, opportunity: Opportunity, flatten: bool, flatten_in_db: bool = True):
         self.opportunity = opportunity
         self.flatten = flatten
+        self.flatten_in_db = flatten_in_db
         self.headers = []
         self.columns = []
         self.form_json_schema = []
@@ -53,48 +90,76 @@ class UserVisitExporter:
             self.headers.append("form_json")
         self.form_json_schema = []
 
-    def _process_row(self, row, dataset, schema_set):
-        form_json = row.pop()
-        form_json.pop("attachments", None)
+    def _get_form_json_schema(self, user_visits):
+        paths = set()
+        for form_json in user_visits.values_list("form_json", flat=True).iterator(chunk_size=self.chunk_size):
+            paths.update(path for path, _ in iter_form_json_leaves(form_json))
+        return [".".join(path) for path in sorted(paths, key=jsonb_key_order)]
+
+    def _get_form_json_values(self, user_visit):
+        if self.flatten and self.flatten_in_db:
+            return user_visit.form_json_values or []
         if self.flatten:
+            form_json = user_visit.form_json
+            form_json.pop("attachments", None)
             flat_json = flatten_json(form_json, reducer="dot", enumerate_types=(list,))
-            for key in flat_json:
-                if key not in schema_set:
-                    schema_set.add(key)
-                    self.form_json_schema.append(key)
-                    if len(dataset) > 0:
-                        dataset.append_col([""] * len(dataset), header=key)
-                    else:
-                        dataset.headers.append(key)
-            row.extend(flat_json.get(key, "") for key in self.form_json_schema)
-        else:
-            row.append(json.dumps(form_json))
-        return row
-
-    def get_dataset(self, from_date, to_date, status: list[VisitValidationStatus]) -> Dataset:
-        """Get dataset of all user visits for an opportunity."""
+            return [flat_json.get(key, "") for key in self.form_json_schema]
+        if self.flatten_in_db:
+            return [json.dumps(user_visit.form_json_export)]
+        form_json = user_visit.form_json
+        form_json.pop("attachments", None)
+        return [json.dumps(form_json)]
+
+    def _get_user_visits(self, from_date, to_date, status: list[VisitValidationStatus]):
         from_date, to_date = get_start_end_date_range_with_time(from_date, to_date)
         user_visits = UserVisit.objects.filter(
             opportunity=self.opportunity, visit_date__gte=from_date, visit_date__lte=to_date
         )
         if status and "all" not in status:
             user_visits = user_visits.filter(status__in=status)
-        user_visits = user_visits.order_by("visit_date")
+        return user_visits.order_by("visit_date", "id")
+
+    def get_rows(self, from_date, to_date, status: list[VisitValidationStatus]):
+        """Return the export headers and an iterator over its rows."""
+        user_visits = self._get_user_visits(from_date, to_date, status)
         self._get_table_metadata()
+        if self.flatten and self.flatten_in_db:
+            paths = get_form_json_paths(self.opportunity.deliver_app, user_visits)
+            self.form_json_schema = [".".join(path) for path in paths]
+            user_visits = user_visits.defer("form_json").annotate(
+                form_json_values=RawSQL(FORM_JSON_VALUES_SQL, (json.dumps(paths),), output_field=JSONField())
+            )
+        elif self.flatten:
+            self.form_json_schema = self._get_form_json_schema(user_visits)
+        elif self.flatten_in_db:
+            user_visits = user_visits.defer("form_json").annotate(
+                form_json_export=RawSQL(
+                    "opportunity_uservisit.form_json - 'attachments'", (), output_field=JSONField()
+                )
+            )
+        if self.flatten_in_db:
+            # UserVisit.duration reads the metadata from this rather than loading the deferred form_json.
+            user_visits = user_visits.annotate(
+                form_json_metadata=RawSQL(
+                    "opportunity_uservisit.form_json -> 'metadata'", (), output_field=JSONField()
+                )
+            )
+        headers = self.headers + self.form_json_schema
+        return headers, self._iter_rows(user_visits.select_related("user", "deliver_unit"))
 
-        dataset = Dataset(title="Export User Visits", headers=self.headers)
-        schema_set = set()
-        for page in Paginator(user_visits, per_page=500):
-            table = UserVisitTable(page.object_list)
-            base_data = [
-                # form_json must be the last column in the row
-                [row.get_cell_value(column.name) for column in self.columns] + [row.get_cell_value("form_json")]
-                for row in table.rows
-            ]
-            for row in base_data:
-                row = self._process_row(row, dataset, schema_set)
-                dataset.append([force_str(col, strings_only=True) for col in row])
-        return dataset
+    def _iter_rows(self, user_visits):
+        visits = user_visits.iterator(chunk_size=self.chunk_size)
+        while chunk := list(islice(visits, self.chunk_size)):
+            table = UserVisitTable(chunk)
+            for row in table.rows:
+                values = [row.get_cell_value(column.name) for column in self.columns]
+                values.extend(self._get_form_json_values(row.record))
+                yield [force_str(col, strings_only=True) for col in values]
+
+    def write(self, file, export_format, from_date, to_date, status: list[VisitValidationStatus]):
+        """Write the export of all user visits for an opportunity to ``file``, a binary file object."""
+        headers, rows = self.get_rows(from_date, to_date, status)
+        write_export(file, export_format, self.title, headers, rows)
 
 
 def export_user_visit_review_data(
@@ -169,15 +234,7 @@ def export_deliver_status_table(opportunity: Opportunity) -> Dataset:
 
 
 def export_work_status_table(opportunity: Opportunity) -> Dataset:
-    access_objects = OpportunityAccess.objects.filter(opportunity=opportunity, suspended=False)
-    completed_works = []
-    for completed_work in CompletedWork.objects.filter(opportunity_access__in=access_objects):
-        completed = completed_work.completed
-        if opportunity.auto_approve_payments and completed and completed_work.flags:
-            completed_works.append(completed_work)
-            continue
-        if completed:
-            completed_works.append(completed_work)
+    completed_works = get_completed_work_table_data(opportunity, exclude_suspended=True)
     table = CompletedWorkTable(completed_works, exclude=("date_popup"))
     return get_dataset(table, export_title="Payment Verification export")
 
@@ -188,6 +245,43 @@ def export_catchment_area_table(opportunity):
     return get_dataset(table, export_title="Catchment Area Export")
 
 
+def write_export(file, export_format, title, headers, rows):
+    """Write ``headers`` and the ``rows`` iterable to a binary file object one row at a time.
+
+    Produces the same CSV and XLSX files as ``Dataset.export`` without holding the rows in memory,
+    except that XLSX columns keep their default width.
+    """
+    if export_format == "csv":
+        stream = io.TextIOWrapper(file, encoding="utf-8", newline="", write_through=True)
+        writer = csv.writer(stream)
+        writer.writerow(headers)
+        writer.writerows(rows)
+        stream.detach()
+    elif export_format == "xlsx":
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(title)
+        worksheet.freeze_panes = "A2"
+        bold = Font(bold=True)
+        worksheet.append([_xlsx_cell(worksheet, header, font=bold) for header in headers])
+        for row in rows:
+            worksheet.append([_xlsx_cell(worksheet, value) for value in row])
+        workbook.save(file)
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+
+def _xlsx_cell(worksheet, value, font=None):
+    try:
+        cell = WriteOnlyCell(worksheet, value=value)
+    except ValueError:
+        cell = WriteOnlyCell(worksheet, value=str(value))
+    if font:
+        cell.font = font
+    elif isinstance(value, str) and "\n" in value:
+        cell.alignment = Alignment(wrap_text=True)
+    return cell
+
+
 def get_dataset(table, export_title):
     columns = [column for column in table.columns.iterall()]
     headers = [force_str(column.header, strings_only=True) for column in columns]
@@ -1550,6 +1550,9 @@ class DeliverUnitFlagsForm(forms.ModelForm):
         return deliver_unit
 
 
+QUESTION_PATH_DATALIST_ID = "form-json-question-paths"
+
+
 class FormJsonValidationRulesForm(forms.ModelForm):
     class Meta:
         model = FormJsonValidationRules
@@ -1576,6 +1579,8 @@ class FormJsonValidationRulesForm(forms.ModelForm):
             queryset=DeliverUnit.objects.filter(app=self.opportunity.deliver_app),
             widget=forms.CheckboxSelectMultiple,
         )
+        # Suggests the catalogued form_json keys, listed by the verification flags template.
+        self.fields["question_path"].widget.attrs["list"] = QUESTION_PATH_DATALIST_ID
 
 
 class PaymentInvoiceInvoiceTicketLinkForm(forms.Form):
@@ -1,18 +1,22 @@
 from collections import namedtuple
 from datetime import timedelta
+from functools import partial
 
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db import transaction
 from django.db.models import (
     Case,
     CharField,
     Count,
     DateTimeField,
-    DecimalField,
     DurationField,
     Exists,
     ExpressionWrapper,
     F,
     FloatField,
+    Func,
     IntegerField,
+    JSONField,
     Max,
     Min,
     OuterRef,
@@ -28,134 +32,23 @@ from django.utils.timezone import now
 
 from commcare_connect.opportunity.models import (
     Assessment,
-    AssignedTask,
-    AssignedTaskStatus,
     CompletedModule,
     CompletedWork,
     CompletedWorkStatus,
+    CompletedWorkVisitCount,
+    DeliverUnit,
     Opportunity,
     OpportunityAccess,
-    OpportunityClaim,
     OpportunityClaimLimit,
-    Payment,
+    OpportunityDailyStats,
+    PaymentUnit,
     UserInvite,
-    UserInviteStatus,
     UserVisit,
-    VisitReviewStatus,
     VisitValidationStatus,
 )
-
-
-def inactive_workers_subquery(days_ago):
-    subquery = (
-        OpportunityAccess.objects.filter(
-            opportunity_id=OuterRef("pk"),
-            last_active__isnull=False,
-            last_active__lt=days_ago,
-        )
-        .values("opportunity_id")
-        .annotate(count=Count("id", distinct=True))
-        .values("count")
-    )
-
-    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
-
-
-def get_deliveries_count_subquery(status=None):
-    filters = {"opportunity_access__opportunity_id": OuterRef("pk")}
-    if status is not None:
-        filters["status"] = status
-
-    return Coalesce(
-        Subquery(
-            CompletedWork.objects.filter(**filters)
-            .values("opportunity_access__opportunity_id")
-            .annotate(count=Count("id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        0,
-    )
-
-
-def total_accrued_sq():
-    return Coalesce(
-        Subquery(
-            OpportunityAccess.objects.filter(opportunity_id=OuterRef("pk"))
-            .values("opportunity_id")
-            .annotate(total=Sum("payment_accrued"))
-            .values("total"),
-            output_field=IntegerField(),
-        ),
-        0,
-    )
-
-
-def total_paid_sq():
-    return Coalesce(
-        Subquery(
-            Payment.objects.filter(opportunity_access__opportunity_id=OuterRef("pk"))
-            .values("opportunity_access__opportunity_id")
-            .annotate(total=Sum("amount"))
-            .values("total"),
-            output_field=DecimalField(),
-        ),
-        Value(0, output_field=DecimalField()),
-    )
-
-
-def deliveries_from_yesterday_sq():
-    return Coalesce(
-        Subquery(
-            UserVisit.objects.filter(opportunity_id=OuterRef("pk"), visit_date__gte=now().date() - timedelta(days=1))
-            .values("opportunity_id")
-            .annotate(count=Count("id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        0,
-    )
-
-
-def workers_invited_subquery():
-    return Coalesce(
-        Subquery(
-            UserInvite.objects.filter(opportunity_id=OuterRef("pk"))
-            .exclude(status=UserInviteStatus.not_found)
-            .values("opportunity_id")
-            .annotate(count=Count("id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        0,
-    )
-
-
-def pending_invites_subquery():
-    return Coalesce(
-        Subquery(
-            UserInvite.objects.filter(opportunity_id=OuterRef("pk"))
-            .exclude(status__in=[UserInviteStatus.not_found, UserInviteStatus.accepted])
-            .values("opportunity_id")
-            .annotate(count=Count("id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        0,
-    )
-
-
-def started_learning_subquery():
-    return Coalesce(
-        Subquery(
-            OpportunityAccess.objects.filter(opportunity_id=OuterRef("pk"), date_learn_started__isnull=False)
-            .values("opportunity_id")
-            .annotate(count=Count("id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        Value(0),
-    )
+from commcare_connect.opportunity.utils.list_metrics import get_opportunity_list_metrics
+from commcare_connect.opportunity.utils.opportunity_stats import compute_opportunity_stats
+from commcare_connect.opportunity.utils.payment_accrual import get_parent_payment_unit_levels
 
 
 def get_annotated_opportunity_access(opportunity: Opportunity):
@@ -467,35 +360,8 @@ class OpportunityData:
     def get_data_qs(opp_ids, program_manager=False):
         # Meant to be used with a small page of opp_ids (10/20)
         today = now().date()
-        three_days_ago = now() - timedelta(days=3)
-
-        pending_approvals_sq = Subquery(
-            CompletedWork.objects.filter(
-                opportunity_access__opportunity_id=OuterRef("pk"),
-            )
-            .filter(
-                Q(uservisit__status=VisitValidationStatus.pending)  # NM reviews
-                | Q(
-                    uservisit__review_status=VisitReviewStatus.pending, uservisit__review_created_on__isnull=False
-                ),  # PM reviews
-            )
-            .values("opportunity_access__opportunity_id")
-            .annotate(count=Count("id", distinct=True))
-            .values("count")[:1],
-            output_field=IntegerField(),
-        )
-
         queryset = Opportunity.objects.filter(id__in=opp_ids).annotate(
             program_name=F("program__name"),
-            pending_invites=pending_invites_subquery(),
-            pending_approvals=Coalesce(pending_approvals_sq, Value(0)),
-            total_accrued=total_accrued_sq(),
-            total_paid=total_paid_sq(),
-            payments_due=ExpressionWrapper(
-                F("total_accrued") - F("total_paid"),
-                output_field=DecimalField(),
-            ),
-            inactive_workers=inactive_workers_subquery(three_days_ago),
             status=Case(
                 When(Q(active=True) & Q(end_date__gte=today), then=Value(0)),  # Active
                 When(Q(active=True) & Q(end_date__lt=today), then=Value(1)),  # Ended
@@ -503,47 +369,21 @@ class OpportunityData:
                 output_field=IntegerField(),
             ),
         )
-
-        if program_manager:
-            deliveries_agg = (
-                CompletedWork.objects.filter(opportunity_access__opportunity_id__in=opp_ids)
-                .values("opportunity_access__opportunity_id")
-                .annotate(
-                    total_deliveries=Count("id", distinct=True),
-                    verified_deliveries=Count("id", filter=Q(status=CompletedWorkStatus.approved), distinct=True),
-                )
-            )
-            deliveries_by_opp = {
-                item["opportunity_access__opportunity_id"]: {
-                    "total_deliveries": item["total_deliveries"],
-                    "verified_deliveries": item["verified_deliveries"],
-                }
-                for item in deliveries_agg
-            }
-
-            workers_agg = (
-                OpportunityAccess.objects.filter(opportunity_id__in=opp_ids)
-                .values("opportunity_id")
-                .annotate(
-                    total_workers=Count("id", distinct=True),
-                    started_learning=Count("id", filter=Q(date_learn_started__isnull=False), distinct=True),
-                )
-            )
-            workers_by_opp = {
-                item["opportunity_id"]: {
-                    "total_workers": item["total_workers"],
-                    "started_learning": item["started_learning"],
-                }
-                for item in workers_agg
-            }
-
-            for opp in queryset:
-                delivery_stats = deliveries_by_opp.get(opp.id, {})
-                worker_stats = workers_by_opp.get(opp.id, {})
-                opp.total_deliveries = delivery_stats.get("total_deliveries", 0)
-                opp.verified_deliveries = delivery_stats.get("verified_deliveries", 0)
-                opp.total_workers = worker_stats.get("total_workers", 0)
-                opp.started_learning = worker_stats.get("started_learning", 0)
+        metrics_by_opp = get_opportunity_list_metrics(opp_ids)
+
+        for opp in queryset:
+            metrics = metrics_by_opp[opp.id]
+            opp.pending_invites = metrics["pending_invites"]
+            opp.pending_approvals = metrics["pending_approvals"]
+            opp.total_accrued = metrics["total_accrued"]
+            opp.total_paid = metrics["total_paid"]
+            opp.payments_due = opp.total_accrued - opp.total_paid
+            opp.inactive_workers = metrics["inactive_workers"]
+            if program_manager:
+                opp.total_deliveries = metrics["total_deliveries"]
+                opp.verified_deliveries = metrics["verified_deliveries"]
+                opp.total_workers = metrics["total_workers"]
+                opp.started_learning = metrics["started_learning"]
                 opp.active_workers = opp.started_learning - opp.inactive_workers
 
         # preserve the order of opp_ids argument
@@ -658,143 +498,154 @@ def get_worker_work_area_table_data(opportunity):
     )
 
 
-def get_opportunity_delivery_progress(opp_id):
-    today = now().replace(hour=0, minute=0, second=0, microsecond=0)
-    three_days_ago = today - timedelta(days=3)
-    yesterday = today - timedelta(days=1)
+def _has_completion(child_levels):
+    """Condition on a completed work having at least one completion, from its live visit counts.
 
-    accrued_since_yesterday_sq = Coalesce(
-        Subquery(
-            CompletedWork.objects.filter(
-                opportunity_access__opportunity_id=OuterRef("pk"),
-                status_modified_date__gte=yesterday,
-                status=CompletedWorkStatus.approved,
-            )
-            .values("opportunity_access__opportunity_id")
-            .annotate(total=Sum("saved_payment_accrued"))
-            .values("total"),
-            output_field=IntegerField(),
-        ),
-        0,
+    Follows ``CompletedWork.calculate_completed``: every required deliver unit of the payment unit
+    has a visit, one of its optional deliver units does if it has any, and so does the work of a
+    child payment unit for the same entity, down ``child_levels`` levels of child payment units.
+    """
+    visited = CompletedWorkVisitCount.objects.filter(
+        completed_work=OuterRef(OuterRef("pk")), deliver_unit=OuterRef("pk"), visit_count__gt=0
     )
-
-    most_recent_delivery_sq = Subquery(
-        UserVisit.objects.filter(opportunity_id=OuterRef("pk"))
-        .values("opportunity_id")
-        .annotate(latest=Max("visit_date"))
-        .values("latest")[:1],
-        output_field=DateTimeField(),
+    deliver_units = DeliverUnit.objects.filter(payment_unit=OuterRef("payment_unit"))
+    required_units = deliver_units.filter(optional=False)
+    optional_units = deliver_units.filter(optional=True)
+    condition = (
+        Exists(required_units)
+        & ~Exists(required_units.filter(~Exists(visited)))
+        & (~Exists(optional_units) | Exists(optional_units.filter(Exists(visited))))
     )
+    if child_levels:
+        child_works = CompletedWork.objects.filter(
+            _has_completion(child_levels - 1),
+            opportunity_access=OuterRef("opportunity_access"),
+            payment_unit__parent_payment_unit=OuterRef("payment_unit"),
+        )
+        condition &= (
+            ~Exists(PaymentUnit.objects.filter(parent_payment_unit=OuterRef("payment_unit")))
+            | Exists(child_works.filter(entity_id=OuterRef("entity_id")))
+            | (Q(entity_id__isnull=True) & Exists(child_works.filter(entity_id__isnull=True)))
+        )
+    return condition
+
+
+def get_completed_work_table_data(opportunity, exclude_suspended=False):
+    """Completed work of the opportunity with at least one completion, annotated for ``CompletedWorkTable``.
 
-    recent_payment_sq = Subquery(
-        Payment.objects.filter(opportunity_access__opportunity_id=OuterRef("pk"))
-        .values("opportunity_access__opportunity_id")
-        .annotate(latest=Max("date_paid"))
-        .values("latest")[:1],
-        output_field=DateTimeField(),
+    The completion date and flags are computed in the query rather than per row through the
+    ``CompletedWork`` properties, and completion is read from the ``CompletedWorkVisitCount``
+    rows the visit triggers keep current, rather than the saved count, which lags behind until
+    the payment accrual is recalculated.
+    """
+    access_filter = Q(opportunity_access__opportunity=opportunity)
+    if exclude_suspended:
+        access_filter &= Q(opportunity_access__suspended=False)
+    last_visit_date = (
+        UserVisit.objects.filter(completed_work=OuterRef("pk"))
+        .values("completed_work")
+        .annotate(latest=Max("visit_date"))
+        .values("latest")
     )
-    active_tasks_count = Coalesce(
-        Subquery(
-            AssignedTask.objects.filter(
-                opportunity_access__opportunity_id=OuterRef("pk"),
-                status=AssignedTaskStatus.ASSIGNED,
+    # Flag codes of the visits that are not yet approved, as the ``flags`` property returns them.
+    flag_codes = (
+        UserVisit.objects.filter(completed_work=OuterRef("pk"))
+        .exclude(status=VisitValidationStatus.approved)
+        .values("completed_work")
+        .annotate(
+            codes=Func(
+                JSONBAgg("flag_reason"),
+                Value("$[*].flags[*][0]"),
+                function="jsonb_path_query_array",
+                output_field=JSONField(),
             )
-            .values("opportunity_access__opportunity_id")
-            .annotate(total=Count("pk"))
-            .values("total"),
-            output_field=IntegerField(),
-        ),
-        0,
-    )
-
-    annotated_opportunity = Opportunity.objects.filter(id=opp_id).annotate(
-        inactive_workers=inactive_workers_subquery(three_days_ago),
-        deliveries_from_yesterday=deliveries_from_yesterday_sq(),
-        accrued_since_yesterday=accrued_since_yesterday_sq,
-        most_recent_delivery=most_recent_delivery_sq,
-        total_deliveries=get_deliveries_count_subquery(),
-        recent_payment=recent_payment_sq,
-        workers_invited=workers_invited_subquery(),
-        pending_invites=pending_invites_subquery(),
-        total_accrued=total_accrued_sq(),
-        total_paid=total_paid_sq(),
-        payments_due=ExpressionWrapper(F("total_accrued") - F("total_paid"), output_field=DecimalField()),
-        active_tasks_count=active_tasks_count,
+        )
+        .values("codes")
     )
-
-    return annotated_opportunity.first()
-
-
-def get_opportunity_worker_progress(opp_id):
+    child_levels = len(get_parent_payment_unit_levels(opportunity))
     return (
-        Opportunity.objects.filter(id=opp_id)
+        CompletedWork.objects.filter(access_filter, _has_completion(child_levels))
+        .select_related("opportunity_access__user", "payment_unit")
         .annotate(
-            total_deliveries=get_deliveries_count_subquery(),
-            approved_deliveries=get_deliveries_count_subquery(CompletedWorkStatus.approved),
-            rejected_deliveries=get_deliveries_count_subquery(CompletedWorkStatus.rejected),
-            total_accrued=total_accrued_sq(),
-            total_paid=total_paid_sq(),
-            visits_since_yesterday=deliveries_from_yesterday_sq(),
+            last_visit_date=Subquery(last_visit_date, output_field=DateTimeField()),
+            flag_codes=Coalesce(Subquery(flag_codes), Value([], output_field=JSONField())),
         )
-        .first()
+        .order_by("id")
     )
 
 
-def get_opportunity_funnel_progress(opp_id):
-    claimed_job_subquery = Coalesce(
-        Subquery(
-            OpportunityClaim.objects.filter(opportunity_access__opportunity_id=OuterRef("pk"))
-            .values("opportunity_access__opportunity_id")
-            .annotate(count=Count("id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        Value(0),
-    )
+def get_opportunity_with_stats(opp_id, fields, since_yesterday=None):
+    """The opportunity with the figures its dashboard shows.
 
-    started_deliveries_subquery = Coalesce(
-        Subquery(
-            UserVisit.objects.filter(opportunity_id=OuterRef("pk"))
-            .values("opportunity_id")
-            .annotate(count=Count("user_id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        Value(0),
-    )
+    ``fields`` maps the attributes to set to the ``OpportunityStats`` field they're read from, and
+    ``since_yesterday`` to the ``OpportunityDailyStats`` field they total since yesterday. Until
+    the task that builds an opportunity's stats has run, they are computed during the request
+    without being saved.
+    """
+    from commcare_connect.opportunity.tasks import build_opportunity_stats
+
+    opportunity = Opportunity.objects.filter(id=opp_id).select_related("stats").first()
+    if opportunity is None:
+        return None
+    yesterday = now().date() - timedelta(days=1)
+    stats = getattr(opportunity, "stats", None)
+    if stats is None or stats.date_reconciled is None:
+        stats, daily = compute_opportunity_stats(opp_id)
+        transaction.on_commit(partial(build_opportunity_stats.delay, opp_id))
+    else:
+        daily = OpportunityDailyStats.objects.filter(opportunity_id=opp_id, date__gte=yesterday)
+    for attribute, field in fields.items():
+        setattr(opportunity, attribute, getattr(stats, field))
+    for attribute, field in (since_yesterday or {}).items():
+        setattr(opportunity, attribute, sum(getattr(bucket, field) for bucket in daily if bucket.date >= yesterday))
+    return opportunity
 
-    completed_assessments_subquery = Coalesce(
-        Subquery(
-            Assessment.objects.filter(opportunity_id=OuterRef("pk"), passed=True)
-            .values("opportunity_id")
-            .annotate(count=Count("user_id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        Value(0),
+
+def get_opportunity_delivery_progress(opp_id):
+    opportunity = get_opportunity_with_stats(
+        opp_id,
+        {
+            "inactive_workers": "inactive_workers",
+            "most_recent_delivery": "most_recent_delivery",
+            "total_deliveries": "total_deliveries",
+            "recent_payment": "recent_payment",
+            "workers_invited": "workers_invited",
+            "pending_invites": "pending_invites",
+            "total_accrued": "total_accrued",
+            "total_paid": "total_paid",
+            "active_tasks_count": "active_tasks",
+        },
+        {"deliveries_from_yesterday": "deliveries", "accrued_since_yesterday": "accrued"},
     )
+    if opportunity is not None:
+        opportunity.payments_due = opportunity.total_accrued - opportunity.total_paid
+    return opportunity
 
-    completed_learning_subquery = Coalesce(
-        Subquery(
-            OpportunityAccess.objects.filter(opportunity_id=OuterRef("pk"), completed_learn_date__isnull=False)
-            .values("opportunity_id")
-            .annotate(count=Count("user_id", distinct=True))
-            .values("count"),
-            output_field=IntegerField(),
-        ),
-        Value(0),
+
+def get_opportunity_worker_progress(opp_id):
+    return get_opportunity_with_stats(
+        opp_id,
+        {
+            "total_deliveries": "total_deliveries",
+            "approved_deliveries": "approved_deliveries",
+            "rejected_deliveries": "rejected_deliveries",
+            "total_accrued": "total_accrued",
+            "total_paid": "total_paid",
+        },
+        {"visits_since_yesterday": "deliveries"},
     )
 
-    return (
-        Opportunity.objects.filter(id=opp_id)
-        .annotate(
-            workers_invited=workers_invited_subquery(),
-            pending_invites=pending_invites_subquery(),
-            started_learning_count=started_learning_subquery(),
-            claimed_job=claimed_job_subquery,
-            started_deliveries=started_deliveries_subquery,
-            completed_assessments=completed_assessments_subquery,
-            completed_learning=completed_learning_subquery,
-        )
-        .first()
+
+def get_opportunity_funnel_progress(opp_id):
+    return get_opportunity_with_stats(
+        opp_id,
+        {
+            "workers_invited": "workers_invited",
+            "pending_invites": "pending_invites",
+            "started_learning_count": "started_learning",
+            "claimed_job": "claimed_job",
+            "started_deliveries": "started_deliveries",
+            "completed_assessments": "completed_assessments",
+            "completed_learning": "completed_learning",
+        },
     )
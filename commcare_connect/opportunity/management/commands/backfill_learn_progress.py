@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from commcare_connect.opportunity.models import OpportunityAccess
+from commcare_connect.opportunity.utils.learn_progress import update_learn_progress_in_range
+
+
+class Command(BaseCommand):
+    help = "Populates the learn progress stored on OpportunityAccess from completed modules, in batches of accesses"
+
+    def add_arguments(self, parser, *args, **kwargs):
+        parser.add_argument("--opp", type=int)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        opp_id = options.get("opp")
+        batch_size = options["batch_size"]
+        accesses = OpportunityAccess.objects.all()
+        if opp_id:
+            accesses = accesses.filter(opportunity=opp_id)
+
+        bounds = accesses.aggregate(start=Min("id"), end=Max("id"))
+        if bounds["start"] is None:
+            self.stdout.write("No accesses to backfill")
+            return
+
+        updated = 0
+        for start in range(bounds["start"], bounds["end"] + 1, batch_size):
+            with transaction.atomic():
+                updated += update_learn_progress_in_range(start, start + batch_size, opportunity_id=opp_id)
+            self.stdout.write(f"Processed accesses up to id {start + batch_size - 1}, {updated} updated")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled learn progress for {updated} accesses"))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+# ``location`` is "<lat> <lng> <altitude> <accuracy>"; rows that don't start with two numbers are skipped.
+BACKFILL_SQL = r"""
+UPDATE opportunity_uservisit
+SET location_point = ST_SetSRID(
+    ST_MakePoint(split_part(location, ' ', 2)::float, split_part(location, ' ', 1)::float), 4326
+)
+WHERE id >= %(start)s AND id < %(end)s
+  AND location_point IS NULL
+  AND location ~ '^-?[0-9]+(\.[0-9]+)? -?[0-9]+(\.[0-9]+)?( |$)'
+"""
+
+BOUNDS_SQL = """
+SELECT MIN(id), MAX(id)
+FROM opportunity_uservisit
+WHERE location_point IS NULL AND location IS NOT NULL
+"""
+
+
+def backfill_location_points(opp_id=None, batch_size=10000, log=None):
+    """Fill in the location_point of visits that have a location, one batch of ids per transaction.
+
+    Only reads and writes the table, so that the migration running it on deploy can too.
+    Returns the number of visits updated.
+    """
+    sql, bounds_sql = BACKFILL_SQL, BOUNDS_SQL
+    params = {}
+    if opp_id:
+        sql += " AND opportunity_id = %(opp_id)s"
+        bounds_sql += " AND opportunity_id = %(opp_id)s"
+        params["opp_id"] = opp_id
+
+    with connection.cursor() as cursor:
+        cursor.execute(bounds_sql, params)
+        start_id, end_id = cursor.fetchone()
+    if start_id is None:
+        return 0
+
+    updated = 0
+    for start in range(start_id, end_id + 1, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, {**params, "start": start, "end": start + batch_size})
+            updated += cursor.rowcount
+        if log:
+            log(f"Processed visits up to id {start + batch_size - 1}, {updated} updated")
+    return updated
+
+
+class Command(BaseCommand):
+    help = "Populates UserVisit.location_point from the location string, in batches of visit ids"
+
+    def add_arguments(self, parser, *args, **kwargs):
+        parser.add_argument("--opp", type=int)
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        updated = backfill_location_points(options.get("opp"), options["batch_size"], log=self.stdout.write)
+        if not updated:
+            self.stdout.write("No visits to backfill")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Backfilled location points for {updated} visits"))
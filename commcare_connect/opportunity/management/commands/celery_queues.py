@@ -0,0 +1,54 @@
+import json
+import time
+
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from commcare_connect.utils.celery_routing import QUEUES, get_queue_names
+
+
+class Command(BaseCommand):
+    help = "Report how many tasks are waiting in each Celery queue and how long the oldest has waited."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--worker-options",
+            nargs="?",
+            const="",
+            metavar="QUEUE",
+            help="Print the celery worker options to consume QUEUE, or every queue when not given, and exit.",
+        )
+
+    def handle(self, *args, worker_options=None, **options):
+        if worker_options is not None:
+            self.stdout.write(self._get_worker_options(worker_options))
+            return
+
+        client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+        now = time.time()
+        self.stdout.write(f"{'Queue':<20} {'Waiting':>8} {'Oldest (s)':>11}")
+        for queue in get_queue_names():
+            waiting = client.llen(queue)
+            age = ""
+            # Kombu pushes messages on the left and workers pop from the right.
+            if waiting and (published_at := _get_published_at(client.lindex(queue, -1))):
+                age = f"{now - published_at:.0f}"
+            self.stdout.write(f"{queue:<20} {waiting:>8} {age:>11}")
+
+    def _get_worker_options(self, queue):
+        if not queue:
+            return f"-Q {','.join(get_queue_names())}"
+        if queue not in QUEUES:
+            raise CommandError(f"Unknown queue '{queue}', expected one of {', '.join(QUEUES)}")
+        return f"-Q {','.join(get_queue_names(queue))} --concurrency {settings.CELERY_QUEUE_CONCURRENCY[queue]}"
+
+
+def _get_published_at(message):
+    """When the task was published, as recorded in its headers by ``config.celery_app``."""
+    if message is None:
+        return None
+    try:
+        return json.loads(message)["headers"].get("published_at")
+    except (ValueError, KeyError, AttributeError):
+        return None
@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Q
+
+from commcare_connect.opportunity.models import (
+    CompletedWork,
+    CompletedWorkVisitCount,
+    UserVisit,
+    VisitReviewStatus,
+    VisitValidationStatus,
+)
+
+COUNT_FIELDS = ["visit_count", "approved_count", "agreed_count", "rejected_count"]
+
+
+class Command(BaseCommand):
+    help = "Compares CompletedWorkVisitCount with counts recomputed from the visits, in batches of completed works"
+
+    def add_arguments(self, parser, *args, **kwargs):
+        parser.add_argument("--opp", type=int)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--fix", action="store_true", help="Overwrite counters that don't match the visits")
+
+    def handle(self, *args, **options):
+        completed_works = CompletedWork.objects.all()
+        if options.get("opp"):
+            completed_works = completed_works.filter(opportunity_access__opportunity=options["opp"])
+        bounds = completed_works.aggregate(start=Min("id"), end=Max("id"))
+        if bounds["start"] is None:
+            self.stdout.write("No completed works to check")
+            return
+
+        batch_size = options["batch_size"]
+        mismatched = 0
+        for start in range(bounds["start"], bounds["end"] + 1, batch_size):
+            ids = completed_works.filter(id__gte=start, id__lt=start + batch_size).values("id")
+            with transaction.atomic():
+                if options["fix"]:
+                    # Holds off visit writes so the recount and the counters can't drift apart while fixing.
+                    with connection.cursor() as cursor:
+                        cursor.execute("LOCK TABLE opportunity_uservisit IN SHARE MODE")
+                expected = _recount(ids)
+                actual = {
+                    (row["completed_work_id"], row["deliver_unit_id"]): row
+                    for row in CompletedWorkVisitCount.objects.filter(completed_work_id__in=ids).values(
+                        "completed_work_id", "deliver_unit_id", *COUNT_FIELDS
+                    )
+                }
+                stale = _diff(expected, actual)
+                for key in stale:
+                    self.stdout.write(f"Mismatch for completed work {key[0]}, deliver unit {key[1]}")
+                if options["fix"] and stale:
+                    _fix(expected, stale)
+            mismatched += len(stale)
+
+        if mismatched:
+            action = "Fixed" if options["fix"] else "Found"
+            self.stdout.write(self.style.WARNING(f"{action} {mismatched} mismatched counters"))
+        else:
+            self.stdout.write(self.style.SUCCESS("All counters match the visits"))
+
+
+def _recount(completed_work_ids):
+    approved = Q(status=VisitValidationStatus.approved)
+    rows = (
+        UserVisit.objects.filter(completed_work_id__in=completed_work_ids)
+        .values("completed_work_id", "deliver_unit_id")
+        .annotate(
+            visit_count=Count("id"),
+            approved_count=Count("id", filter=approved),
+            agreed_count=Count("id", filter=approved & Q(review_status=VisitReviewStatus.agree)),
+            rejected_count=Count("id", filter=Q(status=VisitValidationStatus.rejected)),
+        )
+        .order_by()
+    )
+    return {(row["completed_work_id"], row["deliver_unit_id"]): row for row in rows}
+
+
+def _diff(expected, actual):
+    stale = []
+    for key in expected.keys() | actual.keys():
+        expected_counts = [expected[key][field] if key in expected else 0 for field in COUNT_FIELDS]
+        actual_counts = [actual[key][field] if key in actual else 0 for field in COUNT_FIELDS]
+        if expected_counts != actual_counts:
+            stale.append(key)
+    return sorted(stale)
+
+
+def _fix(expected, stale):
+    CompletedWorkVisitCount.objects.bulk_create(
+        [
+            CompletedWorkVisitCount(
+                completed_work_id=key[0],
+                deliver_unit_id=key[1],
+                **{field: expected[key][field] if key in expected else 0 for field in COUNT_FIELDS},
+            )
+            for key in stale
+        ],
+        update_conflicts=True,
+        unique_fields=["completed_work", "deliver_unit"],
+        update_fields=COUNT_FIELDS,
+    )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from commcare_connect.opportunity.models import CommCareApp, Opportunity
+from commcare_connect.opportunity.utils.form_json_keys import refresh_form_json_keys
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the form_json key catalog of deliver apps from their visits"
+
+    def add_arguments(self, parser, *args, **kwargs):
+        parser.add_argument("--opp", type=int, help="Only the deliver app of this opportunity")
+        parser.add_argument("--missing", action="store_true", help="Only apps whose catalog was never rebuilt")
+
+    def handle(self, *args, **options):
+        opportunities = Opportunity.objects.filter(deliver_app__isnull=False)
+        if options.get("opp"):
+            opportunities = opportunities.filter(id=options["opp"])
+        apps = CommCareApp.objects.filter(id__in=opportunities.values("deliver_app")).order_by("id")
+        if options["missing"]:
+            apps = apps.filter(form_json_keys_refreshed__isnull=True)
+
+        for app in apps:
+            refresh_form_json_keys(app)
+            self.stdout.write(f"Refreshed form_json keys for app {app.id} ({app.name})")
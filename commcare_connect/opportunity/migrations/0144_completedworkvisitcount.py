@@ -0,0 +1,124 @@
+# Generated by Django 5.2 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Keeps opportunity_completedworkvisitcount in step with opportunity_uservisit. Rows are only
+# ever adjusted by the change a visit write makes, so concurrent writes to different visits of
+# the same completed work serialize on the counter row instead of recounting.
+CREATE_TRIGGERS = """
+CREATE FUNCTION opportunity_uservisit_visit_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.completed_work_id IS NOT NULL THEN
+        UPDATE opportunity_completedworkvisitcount
+        SET visit_count = visit_count - 1,
+            approved_count = approved_count - (OLD.status = 'approved')::int,
+            agreed_count = agreed_count - (OLD.status = 'approved' AND OLD.review_status = 'agree')::int,
+            rejected_count = rejected_count - (OLD.status = 'rejected')::int
+        WHERE completed_work_id = OLD.completed_work_id AND deliver_unit_id = OLD.deliver_unit_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.completed_work_id IS NOT NULL THEN
+        INSERT INTO opportunity_completedworkvisitcount AS counts (
+            completed_work_id, deliver_unit_id, visit_count, approved_count, agreed_count, rejected_count
+        )
+        VALUES (
+            NEW.completed_work_id,
+            NEW.deliver_unit_id,
+            1,
+            (NEW.status = 'approved')::int,
+            (NEW.status = 'approved' AND NEW.review_status = 'agree')::int,
+            (NEW.status = 'rejected')::int
+        )
+        ON CONFLICT (completed_work_id, deliver_unit_id) DO UPDATE
+        SET visit_count = counts.visit_count + 1,
+            approved_count = counts.approved_count + EXCLUDED.approved_count,
+            agreed_count = counts.agreed_count + EXCLUDED.agreed_count,
+            rejected_count = counts.rejected_count + EXCLUDED.rejected_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER opportunity_uservisit_visit_counts_insert_delete
+AFTER INSERT OR DELETE ON opportunity_uservisit
+FOR EACH ROW EXECUTE FUNCTION opportunity_uservisit_visit_counts();
+
+CREATE TRIGGER opportunity_uservisit_visit_counts_update
+AFTER UPDATE OF completed_work_id, deliver_unit_id, status, review_status ON opportunity_uservisit
+FOR EACH ROW
+WHEN (
+    OLD.completed_work_id IS DISTINCT FROM NEW.completed_work_id
+    OR OLD.deliver_unit_id IS DISTINCT FROM NEW.deliver_unit_id
+    OR OLD.status IS DISTINCT FROM NEW.status
+    OR OLD.review_status IS DISTINCT FROM NEW.review_status
+)
+EXECUTE FUNCTION opportunity_uservisit_visit_counts();
+"""
+
+# Runs in the same transaction as CREATE_TRIGGERS, whose lock on opportunity_uservisit keeps
+# visits from changing between the two.
+BACKFILL_COUNTS = """
+INSERT INTO opportunity_completedworkvisitcount (
+    completed_work_id, deliver_unit_id, visit_count, approved_count, agreed_count, rejected_count
+)
+SELECT
+    completed_work_id,
+    deliver_unit_id,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE status = 'approved'),
+    COUNT(*) FILTER (WHERE status = 'approved' AND review_status = 'agree'),
+    COUNT(*) FILTER (WHERE status = 'rejected')
+FROM opportunity_uservisit
+WHERE completed_work_id IS NOT NULL
+GROUP BY completed_work_id, deliver_unit_id;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS opportunity_uservisit_visit_counts_update ON opportunity_uservisit;
+DROP TRIGGER IF EXISTS opportunity_uservisit_visit_counts_insert_delete ON opportunity_uservisit;
+DROP FUNCTION IF EXISTS opportunity_uservisit_visit_counts();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0143_uservisit_location_point"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompletedWorkVisitCount",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("visit_count", models.IntegerField(default=0)),
+                ("approved_count", models.IntegerField(default=0, help_text="Visits with the approved status")),
+                (
+                    "agreed_count",
+                    models.IntegerField(default=0, help_text="Approved visits whose review status is agree"),
+                ),
+                ("rejected_count", models.IntegerField(default=0)),
+                (
+                    "completed_work",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visit_counts",
+                        to="opportunity.completedwork",
+                    ),
+                ),
+                (
+                    "deliver_unit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="opportunity.deliverunit"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("completed_work", "deliver_unit"), name="unique_completed_work_deliver_unit_count"
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS + BACKFILL_COUNTS, DROP_TRIGGERS),
+    ]
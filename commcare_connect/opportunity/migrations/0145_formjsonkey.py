@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 11:20
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0144_completedworkvisitcount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="commcareapp",
+            name="form_json_keys_refreshed",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When FormJsonKey was last rebuilt from all of the app's visits. Until then it may be incomplete.",
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="FormJsonKey",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("app_build_version", models.IntegerField(blank=True, null=True)),
+                (
+                    "path",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(),
+                        help_text="Keys from the form_json root, with list indexes as strings",
+                        size=None,
+                    ),
+                ),
+                (
+                    "value_types",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=16),
+                        default=list,
+                        help_text="JSON types observed, as named by jsonb_typeof",
+                        size=None,
+                    ),
+                ),
+                ("visit_count", models.IntegerField(default=0, help_text="Visits whose form_json has the key")),
+                ("date_modified", models.DateTimeField(auto_now=True)),
+                (
+                    "app",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="form_json_keys",
+                        to="opportunity.commcareapp",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("app", "app_build_version", "path"),
+                        name="unique_form_json_key",
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+    ]
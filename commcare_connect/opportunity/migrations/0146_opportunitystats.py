@@ -0,0 +1,107 @@
+# Generated by Django 5.2 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+RECONCILE_TASK = "commcare_connect.opportunity.tasks.reconcile_opportunity_stats"
+
+
+def create_periodic_tasks(apps, schema_editor):
+    # Active opportunities every 15 minutes; all of them just after midnight, when the inactive
+    # worker cutoff moves.
+    for name, minute, hour, kwargs in [
+        ("reconcile_active_opportunity_stats", "*/15", "*", '{"active_only": true}'),
+        ("reconcile_all_opportunity_stats", "5", "0", "{}"),
+    ]:
+        schedule, _ = CrontabSchedule.objects.get_or_create(
+            minute=minute,
+            hour=hour,
+            day_of_week="*",
+            day_of_month="*",
+            month_of_year="*",
+        )
+        PeriodicTask.objects.update_or_create(
+            name=name,
+            defaults={"crontab": schedule, "task": RECONCILE_TASK, "kwargs": kwargs},
+        )
+
+
+def delete_periodic_tasks(apps, schema_editor):
+    PeriodicTask.objects.filter(task=RECONCILE_TASK).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0145_formjsonkey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OpportunityStats",
+            fields=[
+                (
+                    "opportunity",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="opportunity.opportunity",
+                    ),
+                ),
+                ("total_deliveries", models.IntegerField(default=0, help_text="Completed works, in any status")),
+                ("approved_deliveries", models.IntegerField(default=0)),
+                ("rejected_deliveries", models.IntegerField(default=0)),
+                ("most_recent_delivery", models.DateTimeField(null=True)),
+                ("started_deliveries", models.IntegerField(default=0, help_text="Workers with at least one visit")),
+                ("total_accrued", models.BigIntegerField(default=0)),
+                ("total_paid", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("recent_payment", models.DateTimeField(null=True)),
+                (
+                    "workers_invited",
+                    models.IntegerField(default=0, help_text="Invites to phone numbers that have a ConnectID"),
+                ),
+                ("pending_invites", models.IntegerField(default=0, help_text="Invites that have not been accepted")),
+                ("started_learning", models.IntegerField(default=0)),
+                ("completed_learning", models.IntegerField(default=0)),
+                (
+                    "completed_assessments",
+                    models.IntegerField(default=0, help_text="Workers that passed an assessment"),
+                ),
+                ("claimed_job", models.IntegerField(default=0)),
+                (
+                    "inactive_workers",
+                    models.IntegerField(default=0, help_text="Workers not active in the 3 days before reconciling"),
+                ),
+                ("active_tasks", models.IntegerField(default=0)),
+                ("date_reconciled", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="OpportunityDailyStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("deliveries", models.IntegerField(default=0, help_text="Visits with this visit date")),
+                (
+                    "accrued",
+                    models.BigIntegerField(default=0, help_text="Accrual of the work approved on this date"),
+                ),
+                (
+                    "opportunity",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="opportunity.opportunity",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("opportunity", "date"), name="unique_opportunity_daily_stats")
+                ],
+            },
+        ),
+        migrations.RunPython(create_periodic_tasks, delete_periodic_tasks, hints={"run_on_secondary": False}),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0146_opportunitystats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opportunityaccess",
+            name="learn_modules_completed",
+            field=models.IntegerField(default=0, help_text="Distinct learn modules completed"),
+        ),
+        migrations.AddField(
+            model_name="opportunityaccess",
+            name="learn_progress",
+            field=models.FloatField(default=0, help_text="Percentage of the learn app's modules completed"),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Keeps opportunity_visitlimitcount in step with opportunity_uservisit, in the same way as the
+# opportunity_uservisit_visit_counts triggers. Visits over the limit or made during the trial
+# don't count towards the limits and are left out.
+CREATE_TRIGGERS = """
+CREATE FUNCTION opportunity_uservisit_limit_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE')
+        AND OLD.opportunity_access_id IS NOT NULL
+        AND OLD.status NOT IN ('over_limit', 'trial') THEN
+        UPDATE opportunity_visitlimitcount
+        SET visit_count = visit_count - 1
+        WHERE opportunity_access_id = OLD.opportunity_access_id
+            AND deliver_unit_id = OLD.deliver_unit_id
+            AND date = (OLD.visit_date AT TIME ZONE 'UTC')::date;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE')
+        AND NEW.opportunity_access_id IS NOT NULL
+        AND NEW.status NOT IN ('over_limit', 'trial') THEN
+        INSERT INTO opportunity_visitlimitcount AS counts (opportunity_access_id, deliver_unit_id, date, visit_count)
+        VALUES (NEW.opportunity_access_id, NEW.deliver_unit_id, (NEW.visit_date AT TIME ZONE 'UTC')::date, 1)
+        ON CONFLICT (opportunity_access_id, deliver_unit_id, date) DO UPDATE
+        SET visit_count = counts.visit_count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER opportunity_uservisit_limit_counts_insert_delete
+AFTER INSERT OR DELETE ON opportunity_uservisit
+FOR EACH ROW EXECUTE FUNCTION opportunity_uservisit_limit_counts();
+
+CREATE TRIGGER opportunity_uservisit_limit_counts_update
+AFTER UPDATE OF opportunity_access_id, deliver_unit_id, visit_date, status ON opportunity_uservisit
+FOR EACH ROW
+WHEN (
+    OLD.opportunity_access_id IS DISTINCT FROM NEW.opportunity_access_id
+    OR OLD.deliver_unit_id IS DISTINCT FROM NEW.deliver_unit_id
+    OR OLD.visit_date IS DISTINCT FROM NEW.visit_date
+    OR OLD.status IS DISTINCT FROM NEW.status
+)
+EXECUTE FUNCTION opportunity_uservisit_limit_counts();
+"""
+
+# Runs in the same transaction as CREATE_TRIGGERS, whose lock on opportunity_uservisit keeps
+# visits from changing between the two.
+BACKFILL_COUNTS = """
+INSERT INTO opportunity_visitlimitcount (opportunity_access_id, deliver_unit_id, date, visit_count)
+SELECT opportunity_access_id, deliver_unit_id, (visit_date AT TIME ZONE 'UTC')::date, COUNT(*)
+FROM opportunity_uservisit
+WHERE opportunity_access_id IS NOT NULL AND status NOT IN ('over_limit', 'trial')
+GROUP BY 1, 2, 3;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS opportunity_uservisit_limit_counts_update ON opportunity_uservisit;
+DROP TRIGGER IF EXISTS opportunity_uservisit_limit_counts_insert_delete ON opportunity_uservisit;
+DROP FUNCTION IF EXISTS opportunity_uservisit_limit_counts();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0147_opportunityaccess_learn_progress"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VisitLimitCount",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("visit_count", models.IntegerField(default=0)),
+                (
+                    "deliver_unit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="opportunity.deliverunit"
+                    ),
+                ),
+                (
+                    "opportunity_access",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visit_limit_counts",
+                        to="opportunity.opportunityaccess",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("opportunity_access", "deliver_unit", "date"), name="unique_visit_limit_count"
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS + BACKFILL_COUNTS, DROP_TRIGGERS),
+    ]
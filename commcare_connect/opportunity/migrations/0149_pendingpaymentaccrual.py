@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-18 16:10
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+
+def create_process_pending_payment_accruals_periodic_task(apps, schema_editor):
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute="*/5",
+        hour="*",
+        day_of_week="*",
+        day_of_month="*",
+        month_of_year="*",
+    )
+    PeriodicTask.objects.update_or_create(
+        name="process_pending_payment_accruals",
+        defaults={
+            "crontab": schedule,
+            "task": "commcare_connect.opportunity.tasks.process_pending_payment_accruals",
+        },
+    )
+
+
+def delete_process_pending_payment_accruals_periodic_task(apps, schema_editor):
+    PeriodicTask.objects.filter(name="process_pending_payment_accruals").delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0148_visitlimitcount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingPaymentAccrual",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "completed_work_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(),
+                        default=list,
+                        help_text="Completed works to recalculate even if already approved",
+                        size=None,
+                    ),
+                ),
+                ("version", models.IntegerField(default=0)),
+                ("date_queued", models.DateTimeField(auto_now_add=True)),
+                (
+                    "opportunity_access",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE, to="opportunity.opportunityaccess"
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(
+            create_process_pending_payment_accruals_periodic_task,
+            delete_process_pending_payment_accruals_periodic_task,
+            hints={"run_on_secondary": False},
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-18 18:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Stamps every row written to the exported tables with the id of the writing transaction, so the
+# data export API can list the rows changed since a cursor. Existing rows keep row_version 0.
+CREATE_TRIGGERS = """
+CREATE FUNCTION opportunity_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.row_version := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER opportunity_uservisit_row_version
+BEFORE INSERT OR UPDATE ON opportunity_uservisit
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+
+CREATE TRIGGER opportunity_completedwork_row_version
+BEFORE INSERT OR UPDATE ON opportunity_completedwork
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+
+CREATE TRIGGER opportunity_payment_row_version
+BEFORE INSERT OR UPDATE ON opportunity_payment
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS opportunity_payment_row_version ON opportunity_payment;
+DROP TRIGGER IF EXISTS opportunity_completedwork_row_version ON opportunity_completedwork;
+DROP TRIGGER IF EXISTS opportunity_uservisit_row_version ON opportunity_uservisit;
+DROP FUNCTION IF EXISTS opportunity_row_version();
+"""
+
+
+class Migration(migrations.Migration):
+    # The indexes are built concurrently so the tables stay writable.
+    atomic = False
+
+    dependencies = [
+        ("opportunity", "0149_pendingpaymentaccrual"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uservisit",
+            name="row_version",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="completedwork",
+            name="row_version",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="row_version",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+        AddIndexConcurrently(
+            model_name="uservisit",
+            index=models.Index(fields=["opportunity", "row_version", "id"], name="opportunity_opportu_5302b2_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="completedwork",
+            index=models.Index(fields=["opportunity_access", "row_version"], name="opportunity_opportu_99d7bc_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="payment",
+            index=models.Index(fields=["row_version"], name="opportunity_row_ver_fdd7f7_idx"),
+        ),
+    ]
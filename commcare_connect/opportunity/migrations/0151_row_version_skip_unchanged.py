@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 20:10
+
+from django.db import migrations
+
+TABLES = ["opportunity_uservisit", "opportunity_completedwork", "opportunity_payment"]
+
+# Updates that leave a row as it was, like the periodic payment accrual recalculation does for
+# most completed works, keep its row_version so the change feed doesn't list the row again.
+CREATE_TRIGGERS = "".join(
+    f"""
+DROP TRIGGER IF EXISTS {table}_row_version ON {table};
+
+CREATE TRIGGER {table}_row_version_insert
+BEFORE INSERT ON {table}
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+
+CREATE TRIGGER {table}_row_version_update
+BEFORE UPDATE ON {table}
+FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION opportunity_row_version();
+"""
+    for table in TABLES
+)
+
+DROP_TRIGGERS = "".join(
+    f"""
+DROP TRIGGER IF EXISTS {table}_row_version_update ON {table};
+DROP TRIGGER IF EXISTS {table}_row_version_insert ON {table};
+
+CREATE TRIGGER {table}_row_version
+BEFORE INSERT OR UPDATE ON {table}
+FOR EACH ROW EXECUTE FUNCTION opportunity_row_version();
+"""
+    for table in TABLES
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0150_row_version"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0151_row_version_skip_unchanged"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="opportunitystats",
+            name="date_reconciled",
+            field=models.DateTimeField(help_text="Unset until the stats are first computed", null=True),
+        ),
+    ]
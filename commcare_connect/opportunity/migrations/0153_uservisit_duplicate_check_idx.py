@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 22:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The index is built concurrently so the table stays writable.
+    atomic = False
+
+    dependencies = [
+        ("opportunity", "0152_alter_opportunitystats_date_reconciled"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="uservisit",
+            index=models.Index(
+                condition=models.Q(("status__in", ["over_limit", "trial"]), _negated=True),
+                fields=["opportunity_access", "deliver_unit", "entity_id"],
+                name="uservisit_duplicate_check_idx",
+            ),
+        ),
+    ]
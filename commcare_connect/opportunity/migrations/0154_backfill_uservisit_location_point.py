@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 22:30
+
+from django.db import migrations
+
+from commcare_connect.opportunity.management.commands.backfill_user_visit_location_points import (
+    backfill_location_points,
+)
+
+
+def backfill(apps, schema_editor):
+    backfill_location_points()
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own, so the visits are never locked for the whole backfill.
+    atomic = False
+
+    dependencies = [
+        ("opportunity", "0153_uservisit_duplicate_check_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, hints={"run_on_secondary": False}),
+    ]
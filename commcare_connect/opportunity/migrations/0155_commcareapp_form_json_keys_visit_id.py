@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 23:10
+
+from django.db import migrations, models
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+REFRESH_TASK = "commcare_connect.opportunity.tasks.refresh_form_json_key_catalogs"
+
+
+def create_periodic_task(apps, schema_editor):
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute="30",
+        hour="1",
+        day_of_week="*",
+        day_of_month="*",
+        month_of_year="*",
+    )
+    PeriodicTask.objects.update_or_create(
+        name="refresh_form_json_key_catalogs",
+        defaults={"crontab": schedule, "task": REFRESH_TASK},
+    )
+
+
+def delete_periodic_task(apps, schema_editor):
+    PeriodicTask.objects.filter(task=REFRESH_TASK).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0154_backfill_uservisit_location_point"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="commcareapp",
+            name="form_json_keys_visit_id",
+            field=models.BigIntegerField(
+                blank=True,
+                help_text="The last of the app's visits when FormJsonKey was last rebuilt. Later visits' keys may be missing.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(create_periodic_task, delete_periodic_task, hints={"run_on_secondary": False}),
+    ]
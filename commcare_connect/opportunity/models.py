@@ -6,6 +6,8 @@ from decimal import Decimal
 from uuid import uuid4
 
 import pghistory
+from django.contrib.gis.db.models import PointField
+from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import IntegrityError, models, transaction
@@ -39,6 +41,16 @@ class CommCareApp(BaseModel):
     description = models.TextField()
     passing_score = models.IntegerField(null=True)
     hq_server = models.ForeignKey(HQServer, on_delete=models.DO_NOTHING, null=True)
+    form_json_keys_refreshed = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When FormJsonKey was last rebuilt from all of the app's visits. Until then it may be incomplete.",
+    )
+    form_json_keys_visit_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="The last of the app's visits when FormJsonKey was last rebuilt. Later visits' keys may be missing.",
+    )
 
     def __str__(self):
         return self.name
@@ -356,6 +368,8 @@ class OpportunityAccess(models.Model):
     invited_date = models.DateTimeField(auto_now_add=True, editable=False, null=True)
     completed_learn_date = models.DateTimeField(null=True)
     last_active = models.DateTimeField(null=True)
+    learn_modules_completed = models.IntegerField(default=0, help_text="Distinct learn modules completed")
+    learn_progress = models.FloatField(default=0, help_text="Percentage of the learn app's modules completed")
 
     class Meta:
         indexes = [
@@ -364,17 +378,6 @@ class OpportunityAccess(models.Model):
         ]
         unique_together = ("user", "opportunity")
 
-    # TODO: Convert to a field and calculate this property CompletedModule is saved
-    @property
-    def learn_progress(self):
-        learn_modules = LearnModule.objects.filter(app=self.opportunity.learn_app)
-        learn_modules_count = learn_modules.count()
-        if learn_modules_count <= 0:
-            return 0
-        completed_modules = self.unique_completed_modules.count()
-        percentage = (completed_modules / learn_modules_count) * 100
-        return round(percentage, 2)
-
     @property
     def visit_count(self):
         return (
@@ -509,6 +512,7 @@ class AssignedTask(XFormBaseModel):
     def assign(cls, *, task_type, opportunity_access, due_date, assigned_by=None) -> AssignedTask:
         from commcare_connect.commcarehq.api import bulk_update_usercases
         from commcare_connect.opportunity.tasks import send_task_assignment_notification
+        from commcare_connect.opportunity.utils.opportunity_stats import adjust_opportunity_stats
 
         with transaction.atomic():
             try:
@@ -521,6 +525,7 @@ class AssignedTask(XFormBaseModel):
                 )
             except IntegrityError:
                 raise TaskAlreadyAssignedError(f"Task type '{task_type}' could not be assigned.")
+            adjust_opportunity_stats(opportunity_access.opportunity_id, active_tasks=1)
 
             if task_type.mode == TaskTypeModeChoices.OCS:
                 assigned_task.trigger_ocs_bot(assigned_by)
@@ -553,6 +558,10 @@ class AssignedTask(XFormBaseModel):
     ):
         """Mark this task complete and notify the assignee."""
         from commcare_connect.opportunity.tasks import send_task_completion_notification
+        from commcare_connect.opportunity.utils.opportunity_stats import (
+            adjust_opportunity_stats,
+            last_active_stats_deltas,
+        )
 
         if self.status == AssignedTaskStatus.COMPLETED:
             return
@@ -576,15 +585,20 @@ class AssignedTask(XFormBaseModel):
         )
 
         access = self.opportunity_access
+        old_last_active = access.last_active
         if not access.last_active or access.last_active < self.completed_at:
             access.last_active = self.completed_at
             access.save(update_fields=["last_active"])
+        adjust_opportunity_stats(
+            access.opportunity_id, active_tasks=-1, **last_active_stats_deltas(old_last_active, access.last_active)
+        )
 
         transaction.on_commit(lambda: send_task_completion_notification.delay(self.pk))
 
     @classmethod
     def bulk_delete(cls, task_ids: list[int], opportunity: Opportunity) -> int:
         from commcare_connect.commcarehq.api import HQ_CASE_BULK_CHUNK_SIZE, bulk_update_usercases
+        from commcare_connect.opportunity.utils.opportunity_stats import adjust_opportunity_stats
 
         tasks = list(
             cls.objects.filter(
@@ -606,6 +620,7 @@ class AssignedTask(XFormBaseModel):
             deleted_count, _ = (
                 cls.objects.filter(pk__in=[t.pk for t in tasks]).exclude(status=AssignedTaskStatus.COMPLETED).delete()
             )
+            adjust_opportunity_stats(opportunity.id, active_tasks=-deleted_count)
             if hq_updates:
                 still_assigned = set(
                     cls.objects.filter(
@@ -804,6 +819,11 @@ class Payment(models.Model):
     invoice = models.OneToOneField(PaymentInvoice, on_delete=models.DO_NOTHING, null=True, blank=True)
     payment_method = models.CharField(max_length=50, null=True, blank=True)
     payment_operator = models.CharField(max_length=50, null=True, blank=True)
+    # Set by the opportunity_row_version database trigger, see ChangeFeedPagination.
+    row_version = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["row_version"])]
 
 
 class CompletedWorkStatus(models.TextChoices):
@@ -845,9 +865,12 @@ class CompletedWork(models.Model):
         max_digits=10, decimal_places=2, default=0, help_text=gettext_lazy("Payment accrued for the workspace in USD.")
     )
     invoice = models.ForeignKey(PaymentInvoice, on_delete=models.SET_NULL, null=True, blank=True)
+    # Set by the opportunity_row_version database trigger, see ChangeFeedPagination.
+    row_version = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ("opportunity_access", "entity_id", "payment_unit")
+        indexes = [models.Index(fields=["opportunity_access", "row_version"])]
 
     def __init__(self, *args, **kwargs):
         self.status = CompletedWorkStatus.incomplete
@@ -859,20 +882,18 @@ class CompletedWork(models.Model):
                 self.status_modified_date = now()
         super().__setattr__(name, value)
 
-    # TODO: add caching on this property
     @property
     def completed_count(self):
         """Returns the no of completion of this work. Includes duplicate submissions."""
-        visits = self.uservisit_set.values_list("deliver_unit_id", flat=True)
-        return self.calculate_completed(visits)
+        unit_counts = Counter(dict(self.visit_counts.values_list("deliver_unit_id", "visit_count")))
+        return self.calculate_completed(unit_counts)
 
     @property
     def approved_count(self):
-        qs = self.uservisit_set.filter(status=VisitValidationStatus.approved, review_status=VisitReviewStatus.agree)
-        visits = qs.values_list("deliver_unit_id", flat=True)
-        return self.calculate_completed(visits, approved=True)
+        unit_counts = Counter(dict(self.visit_counts.values_list("deliver_unit_id", "agreed_count")))
+        return self.calculate_completed(unit_counts, approved=True)
 
-    def calculate_completed(self, visits, approved=False):
+    def calculate_completed(self, unit_counts: Counter, approved=False):
         """Count completed deliveries for this entity by taking the minimum across required deliver units.
 
         A delivery is "complete" when all required deliver unit forms have been submitted.
@@ -880,7 +901,6 @@ class CompletedWork(models.Model):
         total of optional units if any exist, and further constrained by child payment
         unit completion counts.
         """
-        unit_counts = Counter(visits)
         deliver_units = self.payment_unit.deliver_units.values("id", "optional")
         required_deliver_units = list(
             du["id"] for du in filter(lambda du: not du.get("optional", False), deliver_units)
@@ -970,6 +990,8 @@ class UserVisit(XFormBaseModel):
     form_json = models.JSONField()
     reason = models.CharField(max_length=300, null=True, blank=True)
     location = models.CharField(null=True)
+    # Parsed from ``location`` so proximity checks and map tiles can use the spatial index.
+    location_point = PointField(srid=4326, null=True, blank=True)
     flagged = models.BooleanField(default=False)
     flag_reason = models.JSONField(null=True, blank=True)
     completed_work = models.ForeignKey(CompletedWork, on_delete=models.DO_NOTHING, null=True, blank=True)
@@ -987,6 +1009,9 @@ class UserVisit(XFormBaseModel):
     review_created_on = models.DateTimeField(blank=True, null=True)
     justification = models.CharField(max_length=300, null=True, blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
+    # Id of the transaction that last wrote the visit, set by the opportunity_row_version
+    # database trigger. Lets exports list the visits changed since a cursor, see ChangeFeedPagination.
+    row_version = models.BigIntegerField(default=0, editable=False)
 
     def __init__(self, *args, **kwargs):
         self.status = VisitValidationStatus.pending
@@ -1009,8 +1034,13 @@ class UserVisit(XFormBaseModel):
     @property
     def duration(self):
         duration = None
-        start = self.form_json["metadata"].get("timeStart")
-        end = self.form_json["metadata"].get("timeEnd")
+        # Querysets that defer form_json annotate its metadata instead, see UserVisitExporter.
+        if hasattr(self, "form_json_metadata"):
+            metadata = self.form_json_metadata or {}
+        else:
+            metadata = self.form_json["metadata"]
+        start = metadata.get("timeStart")
+        end = metadata.get("timeEnd")
         if start and end:
             try:
                 duration = parse_datetime(end) - parse_datetime(start)
@@ -1041,9 +1071,121 @@ class UserVisit(XFormBaseModel):
         ]
         indexes = [
             models.Index(fields=["opportunity", "status"]),
+            models.Index(fields=["opportunity", "row_version", "id"]),
+            # The form processor's duplicate visit check, see VISIT_LIMIT_COUNTS_SQL.
+            models.Index(
+                fields=["opportunity_access", "deliver_unit", "entity_id"],
+                condition=~Q(status__in=[VisitValidationStatus.over_limit, VisitValidationStatus.trial]),
+                name="uservisit_duplicate_check_idx",
+            ),
+        ]
+
+
+class CompletedWorkVisitCount(models.Model):
+    """Running counts of the visits of a CompletedWork for one of its deliver units.
+
+    The counts are maintained by the ``opportunity_uservisit_visit_counts`` database triggers
+    whenever a visit is created or deleted, or its completed work, deliver unit, status or review
+    status changes, including through bulk and queryset updates. The
+    ``reconcile_completed_work_visit_counts`` command checks them against the visits.
+    """
+
+    completed_work = models.ForeignKey(CompletedWork, on_delete=models.CASCADE, related_name="visit_counts")
+    deliver_unit = models.ForeignKey(DeliverUnit, on_delete=models.CASCADE)
+    visit_count = models.IntegerField(default=0)
+    approved_count = models.IntegerField(default=0, help_text="Visits with the approved status")
+    agreed_count = models.IntegerField(default=0, help_text="Approved visits whose review status is agree")
+    rejected_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["completed_work", "deliver_unit"], name="unique_completed_work_deliver_unit_count"
+            )
+        ]
+
+
+class VisitLimitCount(models.Model):
+    """Running count of a worker's visits for a deliver unit on one day, for the visit limit checks.
+
+    Only visits that count towards the limits are included, i.e. not those over the limit or made
+    during the trial period. The ``opportunity_uservisit_limit_counts`` database triggers maintain
+    the counts whenever a visit is created or deleted, or its access, deliver unit, visit date or
+    status changes. Days are UTC dates of the visit date.
+    """
+
+    opportunity_access = models.ForeignKey(
+        OpportunityAccess, on_delete=models.CASCADE, related_name="visit_limit_counts"
+    )
+    deliver_unit = models.ForeignKey(DeliverUnit, on_delete=models.CASCADE)
+    date = models.DateField()
+    visit_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["opportunity_access", "deliver_unit", "date"], name="unique_visit_limit_count"
+            )
         ]
 
 
+class PendingPaymentAccrual(models.Model):
+    """An access whose payment accrual is due to be recalculated after new deliveries.
+
+    The form receiver queues one entry per access, merging the completed works of later
+    submissions into it until ``process_payment_accrual`` recalculates them and removes it.
+    ``version`` is bumped on every merge so the entry is only removed if nothing was queued
+    during the recalculation.
+    """
+
+    opportunity_access = models.OneToOneField(OpportunityAccess, on_delete=models.CASCADE)
+    completed_work_ids = ArrayField(
+        models.IntegerField(), default=list, help_text="Completed works to recalculate even if already approved"
+    )
+    version = models.IntegerField(default=0)
+    date_queued = models.DateTimeField(auto_now_add=True)
+
+
+class OpportunityStats(models.Model):
+    """Rollup of the figures shown on an opportunity's dashboard.
+
+    The form receiver, accrual, payment, invite and task paths adjust the counts they affect once
+    their transaction commits; everything else, and any drift, is recomputed by
+    ``reconcile_opportunity_stats``. See ``opportunity.utils.opportunity_stats``.
+    """
+
+    opportunity = models.OneToOneField(Opportunity, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    total_deliveries = models.IntegerField(default=0, help_text="Completed works, in any status")
+    approved_deliveries = models.IntegerField(default=0)
+    rejected_deliveries = models.IntegerField(default=0)
+    most_recent_delivery = models.DateTimeField(null=True)
+    started_deliveries = models.IntegerField(default=0, help_text="Workers with at least one visit")
+    total_accrued = models.BigIntegerField(default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    recent_payment = models.DateTimeField(null=True)
+    workers_invited = models.IntegerField(default=0, help_text="Invites to phone numbers that have a ConnectID")
+    pending_invites = models.IntegerField(default=0, help_text="Invites that have not been accepted")
+    started_learning = models.IntegerField(default=0)
+    completed_learning = models.IntegerField(default=0)
+    completed_assessments = models.IntegerField(default=0, help_text="Workers that passed an assessment")
+    claimed_job = models.IntegerField(default=0)
+    inactive_workers = models.IntegerField(default=0, help_text="Workers not active in the 3 days before reconciling")
+    active_tasks = models.IntegerField(default=0)
+    date_reconciled = models.DateTimeField(null=True, help_text="Unset until the stats are first computed")
+
+
+class OpportunityDailyStats(models.Model):
+    """Deliveries and approved accrual of an opportunity by UTC day, for recent days only."""
+
+    opportunity = models.ForeignKey(Opportunity, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+    deliveries = models.IntegerField(default=0, help_text="Visits with this visit date")
+    accrued = models.BigIntegerField(default=0, help_text="Accrual of the work approved on this date")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["opportunity", "date"], name="unique_opportunity_daily_stats")]
+
+
 class OpportunityClaim(models.Model):
     opportunity_access = models.OneToOneField(OpportunityAccess, on_delete=models.CASCADE)
     # to be removed
@@ -1169,6 +1311,30 @@ class FormJsonValidationRules(models.Model):
         super().save(*args, **kwargs)
 
 
+class FormJsonKey(models.Model):
+    """A leaf key path observed in the form_json of visits from one build of a deliver app."""
+
+    app = models.ForeignKey(CommCareApp, on_delete=models.CASCADE, related_name="form_json_keys")
+    app_build_version = models.IntegerField(null=True, blank=True)
+    path = ArrayField(models.TextField(), help_text="Keys from the form_json root, with list indexes as strings")
+    value_types = ArrayField(
+        models.CharField(max_length=16), default=list, help_text="JSON types observed, as named by jsonb_typeof"
+    )
+    visit_count = models.IntegerField(default=0, help_text="Visits whose form_json has the key")
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["app", "app_build_version", "path"], name="unique_form_json_key", nulls_distinct=False
+            )
+        ]
+
+    @property
+    def dotted_path(self):
+        return ".".join(self.path)
+
+
 class DeliverUnitFlagRules(models.Model):
     deliver_unit = models.ForeignKey(DeliverUnit, on_delete=models.CASCADE)
     opportunity = models.ForeignKey(Opportunity, on_delete=models.CASCADE)
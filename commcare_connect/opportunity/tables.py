@@ -229,6 +229,8 @@ class CompletedWorkTable(tables.Table):
     display_name = columns.Column("Name of the User", accessor="opportunity_access__display_name")
     payment_unit = columns.Column("Payment Unit", accessor="payment_unit__name")
     status = columns.Column("Payment Approval")
+    completion_date = columns.Column(accessor="last_visit_date")
+    flags = columns.Column(accessor="flag_codes")
 
     class Meta:
         model = CompletedWork
@@ -256,7 +258,7 @@ class CompletedWorkTable(tables.Table):
         )
 
     def render_flags(self, record, value):
-        return ", ".join(value)
+        return ", ".join(sorted(set(value)))
 
     def render_completion_date(self, record, value):
         return date_with_time_popup(self, value)
@@ -1,5 +1,7 @@
 import datetime
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decimal import Decimal
 
 import httpx
@@ -9,11 +11,11 @@ from allauth.utils import build_absolute_uri
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.cache import cache
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from django.db import transaction
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, Max, OuterRef, Q, Subquery
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils.text import slugify
@@ -24,6 +26,7 @@ from tablib import Dataset
 from commcare_connect.cache import quickcache
 from commcare_connect.connect_id_client import fetch_users, send_message, send_message_bulk
 from commcare_connect.connect_id_client.models import ConnectIdUser, Message
+from commcare_connect.form_receiver.resolution import invalidate_resolution_caches
 from commcare_connect.microplanning.models import WorkAreaInaccessibilityRequest
 from commcare_connect.opportunity.app_xml import get_connect_blocks_for_app, get_deliver_units_for_app
 from commcare_connect.opportunity.deletion import delete_opportunity
@@ -41,6 +44,8 @@ from commcare_connect.opportunity.models import (
     AssignedTask,
     AudioAttachment,
     BlobMeta,
+    CommCareApp,
+    CompletedModule,
     CompletedWorkStatus,
     DeliverUnit,
     ExchangeRate,
@@ -62,12 +67,26 @@ from commcare_connect.opportunity.utils.completed_work import (
     link_invoice_to_completed_works,
     update_status,
 )
+from commcare_connect.opportunity.utils.form_json_keys import (
+    get_uncatalogued_visits,
+    record_form_json_keys,
+    refresh_form_json_keys,
+)
 from commcare_connect.opportunity.utils.invoice import generate_invoice_number, get_start_date_for_invoice
+from commcare_connect.opportunity.utils.learn_progress import update_app_learn_progress
+from commcare_connect.opportunity.utils.opportunity_stats import (
+    adjust_opportunity_stats,
+    invite_stats_deltas,
+)
+from commcare_connect.opportunity.utils.opportunity_stats import reconcile_opportunity_stats as reconcile_stats
+from commcare_connect.opportunity.utils.payment_accrual import lock_completed_work, recompute_payment_accrual
+from commcare_connect.opportunity.utils.payment_accrual_queue import drain_payment_accrual, get_stale_payment_accruals
 from commcare_connect.users.models import User
 from commcare_connect.users.user_credentials import UserCredentialIssuer
 from commcare_connect.utils.analytics import Event, GATrackingInfo, _serialize_events, send_event_task
 from commcare_connect.utils.celery import set_task_progress
 from commcare_connect.utils.datetime import get_end_date_previous_month, is_date_before
+from commcare_connect.utils.itertools import batched
 from commcare_connect.utils.sms import send_sms
 from config import celery_app
 
@@ -75,6 +94,8 @@ logger = logging.getLogger(__name__)
 
 OPPORTUNITY_AUTO_DEACTIVATION_DAYS = 30
 OPPORTUNITY_AUTO_ARCHIVE_DAYS = 30
+RECONCILE_STATS_BATCH_SIZE = 100
+NOTIFICATION_BATCH_SIZE = 500
 SYSTEM = "system"
 
 
@@ -85,8 +106,9 @@ def sync_learn_modules_and_deliver_units(opportunity):
     learn_app_connect_blocks = get_connect_blocks_for_app(learn_app)
     deliver_app_connect_blocks = get_deliver_units_for_app(deliver_app)
 
+    new_learn_modules = False
     for block in learn_app_connect_blocks:
-        LearnModule.objects.update_or_create(
+        _, created = LearnModule.objects.update_or_create(
             app=learn_app,
             slug=block.id,
             defaults={
@@ -95,6 +117,9 @@ def sync_learn_modules_and_deliver_units(opportunity):
                 "time_estimate": block.time_estimate,
             },
         )
+        new_learn_modules = new_learn_modules or created
+    if new_learn_modules:
+        update_app_learn_progress(learn_app.id)
 
     for block in deliver_app_connect_blocks:
         DeliverUnit.objects.get_or_create(app=deliver_app, slug=block.id, defaults=dict(name=block.name))
@@ -129,11 +154,13 @@ def update_user_and_send_invite(user: ConnectIdUser, opp_id):
         username=user.username, defaults={"phone_number": user.phone_number, "name": user.name}
     )
     opportunity_access, _ = OpportunityAccess.objects.get_or_create(user=u, opportunity_id=opp_id)
-    UserInvite.objects.update_or_create(
+    invite, created = UserInvite.objects.update_or_create(
         opportunity_id=opp_id,
         phone_number=user.phone_number,
         defaults={"opportunity_access": opportunity_access},
     )
+    if created:
+        adjust_opportunity_stats(opp_id, **invite_stats_deltas(None, invite.status))
     invite_user.delay(u.pk, opportunity_access.pk)
 
 
@@ -147,13 +174,17 @@ def invite_user(user_id, opportunity_access_id):
     if not user.phone_number:
         return
     sms_status = send_sms(user.phone_number, body)
-    UserInvite.objects.update_or_create(
+    old_status = (
+        UserInvite.objects.filter(opportunity_access=opportunity_access).values_list("status", flat=True).first()
+    )
+    invite, _ = UserInvite.objects.update_or_create(
         opportunity_access=opportunity_access,
         defaults={
             "message_sid": sms_status.sid,
             "status": UserInviteStatus.accepted if opportunity_access.accepted else UserInviteStatus.invited,
         },
     )
+    adjust_opportunity_stats(invite.opportunity_id, **invite_stats_deltas(old_status, invite.status))
     message = Message(
         usernames=[user.username],
         data={
@@ -204,9 +235,10 @@ def generate_visit_export(
         f"Export for {opportunity.name} with date range from {from_date} to {to_date} and status {','.join(status)}"
     )
     exporter = UserVisitExporter(opportunity, flatten)
-    dataset = exporter.get_dataset(from_date, to_date, [VisitValidationStatus(s) for s in status])
     export_tmp_name = f"{now().isoformat()}_{slugify(opportunity.name)}_visit_export.{export_format}"
-    return save_export(dataset, export_tmp_name, export_format)
+    with tempfile.TemporaryFile() as export_file:
+        exporter.write(export_file, export_format, from_date, to_date, [VisitValidationStatus(s) for s in status])
+        return save_export_file(export_file, export_tmp_name)
 
 
 @celery_app.task()
@@ -254,18 +286,39 @@ def save_export(dataset: Dataset, file_name: str, export_format: str):
     return ExportS3Boto3Storage().save(file_name, ContentFile(content))
 
 
+def save_export_file(export_file, file_name: str):
+    """Upload an export that was written to a file without reading it back into memory."""
+    from commcare_connect.utils.storages import ExportS3Boto3Storage
+
+    export_file.seek(0)
+    return ExportS3Boto3Storage().save(file_name, File(export_file, name=file_name))
+
+
 @celery_app.task()
 def send_notification_inactive_users():
-    opportunity_accesses = OpportunityAccess.objects.filter(
-        opportunity__active=True,
-        opportunity__end_date__gte=datetime.date.today(),
-    ).select_related("opportunity")
-    messages = []
-    for access in opportunity_accesses:
-        message = _get_inactive_message(access)
-        if message:
-            messages.append(message)
-    send_message_bulk(messages)
+    today = now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def days_ago(days):
+        # The UTC day ``days`` before today, as checked by ``is_date_before``.
+        return (today - datetime.timedelta(days=days), today - datetime.timedelta(days=days - 1))
+
+    accesses = (
+        _annotate_inactivity(
+            OpportunityAccess.objects.filter(
+                opportunity__active=True,
+                opportunity__end_date__gte=datetime.date.today(),
+            )
+        )
+        .filter(
+            Q(has_claim=True, last_visit_date__range=days_ago(2))
+            | Q(has_claim=False, learn_progress=100)
+            | Q(has_claim=False, last_module_date__range=days_ago(3))
+        )
+        .select_related("opportunity", "user")
+    )
+    messages = (_get_inactive_message(access) for access in accesses.iterator(chunk_size=NOTIFICATION_BATCH_SIZE))
+    for batch in batched(filter(None, messages), NOTIFICATION_BATCH_SIZE):
+        send_message_bulk(list(batch))
 
 
 @celery_app.task()
@@ -275,7 +328,9 @@ def auto_deactivate_ended_opportunities():
 
     action = f"{__name__}.auto_deactivate_ended_opportunities"
     with pghistory.context(username=SYSTEM, action=action):
-        opportunities.update(active=False)
+        deactivated = opportunities.update(active=False)
+    if deactivated:
+        invalidate_resolution_caches()
 
 
 @celery_app.task()
@@ -284,22 +339,38 @@ def auto_archive_test_opportunities():
     Opportunity.objects.filter(is_test=True, archived=False, end_date__lte=cutoff).update(archived=True)
 
 
+def _annotate_inactivity(accesses):
+    """Annotate what ``_get_inactive_message`` needs to know about each access."""
+    return accesses.annotate(
+        has_claim=Exists(OpportunityClaim.objects.filter(opportunity_access=OuterRef("pk"))),
+        last_visit_date=Subquery(
+            UserVisit.objects.filter(opportunity_access=OuterRef("pk"))
+            .values("opportunity_access")
+            .annotate(latest=Max("visit_date"))
+            .values("latest")
+        ),
+        last_module_date=Subquery(
+            CompletedModule.objects.filter(opportunity_access=OuterRef("pk"))
+            .values("opportunity_access")
+            .annotate(latest=Max("date"))
+            .values("latest")
+        ),
+    )
+
+
 def _get_inactive_message(access: OpportunityAccess):
-    has_claimed_opportunity = OpportunityClaim.objects.filter(opportunity_access=access).exists()
-    if has_claimed_opportunity:
-        message = _check_deliver_inactive(access)
-    else:
-        # Send notification if user has completed learn modules and has not claimed the opportunity
-        if access.learn_progress == 100:
-            message = _get_deliver_message(access)
-        else:
-            message = _get_learn_message(access)
-    return message
+    if access.has_claim:
+        if access.last_visit_date and is_date_before(access.last_visit_date, days=2):
+            return _get_deliver_message(access)
+        return None
+    # Send notification if user has completed learn modules and has not claimed the opportunity
+    if access.learn_progress == 100:
+        return _get_deliver_message(access)
+    return _get_learn_message(access)
 
 
 def _get_learn_message(access: OpportunityAccess):
-    last_user_learn_module = access.completedmodule_set.order_by("date").last()
-    if last_user_learn_module and is_date_before(last_user_learn_module.date, days=3):
+    if access.last_module_date and is_date_before(access.last_module_date, days=3):
         return Message(
             usernames=[access.user.username],
             data={
@@ -315,12 +386,6 @@ def _get_learn_message(access: OpportunityAccess):
         )
 
 
-def _check_deliver_inactive(access: OpportunityAccess):
-    last_user_deliver_visit = access.uservisit_set.order_by("visit_date").last()
-    if last_user_deliver_visit and is_date_before(last_user_deliver_visit.visit_date, days=2):
-        return _get_deliver_message(access)
-
-
 def _get_deliver_message(access: OpportunityAccess):
     return Message(
         usernames=[access.user.username],
@@ -377,42 +442,100 @@ def send_push_notification_task(
 RETRYABLE_EXCS = (httpx.ReadTimeout, httpx.ConnectTimeout)
 
 
+ATTACHMENT_DOWNLOAD_CONCURRENCY = 4
+# Attachments are written to a temporary file once larger than this rather than held in memory.
+ATTACHMENT_SPOOL_MAX_SIZE = 1024 * 1024
+
+_hq_clients = {}
+
+
+def _get_hq_client(hq_server) -> httpx.Client:
+    """A client for ``hq_server`` whose connections are reused by every download in this process."""
+    client = _hq_clients.get(hq_server.url)
+    if client is None:
+        client = _hq_clients[hq_server.url] = httpx.Client(
+            base_url=hq_server.url,
+            limits=httpx.Limits(max_keepalive_connections=ATTACHMENT_DOWNLOAD_CONCURRENCY),
+        )
+    return client
+
+
 def _download_attachments(api_key, domain: str, xform_id: str, attachments: dict, user_visit=None):
+    """Download the form's attachments that aren't stored yet, ATTACHMENT_DOWNLOAD_CONCURRENCY at a time.
+
+    An attachment's record is only created once its content is saved, so a retry after a failed
+    download fetches just the attachments that are still missing.
+    """
+    pending = _get_pending_attachments(xform_id, attachments, user_visit)
+    if not pending:
+        return
+
+    client = _get_hq_client(api_key.hq_server)
+    headers = {"Authorization": f"ApiKey {api_key.user.email}:{api_key.api_key}"}
+    saved, error = [], None
+    with ThreadPoolExecutor(max_workers=min(ATTACHMENT_DOWNLOAD_CONCURRENCY, len(pending))) as executor:
+        futures = {
+            executor.submit(
+                _save_hq_attachment,
+                client,
+                f"/a/{domain}/api/form/attachment/{xform_id}/{attachment.name}",
+                headers,
+                attachment,
+            ): attachment
+            for attachment in pending
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                error = error or e
+            else:
+                saved.append(futures[future])
+
+    for model in (BlobMeta, AudioAttachment):
+        model.objects.bulk_create(
+            [attachment for attachment in saved if isinstance(attachment, model)], ignore_conflicts=True
+        )
+    if error is not None:
+        raise error
+
+
+def _get_pending_attachments(xform_id, attachments, user_visit=None):
+    """Unsaved ``BlobMeta`` or, for a visit's audio, ``AudioAttachment`` records of the attachments not stored yet."""
+    blobs, audio = {}, {}
     for name, blob in attachments.items():
         if name == "form.xml":
             continue
-        url = f"{api_key.hq_server.url}/a/{domain}/api/form/attachment/{xform_id}/{name}"
-        _save_attachment(api_key, url, name, blob, xform_id, user_visit)
-
-
-def _fetch_hq_attachment(api_key, url):
-    response = httpx.get(
-        url,
-        headers={"Authorization": f"ApiKey {api_key.user.email}:{api_key.api_key}"},
-    )
-    return response.content
+        content_type = blob.get("content_type") or ""
+        if user_visit is not None and content_type.startswith("audio/"):
+            audio[name] = AudioAttachment(
+                user_visit=user_visit, name=name, content_length=blob["length"], content_type=blob["content_type"]
+            )
+        else:
+            blobs[name] = BlobMeta(
+                parent_id=xform_id, name=name, content_length=blob["length"], content_type=blob["content_type"]
+            )
 
+    if blobs:
+        for name in BlobMeta.objects.filter(parent_id=xform_id, name__in=blobs).values_list("name", flat=True):
+            del blobs[name]
+    if audio:
+        for name in AudioAttachment.objects.filter(user_visit=user_visit, name__in=audio).values_list(
+            "name", flat=True
+        ):
+            del audio[name]
+    return [*blobs.values(), *audio.values()]
 
-def _save_attachment(api_key, url, name, blob, xform_id, user_visit=None):
-    content_type = blob.get("content_type") or ""
-    if user_visit is not None and content_type.startswith("audio/"):
-        model, lookup = AudioAttachment, {"user_visit": user_visit, "name": name}
-    else:
-        model, lookup = BlobMeta, {"parent_id": xform_id, "name": name}
 
-    with transaction.atomic():
-        obj, created = model.objects.get_or_create(
-            **lookup,
-            defaults={
-                "content_length": blob["length"],
-                "content_type": blob["content_type"],
-            },
-        )
-        if not created:
-            # attachment already exists
-            return
-        content = _fetch_hq_attachment(api_key, url)
-        default_storage.save(str(obj.blob_id), ContentFile(content, name))
+def _save_hq_attachment(client, url, headers, attachment):
+    with tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_MAX_SIZE) as content:
+        with client.stream("GET", url, headers=headers) as response:
+            # An error page must not be stored, or the attachment would count as downloaded.
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                content.write(chunk)
+        content.seek(0)
+        default_storage.save(str(attachment.blob_id), File(content, attachment.name))
 
 
 @celery_app.task(
@@ -448,6 +571,25 @@ def download_inaccessibility_request_attachments(self, xform_id: str, attachment
     _download_attachments(api_key, domain, xform_id, attachments)
 
 
+@celery_app.task()
+def record_visit_form_json_keys(app_id: int, xform_id: str):
+    """Add the keys of a deliver form's visits to the form_json key catalog of their app."""
+    visits = UserVisit.objects.filter(xform_id=xform_id, deliver_unit__app_id=app_id)
+    visit = visits.values("app_build_version", "form_json").first()
+    if visit is None:
+        return
+    record_form_json_keys(app_id, visit["app_build_version"], visit["form_json"], visit_count=visits.count())
+
+
+@celery_app.task()
+def refresh_form_json_key_catalogs():
+    """Rebuild the form_json key catalogs of the deliver apps with visits since their last rebuild."""
+    apps = CommCareApp.objects.filter(id__in=Opportunity.objects.values("deliver_app")).order_by("id")
+    for app in apps:
+        if get_uncatalogued_visits(app).exists():
+            refresh_form_json_keys(app)
+
+
 @celery_app.task()
 def generate_work_status_export(opportunity_id: int, export_format: str):
     opportunity = Opportunity.objects.get(id=opportunity_id)
@@ -458,15 +600,30 @@ def generate_work_status_export(opportunity_id: int, export_format: str):
 
 @celery_app.task()
 def bulk_approve_completed_work():
-    access_objects = OpportunityAccess.objects.filter(
-        opportunity__active=True,
-        opportunity__end_date__gte=datetime.date.today(),
-        opportunity__auto_approve_payments=True,
-        suspended=False,
-    )
-    for access in access_objects:
-        completed_works = access.completedwork_set.exclude(status=CompletedWorkStatus.rejected)
-        update_status(completed_works, access, compute_payment=True)
+    opportunities = Opportunity.objects.filter(
+        active=True,
+        end_date__gte=datetime.date.today(),
+        auto_approve_payments=True,
+    ).select_related("currency")
+    for opportunity in opportunities:
+        recompute_payment_accrual(opportunity, exclude_rejected=True)
+
+
+@celery_app.task()
+def reconcile_opportunity_stats(active_only=False):
+    """Recompute the dashboard stats of the opportunities that have them."""
+    opportunities = Opportunity.objects.filter(stats__isnull=False)
+    if active_only:
+        opportunities = opportunities.filter(active=True, end_date__gte=datetime.date.today())
+    opportunity_ids = list(opportunities.order_by("id").values_list("id", flat=True))
+    for batch in batched(opportunity_ids, RECONCILE_STATS_BATCH_SIZE):
+        reconcile_stats(batch)
+
+
+@celery_app.task()
+def build_opportunity_stats(opportunity_id):
+    """Compute the stats of an opportunity whose dashboard found none."""
+    reconcile_stats([opportunity_id])
 
 
 @celery_app.task()
@@ -571,13 +728,29 @@ def bulk_update_payment_accrued(opportunity_id, user_ids: list):
     """Updates payment accrued for completed and approved CompletedWork instances."""
     access_objects = OpportunityAccess.objects.filter(opportunity=opportunity_id, user__in=user_ids, suspended=False)
     for access in access_objects:
-        with cache.lock(f"update_payment_accrued_lock_{access.id}", timeout=900):
+        with cache.lock(f"update_payment_accrued_lock_{access.id}", timeout=900), transaction.atomic():
+            lock_completed_work(access)
             completed_works = access.completedwork_set.exclude(status=CompletedWorkStatus.rejected).select_related(
                 "payment_unit"
             )
             update_status(completed_works, access, compute_payment=True)
 
 
+@celery_app.task()
+def process_payment_accrual(access_id):
+    """Recalculate the payment accrual queued for an access by the form receiver."""
+    if not drain_payment_accrual(access_id):
+        # Deliveries queued during the recalculation were merged into the entry without a task.
+        process_payment_accrual.delay(access_id)
+
+
+@celery_app.task()
+def process_pending_payment_accruals():
+    """Periodic safety net for queued payment accruals whose task was lost, e.g. when a worker died."""
+    for access_id in get_stale_payment_accruals():
+        process_payment_accrual.delay(access_id)
+
+
 @quickcache(vary_on=["url"], timeout=60 * 60 * 24)
 def request_rates(url):
     response = httpx.get(url)
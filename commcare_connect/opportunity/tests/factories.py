@@ -1,5 +1,6 @@
 from datetime import date, timedelta, timezone
 
+from django.contrib.gis.geos import Point
 from factory import DictFactory, Faker, LazyAttribute, LazyFunction, SelfAttribute, SubFactory
 from factory.django import DjangoModelFactory
 
@@ -143,6 +144,11 @@ class UserVisitFactory(DjangoModelFactory):
     form_json = Faker("pydict", value_types=[str, int, float, bool])
     xform_id = Faker("uuid4")
     completed_work = SubFactory(CompletedWorkFactory)
+    location = None
+    # Parsed from ``location`` as the form receiver does.
+    location_point = LazyAttribute(
+        lambda o: Point(float(o.location.split()[1]), float(o.location.split()[0]), srid=4326) if o.location else None
+    )
 
     class Meta:
         model = "opportunity.UserVisit"
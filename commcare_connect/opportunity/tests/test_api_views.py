@@ -1,6 +1,8 @@
 import datetime
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
 from commcare_connect.opportunity.api.serializers.mobile import (
@@ -28,6 +30,8 @@ from commcare_connect.opportunity.tests.factories import (
     CompletedWorkFactory,
     LearnModuleFactory,
     OpportunityAccessFactory,
+    OpportunityClaimFactory,
+    OpportunityClaimLimitFactory,
     OpportunityFactory,
     PaymentUnitFactory,
     UserVisitFactory,
@@ -224,6 +228,49 @@ def test_opportunity_list_endpoint(
     assert all(all(field in unit for field in payment_unit_fields) for unit in payment_units)
 
 
+@pytest.mark.django_db
+def test_opportunity_list_endpoint_query_count(mobile_user_with_connect_link: User, api_client: APIClient):
+    api_client.force_authenticate(mobile_user_with_connect_link)
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get("/api/opportunity/")
+    assert len(response.data) == 1
+
+    for _ in range(3):
+        opportunity = OpportunityFactory()
+        payment_unit = PaymentUnitFactory(opportunity=opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity, user=mobile_user_with_connect_link)
+        claim = OpportunityClaimFactory(opportunity_access=access)
+        OpportunityClaimLimitFactory(opportunity_claim=claim, payment_unit=payment_unit)
+        LearnModuleFactory(app=opportunity.learn_app)
+        CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit, saved_completed_count=2)
+    with CaptureQueriesContext(connection) as more_queries:
+        response = api_client.get("/api/opportunity/")
+    assert len(response.data) == 4
+    assert len(more_queries) == len(queries)
+    listed = {item["id"]: item for item in response.data}
+    assert listed[opportunity.id]["deliver_progress"] == 2
+    assert listed[opportunity.id]["learn_progress"] == {"total_modules": 1, "completed_modules": 0}
+    assert listed[opportunity.id]["claim"]["max_payments"] == claim.opportunityclaimlimit_set.get().max_visits
+
+
+@pytest.mark.django_db
+def test_opportunity_list_endpoint_etag(
+    mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    api_client.force_authenticate(mobile_user_with_connect_link)
+    response = api_client.get("/api/opportunity/")
+    etag = response["ETag"]
+
+    response = api_client.get("/api/opportunity/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+    PaymentUnitFactory(opportunity=opportunity)
+    response = api_client.get("/api/opportunity/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
 @pytest.mark.django_db
 def test_opportunity_list_endpoint_excludes_archived(
     mobile_user_with_connect_link: User,
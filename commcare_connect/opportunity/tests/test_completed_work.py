@@ -1,12 +1,16 @@
 from datetime import datetime, timezone
+from io import StringIO
 from unittest.mock import patch
 
 import pytest
 from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
 
 from commcare_connect.opportunity.models import (
     CompletedWork,
     CompletedWorkStatus,
+    CompletedWorkVisitCount,
+    UserVisit,
     VisitReviewStatus,
     VisitValidationStatus,
 )
@@ -884,3 +888,70 @@ def test_get_invoice_items_total_includes_org_pay():
     # Totals always fold in org pay (FLW + Org).
     assert item["total_amount_local"] == 28
     assert float(item["total_amount_usd"]) == 3.0
+
+
+@pytest.mark.django_db
+class TestCompletedWorkVisitCount:
+    def _counts(self, completed_work, deliver_unit):
+        return CompletedWorkVisitCount.objects.filter(completed_work=completed_work, deliver_unit=deliver_unit).values(
+            "visit_count", "approved_count", "agreed_count", "rejected_count"
+        )[0]
+
+    def test_counts_follow_visit_changes(self):
+        completed_work = CompletedWorkFactory()
+        deliver_unit = DeliverUnitFactory(payment_unit=completed_work.payment_unit)
+        other_deliver_unit = DeliverUnitFactory()
+        visits = UserVisitFactory.create_batch(
+            3,
+            completed_work=completed_work,
+            deliver_unit=deliver_unit,
+            status=VisitValidationStatus.pending,
+            review_status=VisitReviewStatus.pending,
+        )
+        assert self._counts(completed_work, deliver_unit) == {
+            "visit_count": 3,
+            "approved_count": 0,
+            "agreed_count": 0,
+            "rejected_count": 0,
+        }
+
+        # Queryset and bulk updates bypass save() and are counted all the same.
+        UserVisit.objects.filter(id=visits[0].id).update(
+            status=VisitValidationStatus.approved, review_status=VisitReviewStatus.agree
+        )
+        visits[1].status = VisitValidationStatus.rejected
+        visits[2].deliver_unit = other_deliver_unit
+        UserVisit.objects.bulk_update(visits[1:], ["status", "deliver_unit"])
+        assert self._counts(completed_work, deliver_unit) == {
+            "visit_count": 2,
+            "approved_count": 1,
+            "agreed_count": 1,
+            "rejected_count": 1,
+        }
+        assert self._counts(completed_work, other_deliver_unit)["visit_count"] == 1
+        assert completed_work.completed_count == 2
+        assert completed_work.approved_count == 1
+
+        visits[0].delete()
+        assert self._counts(completed_work, deliver_unit)["agreed_count"] == 0
+        assert completed_work.approved_count == 0
+
+    def test_reconcile_command(self):
+        completed_work = CompletedWorkFactory()
+        deliver_unit = DeliverUnitFactory(payment_unit=completed_work.payment_unit)
+        UserVisitFactory(
+            completed_work=completed_work, deliver_unit=deliver_unit, status=VisitValidationStatus.approved
+        )
+        CompletedWorkVisitCount.objects.filter(completed_work=completed_work).update(visit_count=5)
+
+        out = StringIO()
+        call_command("reconcile_completed_work_visit_counts", stdout=out)
+        assert "Found 1 mismatched counters" in out.getvalue()
+        assert self._counts(completed_work, deliver_unit)["visit_count"] == 5
+
+        call_command("reconcile_completed_work_visit_counts", "--fix", stdout=StringIO())
+        assert self._counts(completed_work, deliver_unit)["visit_count"] == 1
+
+        out = StringIO()
+        call_command("reconcile_completed_work_visit_counts", stdout=out)
+        assert "All counters match the visits" in out.getvalue()
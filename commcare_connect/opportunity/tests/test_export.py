@@ -1,8 +1,11 @@
 import datetime
+import io
 import random
 from datetime import timedelta
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now
 from tablib import Dataset
 
@@ -11,12 +14,20 @@ from commcare_connect.opportunity.export import (
     export_catchment_area_table,
     export_user_status_table,
     export_user_visit_review_data,
+    export_work_status_table,
+)
+from commcare_connect.opportunity.models import (
+    Opportunity,
+    UserInviteStatus,
+    UserVisit,
+    VisitReviewStatus,
+    VisitValidationStatus,
 )
-from commcare_connect.opportunity.models import Opportunity, UserInviteStatus, UserVisit, VisitReviewStatus
 from commcare_connect.opportunity.tests.factories import (
     AssessmentFactory,
     CatchmentAreaFactory,
     CompletedModuleFactory,
+    CompletedWorkFactory,
     DeliverUnitFactory,
     LearnModuleFactory,
     OpportunityAccessFactory,
@@ -28,6 +39,13 @@ from commcare_connect.opportunity.tests.factories import (
 from commcare_connect.users.tests.factories import MobileUserFactory
 
 
+def _export_user_visits(opportunity, flatten, from_date, to_date, export_format="csv"):
+    export_file = io.BytesIO()
+    UserVisitExporter(opportunity, flatten).write(export_file, export_format, from_date, to_date, [])
+    content = export_file.getvalue()
+    return content.decode() if export_format == "csv" else content
+
+
 def test_export_user_visit_data(mobile_user_with_connect_link):
     opportunity = OpportunityFactory()
     deliver_units = DeliverUnitFactory.create_batch(2, app=opportunity.deliver_app)
@@ -53,12 +71,10 @@ def test_export_user_visit_data(mobile_user_with_connect_link):
             ),
         ]
     )
-    exporter = UserVisitExporter(opportunity, True)
-    dataset = exporter.get_dataset(date1, date2, [])
     username = mobile_user_with_connect_link.username
     name = mobile_user_with_connect_link.name
 
-    assert dataset.export("csv") == (
+    assert _export_user_visits(opportunity, True, date1, date2) == (
         "Visit ID,Visit date,Status,Username,Name of User,Unit Name,Rejected Reason,"
         "Justification,Duration,Entity ID,Entity Name,Flags,form.name,form.group.q\r\n"
         f",{date1.isoformat()},Pending,{username},{name},{deliver_units[0].name},,,,,,,test_form1,\r\n"
@@ -89,8 +105,7 @@ def test_export_user_visit_data_disjoint_fields(mobile_user_with_connect_link):
             ),
         ]
     )
-    exporter = UserVisitExporter(opportunity, True)
-    dataset = exporter.get_dataset(date1, date2, [])
+    dataset = Dataset().load(_export_user_visits(opportunity, True, date1, date2), format="csv")
 
     assert "form.field_a" in dataset.headers
     assert "form.field_b" in dataset.headers
@@ -131,11 +146,9 @@ def test_export_user_visit_data_no_flatten(mobile_user_with_connect_link):
             ),
         ]
     )
-    exporter = UserVisitExporter(opportunity, False)
-    dataset = exporter.get_dataset(date1, date2, [])
     username = mobile_user_with_connect_link.username
     name = mobile_user_with_connect_link.name
-    assert dataset.export("csv") == (
+    assert _export_user_visits(opportunity, False, date1, date2) == (
         "Visit ID,Visit date,Status,Username,Name of User,Unit Name,Rejected Reason,"
         "Justification,Duration,Entity ID,Entity Name,Flags,form_json\r\n"
         f',{date1.isoformat()},Pending,{username},{name},{deliver_units[0].name},,,,,,,"{form_json_1_string}"\r\n'
@@ -144,6 +157,91 @@ def test_export_user_visit_data_no_flatten(mobile_user_with_connect_link):
     )
 
 
+def test_export_user_visit_data_xlsx(mobile_user_with_connect_link):
+    opportunity = OpportunityFactory()
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app)
+    visit_date = now()
+    UserVisitFactory.create_batch(
+        3,
+        opportunity=opportunity,
+        user=mobile_user_with_connect_link,
+        deliver_unit=deliver_unit,
+        visit_date=visit_date,
+        form_json={"form": {"name": "test_form", "repeat": [{"q": 1}, {"q": 2}]}, "attachments": {"a": "b"}},
+    )
+    content = _export_user_visits(opportunity, True, visit_date, visit_date, export_format="xlsx")
+
+    dataset = Dataset().load(content, format="xlsx")
+    assert dataset.title == "Export User Visits"
+    assert dataset.headers[-3:] == ["form.name", "form.repeat.0.q", "form.repeat.1.q"]
+    assert [row[-3:] for row in dataset] == [("test_form", 1, 2)] * 3
+
+
+@pytest.mark.parametrize("flatten", [True, False])
+def test_export_user_visit_data_flattened_in_db(mobile_user_with_connect_link, flatten):
+    opportunity = OpportunityFactory()
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app)
+    visit_date = now()
+    form_jsons = [
+        {"form": {"name": "first", "count": 3, "done": True, "empty": {}, "none": None}, "attachments": {"a": "b"}},
+        {"form": {"repeat": [{"q": "x"}, {"q": "y", "r": 1.5}], "tags": ["a", "b"], "name": "second"}},
+        {"form": {"0": "digit key", "group": {"nested": {"deep": "value"}}}, "metadata": {"v": "2.0"}},
+    ]
+    for index, form_json in enumerate(form_jsons):
+        UserVisitFactory(
+            opportunity=opportunity,
+            user=mobile_user_with_connect_link,
+            deliver_unit=deliver_unit,
+            visit_date=visit_date + timedelta(minutes=index),
+            form_json=form_json,
+        )
+    from_date, to_date = visit_date, visit_date + timedelta(minutes=len(form_jsons))
+
+    expected_file, actual_file = io.BytesIO(), io.BytesIO()
+    UserVisitExporter(opportunity, flatten, flatten_in_db=False).write(expected_file, "csv", from_date, to_date, [])
+    UserVisitExporter(opportunity, flatten, flatten_in_db=True).write(actual_file, "csv", from_date, to_date, [])
+
+    assert actual_file.getvalue() == expected_file.getvalue()
+    assert b"attachments" not in actual_file.getvalue()
+
+
+@pytest.mark.parametrize("flatten", [True, False])
+def test_export_user_visit_data_in_db_queries(mobile_user_with_connect_link, flatten, django_assert_num_queries):
+    opportunity = OpportunityFactory()
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app)
+    visit_date = now()
+    form_json = {
+        "form": {"name": "test_form"},
+        "metadata": {"timeStart": "2024-01-01T10:00:00Z", "timeEnd": "2024-01-01T10:05:00Z"},
+    }
+
+    def export():
+        headers, rows = UserVisitExporter(opportunity, flatten).get_rows(visit_date, visit_date, [])
+        return headers, list(rows)
+
+    def add_visits(count):
+        UserVisitFactory.create_batch(
+            count,
+            opportunity=opportunity,
+            user=mobile_user_with_connect_link,
+            deliver_unit=deliver_unit,
+            visit_date=visit_date,
+            form_json=form_json,
+        )
+
+    add_visits(1)
+    export()
+    with CaptureQueriesContext(connection) as context:
+        export()
+
+    # The duration column doesn't load each visit's deferred form_json.
+    add_visits(4)
+    with django_assert_num_queries(len(context.captured_queries)):
+        headers, rows = export()
+    assert len(rows) == 5
+    assert {row[headers.index("Duration")] for row in rows} == {"0:05:00"}
+
+
 def _get_prepared_dataset_for_user_status_test(data):
     headers = (
         "Name",
@@ -447,7 +545,7 @@ def test_export_user_visit_review_data_boundary_dates(organization):
 
 
 @pytest.mark.django_db
-def test_user_visit_exporter_get_dataset_boundary_dates(opportunity, mobile_user_with_connect_link):
+def test_user_visit_exporter_get_rows_boundary_dates(opportunity, mobile_user_with_connect_link):
     deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app)
 
     from_date = datetime.date.today() - datetime.timedelta(days=5)
@@ -482,6 +580,47 @@ def test_user_visit_exporter_get_dataset_boundary_dates(opportunity, mobile_user
     )
 
     exporter = UserVisitExporter(opportunity, False)
-    dataset = exporter.get_dataset(from_date, to_date, [])
+    _, rows = exporter.get_rows(from_date, to_date, [])
 
-    assert len(dataset) == 2, f"Expected 2 visits (boundary dates), got {len(dataset)}"
+    assert len(list(rows)) == 2, "Expected 2 visits (boundary dates)"
+
+
+def _create_completed_work(access, visit_date, flags=None):
+    completed_work = CompletedWorkFactory(opportunity_access=access)
+    deliver_unit = DeliverUnitFactory(payment_unit=completed_work.payment_unit)
+    for days_before, status in ((1, VisitValidationStatus.approved), (0, VisitValidationStatus.pending)):
+        UserVisitFactory(
+            opportunity=access.opportunity,
+            opportunity_access=access,
+            user=access.user,
+            completed_work=completed_work,
+            deliver_unit=deliver_unit,
+            status=status,
+            visit_date=visit_date - timedelta(days=days_before),
+            flag_reason={"flags": [[flag, "reason"] for flag in flags or []]},
+        )
+    return completed_work
+
+
+def test_export_work_status_table_query_count(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    suspended_access = OpportunityAccessFactory(opportunity=opportunity, suspended=True)
+    visit_date = now()
+    _create_completed_work(access, visit_date, flags=["duplicate", "gps"])
+    _create_completed_work(suspended_access, visit_date)
+    # Completion is read from the visits rather than the saved counts, which may be out of date.
+    stale_work = CompletedWorkFactory(opportunity_access=access, saved_completed_count=1)
+    DeliverUnitFactory(payment_unit=stale_work.payment_unit)
+
+    with CaptureQueriesContext(connection) as queries:
+        dataset = export_work_status_table(opportunity)
+    assert len(dataset) == 1
+    assert dataset["Completion date"] == [visit_date.replace(tzinfo=None)]
+    assert dataset["Flags"] == ["duplicate, gps"]
+
+    for _ in range(5):
+        _create_completed_work(access, visit_date, flags=["gps"])
+    with CaptureQueriesContext(connection) as more_queries:
+        dataset = export_work_status_table(opportunity)
+    assert len(dataset) == 6
+    assert len(more_queries) == len(queries)
@@ -0,0 +1,162 @@
+import datetime
+import io
+
+import pytest
+from flatten_dict import flatten as flatten_json
+from tablib import Dataset
+
+from commcare_connect.opportunity.export import UserVisitExporter
+from commcare_connect.opportunity.models import FormJsonKey
+from commcare_connect.opportunity.tasks import refresh_form_json_key_catalogs
+from commcare_connect.opportunity.tests.factories import DeliverUnitFactory, OpportunityFactory, UserVisitFactory
+from commcare_connect.opportunity.utils.form_json_keys import (
+    get_app_form_json_paths,
+    is_form_json_key_absent,
+    iter_form_json_leaves,
+    record_form_json_keys,
+    refresh_form_json_keys,
+)
+
+FORM_JSON = {
+    "form": {"name": "test", "count": 3, "done": False, "empty": {}, "repeat": [{"q": "x"}, {"q": None}]},
+    "metadata": {"app_build_version": 7},
+    "attachments": {"photo.jpg": {"url": "https://example.com"}},
+}
+
+
+def _catalog(app):
+    return {
+        (row["app_build_version"], tuple(row["path"])): (row["value_types"], row["visit_count"])
+        for row in FormJsonKey.objects.filter(app=app).values(
+            "app_build_version", "path", "value_types", "visit_count"
+        )
+    }
+
+
+def test_iter_form_json_leaves_matches_flatten_dict():
+    form_json = {key: value for key, value in FORM_JSON.items() if key != "attachments"}
+    flat = flatten_json(form_json, reducer="dot", enumerate_types=(list,))
+    assert [".".join(path) for path, _ in iter_form_json_leaves(FORM_JSON)] == list(flat)
+    assert [value for _, value in iter_form_json_leaves(FORM_JSON)] == list(flat.values())
+
+
+@pytest.mark.django_db
+class TestFormJsonKeys:
+    @pytest.fixture
+    def opportunity(self):
+        return OpportunityFactory()
+
+    def _visit(self, opportunity, form_json, app_build_version=7):
+        return UserVisitFactory(
+            opportunity=opportunity,
+            deliver_unit=DeliverUnitFactory(app=opportunity.deliver_app),
+            form_json=form_json,
+            app_build_version=app_build_version,
+        )
+
+    def test_record_adds_new_keys_of_build(self, opportunity):
+        app = opportunity.deliver_app
+        record_form_json_keys(app.id, "7", FORM_JSON)
+        record_form_json_keys(app.id, "7", {"form": {"name": 5, "extra": "1"}}, visit_count=2)
+        record_form_json_keys(app.id, None, {"form": {"name": 1}})
+
+        # Keys the build already has keep the types and count they were added with.
+        catalog = _catalog(app)
+        assert catalog[(7, ("form", "name"))] == (["string"], 1)
+        assert catalog[(7, ("form", "repeat", "1", "q"))] == (["null"], 1)
+        assert catalog[(7, ("form", "extra"))] == (["string"], 2)
+        assert catalog[(None, ("form", "name"))] == (["number"], 1)
+        assert (7, ("form", "empty")) not in catalog
+        assert not any(path[0] == "attachments" for _, path in catalog)
+
+    def test_refresh_recounts_from_visits(self, opportunity):
+        app = opportunity.deliver_app
+        record_form_json_keys(app.id, 7, {"form": {"name": "stale"}})
+        self._visit(opportunity, FORM_JSON)
+        self._visit(opportunity, {"form": {"name": 12, "other": "a"}})
+        self._visit(opportunity, {"form": {"name": "b"}}, app_build_version=None)
+        UserVisitFactory(opportunity=opportunity, form_json={"form": {"unrelated_app": "x"}})
+
+        refresh_form_json_keys(app)
+
+        catalog = _catalog(app)
+        assert catalog[(7, ("form", "name"))] == (["number", "string"], 2)
+        assert catalog[(7, ("form", "other"))] == (["string"], 1)
+        assert catalog[(None, ("form", "name"))] == (["string"], 1)
+        assert not any(path == ("form", "unrelated_app") for _, path in catalog)
+        app.refresh_from_db()
+        assert app.form_json_keys_refreshed is not None
+
+    def test_key_absent_checks_uncatalogued_visits(self, opportunity):
+        app = opportunity.deliver_app
+        self._visit(opportunity, FORM_JSON)
+        assert is_form_json_key_absent(app, ("form", "missing"))
+        assert not is_form_json_key_absent(app, ("form", "name"))
+
+        refresh_form_json_keys(app)
+        assert is_form_json_key_absent(app, ("form", "missing"))
+        assert not is_form_json_key_absent(app, ("form", "name"))
+
+        # A visit whose keys were never recorded, e.g. as its task was lost.
+        self._visit(opportunity, {"form": {"missing": None}})
+        assert not is_form_json_key_absent(app, ("form", "missing"))
+
+    def test_periodic_refresh_skips_catalogued_apps(self, opportunity):
+        app = opportunity.deliver_app
+        visit = self._visit(opportunity, FORM_JSON)
+        refresh_form_json_key_catalogs()
+        app.refresh_from_db()
+        assert app.form_json_keys_visit_id == visit.id
+        refreshed = app.form_json_keys_refreshed
+
+        refresh_form_json_key_catalogs()
+        app.refresh_from_db()
+        assert app.form_json_keys_refreshed == refreshed
+
+        visit = self._visit(opportunity, {"form": {"new": "1"}})
+        refresh_form_json_key_catalogs()
+        app.refresh_from_db()
+        assert app.form_json_keys_visit_id == visit.id
+        assert (7, ("form", "new")) in _catalog(app)
+
+    def _export(self, opportunity, visit):
+        export_file = io.BytesIO()
+        UserVisitExporter(opportunity, True).write(export_file, "csv", visit.visit_date, visit.visit_date, [])
+        return Dataset().load(export_file.getvalue().decode(), format="csv")
+
+    def test_export_uses_catalog_of_exported_builds(self, opportunity):
+        visit = self._visit(opportunity, {"form": {"bb": "2", "a": "1", "list": ["x"] * 11}})
+        self._visit(opportunity, {"form": {"bb": "2", "d": "4"}})
+        other_visit = self._visit(opportunity, {"form": {"c": "3"}}, app_build_version=8)
+        other_visit.visit_date = visit.visit_date - datetime.timedelta(days=30)
+        other_visit.save()
+        refresh_form_json_keys(opportunity.deliver_app)
+
+        # jsonb key order: shorter keys first, which also puts list indexes in numeric order.
+        paths = [".".join(path) for path in get_app_form_json_paths(opportunity.deliver_app_id)]
+        assert paths == ["form.a", "form.c", "form.d", "form.bb", *[f"form.list.{i}" for i in range(11)]]
+
+        # Keys of the build the visits are from, whether or not they have them, but not of other builds.
+        dataset = self._export(opportunity, visit)
+        export_paths = [path for path in paths if path != "form.c"]
+        assert list(dataset.headers[-len(export_paths) :]) == export_paths
+        assert sorted(row[-len(export_paths) :] for row in dataset) == [
+            ("", "4", "2", *[""] * 11),
+            ("1", "", "2", *["x"] * 11),
+        ]
+
+    def test_export_reads_keys_of_uncatalogued_visits(self, opportunity):
+        visit = self._visit(opportunity, {"form": {"bb": "2", "a": "1", "list": ["x"] * 11}})
+
+        # Without a catalog, the keys are read from the visits, in the same order.
+        headers = self._export(opportunity, visit).headers
+        assert not FormJsonKey.objects.filter(app=opportunity.deliver_app).exists()
+        assert headers[-13:] == ["form.a", "form.bb", *[f"form.list.{i}" for i in range(11)]]
+        refresh_form_json_keys(opportunity.deliver_app)
+        assert self._export(opportunity, visit).headers == headers
+
+        # A key whose visit was never recorded in the catalog, e.g. as its task was lost.
+        self._visit(opportunity, {"form": {"new": "3"}})
+        dataset = self._export(opportunity, visit)
+        assert (7, ("form", "new")) not in _catalog(opportunity.deliver_app)
+        assert dataset.headers[-14:] == ["form.a", "form.bb", "form.new", *[f"form.list.{i}" for i in range(11)]]
@@ -1,13 +1,16 @@
 import datetime
 
+import pytest
 from django.core.management import call_command
 
 from commcare_connect.opportunity.models import (
     InvoiceStatus,
+    UserVisit,
 )
 from commcare_connect.opportunity.tests.factories import (
     OpportunityFactory,
     PaymentInvoiceFactory,
+    UserVisitFactory,
 )
 
 
@@ -47,3 +50,17 @@ class ArchivePendingInvoicesTest:
 
         assert invoice5.status == InvoiceStatus.ARCHIVED
         assert invoice5.archived_date is not None
+
+
+@pytest.mark.django_db
+def test_backfill_user_visit_location_points():
+    visit = UserVisitFactory(location="28.6 77.1 0 0")
+    unparsable = UserVisitFactory(location="unknown")
+    UserVisit.objects.filter(id__in=[visit.id, unparsable.id]).update(location_point=None)
+
+    call_command("backfill_user_visit_location_points", batch_size=1)
+
+    visit.refresh_from_db()
+    unparsable.refresh_from_db()
+    assert (visit.location_point.x, visit.location_point.y) == (77.1, 28.6)
+    assert unparsable.location_point is None
@@ -35,6 +35,7 @@ from commcare_connect.opportunity.tests.factories import (
     UserVisitFactory,
 )
 from commcare_connect.opportunity.utils.invoice import generate_invoice_number
+from commcare_connect.opportunity.utils.learn_progress import update_app_learn_progress, update_learn_progress
 from commcare_connect.opportunity.visit_import import update_payment_accrued
 from commcare_connect.program.tests.factories import ProgramFactory
 from commcare_connect.users.models import User
@@ -120,8 +121,17 @@ def test_learn_progress(opportunity: Opportunity):
     access_1, access_2 = OpportunityAccessFactory.create_batch(2, opportunity=opportunity)
     for learn_module in learn_modules:
         CompletedModuleFactory(module=learn_module, opportunity_access=access_1)
-    assert access_1.learn_progress == 100
-    assert access_2.learn_progress == 0
+    CompletedModuleFactory(module=learn_modules[0], opportunity_access=access_1)
+    update_learn_progress(access_1)
+    update_learn_progress(access_2)
+    assert (access_1.learn_modules_completed, access_1.learn_progress) == (2, 100)
+    assert (access_2.learn_modules_completed, access_2.learn_progress) == (0, 0)
+
+    # A new module lowers the progress of everyone using the learn app.
+    LearnModuleFactory(app=opportunity.learn_app)
+    assert update_app_learn_progress(opportunity.learn_app_id) == 1
+    access_1.refresh_from_db()
+    assert access_1.learn_progress == 66.67
 
 
 @pytest.mark.django_db
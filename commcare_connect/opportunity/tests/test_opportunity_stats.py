@@ -0,0 +1,167 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from django.utils.timezone import now
+
+from commcare_connect.opportunity.helpers import get_opportunity_delivery_progress
+from commcare_connect.opportunity.models import OpportunityDailyStats, OpportunityStats, UserInviteStatus
+from commcare_connect.opportunity.tasks import build_opportunity_stats
+from commcare_connect.opportunity.tasks import reconcile_opportunity_stats as reconcile_opportunity_stats_task
+from commcare_connect.opportunity.tests.factories import (
+    OpportunityAccessFactory,
+    OpportunityFactory,
+    PaymentFactory,
+    UserVisitFactory,
+)
+from commcare_connect.opportunity.utils.opportunity_stats import (
+    STATS_FIELDS,
+    adjust_opportunity_stats,
+    compute_opportunity_stats,
+    invite_stats_deltas,
+    last_active_stats_deltas,
+    reconcile_opportunity_stats,
+    utc_date,
+)
+
+
+@pytest.mark.parametrize(
+    "old_status,new_status,expected",
+    [
+        (None, UserInviteStatus.invited, (1, 1)),
+        (None, UserInviteStatus.not_found, (0, 0)),
+        (UserInviteStatus.invited, UserInviteStatus.accepted, (0, -1)),
+        (UserInviteStatus.sms_delivered, UserInviteStatus.invited, (0, 0)),
+        (UserInviteStatus.not_found, UserInviteStatus.accepted, (1, 0)),
+        (UserInviteStatus.invited, None, (-1, -1)),
+        (UserInviteStatus.accepted, None, (-1, 0)),
+    ],
+)
+def test_invite_stats_deltas(old_status, new_status, expected):
+    deltas = invite_stats_deltas(old_status, new_status)
+    assert (deltas["workers_invited"], deltas["pending_invites"]) == expected
+
+
+@pytest.mark.parametrize(
+    "old_days,new_days,expected",
+    [(None, 0, 0), (10, 0, -1), (1, 0, 0), (None, 10, 1)],
+)
+def test_last_active_stats_deltas(old_days, new_days, expected):
+    def last_active(days):
+        return None if days is None else now() - timedelta(days=days)
+
+    deltas = last_active_stats_deltas(last_active(old_days), last_active(new_days))
+    assert deltas == {"inactive_workers": expected}
+
+
+@pytest.mark.django_db
+class TestOpportunityStats:
+    def test_dashboard_computes_missing_stats(self, opportunity, django_capture_on_commit_callbacks):
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        UserVisitFactory(opportunity=opportunity, opportunity_access=access, visit_date=now())
+        PaymentFactory(opportunity_access=access, amount=Decimal("5"))
+
+        # Missing stats are computed without saving them, and a task is queued to build them.
+        with (
+            mock.patch("commcare_connect.opportunity.tasks.build_opportunity_stats.delay") as build,
+            django_capture_on_commit_callbacks(execute=True),
+        ):
+            progress = get_opportunity_delivery_progress(opportunity.id)
+        assert progress.deliveries_from_yesterday == 1
+        assert progress.total_paid == Decimal("5")
+        assert progress.payments_due == Decimal("-5")
+        assert not OpportunityStats.objects.filter(opportunity=opportunity).exists()
+        build.assert_called_once_with(opportunity.id)
+
+        build_opportunity_stats(opportunity.id)
+        assert OpportunityStats.objects.get(opportunity=opportunity).date_reconciled is not None
+
+    def test_computed_stats_match_reconciled(self, opportunity):
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        UserVisitFactory(opportunity=opportunity, opportunity_access=access, visit_date=now())
+        PaymentFactory(opportunity_access=access, amount=Decimal("5"))
+
+        stats, daily = compute_opportunity_stats(opportunity.id)
+        reconcile_opportunity_stats([opportunity.id])
+        reconciled = OpportunityStats.objects.get(opportunity=opportunity)
+        assert {field: getattr(stats, field) for field in STATS_FIELDS} == {
+            field: getattr(reconciled, field) for field in STATS_FIELDS
+        }
+        assert [(bucket.date, bucket.deliveries, bucket.accrued) for bucket in daily] == list(
+            OpportunityDailyStats.objects.filter(opportunity=opportunity).values_list("date", "deliveries", "accrued")
+        )
+
+    def test_dashboard_reads_rollup(self, opportunity, django_capture_on_commit_callbacks):
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        UserVisitFactory(opportunity=opportunity, opportunity_access=access, visit_date=now())
+        reconcile_opportunity_stats([opportunity.id])
+
+        # Visits created outside the tracked paths only show up once reconciled.
+        UserVisitFactory(opportunity=opportunity, opportunity_access=access, visit_date=now())
+        with (
+            mock.patch("commcare_connect.opportunity.tasks.build_opportunity_stats.delay") as build,
+            django_capture_on_commit_callbacks(execute=True),
+        ):
+            assert get_opportunity_delivery_progress(opportunity.id).deliveries_from_yesterday == 1
+        build.assert_not_called()
+        reconcile_opportunity_stats([opportunity.id])
+        assert get_opportunity_delivery_progress(opportunity.id).deliveries_from_yesterday == 2
+
+    def test_adjustment_applied_on_commit(self, opportunity, django_capture_on_commit_callbacks):
+        reconcile_opportunity_stats([opportunity.id])
+        visit_date = now()
+        with django_capture_on_commit_callbacks(execute=True):
+            adjust_opportunity_stats(
+                opportunity.id,
+                latest={"most_recent_delivery": visit_date},
+                daily={utc_date(visit_date): {"deliveries": 2}},
+                total_deliveries=1,
+                total_paid=Decimal("10.50"),
+            )
+            stats = OpportunityStats.objects.get(opportunity=opportunity)
+            assert stats.total_deliveries == 0
+
+        stats.refresh_from_db()
+        assert stats.total_deliveries == 1
+        assert stats.total_paid == Decimal("10.50")
+        assert stats.most_recent_delivery == visit_date
+        daily = OpportunityDailyStats.objects.get(opportunity=opportunity, date=utc_date(visit_date))
+        assert daily.deliveries == 2
+
+        with django_capture_on_commit_callbacks(execute=True):
+            adjust_opportunity_stats(opportunity.id, latest={"most_recent_delivery": visit_date - timedelta(days=1)})
+        stats.refresh_from_db()
+        assert stats.most_recent_delivery == visit_date
+
+    def test_adjustment_skipped_without_stats(self, opportunity, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            adjust_opportunity_stats(opportunity.id, daily={utc_date(now()): {"deliveries": 1}}, total_deliveries=1)
+        assert not OpportunityStats.objects.filter(opportunity=opportunity).exists()
+        assert not OpportunityDailyStats.objects.filter(opportunity=opportunity).exists()
+
+    def test_reconcile_replaces_drift_and_old_buckets(self, opportunity):
+        access = OpportunityAccessFactory(opportunity=opportunity, payment_accrued=40)
+        UserVisitFactory(opportunity=opportunity, opportunity_access=access, visit_date=now() - timedelta(days=30))
+        PaymentFactory(opportunity_access=access, amount=25)
+        reconcile_opportunity_stats([opportunity.id])
+        OpportunityStats.objects.filter(opportunity=opportunity).update(total_paid=0, total_accrued=1)
+        OpportunityDailyStats.objects.create(opportunity=opportunity, date=utc_date(now()), deliveries=5)
+
+        reconcile_opportunity_stats([opportunity.id])
+
+        stats = OpportunityStats.objects.get(opportunity=opportunity)
+        assert stats.total_paid == 25
+        assert stats.total_accrued == 40
+        assert stats.started_deliveries == 1
+        assert not OpportunityDailyStats.objects.filter(opportunity=opportunity).exists()
+
+    def test_periodic_task_only_reconciles_existing_stats(self, opportunity):
+        other_opportunity = OpportunityFactory()
+        reconcile_opportunity_stats([opportunity.id])
+        OpportunityStats.objects.filter(opportunity=opportunity).update(total_deliveries=7)
+
+        reconcile_opportunity_stats_task()
+
+        assert OpportunityStats.objects.get(opportunity=opportunity).total_deliveries == 0
+        assert not OpportunityStats.objects.filter(opportunity=other_opportunity).exists()
@@ -0,0 +1,362 @@
+import datetime
+from unittest import mock
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from commcare_connect.opportunity.models import (
+    CompletedWork,
+    CompletedWorkStatus,
+    Currency,
+    OpportunityAccess,
+    OpportunityStats,
+    PendingPaymentAccrual,
+    VisitReviewStatus,
+    VisitValidationStatus,
+)
+from commcare_connect.opportunity.tests.factories import (
+    CompletedWorkFactory,
+    DeliverUnitFactory,
+    ExchangeRateFactory,
+    OpportunityAccessFactory,
+    OpportunityFactory,
+    PaymentUnitFactory,
+    UserVisitFactory,
+)
+from commcare_connect.opportunity.utils.completed_work import update_status
+from commcare_connect.opportunity.utils.opportunity_stats import reconcile_opportunity_stats
+from commcare_connect.opportunity.utils.payment_accrual import recompute_payment_accrual
+from commcare_connect.opportunity.utils.payment_accrual_queue import drain_payment_accrual, queue_payment_accrual
+
+COMPLETED_WORK_FIELDS = [
+    "status",
+    "reason",
+    "saved_completed_count",
+    "saved_approved_count",
+    "saved_payment_accrued",
+    "saved_payment_accrued_usd",
+    "saved_org_payment_accrued",
+    "saved_org_payment_accrued_usd",
+]
+
+
+def _create_visit(completed_work, deliver_unit, status, review_status=VisitReviewStatus.agree, **kwargs):
+    access = completed_work.opportunity_access
+    return UserVisitFactory(
+        opportunity=access.opportunity,
+        user=access.user,
+        opportunity_access=access,
+        deliver_unit=deliver_unit,
+        completed_work=completed_work,
+        status=status,
+        review_status=review_status,
+        **kwargs,
+    )
+
+
+def _snapshot(opportunity):
+    completed_works = {
+        row["id"]: row
+        for row in CompletedWork.objects.filter(opportunity_access__opportunity=opportunity).values(
+            "id", "status_modified_date", *COMPLETED_WORK_FIELDS
+        )
+    }
+    accrued = dict(OpportunityAccess.objects.filter(opportunity=opportunity).values_list("id", "payment_accrued"))
+    return completed_works, accrued
+
+
+def _restore(snapshot):
+    completed_works, accrued = snapshot
+    for completed_work_id, fields in completed_works.items():
+        CompletedWork.objects.filter(id=completed_work_id).update(**fields)
+    for access_id, payment_accrued in accrued.items():
+        OpportunityAccess.objects.filter(id=access_id).update(payment_accrued=payment_accrued)
+
+
+def _without_dates(snapshot):
+    completed_works, accrued = snapshot
+    return {
+        completed_work_id: {field: fields[field] for field in COMPLETED_WORK_FIELDS}
+        for completed_work_id, fields in completed_works.items()
+    }, accrued
+
+
+def assert_matches_update_status(opportunity, incremental=False, exclude_rejected=False, **kwargs):
+    """Runs the per-worker ``update_status`` path and the set-based recalculation from the same
+    starting state and checks they leave the same completed works and access totals behind."""
+    original = _snapshot(opportunity)
+    for access in OpportunityAccess.objects.filter(opportunity=opportunity, suspended=False):
+        completed_works = access.completedwork_set.select_related("payment_unit")
+        if incremental:
+            completed_works = completed_works.filter(saved_approved_count=0).exclude(
+                status=CompletedWorkStatus.approved
+            )
+        if exclude_rejected:
+            completed_works = completed_works.exclude(status=CompletedWorkStatus.rejected)
+        update_status(completed_works, access, compute_payment=True)
+    expected = _snapshot(opportunity)
+
+    _restore(original)
+    recompute_payment_accrual(opportunity, incremental=incremental, exclude_rejected=exclude_rejected, **kwargs)
+    actual = _snapshot(opportunity)
+
+    assert _without_dates(actual) == _without_dates(expected)
+    return actual
+
+
+@pytest.mark.django_db
+class TestRecomputePaymentAccrual:
+    @pytest.fixture
+    def opportunity(self):
+        return OpportunityFactory(auto_approve_payments=True)
+
+    def _payment_unit(self, opportunity, optional_units=0, **kwargs):
+        payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=100, org_amount=10, **kwargs)
+        required = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit)
+        optional = [
+            DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit, optional=True)
+            for _ in range(optional_units)
+        ]
+        return payment_unit, required, optional
+
+    def test_required_deliver_units(self, opportunity):
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        for statuses in [
+            [VisitValidationStatus.approved] * 3,
+            [VisitValidationStatus.approved, VisitValidationStatus.pending],
+            [VisitValidationStatus.pending],
+        ]:
+            access = OpportunityAccessFactory(opportunity=opportunity)
+            completed_work = CompletedWorkFactory(
+                opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.incomplete
+            )
+            for status in statuses:
+                _create_visit(completed_work, required, status)
+
+        actual, accrued = assert_matches_update_status(opportunity)
+        assert sorted(fields["saved_approved_count"] for fields in actual.values()) == [0, 1, 3]
+        assert sorted(accrued.values()) == [0, 100, 300]
+
+    def test_optional_deliver_units(self, opportunity):
+        payment_unit, required, optional = self._payment_unit(opportunity, optional_units=2)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        capped = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        for _ in range(3):
+            _create_visit(capped, required, VisitValidationStatus.approved)
+        _create_visit(capped, optional[0], VisitValidationStatus.approved)
+        _create_visit(capped, optional[1], VisitValidationStatus.pending)
+        missing_optional = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        _create_visit(missing_optional, required, VisitValidationStatus.approved)
+
+        actual, _ = assert_matches_update_status(opportunity)
+        assert actual[capped.id]["saved_completed_count"] == 2
+        assert actual[capped.id]["saved_approved_count"] == 1
+        assert actual[missing_optional.id]["status"] == CompletedWorkStatus.pending
+
+    def test_rejected_visits(self, opportunity):
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        _create_visit(completed_work, required, VisitValidationStatus.rejected, reason="Duplicate")
+        _create_visit(completed_work, required, VisitValidationStatus.rejected, reason="Out of area")
+        _create_visit(completed_work, required, VisitValidationStatus.approved)
+
+        actual, _ = assert_matches_update_status(opportunity)
+        assert actual[completed_work.id]["status"] == CompletedWorkStatus.rejected
+        assert actual[completed_work.id]["reason"] == "Duplicate\nOut of area"
+        assert actual[completed_work.id]["saved_payment_accrued"] == 0
+
+    def test_exclude_rejected_work(self, opportunity):
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        rejected = CompletedWorkFactory(
+            opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.rejected
+        )
+        _create_visit(rejected, required, VisitValidationStatus.approved)
+        pending = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        _create_visit(pending, required, VisitValidationStatus.approved)
+
+        actual, _ = assert_matches_update_status(opportunity, exclude_rejected=True)
+        assert actual[rejected.id]["status"] == CompletedWorkStatus.rejected
+        assert actual[pending.id]["status"] == CompletedWorkStatus.approved
+
+    def test_child_payment_units(self, opportunity):
+        parent, parent_unit, _ = self._payment_unit(opportunity)
+        child, child_unit, _ = self._payment_unit(opportunity, parent_payment_unit=parent)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        entity_id = "household-1"
+        parent_work = CompletedWorkFactory(opportunity_access=access, payment_unit=parent, entity_id=entity_id)
+        child_work = CompletedWorkFactory(opportunity_access=access, payment_unit=child, entity_id=entity_id)
+        for _ in range(2):
+            _create_visit(parent_work, parent_unit, VisitValidationStatus.approved)
+        _create_visit(child_work, child_unit, VisitValidationStatus.approved)
+        orphan = CompletedWorkFactory(opportunity_access=access, payment_unit=parent, entity_id="household-2")
+        _create_visit(orphan, parent_unit, VisitValidationStatus.approved)
+
+        actual, _ = assert_matches_update_status(opportunity)
+        assert actual[parent_work.id]["saved_approved_count"] == 1
+        assert actual[orphan.id]["saved_completed_count"] == 0
+
+    def test_adjusts_stats_total_accrued(self, opportunity, django_capture_on_commit_callbacks):
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        completed_work = CompletedWorkFactory(
+            opportunity_access=OpportunityAccessFactory(opportunity=opportunity), payment_unit=payment_unit
+        )
+        reconcile_opportunity_stats([opportunity.id])
+        _create_visit(completed_work, required, VisitValidationStatus.approved)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            recompute_payment_accrual(opportunity)
+
+        assert OpportunityStats.objects.get(opportunity=opportunity).total_accrued == 100
+
+    def test_auto_approve_disabled(self):
+        opportunity = OpportunityFactory(auto_approve_payments=False)
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        completed_work = CompletedWorkFactory(
+            opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.pending
+        )
+        _create_visit(completed_work, required, VisitValidationStatus.approved)
+
+        actual, accrued = assert_matches_update_status(opportunity)
+        assert actual[completed_work.id]["status"] == CompletedWorkStatus.pending
+        assert accrued[access.id] == 0
+
+    def test_review_disagreement(self, opportunity):
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        _create_visit(completed_work, required, VisitValidationStatus.approved)
+        _create_visit(
+            completed_work, required, VisitValidationStatus.approved, review_status=VisitReviewStatus.disagree
+        )
+
+        actual, _ = assert_matches_update_status(opportunity)
+        assert actual[completed_work.id]["saved_completed_count"] == 2
+        assert actual[completed_work.id]["saved_approved_count"] == 1
+
+    def test_exchange_rate(self):
+        opportunity = OpportunityFactory(auto_approve_payments=True, currency=Currency.objects.get(code="EUR"))
+        ExchangeRateFactory(currency_code="EUR", rate=2, rate_date=datetime.date(2020, 1, 1))
+        ExchangeRateFactory(currency_code="EUR", rate=4, rate_date=now().date())
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        _create_visit(completed_work, required, VisitValidationStatus.approved)
+
+        actual, _ = assert_matches_update_status(opportunity)
+        assert actual[completed_work.id]["saved_payment_accrued_usd"] == 25
+        assert actual[completed_work.id]["saved_org_payment_accrued_usd"] == 2.5
+
+    def test_incremental(self, opportunity):
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity)
+        paid = CompletedWorkFactory(
+            opportunity_access=access,
+            payment_unit=payment_unit,
+            status=CompletedWorkStatus.approved,
+            saved_approved_count=1,
+            saved_payment_accrued=100,
+        )
+        for _ in range(2):
+            _create_visit(paid, required, VisitValidationStatus.approved)
+        pending = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        _create_visit(pending, required, VisitValidationStatus.approved)
+
+        actual, accrued = assert_matches_update_status(opportunity, incremental=True)
+        assert actual[paid.id]["saved_approved_count"] == 1
+        assert accrued[access.id] == 200
+
+    def test_access_scope(self, opportunity):
+        payment_unit, required, _ = self._payment_unit(opportunity)
+        accesses = OpportunityAccessFactory.create_batch(2, opportunity=opportunity)
+        for access in accesses:
+            completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+            _create_visit(completed_work, required, VisitValidationStatus.approved)
+        suspended = OpportunityAccessFactory(opportunity=opportunity, suspended=True)
+        suspended_work = CompletedWorkFactory(opportunity_access=suspended, payment_unit=payment_unit)
+        _create_visit(suspended_work, required, VisitValidationStatus.approved)
+
+        assert recompute_payment_accrual(opportunity, access_ids=[accesses[0].id, suspended.id]) == 1
+        _, accrued = _snapshot(opportunity)
+        assert accrued == {accesses[0].id: 100, accesses[1].id: 0, suspended.id: 0}
+
+    def test_work_without_visits_or_deliver_units(self, opportunity):
+        payment_unit, _, _ = self._payment_unit(opportunity)
+        empty_payment_unit = PaymentUnitFactory(opportunity=opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity, payment_accrued=50)
+        CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        CompletedWorkFactory(opportunity_access=access, payment_unit=empty_payment_unit)
+
+        _, accrued = assert_matches_update_status(opportunity)
+        assert accrued[access.id] == 0
+
+
+@pytest.mark.django_db
+class TestPaymentAccrualQueue:
+    @pytest.fixture
+    def access(self):
+        return OpportunityAccessFactory(opportunity__auto_approve_payments=True)
+
+    def _approved_work(self, access):
+        payment_unit = PaymentUnitFactory(opportunity=access.opportunity, amount=100)
+        deliver_unit = DeliverUnitFactory(app=access.opportunity.deliver_app, payment_unit=payment_unit)
+        completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        _create_visit(completed_work, deliver_unit, VisitValidationStatus.approved)
+        return completed_work
+
+    def test_queued_work_is_merged(self, access, django_capture_on_commit_callbacks):
+        with (
+            mock.patch("commcare_connect.opportunity.tasks.process_payment_accrual.delay") as delay,
+            django_capture_on_commit_callbacks(execute=True),
+        ):
+            queue_payment_accrual(access, 3)
+            queue_payment_accrual(access, 1)
+            queue_payment_accrual(access, 3)
+            queue_payment_accrual(access)
+
+        delay.assert_called_once_with(access.id)
+        entry = PendingPaymentAccrual.objects.get(opportunity_access=access)
+        assert entry.completed_work_ids == [1, 3]
+        assert entry.version == 3
+
+    def test_drain(self, access):
+        completed_work = self._approved_work(access)
+        queue_payment_accrual(access, completed_work.id)
+
+        assert drain_payment_accrual(access.id)
+
+        access.refresh_from_db()
+        assert access.payment_accrued == 100
+        assert not PendingPaymentAccrual.objects.exists()
+        assert drain_payment_accrual(access.id)
+
+    def test_drain_locks_completed_work(self, access):
+        # The lock recompute_payment_accrual takes too, so the two can't overwrite each other.
+        completed_work = self._approved_work(access)
+        queue_payment_accrual(access, completed_work.id)
+
+        with CaptureQueriesContext(connection) as ctx:
+            drain_payment_accrual(access.id)
+
+        assert any(
+            "FOR UPDATE" in query["sql"] and "opportunity_completedwork" in query["sql"]
+            for query in ctx.captured_queries
+        )
+
+    def test_drain_keeps_work_queued_meanwhile(self, access):
+        completed_work = self._approved_work(access)
+        queue_payment_accrual(access)
+
+        with mock.patch(
+            "commcare_connect.opportunity.utils.payment_accrual_queue.update_payment_accrued_for_user",
+            side_effect=lambda *args, **kwargs: queue_payment_accrual(access, completed_work.id),
+        ):
+            assert not drain_payment_accrual(access.id)
+
+        assert PendingPaymentAccrual.objects.get(opportunity_access=access).completed_work_ids == [completed_work.id]
+        assert drain_payment_accrual(access.id)
+        assert not PendingPaymentAccrual.objects.exists()
@@ -1,8 +1,10 @@
 import datetime
 import uuid
+from contextlib import contextmanager
 from decimal import Decimal
 from unittest import mock
 
+import httpx
 import pytest
 from django.utils.timezone import now
 from tablib import Dataset
@@ -23,6 +25,7 @@ from commcare_connect.opportunity.models import (
 )
 from commcare_connect.opportunity.tasks import (
     OPPORTUNITY_AUTO_ARCHIVE_DAYS,
+    _annotate_inactivity,
     _get_inactive_message,
     add_connect_users,
     auto_archive_test_opportunities,
@@ -39,6 +42,7 @@ from commcare_connect.opportunity.tasks import (
     generate_work_status_export,
     notify_user_for_scored_assessment,
     save_export,
+    send_notification_inactive_users,
     send_task_assignment_notification,
     send_task_completion_notification,
 )
@@ -55,6 +59,7 @@ from commcare_connect.opportunity.tests.factories import (
     TaskTypeFactory,
     UserVisitFactory,
 )
+from commcare_connect.opportunity.utils.learn_progress import update_learn_progress
 from commcare_connect.users.models import User
 
 
@@ -98,6 +103,10 @@ class TestConnectUserCreation:
         assert UserInvite.objects.filter(opportunity=opportunity).count() == 0
 
 
+def _annotated_access(access):
+    return _annotate_inactivity(OpportunityAccess.objects.filter(pk=access.pk)).get()
+
+
 def test_send_inactive_notification_learn_inactive_message(mobile_user: User, opportunity: Opportunity):
     learn_modules = LearnModuleFactory.create_batch(2, app=opportunity.learn_app)
     access = OpportunityAccess.objects.get(user=mobile_user, opportunity=opportunity)
@@ -109,7 +118,7 @@ def test_send_inactive_notification_learn_inactive_message(mobile_user: User, op
         opportunity_access=access,
     )
     access.refresh_from_db()
-    message = _get_inactive_message(access)
+    message = _get_inactive_message(_annotated_access(access))
     assert message is not None
     assert message.usernames[0] == mobile_user.username
     assert message.data.get("title") == f"Resume your learning journey for {opportunity.name}"
@@ -135,7 +144,7 @@ def test_send_inactive_notification_deliver_inactive_message(mobile_user: User,
         opportunity_access=access,
     )
 
-    message = _get_inactive_message(access)
+    message = _get_inactive_message(_annotated_access(access))
     assert message is not None
     assert message.usernames[0] == mobile_user.username
     assert message.data.get("title") == f"Resume your job for {opportunity.name}"
@@ -152,7 +161,8 @@ def test_send_inactive_notification_not_claimed_deliver_message(mobile_user: Use
             date=now() - datetime.timedelta(days=2),
             opportunity_access=access,
         )
-    message = _get_inactive_message(access)
+    update_learn_progress(access)
+    message = _get_inactive_message(_annotated_access(access))
     assert message is not None
     assert message.usernames[0] == mobile_user.username
     assert message.data.get("title") == f"Resume your job for {opportunity.name}"
@@ -177,10 +187,59 @@ def test_send_inactive_notification_active_user(mobile_user: User, opportunity:
         visit_date=now() - datetime.timedelta(days=1),
         opportunity_access=access,
     )
-    message = _get_inactive_message(access)
+    message = _get_inactive_message(_annotated_access(access))
     assert message is None
 
 
+@mock.patch("commcare_connect.opportunity.tasks.NOTIFICATION_BATCH_SIZE", 1)
+@mock.patch("commcare_connect.opportunity.tasks.send_message_bulk")
+def test_send_notification_inactive_users(send_message_bulk, opportunity: Opportunity):
+    opportunity.end_date = datetime.date.today() + datetime.timedelta(days=10)
+    opportunity.save()
+    learn_module = LearnModuleFactory(app=opportunity.learn_app)
+    learning, learnt, delivering, active = OpportunityAccessFactory.create_batch(4, opportunity=opportunity)
+    CompletedModuleFactory(
+        opportunity=opportunity, module=learn_module, opportunity_access=learning, date=now() - datetime.timedelta(3)
+    )
+    CompletedModuleFactory(opportunity=opportunity, module=learn_module, opportunity_access=learnt, date=now())
+    update_learn_progress(learnt)
+    for access, days in ((delivering, 2), (active, 1)):
+        OpportunityClaimFactory(opportunity_access=access, end_date=opportunity.end_date)
+        UserVisitFactory(
+            opportunity=opportunity, opportunity_access=access, visit_date=now() - datetime.timedelta(days=days)
+        )
+
+    send_notification_inactive_users()
+
+    sent = [call.args[0] for call in send_message_bulk.call_args_list]
+    assert all(len(batch) == 1 for batch in sent)
+    assert sorted((message.usernames[0], message.data["action"]) for (message,) in sent) == sorted(
+        [
+            (learning.user.username, "ccc_learn_progress"),
+            (learnt.user.username, "ccc_delivery_progress"),
+            (delivering.user.username, "ccc_delivery_progress"),
+        ]
+    )
+
+
+@contextmanager
+def mock_attachment_download(content):
+    """Serve every attachment from HQ as ``content``, yielding the client and the saved blobs by name."""
+    saved = {}
+
+    def save(name, content_file):
+        saved[name] = content_file.read()
+        return name
+
+    with (
+        mock.patch("commcare_connect.opportunity.tasks._get_hq_client") as get_client,
+        mock.patch("commcare_connect.opportunity.tasks.default_storage.save", side_effect=save),
+    ):
+        client = get_client.return_value
+        client.stream.return_value.__enter__.return_value.iter_bytes.return_value = [content]
+        yield client, saved
+
+
 def test_download_attachments(mobile_user: User, opportunity: Opportunity):
     learn_modules = LearnModuleFactory.create_batch(2, app=opportunity.learn_app)
     for learn_module in learn_modules:
@@ -197,21 +256,17 @@ def test_download_attachments(mobile_user: User, opportunity: Opportunity):
         opportunity=opportunity,
         form_json={"attachments": {"myimage.jpg": {"content_type": "image/jpeg", "length": 20}}},
     )
-    with (
-        mock.patch("commcare_connect.opportunity.tasks.httpx.get") as get_response,
-        mock.patch("commcare_connect.opportunity.tasks.default_storage.save") as save_blob,
-    ):
-        get_response.return_value.content = b"asdas"
+    with mock_attachment_download(b"asdas") as (client, saved):
         download_user_visit_attachments.run(user_visit.id)
-        blob_meta = BlobMeta.objects.first()
 
-        assert blob_meta.name == "myimage.jpg"
-        assert blob_meta.parent_id == user_visit.xform_id
-        assert blob_meta.content_length == 20
-        assert blob_meta.content_type == "image/jpeg"
-        blob_id, content_file = save_blob.call_args_list[0].args
-        assert str(blob_id) == blob_meta.blob_id
-        assert content_file.read() == b"asdas"
+    blob_meta = BlobMeta.objects.get()
+    assert blob_meta.name == "myimage.jpg"
+    assert blob_meta.parent_id == user_visit.xform_id
+    assert blob_meta.content_length == 20
+    assert blob_meta.content_type == "image/jpeg"
+    assert saved == {str(blob_meta.blob_id): b"asdas"}
+    (url,) = [call.args[1] for call in client.stream.call_args_list]
+    assert url.endswith(f"/api/form/attachment/{user_visit.xform_id}/myimage.jpg")
 
 
 def test_download_routes_audio_to_audio_attachment(mobile_user: User, opportunity: Opportunity):
@@ -225,11 +280,7 @@ def test_download_routes_audio_to_audio_attachment(mobile_user: User, opportunit
             }
         },
     )
-    with (
-        mock.patch("commcare_connect.opportunity.tasks.httpx.get") as get_response,
-        mock.patch("commcare_connect.opportunity.tasks.default_storage.save") as save_blob,
-    ):
-        get_response.return_value.content = b"bytes"
+    with mock_attachment_download(b"bytes") as (client, saved):
         download_user_visit_attachments.run(user_visit.id)
 
     # Image still goes to BlobMeta
@@ -246,8 +297,7 @@ def test_download_routes_audio_to_audio_attachment(mobile_user: User, opportunit
     assert audio.content_type == "audio/mp4"
     assert audio.content_length == 50
     # Bytes saved under the audio's blob_id
-    saved_keys = [call.args[0] for call in save_blob.call_args_list]
-    assert str(audio.blob_id) in saved_keys
+    assert saved[str(audio.blob_id)] == b"bytes"
 
 
 def test_download_audio_attachment_is_idempotent(mobile_user: User, opportunity: Opportunity):
@@ -256,16 +306,64 @@ def test_download_audio_attachment_is_idempotent(mobile_user: User, opportunity:
         opportunity=opportunity,
         form_json={"attachments": {"recording.m4a": {"content_type": "audio/mp4", "length": 50}}},
     )
-    with (
-        mock.patch("commcare_connect.opportunity.tasks.httpx.get") as get_response,
-        mock.patch("commcare_connect.opportunity.tasks.default_storage.save") as save_blob,
-    ):
-        get_response.return_value.content = b"bytes"
+    with mock_attachment_download(b"bytes") as (client, saved):
         download_user_visit_attachments.run(user_visit.id)
         download_user_visit_attachments.run(user_visit.id)
 
     assert AudioAttachment.objects.filter(user_visit=user_visit).count() == 1
-    assert save_blob.call_count == 1
+    assert client.stream.call_count == 1
+    assert len(saved) == 1
+
+
+def test_download_attachments_retries_only_failed(mobile_user: User, opportunity: Opportunity):
+    user_visit = UserVisitFactory.create(
+        user=mobile_user,
+        opportunity=opportunity,
+        form_json={
+            "attachments": {
+                "first.jpg": {"content_type": "image/jpeg", "length": 20},
+                "second.jpg": {"content_type": "image/jpeg", "length": 20},
+            }
+        },
+    )
+    with mock_attachment_download(b"bytes") as (client, saved):
+        downloaded = client.stream.return_value
+
+        def stream(method, url, **kwargs):
+            if url.endswith("second.jpg"):
+                raise httpx.ReadTimeout("timed out")
+            return downloaded
+
+        client.stream.side_effect = stream
+        with pytest.raises(httpx.ReadTimeout):
+            download_user_visit_attachments.run(user_visit.id)
+        assert list(BlobMeta.objects.values_list("name", flat=True)) == ["first.jpg"]
+
+        client.stream.reset_mock(side_effect=True)
+        download_user_visit_attachments.run(user_visit.id)
+
+    assert set(BlobMeta.objects.values_list("name", flat=True)) == {"first.jpg", "second.jpg"}
+    (url,) = [call.args[1] for call in client.stream.call_args_list]
+    assert url.endswith("second.jpg")
+    assert len(saved) == 2
+
+
+def test_download_attachments_error_response_not_saved(mobile_user: User, opportunity: Opportunity):
+    user_visit = UserVisitFactory.create(
+        user=mobile_user,
+        opportunity=opportunity,
+        form_json={"attachments": {"myimage.jpg": {"content_type": "image/jpeg", "length": 20}}},
+    )
+    with mock_attachment_download(b"Not Found") as (client, saved):
+        response = client.stream.return_value.__enter__.return_value
+        response.raise_for_status.side_effect = httpx.HTTPStatusError(
+            "404 Not Found", request=mock.Mock(), response=mock.Mock(status_code=404)
+        )
+        with pytest.raises(httpx.HTTPStatusError):
+            download_user_visit_attachments.run(user_visit.id)
+
+    assert not BlobMeta.objects.exists()
+    assert saved == {}
 
 
 @pytest.mark.django_db
@@ -280,11 +378,7 @@ def test_download_inaccessibility_request_attachments_creates_blobs(opportunity)
         "photo.jpg": {"content_type": "image/jpeg", "length": 20},
     }
 
-    with (
-        mock.patch("commcare_connect.opportunity.tasks.httpx.get") as get_response,
-        mock.patch("commcare_connect.opportunity.tasks.default_storage.save") as save_blob,
-    ):
-        get_response.return_value.content = b"imgdata"
+    with mock_attachment_download(b"imgdata") as (client, saved):
         download_inaccessibility_request_attachments.run(xform_id, attachments)
 
     assert BlobMeta.objects.filter(parent_id=xform_id).count() == 1  # form.xml excluded
@@ -292,9 +386,7 @@ def test_download_inaccessibility_request_attachments_creates_blobs(opportunity)
     assert blob.name == "photo.jpg"
     assert blob.content_length == 20
     assert blob.content_type == "image/jpeg"
-    blob_id, content_file = save_blob.call_args_list[0].args
-    assert str(blob_id) == blob.blob_id
-    assert content_file.read() == b"imgdata"
+    assert saved == {str(blob.blob_id): b"imgdata"}
 
 
 @pytest.mark.django_db
@@ -312,14 +404,11 @@ def test_download_inaccessibility_request_attachments_skips_existing_blobs(oppor
     )
     attachments = {"photo.jpg": {"content_type": "image/jpeg", "length": 20}}
 
-    with (
-        mock.patch("commcare_connect.opportunity.tasks.httpx.get") as get_response,
-        mock.patch("commcare_connect.opportunity.tasks.default_storage.save") as save_blob,
-    ):
+    with mock_attachment_download(b"imgdata") as (client, saved):
         download_inaccessibility_request_attachments.run(xform_id, attachments)
 
-    get_response.assert_not_called()
-    save_blob.assert_not_called()
+    client.stream.assert_not_called()
+    assert not saved
 
 
 @pytest.mark.django_db
@@ -467,6 +556,16 @@ class TestAutoDeactivateEndedOpportunities:
         assert opp_still_active.active is True
         assert opp_already_inactive.active is False  # unchanged
 
+    @mock.patch("commcare_connect.opportunity.tasks.invalidate_resolution_caches")
+    def test_invalidates_form_receiver_resolution(self, invalidate):
+        OpportunityFactory(active=True, end_date=datetime.date.today())
+        auto_deactivate_ended_opportunities()
+        invalidate.assert_not_called()
+
+        OpportunityFactory(active=True, end_date=datetime.date.today() - datetime.timedelta(days=30))
+        auto_deactivate_ended_opportunities()
+        invalidate.assert_called_once_with()
+
     def test_records_pghistory_event_with_system_context(self):
         cutoff = datetime.date.today() - datetime.timedelta(days=30)
         opp = OpportunityFactory(active=True, end_date=cutoff)
@@ -542,15 +641,14 @@ def test_save_export_uses_export_storage():
 
 @pytest.mark.django_db
 class TestExportTasksCreateExportFile:
-    @mock.patch("commcare_connect.opportunity.tasks.save_export")
+    @mock.patch("commcare_connect.opportunity.tasks.save_export_file")
     @mock.patch("commcare_connect.opportunity.tasks.UserVisitExporter")
     def test_generate_visit_export(self, mock_exporter_cls, mock_save, opportunity):
-        mock_exporter_cls.return_value.get_dataset.return_value = Dataset()
         generate_visit_export(opportunity.id, None, None, [], "csv", False)
+        mock_exporter_cls.return_value.write.assert_called_once()
+        assert mock_exporter_cls.return_value.write.call_args[0][1] == "csv"
         mock_save.assert_called_once()
-        args = mock_save.call_args[0]
-        assert args[1].endswith("_visit_export.csv")
-        assert args[2] == "csv"
+        assert mock_save.call_args[0][1].endswith("_visit_export.csv")
 
     @mock.patch("commcare_connect.opportunity.tasks.save_export")
     @mock.patch("commcare_connect.opportunity.tasks.export_user_visit_review_data")
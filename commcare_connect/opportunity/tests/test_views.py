@@ -37,6 +37,7 @@ from commcare_connect.opportunity.models import (
     OpportunityAccess,
     OpportunityActiveEvent,
     OpportunityClaimLimit,
+    OpportunityStats,
     Payment,
     PaymentUnit,
     TaskType,
@@ -67,6 +68,8 @@ from commcare_connect.opportunity.tests.factories import (
     UserInviteFactory,
     UserVisitFactory,
 )
+from commcare_connect.opportunity.utils.list_metrics import invalidate_opportunity_list_metrics
+from commcare_connect.opportunity.utils.opportunity_stats import reconcile_opportunity_stats
 from commcare_connect.opportunity.views import WorkerPaymentsView
 from commcare_connect.organization.models import Organization
 from commcare_connect.program.tests.factories import ProgramFactory
@@ -733,6 +736,45 @@ def test_opportunity_list_excludes_archived(organization):
     assert queryset.count() == 1
 
 
+@pytest.mark.django_db
+def test_opportunity_list_metrics_cached(organization, django_assert_num_queries, django_capture_on_commit_callbacks):
+    opportunities = OpportunityFactory.create_batch(3, organization=organization)
+    accesses = []
+    for opportunity in opportunities:
+        access = OpportunityAccessFactory(opportunity=opportunity, date_learn_started=now(), last_active=now())
+        CompletedWorkFactory(opportunity_access=access, status=CompletedWorkStatus.approved)
+        UserVisitFactory(
+            opportunity=opportunity,
+            opportunity_access=access,
+            status=VisitValidationStatus.pending,
+            completed_work__opportunity_access=access,
+        )
+        accesses.append(access)
+    opp_ids = [opportunity.id for opportunity in reversed(opportunities)]
+
+    # The page itself, then one query per metrics source for all the opportunities.
+    with django_assert_num_queries(6):
+        data = OpportunityData.get_data_qs(opp_ids, program_manager=True)
+    assert [opp.id for opp in data] == opp_ids
+    for opp in data:
+        assert opp.pending_approvals == 1
+        assert opp.total_deliveries == 2
+        assert opp.verified_deliveries == 1
+        assert opp.total_workers == 1
+        assert opp.active_workers == 1
+        assert opp.total_paid == 0
+
+    with django_assert_num_queries(1):
+        OpportunityData.get_data_qs(opp_ids, program_manager=True)
+
+    PaymentFactory(opportunity_access=accesses[0], amount=30)
+    with django_capture_on_commit_callbacks(execute=True):
+        invalidate_opportunity_list_metrics(opportunities[0].id)
+    data = OpportunityData.get_data_qs(opp_ids, program_manager=True)
+    assert data[-1].total_paid == 30
+    assert data[-1].payments_due == -30
+
+
 @pytest.mark.django_db
 def test_tiered_queryset_basic():
     users = [User.objects.create(username=f"user{i}") for i in range(5)]
@@ -868,6 +910,15 @@ class TestDeleteUserInvites:
         assert str(messages[0]) == "Successfully deleted 2 invite(s)."
         assert str(messages[1]) == "Cannot delete 1 invite(s). Accepted invites cannot be deleted."
 
+    def test_adjusts_invite_stats(self, mock_send_event, opportunity, django_capture_on_commit_callbacks):
+        reconcile_opportunity_stats([opportunity.id])
+        invite_ids = [self.not_found_invites[0].id, self.invited_invite.id]
+        with django_capture_on_commit_callbacks(execute=True):
+            self.client.post(self.url, data={"user_invite_ids": invite_ids})
+
+        stats = OpportunityStats.objects.get(opportunity=opportunity)
+        assert (stats.workers_invited, stats.pending_invites) == (1, 0)
+
 
 @mock.patch("commcare_connect.opportunity.views.send_event_to_ga")
 @pytest.mark.django_db
@@ -1,18 +1,18 @@
 from collections import defaultdict
 
-from django.db.models import F, Sum
+from django.db.models import F, Q, Sum
 from django.db.models.functions import TruncMonth
 
 from commcare_connect.opportunity.models import (
     CompletedWork,
     CompletedWorkStatus,
+    CompletedWorkVisitCount,
     DeliverUnit,
     OpportunityAccess,
     Payment,
     PaymentUnit,
-    VisitReviewStatus,
-    VisitValidationStatus,
 )
+from commcare_connect.opportunity.utils.opportunity_stats import adjust_opportunity_stats
 
 
 class CompletedWorkUpdater:
@@ -30,16 +30,21 @@ class CompletedWorkUpdater:
         self.completed_works = completed_works
 
         self.completed_works_unit_approvals = {}
-        self.counts = defaultdict(lambda: {"completed": 0, "approved": 0})
+        self.counts = {}
+        self.visit_counts = defaultdict(dict)
         self.parent_child_payment_unit_map = defaultdict(list)
         self.deliver_unit_map = defaultdict(list)
 
     def _prepare_deliver_payment_unit_maps(self):
-        payment_units = PaymentUnit.objects.filter(
-            id__in=self.completed_works.values_list("payment_unit_id", flat=True)
-        ).values("id", "parent_payment_unit")
+        # Every payment unit of the opportunity is mapped so that child units are known even when
+        # their completed works are not part of this batch.
+        payment_units = list(
+            PaymentUnit.objects.filter(
+                Q(opportunity=self.opportunity) | Q(id__in=self.completed_works.values("payment_unit_id"))
+            ).values("id", "parent_payment_unit")
+        )
         deliver_units = DeliverUnit.objects.filter(
-            payment_unit__in=self.completed_works.values_list("payment_unit_id", flat=True)
+            payment_unit__in=[payment_unit["id"] for payment_unit in payment_units]
         ).values("id", "optional", "payment_unit_id")
 
         for payment_unit in payment_units:
@@ -63,74 +68,96 @@ class CompletedWorkUpdater:
                 required_deliver_units.append(du_id)
         return required_deliver_units, optional_deliver_units
 
+    def _get_child_completed_works(self, completed_works):
+        """Completed works of child payment units, at any depth, by ``(entity_id, payment_unit_id)``."""
+        child_payment_units = {
+            child_id
+            for parent_id, child_ids in self.parent_child_payment_unit_map.items()
+            if parent_id is not None
+            for child_id in child_ids
+        }
+        child_works = defaultdict(list)
+        if not child_payment_units:
+            return child_works
+        for completed_work in CompletedWork.objects.filter(
+            opportunity_access=self.opportunity_access,
+            payment_unit__in=child_payment_units,
+            entity_id__in={completed_work.entity_id for completed_work in completed_works},
+        ):
+            child_works[(completed_work.entity_id, completed_work.payment_unit_id)].append(completed_work)
+        return child_works
+
     def _get_completed_work_counts(self):
         """Count completed and approved visits for each CompletedWork.
 
-        For each work item, takes the minimum visit count across all required
-        deliver units (ensuring all required forms are submitted). If optional
-        deliver units exist, their total count is also used as an upper bound.
-        If child payment units exist, their counts further constrain the total.
+        Uses the per deliver unit counters in ``CompletedWorkVisitCount``, so the counts take one
+        query for the whole batch however many visits there are. For each work item, takes the
+        minimum visit count across all required deliver units (ensuring all required forms are
+        submitted). If optional deliver units exist, their total count is also used as an upper
+        bound. If child payment units exist, their counts further constrain the total.
         Also tracks whether any visit exists (has_visits), which is used to
         gate status transitions independently of payment eligibility.
         """
         self._prepare_deliver_payment_unit_maps()
+        completed_works = list(self.completed_works)
+        child_works = self._get_child_completed_works(completed_works)
+
+        completed_work_ids = {completed_work.id for completed_work in completed_works}
+        completed_work_ids.update(work.id for works in child_works.values() for work in works)
+        for visit_count in CompletedWorkVisitCount.objects.filter(completed_work_id__in=completed_work_ids):
+            self.visit_counts[visit_count.completed_work_id][visit_count.deliver_unit_id] = visit_count
+
+        for completed_work in completed_works:
+            self._count_completed_work(completed_work, child_works)
+
+    def _count_completed_work(self, completed_work, child_works):
+        if completed_work.id in self.counts:
+            return self.counts[completed_work.id]
+
+        unit_counts = self.visit_counts[completed_work.id]
+        approved_unit_counts = defaultdict(lambda: {"approved": 0, "agree": 0})
+        for deliver_unit_id, visit_count in unit_counts.items():
+            approved_unit_counts[deliver_unit_id]["approved"] = visit_count.approved_count
+            approved_unit_counts[deliver_unit_id]["agree"] = visit_count.agreed_count
+        self.completed_works_unit_approvals[completed_work.id] = approved_unit_counts
+
+        def visits(deliver_id):
+            return unit_counts[deliver_id].visit_count if deliver_id in unit_counts else 0
+
+        payment_unit_id = completed_work.payment_unit_id
+        required_deliver_units, optional_deliver_units = self._get_deliver_units_for_payment_unit(payment_unit_id)
+
+        number_completed = min([visits(deliver_id) for deliver_id in required_deliver_units], default=0)
+        number_approved = min(
+            [approved_unit_counts[deliver_id]["agree"] for deliver_id in required_deliver_units],
+            default=0,
+        )
 
-        for completed_work in self.completed_works:
-            unit_counts = defaultdict(int)
-            approved_unit_counts = defaultdict(lambda: {"approved": 0, "agree": 0})
-            for user_visit in completed_work.uservisit_set.all():
-                unit_counts[user_visit.deliver_unit_id] += 1
-                if user_visit.status == VisitValidationStatus.approved.value:
-                    approved_unit_counts[user_visit.deliver_unit_id]["approved"] += 1
-                    if user_visit.review_status == VisitReviewStatus.agree.value:
-                        approved_unit_counts[user_visit.deliver_unit_id]["agree"] += 1
-
-            has_visits = bool(unit_counts)
-            self.completed_works_unit_approvals[completed_work.id] = approved_unit_counts
-
-            if completed_work.id in self.counts:
-                if has_visits:
-                    self.counts[completed_work.id]["has_visits"] = True
-                continue
-
-            payment_unit_id = completed_work.payment_unit_id
-            required_deliver_units, optional_deliver_units = self._get_deliver_units_for_payment_unit(payment_unit_id)
-
-            number_completed = min([unit_counts[deliver_id] for deliver_id in required_deliver_units], default=0)
-            number_approved = min(
-                [approved_unit_counts[deliver_id]["agree"] for deliver_id in required_deliver_units],
-                default=0,
-            )
-
-            if optional_deliver_units:
-                optional_completed = sum(unit_counts[deliver_id] for deliver_id in optional_deliver_units)
-                number_completed = min(number_completed, optional_completed)
-
-                optional_approved = sum(
-                    approved_unit_counts[deliver_id]["agree"] for deliver_id in optional_deliver_units
-                )
-                number_approved = min(number_approved, optional_approved)
-
-            child_payment_units = self.parent_child_payment_unit_map[payment_unit_id]
-            if child_payment_units:
-                child_completed_works = CompletedWork.objects.filter(
-                    opportunity_access=completed_work.opportunity_access,
-                    payment_unit__in=child_payment_units,
-                    entity_id=completed_work.entity_id,
-                )
-                child_completed_work_count = child_approved_work_count = 0
-                for child_completed_work in child_completed_works:
-                    if child_completed_work.id not in self.counts:
-                        self.counts[child_completed_work.id]["approved"] = child_completed_work.approved_count
-                        self.counts[child_completed_work.id]["completed"] = child_completed_work.completed_count
-                    child_approved_work_count += self.counts[child_completed_work.id]["approved"]
-                    child_completed_work_count += self.counts[child_completed_work.id]["completed"]
-                number_completed = min(number_completed, child_completed_work_count)
-                number_approved = min(number_approved, child_approved_work_count)
-
-            self.counts[completed_work.id]["approved"] = number_approved
-            self.counts[completed_work.id]["completed"] = number_completed
-            self.counts[completed_work.id]["has_visits"] = has_visits
+        if optional_deliver_units:
+            optional_completed = sum(visits(deliver_id) for deliver_id in optional_deliver_units)
+            number_completed = min(number_completed, optional_completed)
+
+            optional_approved = sum(approved_unit_counts[deliver_id]["agree"] for deliver_id in optional_deliver_units)
+            number_approved = min(number_approved, optional_approved)
+
+        child_payment_units = self.parent_child_payment_unit_map[payment_unit_id]
+        if child_payment_units:
+            child_completed_work_count = child_approved_work_count = 0
+            for child_payment_unit_id in child_payment_units:
+                for child_completed_work in child_works[(completed_work.entity_id, child_payment_unit_id)]:
+                    child_counts = self._count_completed_work(child_completed_work, child_works)
+                    child_approved_work_count += child_counts["approved"]
+                    child_completed_work_count += child_counts["completed"]
+            number_completed = min(number_completed, child_completed_work_count)
+            number_approved = min(number_approved, child_approved_work_count)
+
+        self.counts[completed_work.id] = {
+            "approved": number_approved,
+            "completed": number_completed,
+            "has_visits": any(visit_count.visit_count for visit_count in unit_counts.values()),
+            "rejected": any(visit_count.rejected_count for visit_count in unit_counts.values()),
+        }
+        return self.counts[completed_work.id]
 
     def _update_status(self, completed_work):
         """Set CompletedWork status based on visit statuses and approval rules.
@@ -141,11 +168,10 @@ class CompletedWorkUpdater:
         """
         updated = False
         if self.opportunity.auto_approve_payments:
-            visits = completed_work.uservisit_set.values_list("status", "reason", "review_status")
-
-            if any(status == VisitValidationStatus.rejected for status, *_ in visits):
+            if self.counts[completed_work.id]["rejected"]:
+                reasons = completed_work.uservisit_set.values_list("reason", flat=True)
                 completed_work.status = CompletedWorkStatus.rejected
-                completed_work.reason = "\n".join(reason for _, reason, *_ in visits if reason)
+                completed_work.reason = "\n".join(reason for reason in reasons if reason)
             elif self._is_completed_work_approved(completed_work):
                 completed_work.status = CompletedWorkStatus.approved
             elif completed_work.status == CompletedWorkStatus.incomplete:
@@ -249,6 +275,7 @@ def update_status(completed_works, opportunity_access, compute_payment=True):
     """
     CompletedWorkUpdater(opportunity_access, completed_works).update_status_and_set_saved_fields()
     if compute_payment:
+        old_payment_accrued = opportunity_access.payment_accrued
         opportunity_access.payment_accrued = (
             CompletedWork.objects.filter(opportunity_access=opportunity_access)
             .aggregate(payment_accrued=Sum("saved_payment_accrued"))
@@ -256,6 +283,9 @@ def update_status(completed_works, opportunity_access, compute_payment=True):
             or 0
         )
         opportunity_access.save()
+        adjust_opportunity_stats(
+            opportunity_access.opportunity_id, total_accrued=opportunity_access.payment_accrued - old_payment_accrued
+        )
 
 
 def update_work_payment_date(access: OpportunityAccess):
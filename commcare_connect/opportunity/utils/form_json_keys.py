@@ -0,0 +1,205 @@
+"""Catalog of the form_json keys seen in each build of a deliver app.
+
+``FormJsonKey`` records the path to every leaf value in the visits' form_json (attachments
+excluded), the JSON types seen there and how many visits have it, so that exports, rule
+pickers and audit indicators can tell which keys exist without scanning visits.
+
+Once a deliver form's visits are committed, the form processor queues a task adding the keys of
+the form that its build doesn't have yet, with the types and visit count of that form. Rows are
+never updated on that path, so that every form of a build doesn't wait on the same rows.
+``refresh_form_json_keys`` rebuilds an app's keys from all of its visits, recounting the
+frequencies and types, and runs nightly for apps with new visits. The keys of visits submitted
+since then may still be missing, if their task is queued or was lost, so consumers that need every
+key also look at ``get_uncatalogued_visits``.
+"""
+
+import json
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Max, Q
+from django.db.models.expressions import RawSQL
+from django.utils.timezone import now
+
+from commcare_connect.opportunity.models import CommCareApp, FormJsonKey, UserVisit
+
+ATTACHMENTS_KEY = "attachments"
+
+# The leaf values in the form_json of the visits matching ``{where}``, as ``leaves (id, path, value)``.
+LEAVES_CTE = """
+WITH RECURSIVE nodes (id, path, value) AS (
+    SELECT visit.id, ARRAY[item.key], item.value
+    FROM opportunity_uservisit visit
+    JOIN opportunity_deliverunit deliver_unit ON deliver_unit.id = visit.deliver_unit_id
+    CROSS JOIN LATERAL jsonb_each(visit.form_json) AS item (key, value)
+    WHERE {where} AND item.key <> 'attachments'
+    UNION ALL
+    SELECT nodes.id, nodes.path || child.key, child.value
+    FROM nodes
+    CROSS JOIN LATERAL (
+        SELECT item.key, item.value
+        FROM jsonb_each(CASE WHEN jsonb_typeof(nodes.value) = 'object' THEN nodes.value END) AS item (key, value)
+        UNION ALL
+        SELECT (item.ordinal - 1)::text, item.value
+        FROM jsonb_array_elements(CASE WHEN jsonb_typeof(nodes.value) = 'array' THEN nodes.value END)
+            WITH ORDINALITY AS item (value, ordinal)
+    ) AS child
+),
+leaves AS (
+    SELECT * FROM nodes WHERE jsonb_typeof(value) NOT IN ('object', 'array')
+)
+"""
+
+# Recounts the keys of every build of an app from the leaf values in its visits' form_json.
+REFRESH_APP_KEYS_SQL = (
+    LEAVES_CTE.format(where="deliver_unit.app_id = %(app_id)s")
+    + """
+INSERT INTO opportunity_formjsonkey (app_id, app_build_version, path, value_types, visit_count, date_modified)
+SELECT %(app_id)s, visit.app_build_version, leaves.path,
+       array_agg(DISTINCT jsonb_typeof(leaves.value)), COUNT(*), NOW()
+FROM leaves
+JOIN opportunity_uservisit visit ON visit.id = leaves.id
+GROUP BY visit.app_build_version, leaves.path
+ON CONFLICT ON CONSTRAINT unique_form_json_key DO UPDATE
+SET value_types = EXCLUDED.value_types, visit_count = EXCLUDED.visit_count, date_modified = EXCLUDED.date_modified
+"""
+)
+
+# The distinct paths of the leaf values of the visits selected by ``{visits}``, a query of their ids.
+VISIT_PATHS_SQL = (
+    LEAVES_CTE.format(where="visit.id IN ({visits})")
+    + """
+SELECT DISTINCT path FROM leaves
+"""
+)
+
+# Adds a row of ``%(keys)s``, a JSON list of ``{"path": [...], "types": [...]}``, for each key of a
+# form that its build doesn't have yet. Keys already catalogued are left alone, so the forms of a
+# build only contend on a key when they both add it, and then in the list's order.
+RECORD_KEYS_SQL = """
+INSERT INTO opportunity_formjsonkey (app_id, app_build_version, path, value_types, visit_count, date_modified)
+SELECT %(app_id)s, %(app_build_version)s,
+       ARRAY(SELECT jsonb_array_elements_text(item.key -> 'path')),
+       ARRAY(SELECT jsonb_array_elements_text(item.key -> 'types')),
+       %(visit_count)s, NOW()
+FROM jsonb_array_elements(%(keys)s::jsonb) WITH ORDINALITY AS item (key, ordinal)
+ORDER BY item.ordinal
+ON CONFLICT ON CONSTRAINT unique_form_json_key DO NOTHING
+"""
+
+
+def json_type(value):
+    """The name ``jsonb_typeof`` gives the type of a decoded JSON leaf value."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int | float):
+        return "number"
+    return "string"
+
+
+def iter_form_json_leaves(form_json):
+    """Yield ``(path, value)`` for each leaf of ``form_json`` in flatten_dict order, skipping attachments."""
+    stack = [((key,), value) for key, value in reversed(form_json.items()) if key != ATTACHMENTS_KEY]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend((path + (key,), child) for key, child in reversed(value.items()))
+        elif isinstance(value, list):
+            stack.extend((path + (str(index),), child) for index, child in reversed(list(enumerate(value))))
+        else:
+            yield path, value
+
+
+def record_form_json_keys(app_id, app_build_version, form_json: dict, visit_count=1):
+    """Add the keys of a submitted form that the catalog of its build doesn't have yet.
+
+    ``visit_count`` is the number of visits the form made, which new keys start with. The counts
+    and types of keys already catalogued are only brought up to date by ``refresh_form_json_keys``.
+    """
+    if app_build_version is not None:
+        app_build_version = int(app_build_version)
+    types = {}
+    for path, value in iter_form_json_leaves(form_json):
+        types.setdefault(path, set()).add(json_type(value))
+    if not types:
+        return
+    keys = [{"path": list(path), "types": sorted(types[path])} for path in sorted(types)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            RECORD_KEYS_SQL,
+            {
+                "app_id": app_id,
+                "app_build_version": app_build_version,
+                "keys": json.dumps(keys),
+                "visit_count": visit_count,
+            },
+        )
+
+
+def refresh_form_json_keys(app: CommCareApp):
+    """Rebuild the catalog of ``app`` from all of its visits, recounting types and frequencies."""
+    started = now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        last_visit_id = UserVisit.objects.filter(deliver_unit__app=app).aggregate(Max("id"))["id__max"]
+        cursor.execute(REFRESH_APP_KEYS_SQL, {"app_id": app.id})
+        CommCareApp.objects.filter(id=app.id).update(
+            form_json_keys_refreshed=started, form_json_keys_visit_id=last_visit_id
+        )
+    app.form_json_keys_refreshed = started
+    app.form_json_keys_visit_id = last_visit_id
+
+
+def get_uncatalogued_visits(app: CommCareApp, visits=None):
+    """The visits to ``app``, or those of ``visits``, that its last refresh didn't catalogue."""
+    if visits is None:
+        visits = UserVisit.objects.filter(deliver_unit__app=app)
+    if app.form_json_keys_refreshed:
+        visits = visits.filter(id__gt=app.form_json_keys_visit_id or 0)
+    return visits
+
+
+def jsonb_key_order(path):
+    """Sort key putting paths in the order jsonb stores object keys: shorter keys first, then by bytes.
+
+    List indexes sort numerically under the same rule.
+    """
+    return [(len(key.encode()), key.encode()) for key in path]
+
+
+def get_app_form_json_paths(app_id) -> list[list[str]]:
+    """The catalogued paths of all of an app's builds, in jsonb key order."""
+    paths = {tuple(path) for path in FormJsonKey.objects.filter(app_id=app_id).values_list("path", flat=True)}
+    return [list(path) for path in sorted(paths, key=jsonb_key_order)]
+
+
+def get_form_json_paths(app: CommCareApp, visits) -> list[list[str]]:
+    """The paths that ``visits`` to ``app`` may have a value at, in jsonb key order.
+
+    These are the catalogued paths of the builds the visits are from, some of which none of them
+    may have, and the paths of those visits that the catalog doesn't cover yet.
+    """
+    builds = set(visits.order_by().values_list("app_build_version", flat=True).distinct())
+    in_builds = Q(app_build_version__in=builds - {None})
+    if None in builds:
+        in_builds |= Q(app_build_version__isnull=True)
+    paths = {tuple(path) for path in FormJsonKey.objects.filter(in_builds, app=app).values_list("path", flat=True)}
+    uncatalogued, params = get_uncatalogued_visits(app, visits).order_by().values("id").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(VISIT_PATHS_SQL.format(visits=uncatalogued), params)
+        paths.update(tuple(path) for (path,) in cursor.fetchall())
+    return [list(path) for path in sorted(paths, key=jsonb_key_order)]
+
+
+def is_form_json_key_absent(app: CommCareApp, path) -> bool:
+    """Whether no visit to ``app`` has a value at ``path``.
+
+    The catalog answers for the visits its last refresh saw, and the visits since then are checked
+    directly, so a key whose task is queued or lost isn't reported absent.
+    """
+    if FormJsonKey.objects.filter(app=app, path=list(path)).exists():
+        return False
+    has_path = RawSQL(
+        "opportunity_uservisit.form_json #> %s::text[] IS NOT NULL", (list(path),), output_field=BooleanField()
+    )
+    return not get_uncatalogued_visits(app).filter(has_path).exists()
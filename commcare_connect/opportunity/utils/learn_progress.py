@@ -0,0 +1,68 @@
+"""Maintenance of the learn progress stored on ``OpportunityAccess``.
+
+``learn_modules_completed`` is the number of distinct learn modules the worker completed and
+``learn_progress`` the percentage of the learn app's modules that represents. Both are
+recomputed in a single update when a learn form is processed, and for every access of an app's
+opportunities when its modules change, since that changes the total they are measured against.
+"""
+
+from django.db import connection
+
+UPDATE_LEARN_PROGRESS_SQL = """
+UPDATE opportunity_opportunityaccess access
+SET learn_modules_completed = progress.completed,
+    learn_progress = progress.percentage
+FROM (
+    SELECT
+        filtered_access.id,
+        completed.modules AS completed,
+        CASE WHEN total.modules > 0 THEN ROUND(completed.modules * 100.0 / total.modules, 2) ELSE 0 END AS percentage
+    FROM opportunity_opportunityaccess filtered_access
+    JOIN opportunity_opportunity opp ON opp.id = filtered_access.opportunity_id
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS modules FROM opportunity_learnmodule WHERE app_id = opp.learn_app_id
+    ) total
+    CROSS JOIN LATERAL (
+        SELECT COUNT(DISTINCT module_id) AS modules
+        FROM opportunity_completedmodule
+        WHERE opportunity_access_id = filtered_access.id
+    ) completed
+    WHERE {condition}
+) progress
+WHERE access.id = progress.id
+    AND (access.learn_modules_completed, access.learn_progress)
+        IS DISTINCT FROM (progress.completed, progress.percentage)
+RETURNING access.id, access.learn_modules_completed, access.learn_progress
+"""
+
+ACCESS_CONDITION = "filtered_access.id = ANY(%(access_ids)s)"
+APP_CONDITION = "opp.learn_app_id = %(app_id)s"
+ID_RANGE_CONDITION = "filtered_access.id >= %(start)s AND filtered_access.id < %(end)s"
+
+
+def update_learn_progress(access):
+    """Recompute the learn progress of ``access`` and set it on the instance."""
+    for _, completed, progress in _update(ACCESS_CONDITION, {"access_ids": [access.id]}):
+        access.learn_modules_completed = completed
+        access.learn_progress = progress
+
+
+def update_app_learn_progress(app_id):
+    """Recompute the learn progress of every access to an opportunity using ``app_id`` as its learn app."""
+    return len(_update(APP_CONDITION, {"app_id": app_id}))
+
+
+def update_learn_progress_in_range(start, end, opportunity_id=None):
+    """Recompute the learn progress of the accesses with an id in [start, end), returning how many changed."""
+    condition = ID_RANGE_CONDITION
+    params = {"start": start, "end": end}
+    if opportunity_id:
+        condition += " AND filtered_access.opportunity_id = %(opportunity_id)s"
+        params["opportunity_id"] = opportunity_id
+    return len(_update(condition, params))
+
+
+def _update(condition, params):
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_LEARN_PROGRESS_SQL.format(condition=condition), params)
+        return cursor.fetchall()
@@ -0,0 +1,133 @@
+"""Per-opportunity figures shown in the opportunity list, cached for a short time.
+
+``get_opportunity_list_metrics`` serves a page of opportunities from the cache and computes
+the missing ones together, with one grouped query per source table whatever the page size.
+Visit reviews, payments and the visits the form processor writes call
+``invalidate_opportunity_list_metrics``, so pending approvals and deliveries are current in the
+list. Invites and worker inactivity show up when the entry expires.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils.timezone import now
+
+from commcare_connect.opportunity.models import (
+    CompletedWork,
+    CompletedWorkStatus,
+    OpportunityAccess,
+    Payment,
+    UserInvite,
+    UserInviteStatus,
+)
+
+LIST_METRICS_CACHE_TTL_SECONDS = 2 * 60
+INACTIVE_DAYS = 3
+
+# Completed work with a visit awaiting review by the network manager (pending status) or by
+# the program manager (pending review status once a review was requested). Each branch can use
+# its own index, unlike an OR across the two.
+PENDING_APPROVALS_SQL = """
+SELECT opportunity_id, COUNT(DISTINCT completed_work_id)
+FROM (
+    SELECT opportunity_id, completed_work_id
+    FROM opportunity_uservisit
+    WHERE opportunity_id = ANY(%(opportunity_ids)s) AND status = 'pending' AND completed_work_id IS NOT NULL
+    UNION ALL
+    SELECT opportunity_id, completed_work_id
+    FROM opportunity_uservisit
+    WHERE opportunity_id = ANY(%(opportunity_ids)s)
+        AND review_status = 'pending'
+        AND review_created_on IS NOT NULL
+        AND completed_work_id IS NOT NULL
+) pending
+GROUP BY opportunity_id
+"""
+
+
+def get_list_metrics_cache_key(opportunity_id):
+    return f"opportunity:list_metrics:{opportunity_id}"
+
+
+def get_opportunity_list_metrics(opportunity_ids) -> dict[int, dict]:
+    """Map each of ``opportunity_ids`` to its list figures, computing those not cached."""
+    keys = {opportunity_id: get_list_metrics_cache_key(opportunity_id) for opportunity_id in opportunity_ids}
+    cached = cache.get_many(list(keys.values()))
+    metrics = {opportunity_id: cached[key] for opportunity_id, key in keys.items() if key in cached}
+    missing = [opportunity_id for opportunity_id in opportunity_ids if opportunity_id not in metrics]
+    if missing:
+        computed = compute_opportunity_list_metrics(missing)
+        cache.set_many(
+            {keys[opportunity_id]: computed[opportunity_id] for opportunity_id in missing},
+            LIST_METRICS_CACHE_TTL_SECONDS,
+        )
+        metrics.update(computed)
+    return metrics
+
+
+def compute_opportunity_list_metrics(opportunity_ids) -> dict[int, dict]:
+    metrics = {
+        opportunity_id: {
+            "pending_invites": 0,
+            "pending_approvals": 0,
+            "total_accrued": 0,
+            "total_paid": Decimal(0),
+            "inactive_workers": 0,
+            "total_workers": 0,
+            "started_learning": 0,
+            "total_deliveries": 0,
+            "verified_deliveries": 0,
+        }
+        for opportunity_id in opportunity_ids
+    }
+
+    invites = (
+        UserInvite.objects.filter(opportunity_id__in=opportunity_ids)
+        .exclude(status__in=[UserInviteStatus.not_found, UserInviteStatus.accepted])
+        .values("opportunity_id")
+        .annotate(pending_invites=Count("id"))
+    )
+    accesses = (
+        OpportunityAccess.objects.filter(opportunity_id__in=opportunity_ids)
+        .values("opportunity_id")
+        .annotate(
+            total_accrued=Sum("payment_accrued", default=0),
+            inactive_workers=Count("id", filter=Q(last_active__lt=now() - timedelta(days=INACTIVE_DAYS))),
+            total_workers=Count("id"),
+            started_learning=Count("id", filter=Q(date_learn_started__isnull=False)),
+        )
+    )
+    payments = (
+        Payment.objects.filter(opportunity_access__opportunity_id__in=opportunity_ids)
+        .values(opportunity_id=F("opportunity_access__opportunity_id"))
+        .annotate(total_paid=Sum("amount"))
+    )
+    deliveries = (
+        CompletedWork.objects.filter(opportunity_access__opportunity_id__in=opportunity_ids)
+        .values(opportunity_id=F("opportunity_access__opportunity_id"))
+        .annotate(
+            total_deliveries=Count("id"),
+            verified_deliveries=Count("id", filter=Q(status=CompletedWorkStatus.approved)),
+        )
+    )
+    for rows in (invites, accesses, payments, deliveries):
+        for row in rows:
+            metrics[row.pop("opportunity_id")].update(row)
+
+    with connection.cursor() as cursor:
+        cursor.execute(PENDING_APPROVALS_SQL, {"opportunity_ids": list(opportunity_ids)})
+        for opportunity_id, pending_approvals in cursor.fetchall():
+            metrics[opportunity_id]["pending_approvals"] = pending_approvals
+    return metrics
+
+
+def invalidate_opportunity_list_metrics(opportunity_id):
+    """Drop the cached figures of an opportunity once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(get_list_metrics_cache_key(opportunity_id)))
+
+
+def clear_list_metrics_caches():
+    cache.delete_pattern(get_list_metrics_cache_key("*"))
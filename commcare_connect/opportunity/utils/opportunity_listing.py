@@ -0,0 +1,93 @@
+"""ETag of the opportunity listing served to the mobile app.
+
+The app polls the listing, so ``get_opportunity_listing_etag`` fingerprints everything the
+listing is rendered from in one query: the worker's opportunities and their apps, learn modules,
+payment units and verification flags, and the worker's access, delivery progress, claim, claim
+limits and catchment areas. A matching ``If-None-Match`` can then be answered with a 304 without
+loading or serializing any of it. The date is part of the fingerprint as ``is_active`` depends on it.
+"""
+
+from django.db import connection
+from django.utils.http import quote_etag
+
+OPPORTUNITY_LISTING_FINGERPRINT_SQL = """
+WITH access AS (
+    SELECT user_access.id, user_access.opportunity_id, user_access.suspended, user_access.learn_modules_completed
+    FROM opportunity_opportunityaccess user_access
+    JOIN opportunity_opportunity opp ON opp.id = user_access.opportunity_id
+    WHERE user_access.user_id = %(user_id)s AND NOT opp.archived
+),
+app AS (
+    SELECT learn_app_id AS id FROM opportunity_opportunity WHERE id IN (SELECT opportunity_id FROM access)
+    UNION
+    SELECT deliver_app_id FROM opportunity_opportunity WHERE id IN (SELECT opportunity_id FROM access)
+)
+SELECT md5(concat_ws(
+    '|',
+    CURRENT_DATE,
+    (
+        SELECT string_agg(concat_ws(',', row_to_json(opp)::text, org.slug), ';' ORDER BY opp.id)
+        FROM opportunity_opportunity opp
+        JOIN organization_organization org ON org.id = opp.organization_id
+        WHERE opp.id IN (SELECT opportunity_id FROM access)
+    ),
+    (
+        SELECT string_agg(concat_ws(',', row_to_json(app_row)::text, org.slug, server.url), ';' ORDER BY app_row.id)
+        FROM opportunity_commcareapp app_row
+        LEFT JOIN organization_organization org ON org.id = app_row.organization_id
+        LEFT JOIN commcarehq_hqserver server ON server.id = app_row.hq_server_id
+        WHERE app_row.id IN (SELECT id FROM app)
+    ),
+    (
+        SELECT string_agg(row_to_json(module)::text, ';' ORDER BY module.id)
+        FROM opportunity_learnmodule module
+        WHERE module.app_id IN (SELECT id FROM app)
+    ),
+    (
+        SELECT string_agg(row_to_json(unit)::text, ';' ORDER BY unit.id)
+        FROM opportunity_paymentunit unit
+        WHERE unit.opportunity_id IN (SELECT opportunity_id FROM access)
+    ),
+    (
+        SELECT string_agg(row_to_json(flags)::text, ';' ORDER BY flags.id)
+        FROM opportunity_opportunityverificationflags flags
+        WHERE flags.opportunity_id IN (SELECT opportunity_id FROM access)
+    ),
+    (
+        SELECT string_agg(
+            concat_ws(',', access.id, access.suspended, access.learn_modules_completed, progress.visits),
+            ';' ORDER BY access.id
+        )
+        FROM access
+        CROSS JOIN LATERAL (
+            SELECT SUM(saved_completed_count) AS visits
+            FROM opportunity_completedwork
+            WHERE opportunity_access_id = access.id AND status <> 'over_limit'
+        ) progress
+    ),
+    (
+        SELECT string_agg(row_to_json(claim)::text, ';' ORDER BY claim.id)
+        FROM opportunity_opportunityclaim claim
+        WHERE claim.opportunity_access_id IN (SELECT id FROM access)
+    ),
+    (
+        SELECT string_agg(row_to_json(claim_limit)::text, ';' ORDER BY claim_limit.id)
+        FROM opportunity_opportunityclaimlimit claim_limit
+        JOIN opportunity_opportunityclaim claim ON claim.id = claim_limit.opportunity_claim_id
+        WHERE claim.opportunity_access_id IN (SELECT id FROM access)
+    ),
+    (
+        SELECT string_agg(row_to_json(area)::text, ';' ORDER BY area.id)
+        FROM opportunity_catchmentarea area
+        WHERE area.opportunity_access_id IN (SELECT id FROM access)
+    )
+))
+"""
+
+
+def get_opportunity_listing_etag(user, version=None):
+    """The quoted ETag of the opportunity listing ``user`` would get for API ``version``."""
+    with connection.cursor() as cursor:
+        cursor.execute(OPPORTUNITY_LISTING_FINGERPRINT_SQL, {"user_id": user.pk})
+        (fingerprint,) = cursor.fetchone()
+    return quote_etag(f"{fingerprint}-{version}" if version else fingerprint)
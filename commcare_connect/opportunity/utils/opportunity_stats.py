@@ -0,0 +1,257 @@
+"""Maintenance of the ``OpportunityStats`` and ``OpportunityDailyStats`` rollups read by the dashboard.
+
+``reconcile_opportunity_stats`` recomputes an opportunity's rollup from the source tables. An
+opportunity's rollup is first created by the task the dashboard queues when it finds none, and
+until then the dashboard computes the figures with ``compute_opportunity_stats``. Between
+reconciliations the form receiver, accrual, payment, invite and task paths call
+``adjust_opportunity_stats`` with the change they made, which is applied as a short update once
+their transaction commits so that concurrent submissions don't queue on the rollup row. The
+approved and rejected delivery counts and the daily accrual buckets are only brought up to date
+by reconciliation, which also repairs any drift between the two, and moves the inactive worker
+cutoff each day.
+"""
+
+import datetime
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.timezone import now
+
+from commcare_connect.opportunity.models import OpportunityDailyStats, OpportunityStats, UserInviteStatus
+
+INACTIVE_DAYS = 3
+DAILY_STATS_DAYS = 7
+
+STATS_FIELDS = (
+    "total_deliveries",
+    "approved_deliveries",
+    "rejected_deliveries",
+    "most_recent_delivery",
+    "started_deliveries",
+    "total_accrued",
+    "total_paid",
+    "recent_payment",
+    "workers_invited",
+    "pending_invites",
+    "started_learning",
+    "completed_learning",
+    "completed_assessments",
+    "claimed_job",
+    "inactive_workers",
+    "active_tasks",
+)
+
+# One row of the opportunity id followed by the STATS_FIELDS of each opportunity.
+STATS_SQL = """
+SELECT
+    opp.id, works.total, works.approved, works.rejected, visits.latest, visits.workers, accesses.accrued,
+    payments.paid, payments.latest, invites.invited, invites.pending, accesses.started_learning,
+    accesses.completed_learning, assessments.passed, claims.claimed, accesses.inactive, tasks.active
+FROM opportunity_opportunity opp
+CROSS JOIN LATERAL (
+    SELECT
+        COALESCE(SUM(payment_accrued), 0) AS accrued,
+        COUNT(*) FILTER (WHERE last_active < %(inactive_before)s) AS inactive,
+        COUNT(*) FILTER (WHERE date_learn_started IS NOT NULL) AS started_learning,
+        COUNT(DISTINCT user_id) FILTER (WHERE completed_learn_date IS NOT NULL) AS completed_learning
+    FROM opportunity_opportunityaccess
+    WHERE opportunity_id = opp.id
+) accesses
+CROSS JOIN LATERAL (
+    SELECT
+        COUNT(*) AS total,
+        COUNT(*) FILTER (WHERE work.status = 'approved') AS approved,
+        COUNT(*) FILTER (WHERE work.status = 'rejected') AS rejected
+    FROM opportunity_completedwork work
+    JOIN opportunity_opportunityaccess work_access ON work_access.id = work.opportunity_access_id
+    WHERE work_access.opportunity_id = opp.id
+) works
+CROSS JOIN LATERAL (
+    SELECT MAX(visit_date) AS latest, COUNT(DISTINCT user_id) AS workers
+    FROM opportunity_uservisit
+    WHERE opportunity_id = opp.id
+) visits
+CROSS JOIN LATERAL (
+    SELECT COALESCE(SUM(payment.amount), 0) AS paid, MAX(payment.date_paid) AS latest
+    FROM opportunity_payment payment
+    JOIN opportunity_opportunityaccess payment_access ON payment_access.id = payment.opportunity_access_id
+    WHERE payment_access.opportunity_id = opp.id
+) payments
+CROSS JOIN LATERAL (
+    SELECT
+        COUNT(*) FILTER (WHERE status <> 'not_found') AS invited,
+        COUNT(*) FILTER (WHERE status NOT IN ('not_found', 'accepted')) AS pending
+    FROM opportunity_userinvite
+    WHERE opportunity_id = opp.id
+) invites
+CROSS JOIN LATERAL (
+    SELECT COUNT(DISTINCT user_id) AS passed
+    FROM opportunity_assessment
+    WHERE opportunity_id = opp.id AND passed
+) assessments
+CROSS JOIN LATERAL (
+    SELECT COUNT(*) AS claimed
+    FROM opportunity_opportunityclaim claim
+    JOIN opportunity_opportunityaccess claim_access ON claim_access.id = claim.opportunity_access_id
+    WHERE claim_access.opportunity_id = opp.id
+) claims
+CROSS JOIN LATERAL (
+    SELECT COUNT(*) AS active
+    FROM opportunity_assignedtask task
+    JOIN opportunity_opportunityaccess task_access ON task_access.id = task.opportunity_access_id
+    WHERE task_access.opportunity_id = opp.id AND task.status = 'assigned'
+) tasks
+WHERE opp.id = ANY(%(opportunity_ids)s)
+"""
+
+RECONCILE_STATS_SQL = f"""
+INSERT INTO opportunity_opportunitystats (opportunity_id, {", ".join(STATS_FIELDS)}, date_reconciled)
+SELECT stats.*, NOW() FROM ({STATS_SQL}) stats
+ON CONFLICT (opportunity_id) DO UPDATE
+SET {", ".join(f"{field} = EXCLUDED.{field}" for field in STATS_FIELDS + ("date_reconciled",))}
+"""
+
+DELETE_DAILY_STATS_SQL = """
+DELETE FROM opportunity_opportunitydailystats WHERE opportunity_id = ANY(%(opportunity_ids)s)
+"""
+
+# Buckets are rebuilt for the last DAILY_STATS_DAYS days only; older ones are dropped.
+DAILY_STATS_SQL = """
+SELECT opportunity_id, date, SUM(deliveries)::integer, SUM(accrued)::bigint
+FROM (
+    SELECT opportunity_id, (visit_date AT TIME ZONE 'UTC')::date AS date, COUNT(*) AS deliveries, 0 AS accrued
+    FROM opportunity_uservisit
+    WHERE opportunity_id = ANY(%(opportunity_ids)s) AND visit_date >= %(daily_since)s
+    GROUP BY 1, 2
+    UNION ALL
+    SELECT
+        access.opportunity_id,
+        (work.status_modified_date AT TIME ZONE 'UTC')::date,
+        0,
+        SUM(work.saved_payment_accrued)
+    FROM opportunity_completedwork work
+    JOIN opportunity_opportunityaccess access ON access.id = work.opportunity_access_id
+    WHERE access.opportunity_id = ANY(%(opportunity_ids)s)
+        AND work.status = 'approved'
+        AND work.status_modified_date >= %(daily_since)s
+    GROUP BY 1, 2
+) buckets
+GROUP BY opportunity_id, date
+"""
+
+RECONCILE_DAILY_STATS_SQL = f"""
+INSERT INTO opportunity_opportunitydailystats (opportunity_id, date, deliveries, accrued)
+{DAILY_STATS_SQL}
+"""
+
+ADD_DAILY_STATS_SQL = """
+INSERT INTO opportunity_opportunitydailystats AS daily (opportunity_id, date, deliveries, accrued)
+VALUES (%s, %s, %s, %s)
+ON CONFLICT (opportunity_id, date) DO UPDATE
+SET deliveries = daily.deliveries + EXCLUDED.deliveries, accrued = daily.accrued + EXCLUDED.accrued
+"""
+
+
+def utc_date(value: datetime.datetime) -> datetime.date:
+    """The day of ``value`` that its daily stats bucket is keyed on."""
+    return value.astimezone(datetime.UTC).date()
+
+
+def inactive_before() -> datetime.datetime:
+    """Workers last active before this time are counted as inactive, until the next reconciliation."""
+    return _today() - datetime.timedelta(days=INACTIVE_DAYS)
+
+
+def _today():
+    return now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _stats_params(opportunity_ids):
+    return {
+        "opportunity_ids": list(opportunity_ids),
+        "inactive_before": inactive_before(),
+        "daily_since": _today() - datetime.timedelta(days=DAILY_STATS_DAYS),
+    }
+
+
+def compute_opportunity_stats(opportunity_id):
+    """The stats and daily buckets of an opportunity computed from the source tables, without saving them.
+
+    Returns ``(None, [])`` for an opportunity that doesn't exist.
+    """
+    params = _stats_params([opportunity_id])
+    with connection.cursor() as cursor:
+        cursor.execute(STATS_SQL, params)
+        row = cursor.fetchone()
+        if row is None:
+            return None, []
+        cursor.execute(DAILY_STATS_SQL, params)
+        daily = [
+            OpportunityDailyStats(opportunity_id=opportunity_id, date=date, deliveries=deliveries, accrued=accrued)
+            for _, date, deliveries, accrued in cursor.fetchall()
+        ]
+    return OpportunityStats(**dict(zip(("opportunity_id",) + STATS_FIELDS, row))), daily
+
+
+def reconcile_opportunity_stats(opportunity_ids):
+    """Recompute the stats of the given opportunities from the source tables, creating missing ones."""
+    params = _stats_params(opportunity_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(RECONCILE_STATS_SQL, params)
+        cursor.execute(DELETE_DAILY_STATS_SQL, params)
+        cursor.execute(RECONCILE_DAILY_STATS_SQL, params)
+
+
+def adjust_opportunity_stats(opportunity_id, latest=None, daily=None, **deltas):
+    """Once the current transaction commits, add ``deltas`` to the opportunity's stats.
+
+    ``latest`` maps timestamp fields to a value they are raised to, and ``daily`` maps a date to
+    the ``deliveries`` and ``accrued`` to add to its bucket. Opportunities whose stats were never
+    built are left alone, as the task building them computes them in full.
+    """
+    if not any(deltas.values()) and not latest and not daily:
+        return
+    transaction.on_commit(
+        partial(_apply_stats_adjustment, opportunity_id, latest or {}, daily or {}, deltas), robust=True
+    )
+
+
+def _apply_stats_adjustment(opportunity_id, latest, daily, deltas):
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    updates.update({field: Greatest(F(field), Value(value)) for field, value in latest.items() if value})
+    with transaction.atomic():
+        stats = OpportunityStats.objects.filter(opportunity_id=opportunity_id)
+        found = stats.update(**updates) if updates else stats.exists()
+        if not found:
+            return
+        with connection.cursor() as cursor:
+            for date, bucket in daily.items():
+                cursor.execute(
+                    ADD_DAILY_STATS_SQL,
+                    [opportunity_id, date, bucket.get("deliveries", 0), bucket.get("accrued", 0)],
+                )
+
+
+def invite_stats_deltas(old_status, new_status):
+    """The change in invite counts of an invite moved from ``old_status`` to ``new_status``.
+
+    ``old_status`` is None for a new invite and ``new_status`` None for a deleted one.
+    """
+
+    def counts(status):
+        invited = status is not None and status != UserInviteStatus.not_found
+        return int(invited), int(invited and status != UserInviteStatus.accepted)
+
+    (old_invited, old_pending), (new_invited, new_pending) = counts(old_status), counts(new_status)
+    return {"workers_invited": new_invited - old_invited, "pending_invites": new_pending - old_pending}
+
+
+def last_active_stats_deltas(old_last_active, new_last_active):
+    """The change in the inactive worker count of an access whose ``last_active`` was updated."""
+
+    def inactive(last_active):
+        return int(last_active is not None and last_active < inactive_before())
+
+    return {"inactive_workers": inactive(new_last_active) - inactive(old_last_active)}
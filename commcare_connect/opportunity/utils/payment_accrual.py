@@ -0,0 +1,289 @@
+"""Set-based recalculation of CompletedWork status and payment accrual for an opportunity.
+
+Produces the same results as running ``CompletedWorkUpdater`` through ``update_status`` for each
+of the opportunity's workers, but in a fixed number of SQL statements however many workers and
+completed works there are:
+
+1. Lock the completed works being recalculated. The per-worker recalculations lock their
+   worker's completed works too, see ``lock_completed_work``, so the two exclude each other.
+2. Compute each completed work's completed and approved counts from ``CompletedWorkVisitCount``
+   (minimum over required deliver units, capped by the optional total) together with its new
+   status, into a temporary table.
+3. Constrain parents by the totals of their child payment units' work, one statement per level
+   of the payment unit hierarchy.
+4. Write status, reason and the ``saved_*`` fields back with one ``UPDATE ... FROM``, converting to
+   USD with the exchange rate in effect at each work's status change.
+5. Recompute ``OpportunityAccess.payment_accrued`` with one more ``UPDATE ... FROM``, adjusting the
+   opportunity's dashboard stats by the change.
+"""
+
+from django.db import connection, transaction
+
+from commcare_connect.opportunity.models import CompletedWork, CompletedWorkStatus, Opportunity, PaymentUnit
+from commcare_connect.opportunity.utils.opportunity_stats import adjust_opportunity_stats
+
+WORK_TABLE = "payment_accrual_work"
+
+CREATE_WORK_TABLE_SQL = f"""
+CREATE TEMPORARY TABLE {WORK_TABLE} ON COMMIT DROP AS
+WITH works AS (
+    SELECT cw.id, cw.opportunity_access_id, cw.payment_unit_id, cw.entity_id, cw.status,
+           cw.status_modified_date, {{scope}} AS in_scope
+    FROM opportunity_completedwork cw
+    JOIN opportunity_opportunityaccess oa ON oa.id = cw.opportunity_access_id
+    WHERE oa.opportunity_id = %(opportunity_id)s
+),
+unit_counts AS (
+    SELECT w.id,
+           LEAST(
+               COALESCE(MIN(COALESCE(c.visit_count, 0)) FILTER (WHERE NOT du.optional), 0),
+               SUM(COALESCE(c.visit_count, 0)) FILTER (WHERE du.optional)
+           ) AS completed,
+           LEAST(
+               COALESCE(MIN(COALESCE(c.agreed_count, 0)) FILTER (WHERE NOT du.optional), 0),
+               SUM(COALESCE(c.agreed_count, 0)) FILTER (WHERE du.optional)
+           ) AS approved,
+           COALESCE(BOOL_AND(COALESCE(c.agreed_count, 0) > 0) FILTER (WHERE NOT du.optional), TRUE)
+               AND COALESCE(BOOL_OR(COALESCE(c.agreed_count, 0) > 0) FILTER (WHERE du.optional), TRUE)
+               AS units_approved
+    FROM works w
+    JOIN opportunity_deliverunit du ON du.payment_unit_id = w.payment_unit_id
+    LEFT JOIN opportunity_completedworkvisitcount c ON c.completed_work_id = w.id AND c.deliver_unit_id = du.id
+    GROUP BY w.id
+),
+visit_totals AS (
+    SELECT c.completed_work_id AS id,
+           SUM(c.visit_count) > 0 AS has_visits,
+           SUM(c.rejected_count) > 0 AS has_rejected
+    FROM opportunity_completedworkvisitcount c
+    JOIN works w ON w.id = c.completed_work_id
+    GROUP BY c.completed_work_id
+),
+statuses AS (
+    SELECT w.*,
+           COALESCE(u.completed, 0) AS completed,
+           COALESCE(u.approved, 0) AS approved,
+           COALESCE(t.has_visits, FALSE) AS has_visits,
+           %(auto_approve)s AND COALESCE(t.has_rejected, FALSE) AS set_reason,
+           CASE
+               WHEN NOT %(auto_approve)s THEN w.status
+               WHEN t.has_rejected THEN %(rejected)s
+               WHEN COALESCE(u.units_approved, TRUE) THEN %(approved)s
+               WHEN w.status = %(incomplete)s THEN %(pending)s
+               ELSE w.status
+           END AS new_status
+    FROM works w
+    LEFT JOIN unit_counts u ON u.id = w.id
+    LEFT JOIN visit_totals t ON t.id = w.id
+)
+SELECT *,
+       CASE WHEN new_status = status THEN status_modified_date ELSE NOW() END AS new_status_modified_date
+FROM statuses
+"""
+
+APPLY_CHILD_UNITS_SQL = f"""
+UPDATE {WORK_TABLE} parent
+SET completed = LEAST(parent.completed, children.completed),
+    approved = LEAST(parent.approved, children.approved)
+FROM (
+    SELECT p.id, COALESCE(SUM(c.completed), 0) AS completed, COALESCE(SUM(c.approved), 0) AS approved
+    FROM {WORK_TABLE} p
+    JOIN opportunity_paymentunit child_unit ON child_unit.parent_payment_unit_id = p.payment_unit_id
+    LEFT JOIN {WORK_TABLE} c
+        ON c.payment_unit_id = child_unit.id
+        AND c.opportunity_access_id = p.opportunity_access_id
+        AND c.entity_id IS NOT DISTINCT FROM p.entity_id
+    WHERE p.payment_unit_id = ANY(%(payment_unit_ids)s)
+    GROUP BY p.id
+) children
+WHERE parent.id = children.id
+"""
+
+# Works whose payment is converted to USD, see ``CompletedWorkUpdater._update_payment``.
+ACCRUING_WORK_CONDITION = (
+    "w.in_scope AND w.has_visits AND w.completed >= 1 AND w.approved > 0 AND w.new_status = %(approved)s"
+)
+
+MISSING_RATE_DATES_SQL = f"""
+SELECT DISTINCT COALESCE(w.new_status_modified_date, NOW())::date
+FROM {WORK_TABLE} w
+WHERE {ACCRUING_WORK_CONDITION}
+  AND NOT EXISTS (
+      SELECT 1 FROM opportunity_exchangerate r
+      WHERE r.currency_code = %(currency_code)s AND r.rate_date <= COALESCE(w.new_status_modified_date, NOW())::date
+  )
+"""
+
+UPDATE_COMPLETED_WORK_SQL = f"""
+UPDATE opportunity_completedwork cw
+SET status = w.new_status,
+    status_modified_date = w.new_status_modified_date,
+    reason = CASE
+        WHEN w.set_reason THEN COALESCE(
+            (
+                SELECT STRING_AGG(v.reason, E'\\n' ORDER BY v.id)
+                FROM opportunity_uservisit v
+                WHERE v.completed_work_id = cw.id AND v.reason <> ''
+            ),
+            ''
+        )
+        ELSE cw.reason
+    END,
+    saved_completed_count = CASE WHEN w.completed >= 1 THEN w.completed ELSE cw.saved_completed_count END,
+    saved_approved_count = CASE WHEN w.completed >= 1 THEN w.approved ELSE cw.saved_approved_count END,
+    saved_payment_accrued = CASE WHEN w.completed >= 1 THEN w.amount ELSE cw.saved_payment_accrued END,
+    saved_payment_accrued_usd = CASE
+        WHEN w.completed >= 1 THEN COALESCE(w.amount / w.rate, 0)
+        ELSE cw.saved_payment_accrued_usd
+    END,
+    saved_org_payment_accrued = CASE WHEN w.completed >= 1 THEN w.org_amount ELSE cw.saved_org_payment_accrued END,
+    saved_org_payment_accrued_usd = CASE
+        WHEN w.completed >= 1 THEN COALESCE(w.org_amount / w.rate, 0)
+        ELSE cw.saved_org_payment_accrued_usd
+    END
+FROM (
+    SELECT w.*,
+           CASE WHEN {ACCRUING_WORK_CONDITION} THEN w.approved * pu.amount ELSE 0 END AS amount,
+           CASE WHEN {ACCRUING_WORK_CONDITION} THEN w.approved * pu.org_amount ELSE 0 END AS org_amount,
+           CASE
+               WHEN NOT ({ACCRUING_WORK_CONDITION}) THEN NULL
+               WHEN %(currency_code)s = 'USD' THEN 1::numeric
+               ELSE (
+                   SELECT r.rate FROM opportunity_exchangerate r
+                   WHERE r.currency_code = %(currency_code)s
+                     AND r.rate_date <= COALESCE(w.new_status_modified_date, NOW())::date
+                   ORDER BY r.rate_date DESC
+                   LIMIT 1
+               )
+           END AS rate
+    FROM {WORK_TABLE} w
+    JOIN opportunity_paymentunit pu ON pu.id = w.payment_unit_id
+    WHERE w.in_scope AND w.has_visits
+) w
+WHERE cw.id = w.id
+"""
+
+# Returns the change in the opportunity's total accrual.
+UPDATE_ACCESS_TOTALS_SQL = """
+WITH updated AS (
+    UPDATE opportunity_opportunityaccess oa
+    SET payment_accrued = totals.payment_accrued
+    FROM (
+        SELECT oa.id, oa.payment_accrued AS old_payment_accrued,
+               COALESCE(SUM(cw.saved_payment_accrued), 0) AS payment_accrued
+        FROM opportunity_opportunityaccess oa
+        LEFT JOIN opportunity_completedwork cw ON cw.opportunity_access_id = oa.id
+        WHERE {access_scope}
+        GROUP BY oa.id
+    ) totals
+    WHERE oa.id = totals.id
+    RETURNING totals.payment_accrued - totals.old_payment_accrued AS change
+)
+SELECT COALESCE(SUM(change), 0) FROM updated
+"""
+
+LOCK_COMPLETED_WORK_SQL = """
+SELECT COUNT(*) FROM (
+    SELECT cw.id
+    FROM opportunity_completedwork cw
+    JOIN opportunity_opportunityaccess oa ON oa.id = cw.opportunity_access_id
+    WHERE oa.opportunity_id = %(opportunity_id)s AND {scope}
+    ORDER BY cw.id
+    FOR UPDATE OF cw
+) locked
+"""
+
+
+def recompute_payment_accrual(
+    opportunity: Opportunity, access_ids=None, incremental=False, exclude_rejected=False
+) -> int:
+    """Recalculate status and payment for the completed works of ``opportunity``'s active workers.
+
+    ``access_ids`` restricts the recalculation to those accesses. ``incremental`` skips work that
+    is already approved and paid, as the form receiver's recalculation does, and
+    ``exclude_rejected`` skips rejected work. Returns the number of completed works updated.
+    """
+    access_scope = ["oa.opportunity_id = %(opportunity_id)s", "NOT oa.suspended"]
+    if access_ids is not None:
+        access_scope.append("oa.id = ANY(%(access_ids)s)")
+    work_scope = list(access_scope[1:])
+    if incremental:
+        work_scope.append("cw.saved_approved_count = 0 AND cw.status <> %(approved)s")
+    if exclude_rejected:
+        work_scope.append("cw.status <> %(rejected)s")
+    scope = " AND ".join(work_scope)
+
+    currency_code = opportunity.currency_code.upper() if opportunity.currency_code else None
+    params = {
+        "opportunity_id": opportunity.pk,
+        "access_ids": list(access_ids) if access_ids is not None else None,
+        "auto_approve": opportunity.auto_approve_payments,
+        "currency_code": currency_code,
+        "approved": CompletedWorkStatus.approved.value,
+        "rejected": CompletedWorkStatus.rejected.value,
+        "incomplete": CompletedWorkStatus.incomplete.value,
+        "pending": CompletedWorkStatus.pending.value,
+    }
+
+    from commcare_connect.opportunity.visit_import import get_exchange_rate
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(LOCK_COMPLETED_WORK_SQL.format(scope=scope), params)
+        cursor.execute(CREATE_WORK_TABLE_SQL.format(scope=scope), params)
+        for payment_unit_ids in get_parent_payment_unit_levels(opportunity):
+            cursor.execute(APPLY_CHILD_UNITS_SQL, {"payment_unit_ids": payment_unit_ids})
+        if currency_code != "USD":
+            cursor.execute(MISSING_RATE_DATES_SQL, params)
+            for (rate_date,) in cursor.fetchall():
+                # Fetches and stores the rate, or raises ImportException as CompletedWorkUpdater does.
+                get_exchange_rate(currency_code, rate_date)
+        cursor.execute(UPDATE_COMPLETED_WORK_SQL, params)
+        updated = cursor.rowcount
+        cursor.execute(UPDATE_ACCESS_TOTALS_SQL.format(access_scope=" AND ".join(access_scope)), params)
+        (accrued_change,) = cursor.fetchone()
+        cursor.execute(f"DROP TABLE {WORK_TABLE}")
+        adjust_opportunity_stats(opportunity.pk, total_accrued=int(accrued_change))
+    return updated
+
+
+def lock_completed_work(access):
+    """Lock the completed works of ``access`` until the current transaction ends.
+
+    Taken by the per-worker recalculations, which ``recompute_payment_accrual`` doesn't otherwise
+    exclude. Rows are locked in id order, as ``recompute_payment_accrual`` does, so that the two
+    can't deadlock.
+    """
+    list(
+        CompletedWork.objects.filter(opportunity_access=access)
+        .order_by("id")
+        .select_for_update()
+        .values_list("id", flat=True)
+    )
+
+
+def get_parent_payment_unit_levels(opportunity):
+    """Parent payment unit ids grouped so that each group only depends on groups before it."""
+    children = {}
+    for payment_unit_id, parent_id in PaymentUnit.objects.filter(opportunity=opportunity).values_list(
+        "id", "parent_payment_unit_id"
+    ):
+        children.setdefault(payment_unit_id, [])
+        if parent_id is not None:
+            children.setdefault(parent_id, []).append(payment_unit_id)
+
+    heights = {}
+
+    def height(payment_unit_id, seen=()):
+        if payment_unit_id not in heights:
+            child_ids = [child for child in children.get(payment_unit_id, []) if child not in seen]
+            heights[payment_unit_id] = 1 + max(
+                (height(child, (*seen, payment_unit_id)) for child in child_ids), default=-1
+            )
+        return heights[payment_unit_id]
+
+    levels = {}
+    for payment_unit_id in children:
+        level = height(payment_unit_id)
+        if level > 0:
+            levels.setdefault(level, []).append(payment_unit_id)
+    return [levels[level] for level in sorted(levels)]
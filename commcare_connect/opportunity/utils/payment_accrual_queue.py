@@ -0,0 +1,98 @@
+"""Queue of payment accrual recalculations for work delivered through the form receiver.
+
+Recalculating an access's payment locks its completed works, which the bulk recalculations lock
+too, so doing it while processing each delivery form made a worker's submissions queue on one
+another.
+``queue_payment_accrual`` instead records the access, and the completed work the visit went to,
+in a ``PendingPaymentAccrual`` entry. Submissions made before the entry is processed are merged
+into it, and only the one that created it schedules ``process_payment_accrual``, so a burst from
+one worker is recalculated once. ``process_pending_payment_accruals`` reschedules entries whose
+task was lost, which bounds how long ``payment_accrued`` can lag behind the visits.
+"""
+
+from datetime import timedelta
+from functools import partial
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from commcare_connect.opportunity.models import CompletedWorkStatus, OpportunityAccess, PendingPaymentAccrual
+from commcare_connect.opportunity.utils.completed_work import update_status
+from commcare_connect.opportunity.utils.payment_accrual import lock_completed_work
+
+# Entries still queued after this long are assumed to have lost their task.
+STALE_PAYMENT_ACCRUAL_AGE = timedelta(minutes=5)
+
+QUEUE_PAYMENT_ACCRUAL_SQL = """
+INSERT INTO opportunity_pendingpaymentaccrual AS queued
+    (opportunity_access_id, completed_work_ids, version, date_queued)
+VALUES (%(access_id)s, %(completed_work_ids)s, 0, NOW())
+ON CONFLICT (opportunity_access_id) DO UPDATE
+SET completed_work_ids = ARRAY(
+        SELECT DISTINCT unnest(queued.completed_work_ids || EXCLUDED.completed_work_ids) ORDER BY 1
+    ),
+    version = queued.version + 1
+RETURNING version = 0
+"""
+
+
+def queue_payment_accrual(access: OpportunityAccess, completed_work_id=None):
+    """Queue the recalculation of ``access``'s payment accrual, to run once the current transaction commits.
+
+    ``completed_work_id`` is recalculated even if it is already approved, e.g. when it was paid
+    and has just received another auto-approved visit.
+    """
+    from commcare_connect.opportunity.tasks import process_payment_accrual
+
+    completed_work_ids = [completed_work_id] if completed_work_id is not None else []
+    with connection.cursor() as cursor:
+        cursor.execute(QUEUE_PAYMENT_ACCRUAL_SQL, {"access_id": access.id, "completed_work_ids": completed_work_ids})
+        (created,) = cursor.fetchone()
+    if created:
+        transaction.on_commit(partial(process_payment_accrual.delay, access.id), robust=True)
+
+
+def drain_payment_accrual(access_id) -> bool:
+    """Recalculate the payment accrual queued for ``access_id``.
+
+    Returns False if more work was queued for the access while it was being recalculated, in
+    which case its entry is left for another run.
+    """
+    entry = PendingPaymentAccrual.objects.filter(opportunity_access_id=access_id).first()
+    if entry is None:
+        return True
+    access = OpportunityAccess.objects.get(id=access_id)
+    update_payment_accrued_for_user(access, incremental=True, completed_work_ids=entry.completed_work_ids)
+    deleted, _ = PendingPaymentAccrual.objects.filter(id=entry.id, version=entry.version).delete()
+    return bool(deleted)
+
+
+def get_stale_payment_accruals():
+    """Ids of the accesses whose queued recalculation should have run by now."""
+    return PendingPaymentAccrual.objects.filter(date_queued__lt=now() - STALE_PAYMENT_ACCRUAL_AGE).values_list(
+        "opportunity_access_id", flat=True
+    )
+
+
+def update_payment_accrued_for_user(opportunity_access, incremental, completed_work_ids=None):
+    """Recalculate payment for the access's CompletedWork records.
+    When incremental, CompletedWork already fully processed (approved, with its
+    payment already computed) is skipped for performance. Pass completed_work_ids
+    to always include those records regardless — e.g. a CompletedWork that was
+    already approved but just received another auto-approved visit (duplicate
+    entity submission), whose payment total is now stale.
+    """
+    incremental_filter = Q()
+    if incremental:
+        incremental_filter = Q(saved_approved_count=0) & ~Q(status=CompletedWorkStatus.approved)
+        if completed_work_ids:
+            incremental_filter |= Q(id__in=completed_work_ids)
+
+    with cache.lock(f"update_payment_accrued_lock_{opportunity_access.id}", timeout=900), transaction.atomic():
+        lock_completed_work(opportunity_access)
+        completed_works = opportunity_access.completedwork_set.filter(incremental_filter).select_related(
+            "payment_unit"
+        )
+        update_status(completed_works, opportunity_access, compute_payment=True)
@@ -77,6 +77,7 @@ from commcare_connect.opportunity.filters import (
     UserTasksFilterSet,
 )
 from commcare_connect.opportunity.forms import (
+    QUESTION_PATH_DATALIST_ID,
     AddBudgetExistingUsersForm,
     AddBudgetNewUsersForm,
     AddTaskTypeForm,
@@ -103,6 +104,7 @@ from commcare_connect.opportunity.forms import (
 from commcare_connect.opportunity.helpers import (
     OpportunityData,
     get_annotated_opportunity_access_deliver_status,
+    get_completed_work_table_data,
     get_opportunity_delivery_progress,
     get_opportunity_funnel_progress,
     get_opportunity_worker_progress,
@@ -191,7 +193,10 @@ from commcare_connect.opportunity.utils.completed_work import (
     get_uninvoiced_completed_works_qs,
     get_uninvoiced_visit_items,
 )
+from commcare_connect.opportunity.utils.form_json_keys import get_app_form_json_paths
 from commcare_connect.opportunity.utils.invoice import InvoiceWorkflow
+from commcare_connect.opportunity.utils.list_metrics import invalidate_opportunity_list_metrics
+from commcare_connect.opportunity.utils.opportunity_stats import adjust_opportunity_stats, invite_stats_deltas
 from commcare_connect.opportunity.visit_import import (
     PAYMENT_IMPORT_FORMATS,
     ImportException,
@@ -1066,6 +1071,8 @@ def payment_delete(request, org_slug=None, opp_id=None, access_id=None, pk=None)
     payment_id = payment.id
     payment_uuid = payment.payment_id
     payment.delete()
+    adjust_opportunity_stats(request.opportunity.id, total_paid=-payment.amount)
+    invalidate_opportunity_list_metrics(request.opportunity.id)
 
     send_push_notification_task.delay(
         [opportunity_access.user_id],
@@ -1378,6 +1385,8 @@ def verification_flags_config(request, org_slug=None, opp_id=None):
             form=form,
             deliver_unit_formset=deliver_unit_formset,
             form_json_formset=form_json_formset,
+            question_path_datalist_id=QUESTION_PATH_DATALIST_ID,
+            question_paths=[".".join(path) for path in get_app_form_json_paths(request.opportunity.deliver_app_id)],
             path=path,
         ),
     )
@@ -1521,10 +1530,7 @@ class OpportunityCompletedWorkTable(OrganizationUserMixin, OpportunityObjectMixi
     template_name = "tables/single_table.html"
 
     def get_queryset(self):
-        access_objects = OpportunityAccess.objects.filter(opportunity=self.get_opportunity())
-        return list(
-            filter(lambda cw: cw.completed, CompletedWork.objects.filter(opportunity_access__in=access_objects))
-        )
+        return get_completed_work_table_data(self.get_opportunity())
 
 
 @org_member_required
@@ -2081,8 +2087,12 @@ def delete_user_invites(request, org_slug, opp_id):
     opportunity_access_ids = [invite.opportunity_access.id for invite in user_invites if invite.opportunity_access]
     deleted_count = user_invites.count()
     cannot_delete_count = len(invite_ids) - deleted_count
+    stats_deltas = Counter()
+    for invite in user_invites:
+        stats_deltas.update(invite_stats_deltas(invite.status, None))
     user_invites.delete()
     OpportunityAccess.objects.filter(id__in=opportunity_access_ids).delete()
+    adjust_opportunity_stats(request.opportunity.id, **stats_deltas)
 
     event = Event(
         name="user_invites_deleted",
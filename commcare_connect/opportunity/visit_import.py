@@ -7,10 +7,9 @@ from decimal import Decimal, InvalidOperation
 from functools import partial
 from itertools import chain
 
-from django.core.cache import cache
 from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Max, Sum
 from django.utils.html import escape, format_html, format_html_join
 from django.utils.timezone import now
 from django.utils.translation import ngettext
@@ -29,7 +28,10 @@ from commcare_connect.opportunity.models import (
     VisitValidationStatus,
 )
 from commcare_connect.opportunity.tasks import bulk_update_payment_accrued, send_payment_notification
-from commcare_connect.opportunity.utils.completed_work import update_status, update_work_payment_date
+from commcare_connect.opportunity.utils.completed_work import update_work_payment_date
+from commcare_connect.opportunity.utils.list_metrics import invalidate_opportunity_list_metrics
+from commcare_connect.opportunity.utils.opportunity_stats import adjust_opportunity_stats
+from commcare_connect.opportunity.utils.payment_accrual import recompute_payment_accrual
 from commcare_connect.utils.file import get_file_extension
 from commcare_connect.utils.itertools import batched
 
@@ -234,31 +236,9 @@ def update_payment_accrued(opportunity: Opportunity, users: list, incremental=Fa
     """Updates payment accrued for completed and approved CompletedWork instances.
     Skips already processed completed works when incremental is true."""
 
-    access_objects = OpportunityAccess.objects.filter(user__in=users, opportunity=opportunity, suspended=False)
-
-    for access in access_objects:
-        update_payment_accrued_for_user(access, incremental)
-
-
-def update_payment_accrued_for_user(opportunity_access, incremental, completed_work_id=None):
-    """Recalculate payment for the access's CompletedWork records.
-    When incremental, CompletedWork already fully processed (approved, with its
-    payment already computed) is skipped for performance. Pass completed_work_id
-    to always include that specific record regardless — e.g. a CompletedWork that
-    was already approved but just received another auto-approved visit (duplicate
-    entity submission), whose payment total is now stale.
-    """
-    incremental_filter = Q()
-    if incremental:
-        incremental_filter = Q(saved_approved_count=0) & ~Q(status=CompletedWorkStatus.approved)
-        if completed_work_id is not None:
-            incremental_filter |= Q(id=completed_work_id)
-
-    with cache.lock(f"update_payment_accrued_lock_{opportunity_access.id}", timeout=900):
-        completed_works = opportunity_access.completedwork_set.filter(incremental_filter).select_related(
-            "payment_unit"
-        )
-        update_status(completed_works, opportunity_access, compute_payment=True)
+    access_ids = OpportunityAccess.objects.filter(user__in=users, opportunity=opportunity).values_list("id", flat=True)
+    recompute_payment_accrual(opportunity, access_ids=list(access_ids), incremental=incremental)
+    invalidate_opportunity_list_metrics(opportunity.id)
 
 
 def get_data_by_visit_id(headers, rows) -> dict[int, VisitData]:
@@ -506,6 +486,11 @@ def _create_payments(opportunity, payments_by_user, accesses, exchange_rates):
         Payment.objects.bulk_create(payments)
         for username in payments_by_user:
             update_work_payment_date(accesses[username])
+        paid = Payment.objects.filter(pk__in=[payment.pk for payment in payments]).aggregate(
+            total=Sum("amount"), latest=Max("date_paid")
+        )
+        adjust_opportunity_stats(opportunity.id, latest={"recent_payment": paid["latest"]}, total_paid=paid["total"])
+        invalidate_opportunity_list_metrics(opportunity.id)
 
     transaction.on_commit(
         partial(send_payment_notification.delay, opportunity.id, [payment.pk for payment in payments])
@@ -33,6 +33,11 @@ from commcare_connect.connect_id_client.models import ConnectIdUser
 from commcare_connect.flags.models import Flag
 from commcare_connect.opportunity.models import HQApiKey, Opportunity, OpportunityAccess, UserInvite, UserInviteStatus
 from commcare_connect.opportunity.tasks import update_user_and_send_invite
+from commcare_connect.opportunity.utils.opportunity_stats import (
+    adjust_opportunity_stats,
+    invite_stats_deltas,
+    last_active_stats_deltas,
+)
 from commcare_connect.users.forms import ManualUserOTPForm
 from commcare_connect.utils.db import get_object_or_list_by_uuid_or_int
 from commcare_connect.utils.error_codes import ErrorCodes
@@ -128,13 +133,21 @@ def start_learn_app(request):
     with transaction.atomic():
         if access_object.date_learn_started is None:
             access_object.date_learn_started = now()
+            adjust_opportunity_stats(opportunity.id, started_learning=1)
 
             if not access_object.last_active or access_object.last_active < access_object.date_learn_started:
+                adjust_opportunity_stats(
+                    opportunity.id,
+                    **last_active_stats_deltas(access_object.last_active, access_object.date_learn_started),
+                )
                 access_object.last_active = access_object.date_learn_started
 
         access_object.accepted = True
         access_object.save()
         user_invite = UserInvite.objects.get(opportunity_access=access_object)
+        adjust_opportunity_stats(
+            user_invite.opportunity_id, **invite_stats_deltas(user_invite.status, UserInviteStatus.accepted)
+        )
         user_invite.status = UserInviteStatus.accepted
         user_invite.save()
     return Response()
@@ -194,6 +207,9 @@ class AcceptInviteView(View):
         o.accepted = True
         o.save()
         user_invite = UserInvite.objects.get(opportunity_access=o)
+        adjust_opportunity_stats(
+            user_invite.opportunity_id, **invite_stats_deltas(user_invite.status, UserInviteStatus.accepted)
+        )
         user_invite.status = UserInviteStatus.accepted
         user_invite.save()
         return HttpResponse(
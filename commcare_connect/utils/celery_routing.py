@@ -0,0 +1,115 @@
+"""Routing of Celery tasks to queues by the kind of work they do.
+
+Each kind gets its own queue so that, say, a large export can't hold up the attachment
+downloads of every other opportunity. Tasks not listed here stay on the default queue.
+
+With ``CELERY_OPPORTUNITY_QUEUE_SHARDS`` above 1, tasks that take an opportunity id are further
+spread over that many queues per kind (``exports.0``, ``exports.1``, ...), picked by the
+opportunity id. A worker consuming all the shards of a kind takes from each in turn, so one
+opportunity's backlog only delays the opportunities sharing its shard.
+"""
+
+import functools
+import inspect
+
+from django.conf import settings
+
+INGEST_QUEUE = "ingest"
+ATTACHMENTS_QUEUE = "attachments"
+RECALCULATION_QUEUE = "recalculation"
+EXPORTS_QUEUE = "exports"
+NOTIFICATIONS_QUEUE = "notifications"
+
+QUEUES = (INGEST_QUEUE, ATTACHMENTS_QUEUE, RECALCULATION_QUEUE, EXPORTS_QUEUE, NOTIFICATIONS_QUEUE)
+
+TASK_QUEUES = {
+    "commcare_connect.form_receiver.tasks.process_xform_submissions": INGEST_QUEUE,
+    "commcare_connect.form_receiver.tasks.process_pending_xform_submissions": INGEST_QUEUE,
+    "commcare_connect.opportunity.tasks.bulk_update_visit_status_task": INGEST_QUEUE,
+    "commcare_connect.opportunity.tasks.bulk_update_payments_task": INGEST_QUEUE,
+    "commcare_connect.opportunity.tasks.add_connect_users": INGEST_QUEUE,
+    "commcare_connect.microplanning.tasks.import_work_areas_task": INGEST_QUEUE,
+    "commcare_connect.microplanning.tasks.import_implementation_areas_task": INGEST_QUEUE,
+    "commcare_connect.opportunity.tasks.download_user_visit_attachments": ATTACHMENTS_QUEUE,
+    "commcare_connect.opportunity.tasks.download_inaccessibility_request_attachments": ATTACHMENTS_QUEUE,
+    "commcare_connect.opportunity.tasks.process_payment_accrual": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.process_pending_payment_accruals": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.bulk_update_payment_accrued": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.bulk_approve_completed_work": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.reconcile_opportunity_stats": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.build_opportunity_stats": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.record_visit_form_json_keys": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.refresh_form_json_key_catalogs": RECALCULATION_QUEUE,
+    "commcare_connect.microplanning.tasks.cluster_work_areas_task": RECALCULATION_QUEUE,
+    "commcare_connect.opportunity.tasks.generate_visit_export": EXPORTS_QUEUE,
+    "commcare_connect.opportunity.tasks.generate_review_visit_export": EXPORTS_QUEUE,
+    "commcare_connect.opportunity.tasks.generate_payment_export": EXPORTS_QUEUE,
+    "commcare_connect.opportunity.tasks.generate_user_status_export": EXPORTS_QUEUE,
+    "commcare_connect.opportunity.tasks.generate_deliver_status_export": EXPORTS_QUEUE,
+    "commcare_connect.opportunity.tasks.generate_work_status_export": EXPORTS_QUEUE,
+    "commcare_connect.opportunity.tasks.generate_catchment_area_export": EXPORTS_QUEUE,
+    "commcare_connect.reports.tasks.export_invoice_report_task": EXPORTS_QUEUE,
+    "audit.generate_audit_reports": EXPORTS_QUEUE,
+    "audit.generate_audit_report": EXPORTS_QUEUE,
+    "commcare_connect.opportunity.tasks.invite_user": NOTIFICATIONS_QUEUE,
+    "commcare_connect.opportunity.tasks.send_notification_inactive_users": NOTIFICATIONS_QUEUE,
+    "commcare_connect.opportunity.tasks.send_payment_notification": NOTIFICATIONS_QUEUE,
+    "commcare_connect.opportunity.tasks.send_push_notification_task": NOTIFICATIONS_QUEUE,
+    "commcare_connect.opportunity.tasks.send_task_assignment_notification": NOTIFICATIONS_QUEUE,
+    "commcare_connect.opportunity.tasks.send_task_completion_notification": NOTIFICATIONS_QUEUE,
+    "commcare_connect.opportunity.tasks.notify_user_for_scored_assessment": NOTIFICATIONS_QUEUE,
+    "commcare_connect.opportunity.tasks.send_invoice_paid_mail": NOTIFICATIONS_QUEUE,
+    "commcare_connect.microplanning.tasks.send_work_area_assignment_notification": NOTIFICATIONS_QUEUE,
+    "commcare_connect.utils.tasks.send_mail_async": NOTIFICATIONS_QUEUE,
+    "audit.notify_audit_reports": NOTIFICATIONS_QUEUE,
+}
+
+OPPORTUNITY_ARGUMENTS = ("opportunity_id", "opp_id")
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Celery router sending the tasks in TASK_QUEUES to the queue, or shard, of their kind."""
+    queue = TASK_QUEUES.get(name)
+    if queue is None:
+        return None
+    shards = settings.CELERY_OPPORTUNITY_QUEUE_SHARDS
+    if shards > 1 and task is not None:
+        opportunity_id = _get_opportunity_id(task, args, kwargs)
+        if opportunity_id is not None:
+            return {"queue": get_shard_queue(queue, int(opportunity_id) % shards)}
+    return {"queue": queue}
+
+
+def get_shard_queue(queue, shard):
+    return f"{queue}.{shard}"
+
+
+def get_queue_names(queue=None):
+    """Every queue a worker has to consume for ``queue``, or for all tasks when not given."""
+    shards = settings.CELERY_OPPORTUNITY_QUEUE_SHARDS
+    queues = [queue] if queue else [settings.CELERY_TASK_DEFAULT_QUEUE, *QUEUES]
+    names = []
+    for name in queues:
+        names.append(name)
+        if shards > 1 and name in QUEUES:
+            names.extend(get_shard_queue(name, shard) for shard in range(shards))
+    return names
+
+
+def _get_opportunity_id(task, args, kwargs):
+    argument = _get_opportunity_argument(task)
+    if argument is None:
+        return None
+    position, name = argument
+    if name in kwargs:
+        return kwargs[name]
+    return args[position] if position < len(args) else None
+
+
+@functools.cache
+def _get_opportunity_argument(task):
+    """Position and name of the task's opportunity id parameter, if it has one."""
+    for position, name in enumerate(inspect.signature(task.run).parameters):
+        if name in OPPORTUNITY_ARGUMENTS:
+            return position, name
+    return None
@@ -0,0 +1,34 @@
+from commcare_connect.opportunity.tasks import download_user_visit_attachments, generate_payment_export
+from commcare_connect.users.tasks import clear_expired_oauth_tokens
+from commcare_connect.utils.celery_routing import TASK_QUEUES, get_queue_names, route_task
+from config import celery_app
+
+
+def _route(task, *args, **kwargs):
+    return route_task(task.name, args, kwargs, {}, task=task)
+
+
+def test_routed_tasks_exist():
+    celery_app.loader.import_default_modules()
+    assert set(TASK_QUEUES) - set(celery_app.tasks) == set()
+
+
+def test_route_by_kind(settings):
+    settings.CELERY_OPPORTUNITY_QUEUE_SHARDS = 1
+    assert _route(download_user_visit_attachments, 1) == {"queue": "attachments"}
+    assert _route(generate_payment_export, 7, "csv") == {"queue": "exports"}
+    assert _route(clear_expired_oauth_tokens) is None
+
+
+def test_route_by_opportunity_shard(settings):
+    settings.CELERY_OPPORTUNITY_QUEUE_SHARDS = 4
+    assert _route(generate_payment_export, 7, "csv") == {"queue": "exports.3"}
+    assert _route(generate_payment_export, opportunity_id=8, export_format="csv") == {"queue": "exports.0"}
+    # Tasks without an opportunity id stay on the unsharded queue.
+    assert _route(download_user_visit_attachments, 7) == {"queue": "attachments"}
+
+
+def test_queue_names(settings):
+    settings.CELERY_OPPORTUNITY_QUEUE_SHARDS = 2
+    assert get_queue_names("exports") == ["exports", "exports.0", "exports.1"]
+    assert get_queue_names()[:4] == ["celery", "ingest", "ingest.0", "ingest.1"]
@@ -2,7 +2,7 @@ from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter, SimpleRouter
 
-from commcare_connect.form_receiver.views import FormReceiver
+from commcare_connect.form_receiver.views import BulkFormReceiver, FormReceiver, FormSubmissionStatusView
 from commcare_connect.opportunity.api.views.automation import (
     InviteUsersView,
     OpportunityActivateView,
@@ -39,6 +39,8 @@ app_name = "api"
 urlpatterns = [
     path("", include(router.urls)),
     path("receiver/", FormReceiver.as_view(), name="receiver"),
+    path("receiver/bulk/", BulkFormReceiver.as_view(), name="receiver_bulk"),
+    path("receiver/status/", FormSubmissionStatusView.as_view(), name="receiver_status"),
     path("task_completed/", TaskCompletedView.as_view(), name="task_completed"),
     path("opportunity/<slug:pk>/learn_progress", UserLearnProgressView.as_view(), name="learn_progress"),
     path("opportunity/<slug:pk>/claim", ClaimOpportunityView.as_view()),
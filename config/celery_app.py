@@ -1,8 +1,9 @@
 import os
+import time
 
 import sentry_sdk
 from celery import Celery
-from celery.signals import task_retry
+from celery.signals import before_task_publish, task_retry
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
@@ -28,3 +29,10 @@ def sentry_log_retry(request=None, reason=None, einfo=None, **kwargs):
         if reason:
             scope.set_extra("reason", str(reason))
         sentry_sdk.capture_message("Celery task retrying", level="warning")
+
+
+@before_task_publish.connect
+def record_publish_time(headers=None, **kwargs):
+    # Read by the celery_queues command to report how long tasks have been waiting.
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
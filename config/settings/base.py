@@ -304,6 +304,19 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_WORKER_SEND_TASK_EVENTS = True
 CELERY_TASK_SEND_SENT_EVENT = True
 CELERY_TASK_TRACK_STARTED = True
+CELERY_TASK_DEFAULT_QUEUE = "celery"
+# Sends tasks to a queue per kind of work, see commcare_connect/utils/celery_routing.py.
+CELERY_TASK_ROUTES = ("commcare_connect.utils.celery_routing.route_task",)
+# Queues per kind that tasks taking an opportunity id are spread over. Workers consume every shard.
+CELERY_OPPORTUNITY_QUEUE_SHARDS = env.int("CELERY_OPPORTUNITY_QUEUE_SHARDS", default=1)
+# Worker processes for each queue when it is given its own worker with CELERY_WORKER_QUEUE.
+CELERY_QUEUE_CONCURRENCY = {
+    "ingest": env.int("CELERY_INGEST_CONCURRENCY", default=2),
+    "attachments": env.int("CELERY_ATTACHMENTS_CONCURRENCY", default=2),
+    "recalculation": env.int("CELERY_RECALCULATION_CONCURRENCY", default=2),
+    "exports": env.int("CELERY_EXPORTS_CONCURRENCY", default=1),
+    "notifications": env.int("CELERY_NOTIFICATIONS_CONCURRENCY", default=1),
+}
 
 # django-allauth
 # ------------------------------------------------------------------------------